@@ -5,6 +5,12 @@ from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from routes import auth, holdings, portfolio, fyers, schemes
 from db import client, ensure_indexes
+from core.http import aclose_async_client
+from services.quote_refresher import quote_refresher
+from services.sip_batch import sip_batch_job
+from services.isin_master import isin_master
+from services.close_store import close_store
+from services.cas_jobs import cas_jobs
 from core.limiter import limiter
 from core.logging import setup_logging, get_logger
 from core.config import settings
@@ -52,6 +58,23 @@ def startup_db_client():
         # Unique index creation fails if duplicate users already exist;
         # keep serving but log loudly so it gets fixed.
         logger.critical(f"MongoDB index creation failed: {e}")
+    # Warm live quotes during market hours (one leader across workers)
+    quote_refresher.start()
+    # Nightly SIP installment sync / NAV allocation (one runner across workers)
+    sip_batch_job.start()
+    # Keep the persisted ISIN -> symbol master current (conditional GETs)
+    isin_master.start()
+    # Daily closes for every held symbol, for historical D-1 estimation
+    close_store.start()
+
+@app.on_event("shutdown")
+async def shutdown_background_jobs():
+    quote_refresher.stop()
+    sip_batch_job.stop()
+    isin_master.stop()
+    close_store.stop()
+    cas_jobs.shutdown()
+    await aclose_async_client()
 
 # Routes
 app.include_router(auth.router)
@@ -26,6 +26,67 @@ class Settings:
         else "http://localhost:8000/api/fyers/callback"
     )
 
+    # Fyers historical candles: batch fetches fan out over this many threads,
+    # and every history call in the process shares one per-second budget.
+    FYERS_HISTORY_WORKERS: int = int(os.getenv("FYERS_HISTORY_WORKERS", "8"))
+    FYERS_HISTORY_RATE_PER_SECOND: float = float(os.getenv("FYERS_HISTORY_RATE_PER_SECOND", "8"))
+
+    # Live quote cache: how long a % change is reused while the market is open.
+    # Outside market hours quotes are frozen and cached until the next open.
+    QUOTE_CACHE_MARKET_TTL_SECONDS: int = int(os.getenv("QUOTE_CACHE_MARKET_TTL_SECONDS", "5"))
+
+    # Background quote refresher: one worker (Mongo lease) polls the symbol
+    # universe during market hours; the others copy its published snapshot.
+    QUOTE_REFRESH_ENABLED: bool = os.getenv("QUOTE_REFRESH_ENABLED", "true").lower() == "true"
+    QUOTE_REFRESH_INTERVAL_SECONDS: int = int(os.getenv("QUOTE_REFRESH_INTERVAL_SECONDS", "10"))
+    QUOTE_REFRESH_JITTER_SECONDS: float = float(os.getenv("QUOTE_REFRESH_JITTER_SECONDS", "2"))
+
+    # Optional streaming quotes: the refresher leader keeps the Fyers data
+    # socket subscribed to every held symbol instead of polling REST quotes.
+    # QUOTE_STREAM_URL=tcp://host:port reads the same ticks from a local feed.
+    QUOTE_STREAM_ENABLED: bool = os.getenv("QUOTE_STREAM_ENABLED", "false").lower() == "true"
+    QUOTE_STREAM_URL: str = os.getenv("QUOTE_STREAM_URL", "")
+
+    # NSE scraping fallback: one process-wide client. Requests per second are
+    # capped; concurrency adapts between 1 and NSE_MAX_CONCURRENCY. A symbol
+    # with no quote NSE_BREAKER_FAILURES times in a row is skipped for the cooldown.
+    NSE_RATE_PER_SECOND: float = float(os.getenv("NSE_RATE_PER_SECOND", "10"))
+    NSE_MAX_CONCURRENCY: int = int(os.getenv("NSE_MAX_CONCURRENCY", "12"))
+    NSE_BREAKER_FAILURES: int = int(os.getenv("NSE_BREAKER_FAILURES", "3"))
+    NSE_BREAKER_COOLDOWN_SECONDS: int = int(os.getenv("NSE_BREAKER_COOLDOWN_SECONDS", "300"))
+
+    # P&L result cache: upper bound on how long a memoized calculate_pnl result
+    # is reused. Keys already change with the document, NAV date and quotes.
+    PNL_CACHE_TTL_SECONDS: int = int(os.getenv("PNL_CACHE_TTL_SECONDS", "3600"))
+
+    # Nightly SIP batch: adds due installments and allocates pending NAVs for
+    # every SIP fund. Runs once a day at this IST time (HH:MM), after AMFI
+    # has published the day's NAVs; a missed run is caught up on startup.
+    SIP_BATCH_ENABLED: bool = os.getenv("SIP_BATCH_ENABLED", "true").lower() == "true"
+    SIP_BATCH_TIME: str = os.getenv("SIP_BATCH_TIME", "23:30")
+
+    # ISIN master: exchange symbol lists are re-checked (conditional GET) by
+    # one worker at most this often; unchanged files cost a 304.
+    ISIN_MASTER_REFRESH_ENABLED: bool = os.getenv("ISIN_MASTER_REFRESH_ENABLED", "true").lower() == "true"
+    ISIN_MASTER_REFRESH_HOURS: int = int(os.getenv("ISIN_MASTER_REFRESH_HOURS", "24"))
+
+    # CAS parsing runs in a process pool per worker. Jobs beyond the pending
+    # limit are refused; parsed results are reused (by content hash) for this long.
+    CAS_PARSE_WORKERS: int = int(os.getenv("CAS_PARSE_WORKERS", "1"))
+    CAS_MAX_PENDING_JOBS: int = int(os.getenv("CAS_MAX_PENDING_JOBS", "4"))
+    CAS_RESULT_TTL_SECONDS: int = int(os.getenv("CAS_RESULT_TTL_SECONDS", "600"))
+
+    # Daily stock closes cached on disk (one .npz per symbol), filled in bulk
+    # from yfinance; used by the NAV estimate backtest.
+    PRICE_HISTORY_DIR: str = os.getenv(
+        "PRICE_HISTORY_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "price_history")
+    )
+
+    # In-memory daily closes for every held symbol, topped up from the price
+    # history once a day; serves historical D-1 estimation without Fyers calls.
+    CLOSE_STORE_ENABLED: bool = os.getenv("CLOSE_STORE_ENABLED", "true").lower() == "true"
+    CLOSE_STORE_DAYS: int = int(os.getenv("CLOSE_STORE_DAYS", "45"))
+
 settings = Settings()
 
 if not settings.SECRET_KEY:
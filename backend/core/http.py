@@ -0,0 +1,85 @@
+"""
+Shared async HTTP client for upstream market-data calls (mfapi.in, Fyers).
+
+One connection-pooled httpx.AsyncClient per worker keeps connections alive
+across requests, and per-host semaphores bound how many calls are in flight
+to each upstream so a burst of concurrent P&L requests cannot overload them.
+"""
+import asyncio
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from core.logging import get_logger
+
+logger = get_logger("HTTP")
+
+# Pool limits for the whole worker
+MAX_CONNECTIONS = 50
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY_SECONDS = 30
+DEFAULT_TIMEOUT_SECONDS = 10
+
+# Max in-flight requests per upstream host. NSE quotes go through
+# services.nse_client, which adapts its own concurrency.
+HOST_CONCURRENCY = {
+    "api.mfapi.in": 8,
+    "api-t1.fyers.in": 4,
+}
+DEFAULT_HOST_CONCURRENCY = 8
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Returns the worker's pooled client, creating it on first use. Pools are
+    bound to the event loop, so a new loop (e.g. asyncio.run in a script or
+    test) gets its own client.
+    """
+    global _client, _client_loop, _semaphores
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=DEFAULT_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            follow_redirects=True,
+        )
+        _client_loop = loop
+        _semaphores = {}
+    return _client
+
+
+def upstream_slot(url: str) -> asyncio.Semaphore:
+    """Semaphore bounding concurrent requests to the host of `url`."""
+    host = urlsplit(url).hostname or ""
+    sem = _semaphores.get(host)
+    if sem is None:
+        sem = asyncio.Semaphore(HOST_CONCURRENCY.get(host, DEFAULT_HOST_CONCURRENCY))
+        _semaphores[host] = sem
+    return sem
+
+
+async def get(url: str, **kwargs) -> httpx.Response:
+    """GET through the shared client, holding the host's concurrency slot."""
+    client = get_async_client()
+    async with upstream_slot(url):
+        return await client.get(url, **kwargs)
+
+
+async def aclose_async_client():
+    """Closes the pooled client; called on app shutdown."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        try:
+            await _client.aclose()
+        except Exception as e:
+            logger.debug(f"Error closing HTTP client: {e}")
+    _client = None
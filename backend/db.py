@@ -26,6 +26,12 @@ except (InvalidURI, ConfigurationError) as e:
 db = client[settings.MONGO_DB]
 holdings_collection = db["holdings"]
 users_collection = db["users"]
+nav_history_collection = db["nav_history"]
+scheduler_locks_collection = db["scheduler_locks"]
+quote_snapshots_collection = db["quote_snapshots"]
+isin_master_collection = db["isin_master"]
+cas_jobs_collection = db["cas_jobs"]
+exposure_index_collection = db["exposure_index"]
 
 
 def ensure_indexes():
@@ -33,3 +39,10 @@ def ensure_indexes():
     users_collection.create_index("username", unique=True)
     users_collection.create_index("email", unique=True)
     holdings_collection.create_index("user_id")
+    nav_history_collection.create_index("scheme_code", unique=True)
+    # Parsed CAS results are short-lived: Mongo drops them at expires_at
+    cas_jobs_collection.create_index("expires_at", expireAfterSeconds=0)
+    cas_jobs_collection.create_index("key")
+    # Look-through reads one user's postings; re-indexing pulls one fund's
+    exposure_index_collection.create_index([("user_id", 1), ("symbol", 1)])
+    exposure_index_collection.create_index([("user_id", 1), ("funds.fund_id", 1)])
@@ -10,6 +10,26 @@ class HoldingItem(BaseModel):
     Symbol: str
     Weight: float = Field(..., gt=0)
 
+class WeightVectorDoc(BaseModel):
+    """Holdings reduced for NAV estimation (see utils.weight_vector)."""
+    symbols: List[str] = []
+    weights: List[float] = []  # Fractions (percent weights divided by 100)
+    fyers_symbols: List[str] = []  # e.g. NSE:RELIANCE-EQ, BSE:SBICARD-A
+    exchanges: List[str] = []  # NSE / BSE, per symbol
+    total_weight: float = 0.0
+    format: int = 0  # utils.weight_vector.VECTOR_FORMAT; older vectors are rebuilt
+
+class SipTotalsDoc(BaseModel):
+    """Running totals over a SIP's installments (see utils.sip_totals)."""
+    counts: dict = {}  # status -> installments
+    allocated_units: float = 0.0
+    pending_nav_count: int = 0
+    pending_nav_amount: float = 0.0
+    estimated_count: int = 0
+    flows: dict = {}  # date -> amount invested (PAID / ASSUMED_PAID)
+    pending: dict = {}  # date -> amount (PENDING)
+    last_date: Optional[str] = None  # YYYY-MM-DD
+
 class SIPInstallment(BaseModel):
     date: str  # DD-MM-YYYY
     amount: float
@@ -43,7 +63,8 @@ class HoldingsDocument(BaseModel):
     manual_invested_amount: Optional[float] = 0.0 # User provided invested amount from CAS (static)
     future_sip_units: float = 0.0 # Accumulated units from tracked installments
     sip_installments: List[SIPInstallment] = []
-    
+    sip_totals: Optional[SipTotalsDoc] = None  # Maintained with $inc on every installment change
+
     # Step-Up SIP Config
     stepup_enabled: bool = False
     stepup_type: Optional[Literal["percentage", "amount"]] = "percentage"
@@ -55,10 +76,13 @@ class HoldingsDocument(BaseModel):
     last_stepup_applied_on: Optional[str] = None  # DD-MM-YYYY
     
     holdings: List[HoldingItem]
+    weight_vector: Optional[WeightVectorDoc] = None  # Precomputed from holdings at upload
     last_updated: bool = True # Legacy field, maybe change to datetime?
     
     # Metadata
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    # `version` (int) is not part of the model: every write bumps it with
+    # $inc so cached P&L results keyed on it go stale (see services.pnl_cache).
 
 class UserUpload(BaseModel):
     holding_id: str
@@ -1,7 +1,9 @@
+import anyio
 from fastapi import APIRouter, Depends, Request, UploadFile, File, Form, HTTPException
-from services.holdings_service import holdings_service, validate_excel_against_scheme
+from services.holdings_service import holdings_service, read_holdings_upload, validate_excel_against_scheme
 from services.nav_service import nav_service
 from services.cas_service import cas_service
+from services.cas_jobs import cas_jobs, CasQueueFull
 from services.auth_service import AuthService
 from routes.auth import get_current_user
 from core.limiter import limiter
@@ -55,10 +57,16 @@ def upload(
     if not file.filename.lower().endswith(('.xls', '.xlsx')):
         raise HTTPException(400, "Invalid file format. Please upload an Excel file (.xls, .xlsx).")
 
+    # Parse the workbook once; validation and saving both use this result
+    try:
+        parsed_holdings = read_holdings_upload(file)
+    except Exception as e:
+        raise HTTPException(400, f"Failed to read Excel: {str(e)}")
+
     # 1.5 Validate Excel matches selected scheme (if scheme_name provided)
     validation_result = None
     if scheme_name and not skip_validation_bool:
-        validation_result = validate_excel_against_scheme(file, scheme_name)
+        validation_result = validate_excel_against_scheme(file, scheme_name, parsed=parsed_holdings)
         
         # If validation failed and user hasn't acknowledged, return for confirmation
         if validation_result and not validation_result.get("is_valid", True):
@@ -198,7 +206,8 @@ def upload(
         stepup_frequency=stepup_frequency_str,
         sip_mode=sip_mode_str,
         detailed_installments=parsed_detailed_installments,
-        cas_cost_value=cas_cost_value_float
+        cas_cost_value=cas_cost_value_float,
+        parsed=parsed_holdings
     )
     
     if "error" in save_result:
@@ -207,7 +216,10 @@ def upload(
     analysis = None
         
     if save_result.get("id"):
-        analysis = nav_service.calculate_pnl(save_result["id"], user_id, amount_float, invested_date)
+        # Sync route (runs in the threadpool): hand the async P&L back to the event loop
+        analysis = anyio.from_thread.run(
+            nav_service.calculate_pnl, save_result["id"], user_id, amount_float, invested_date
+        )
 
     return {
         "upload_status": save_result,
@@ -236,7 +248,7 @@ def update_scheme(
     # But NavService.calculate_pnl handles fetching doc by ID.
     
     # We intentionally pass None for investment/date to use stored values
-    analysis = nav_service.calculate_pnl(fund_id, user_id)
+    analysis = anyio.from_thread.run(nav_service.calculate_pnl, fund_id, user_id)
     
     return {
         "message": "Scheme updated successfully",
@@ -331,38 +343,93 @@ def parse_cas(
         # Read file bytes
         file_bytes = file.file.read()
 
-        # Parse CAS
-        cas_data = cas_service.parse_cas_pdf(file_bytes, password.strip())
-        
-        # Extract investor info
-        investor_info = cas_service.get_investor_info(cas_data)
-        
-        # Extract schemes
-        schemes = cas_service.extract_schemes(cas_data)
+        # Parse CAS (process pool; reuses a recent parse of the same PDF)
+        cas_data = cas_jobs.parse(file_bytes, password.strip(), user_id=str(current_user["_id"]))
         
-        # If scheme filter provided, extract transactions for that scheme
-        transactions_data = None
-        if scheme_filter:
-            transactions_data = cas_service.extract_transactions_for_scheme(
-                cas_data, 
-                scheme_filter=scheme_filter
-            )
-        
-        return {
-            "success": True,
-            "investor_info": investor_info,
-            "schemes": schemes,
-            "transactions": transactions_data.get("transactions", []) if transactions_data else [],
-            "cost_value": transactions_data.get("cost_value") if transactions_data else None,
-            "scheme_filter": scheme_filter
-        }
+        return _cas_parse_response(cas_data, scheme_filter)
         
+    except CasQueueFull as e:
+        raise HTTPException(503, str(e))
     except ValueError as e:
         raise HTTPException(400, str(e))
     except Exception as e:
         raise HTTPException(500, f"Failed to parse CAS: {str(e)}")
 
 
+def _cas_parse_response(cas_data: dict, scheme_filter: str = None) -> dict:
+    """Investor info, scheme list and (optionally) one scheme's transactions."""
+    # Extract investor info
+    investor_info = cas_service.get_investor_info(cas_data)
+    
+    # Extract schemes
+    schemes = cas_service.extract_schemes(cas_data)
+    
+    # If scheme filter provided, extract transactions for that scheme
+    transactions_data = None
+    if scheme_filter:
+        transactions_data = cas_service.extract_transactions_for_scheme(
+            cas_data, 
+            scheme_filter=scheme_filter
+        )
+    
+    return {
+        "success": True,
+        "investor_info": investor_info,
+        "schemes": schemes,
+        "transactions": transactions_data.get("transactions", []) if transactions_data else [],
+        "cost_value": transactions_data.get("cost_value") if transactions_data else None,
+        "scheme_filter": scheme_filter
+    }
+
+
+@router.post("/parse-cas/jobs/")
+@limiter.limit("2/minute")
+def submit_cas_job(
+    request: Request,
+    file: UploadFile = File(...),
+    password: str = Form(...),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Start parsing a CAS PDF in the background.
+    
+    Returns a job_id; poll GET /parse-cas/jobs/{job_id} for the result.
+    Re-submitting the same PDF shortly after reuses the earlier parse.
+    """
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(400, "Invalid file format. Please upload a CAS PDF file.")
+    
+    if not password or not password.strip():
+        raise HTTPException(422, "Password is required. Try PAN + DOB (DDMMYYYY) or the one you set.")
+    
+    try:
+        job_id = cas_jobs.submit(file.file.read(), password.strip(), user_id=str(current_user["_id"]))
+    except CasQueueFull as e:
+        raise HTTPException(503, str(e))
+    
+    return {"job_id": job_id, "status": "pending"}
+
+
+@router.get("/parse-cas/jobs/{job_id}")
+def get_cas_job(
+    job_id: str,
+    scheme_filter: str = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Status of a CAS parse job: "pending", "error" (with error) or "done"
+    with the same payload as POST /parse-cas/.
+    """
+    job = cas_jobs.status(job_id, user_id=str(current_user["_id"]))
+    if job is None:
+        raise HTTPException(404, "CAS job not found or expired. Please upload the file again.")
+    
+    if job["status"] != "done":
+        return job
+    
+    return {"job_id": job_id, "status": "done", **_cas_parse_response(job["result"], scheme_filter)}
+
+
 @router.post("/parse-cas/transactions/")
 @limiter.limit("2/minute")
 def get_cas_transactions(
@@ -371,12 +438,13 @@ def get_cas_transactions(
     password: str = Form(...),
     scheme_name: str = Form(None),
     isin: str = Form(None),
+    amfi: str = Form(None),  # AMFI scheme code (alternative to isin)
     current_user: dict = Depends(get_current_user)
 ):
     """
     Parse CAS and return transactions for a specific scheme.
     
-    Either scheme_name or isin should be provided.
+    One of scheme_name, isin or amfi should be provided.
     Returns transactions in format ready for detailed SIP import.
     """
     if not file.filename.lower().endswith('.pdf'):
@@ -385,18 +453,20 @@ def get_cas_transactions(
     if not password or not password.strip():
         raise HTTPException(422, "Password is required.")
     
-    if not scheme_name and not isin:
-        raise HTTPException(422, "Either scheme_name or isin is required.")
+    if not scheme_name and not isin and not amfi:
+        raise HTTPException(422, "Either scheme_name, isin or amfi is required.")
     
     try:
         file_bytes = file.file.read()
-        cas_data = cas_service.parse_cas_pdf(file_bytes, password.strip())
+        # Usually a cache hit: /parse-cas/ just parsed the same PDF
+        cas_data = cas_jobs.parse(file_bytes, password.strip(), user_id=str(current_user["_id"]))
         
         # Extract transactions with valuation data
         result = cas_service.extract_transactions_for_scheme(
             cas_data,
             scheme_filter=scheme_name,
-            isin_filter=isin
+            isin_filter=isin,
+            amfi_filter=amfi
         )
         
         transactions = result.get("transactions", [])
@@ -431,6 +501,8 @@ def get_cas_transactions(
         
         return response
         
+    except CasQueueFull as e:
+        raise HTTPException(503, str(e))
     except ValueError as e:
         raise HTTPException(400, str(e))
     except HTTPException:
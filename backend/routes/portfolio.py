@@ -6,14 +6,48 @@ from routes.auth import get_current_user
 router = APIRouter(tags=["Portfolio"])
 
 @router.post("/analyze-portfolio")
-def analyze_portfolio(
+async def analyze_portfolio(
     request: PortfolioAnalysisRequest,
     current_user: dict = Depends(get_current_user)
 ):
     user_id = str(current_user["_id"])
-    return nav_service.calculate_pnl(
+    return await nav_service.calculate_pnl(
         request.fund_id, 
         user_id, 
         request.investment_amount, 
         request.investment_date
     )
+
+
+@router.get("/portfolio/summary")
+async def portfolio_summary(current_user: dict = Depends(get_current_user)):
+    """
+    P&L for all of the user's funds in one request, plus portfolio totals.
+    NAV histories and live quotes are fetched once across all funds.
+    """
+    user_id = str(current_user["_id"])
+    return await nav_service.calculate_portfolio_summary(user_id)
+
+
+@router.get("/portfolio/analytics")
+async def portfolio_analytics(current_user: dict = Depends(get_current_user)):
+    """
+    Portfolio XIRR over all funds' cash flows, allocation by fund and
+    look-through stock exposure, from the same batched pass as the summary.
+    """
+    user_id = str(current_user["_id"])
+    return await nav_service.calculate_portfolio_analytics(user_id)
+
+
+@router.get("/portfolio/look-through")
+async def portfolio_look_through(
+    isin: str = None,
+    symbol: str = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    How much of each stock the user really owns across all funds, by value.
+    Pass isin or symbol (e.g. RELIANCE) for one stock and its per-fund split.
+    """
+    user_id = str(current_user["_id"])
+    return await nav_service.calculate_look_through(user_id, isin=isin, symbol=symbol)
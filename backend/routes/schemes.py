@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Query, Depends
-from services.holdings_service import get_scheme_candidates
+from services.holdings_service import aget_scheme_candidates
 from routes.auth import get_current_user
 
 router = APIRouter(prefix="/schemes", tags=["Schemes"])
@@ -17,7 +17,7 @@ async def search_schemes(
     if not q or len(q.strip()) < 2:
         return {"schemes": []}
     
-    candidates = get_scheme_candidates(q.strip())
+    candidates = await aget_scheme_candidates(q.strip())
     
     # Filter to only Growth plans (exclude IDCW, Dividend, Bonus)
     growth_only = [
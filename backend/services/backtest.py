@@ -0,0 +1,186 @@
+"""
+Backtest - Replays the live NAV estimate against official NAVs.
+
+calculate_pnl estimates today's NAV as official D-1 x (1 + weighted % change
+of the holdings), and skips the estimate when less than MIN_COVERAGE of the
+weight is priced. This replays that rule over a date range for stored
+funds: daily closes come from services.price_history (bulk-filled disk
+cache, or cached fixtures offline), official NAVs from the NAV history
+store, and every day of a fund is estimated at once:
+
+    pct      = close[NAV day] / close[previous NAV day] - 1   (days x stocks)
+    change   = pct (NaN as 0) @ weights / priced @ weights    (renormalized)
+    estimate = NAV[previous day] * (1 + change)
+
+Each fund gets a tracking-error report against the official NAVs. sweep()
+re-scores the same loaded data under other coverage thresholds and weight
+handling (renormalized over priced stocks, or unpriced weight as 0%).
+"""
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from core.logging import get_logger
+from services.price_history import PriceHistory
+from utils.nav_series import NavSeries
+from utils.weight_vector import WeightVector, MIN_COVERAGE
+
+logger = get_logger("Backtest")
+
+# Closes are loaded from this many days before the range, for the first day's base
+_LOOKBACK_DAYS = 10
+
+
+def _default_nav_loader(scheme_code: str) -> NavSeries:
+    from services.nav_history_store import nav_history_store  # Mongo-backed; not needed offline
+
+    nav_data, _, _ = nav_history_store.get_history(scheme_code)
+    return NavSeries(nav_data)
+
+
+def replay(weights: np.ndarray, close_ordinals: np.ndarray, closes: np.ndarray,
+           nav_ordinals: np.ndarray, navs: np.ndarray,
+           min_coverage: float = MIN_COVERAGE, renormalize: bool = True) -> Dict[str, np.ndarray]:
+    """
+    Estimated vs official NAV for every NAV day after the first, for one
+    fund: closes is days x stocks (NaN = no close) aligned with weights.
+
+    Returns arrays aligned with nav_ordinals[1:]: estimate (NaN where the
+    coverage rule skips the day), actual, base (previous official NAV),
+    coverage and change (weighted fraction).
+    """
+    prev = np.searchsorted(close_ordinals, nav_ordinals[:-1], side="right") - 1
+    cur = np.searchsorted(close_ordinals, nav_ordinals[1:], side="right") - 1
+    has_base = prev >= 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = closes[np.maximum(cur, 0)] / closes[np.maximum(prev, 0)] - 1.0
+    pct[~has_base] = np.nan
+
+    priced = ~np.isnan(pct)
+    coverage = priced @ weights
+    weighted = np.where(priced, pct, 0.0) @ weights
+    if renormalize:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change = np.where(coverage > 0, weighted / coverage, np.nan)
+    else:
+        change = weighted
+
+    base = navs[:-1]
+    estimate = np.where(coverage >= min_coverage, base * (1.0 + change), np.nan)
+    return {"estimate": estimate, "actual": navs[1:], "base": base, "coverage": coverage, "change": change}
+
+
+def score(days: Dict[str, np.ndarray]) -> dict:
+    """Tracking-error report (percent of the official NAV) for one replay."""
+    estimated = ~np.isnan(days["estimate"])
+    n = int(len(days["actual"]))
+    report = {
+        "days": n,
+        "estimated_days": int(estimated.sum()),
+        "mean_coverage_pct": round(float(days["coverage"].mean()) * 100, 2) if n else None,
+    }
+    if not estimated.any():
+        return {**report, "mean_error_pct": None, "mae_pct": None, "rmse_pct": None,
+                "tracking_error_pct": None, "max_abs_error_pct": None, "direction_hit_rate": None}
+
+    est, actual, base = days["estimate"][estimated], days["actual"][estimated], days["base"][estimated]
+    error = (est / actual - 1.0) * 100
+    hits = np.sign(est - base) == np.sign(actual - base)
+    return {
+        **report,
+        "mean_error_pct": round(float(error.mean()), 4),
+        "mae_pct": round(float(np.abs(error).mean()), 4),
+        "rmse_pct": round(float(np.sqrt((error ** 2).mean())), 4),
+        "tracking_error_pct": round(float(error.std()), 4),
+        "max_abs_error_pct": round(float(np.abs(error).max()), 4),
+        "direction_hit_rate": round(float(hits.mean()), 4),
+    }
+
+
+class Backtest:
+    """Loads closes / NAVs for a set of funds once and replays them."""
+
+    def __init__(self, prices: Optional[PriceHistory] = None,
+                 nav_loader: Optional[Callable[[str], NavSeries]] = None):
+        self.prices = prices or PriceHistory()
+        self.nav_loader = nav_loader or _default_nav_loader
+
+    def load(self, docs: Iterable[dict], start: date, end: date) -> List[dict]:
+        """
+        Per-fund inputs for replay: one price matrix over the union of the
+        funds' symbols, sliced per fund, and each scheme's official NAVs
+        from the day before start through end.
+        """
+        docs = [d for d in docs if d.get("scheme_code")]
+        vectors = [WeightVector.from_doc(d) for d in docs]
+        symbols = list(dict.fromkeys(s for v in vectors for s in v.symbols))
+        close_ordinals, closes = self.prices.matrix(symbols, start - timedelta(days=_LOOKBACK_DAYS), end)
+        column = {s: i for i, s in enumerate(symbols)}
+
+        navs_by_scheme: Dict[str, NavSeries] = {}
+        funds = []
+        lo, hi = start.toordinal(), end.toordinal()
+        for doc, vector in zip(docs, vectors):
+            code = str(doc["scheme_code"])
+            if code not in navs_by_scheme:
+                try:
+                    navs_by_scheme[code] = self.nav_loader(code)
+                except Exception as e:
+                    logger.warning(f"No NAV history for scheme {code}: {e}")
+                    navs_by_scheme[code] = NavSeries(())
+            series = navs_by_scheme[code]
+
+            ordinals = np.asarray(series.ordinals, dtype=np.int64)
+            first = max(int(np.searchsorted(ordinals, lo)) - 1, 0)  # Base NAV for the first day
+            last = int(np.searchsorted(ordinals, hi, side="right"))
+            funds.append({
+                "fund_id": str(doc.get("_id")),
+                "fund_name": doc.get("nickname") or doc.get("fund_name"),
+                "scheme_code": code,
+                "weights": vector.weights,
+                "close_ordinals": close_ordinals,
+                "closes": closes[:, [column[s] for s in vector.symbols]],
+                "nav_ordinals": ordinals[first:last],
+                "navs": np.asarray(series.navs, dtype=np.float64)[first:last],
+            })
+        return funds
+
+    @staticmethod
+    def _report(fund: dict, min_coverage: float, renormalize: bool) -> dict:
+        head = {k: fund[k] for k in ("fund_id", "fund_name", "scheme_code")}
+        if len(fund["navs"]) < 2 or not len(fund["weights"]):
+            return {**head, **score({"estimate": np.zeros(0), "actual": np.zeros(0),
+                                     "base": np.zeros(0), "coverage": np.zeros(0)})}
+        days = replay(fund["weights"], fund["close_ordinals"], fund["closes"],
+                      fund["nav_ordinals"], fund["navs"], min_coverage, renormalize)
+        return {**head, **score(days)}
+
+    def run(self, docs: Iterable[dict], start: date, end: date,
+            min_coverage: float = MIN_COVERAGE, renormalize: bool = True) -> List[dict]:
+        """Tracking-error report per fund over [start, end]."""
+        return [self._report(f, min_coverage, renormalize) for f in self.load(docs, start, end)]
+
+    def sweep(self, docs: Iterable[dict], start: date, end: date,
+              thresholds: Sequence[float] = (0.5, 0.6, 0.75, 0.9),
+              renormalize: Sequence[bool] = (True, False)) -> List[dict]:
+        """
+        The same funds scored under each coverage threshold x weight handling,
+        loading prices and NAVs once. Each entry carries the per-fund reports
+        and their mean tracking error over funds with estimated days.
+        """
+        funds = self.load(docs, start, end)
+        results = []
+        for threshold in thresholds:
+            for renorm in renormalize:
+                reports = [self._report(f, threshold, renorm) for f in funds]
+                errors = [r["tracking_error_pct"] for r in reports if r["tracking_error_pct"] is not None]
+                results.append({
+                    "min_coverage": threshold,
+                    "renormalize": renorm,
+                    "estimated_days": sum(r["estimated_days"] for r in reports),
+                    "mean_tracking_error_pct": round(float(np.mean(errors)), 4) if errors else None,
+                    "funds": reports,
+                })
+        return results
@@ -0,0 +1,233 @@
+"""
+CAS Jobs - CAS PDF parsing off the request thread.
+
+Decrypting and parsing a CAS PDF (casparser / mupdf) is seconds of CPU, so it
+runs in a small ProcessPoolExecutor per worker instead of on the route's
+thread. Clients submit a PDF and get a job id back, then poll it for the
+result; the older one-shot endpoints wait on the same jobs.
+
+Parsed results are kept briefly under a content hash of (user, password,
+PDF bytes), in memory and in the `cas_jobs` collection (TTL index on
+expires_at), so the follow-up /parse-cas/transactions/ call for the same
+statement reuses the first parse - on either uvicorn worker - instead of
+decrypting the PDF again. Job documents also let a poll that lands on the
+other worker see the job's state. The password itself is never stored.
+"""
+import hashlib
+import multiprocessing
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+
+from core.config import settings
+from core.logging import get_logger
+from db import cas_jobs_collection
+from services.cas_service import CasView, as_cas_view, parse_cas_pdf_in_worker
+
+logger = get_logger("CasJobs")
+
+PENDING = "pending"
+DONE = "done"
+ERROR = "error"
+
+_MAX_CACHED = 64
+
+
+class CasQueueFull(RuntimeError):
+    """Too many CAS parses already running on this worker."""
+
+
+def content_key(file_bytes: bytes, password: str, user_id: str) -> str:
+    h = hashlib.sha256()
+    for part in (user_id.encode(), b"\0", password.encode(), b"\0", file_bytes):
+        h.update(part)
+    return h.hexdigest()
+
+
+class CasJobs:
+    """Per-worker CAS parse pool, job registry and result cache."""
+
+    def __init__(self, max_workers: Optional[int] = None, executor=None):
+        self._max_workers = max_workers or settings.CAS_PARSE_WORKERS
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._lock = threading.Lock()
+        ttl = settings.CAS_RESULT_TTL_SECONDS
+        self._jobs: TTLCache = TTLCache(maxsize=_MAX_CACHED * 4, ttl=ttl)  # job_id -> (user_id, key, Future)
+        self._results: TTLCache = TTLCache(maxsize=_MAX_CACHED, ttl=ttl)  # key -> CasView
+        self._inflight: Dict[str, str] = {}  # key -> job_id
+
+    def _pool(self):
+        if self._executor is None:
+            # spawn: don't fork a process holding Mongo clients and threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _pending(self) -> int:
+        return len(self._inflight)
+
+    # ==================== SUBMIT ====================
+
+    def submit(self, file_bytes: bytes, password: str, user_id: str) -> str:
+        """
+        Starts parsing (or reuses a finished / running parse of the same PDF)
+        and returns the job id. Raises CasQueueFull when the pool is saturated.
+        """
+        key = content_key(file_bytes, password, user_id)
+        job_id = uuid.uuid4().hex
+
+        with self._lock:
+            running = self._inflight.get(key)
+            if running and running in self._jobs:
+                return running
+
+            cached = self._results.get(key)
+            if cached is None:
+                cached = self._load_result(key)
+            if cached is not None:
+                self._results[key] = cached
+                future = Future()
+                future.set_result(cached)
+                self._jobs[job_id] = (user_id, key, future)
+                self._save_job(job_id, user_id, key, DONE)
+                return job_id
+
+            if self._pending() >= settings.CAS_MAX_PENDING_JOBS:
+                raise CasQueueFull("CAS parser is busy. Please try again in a minute.")
+
+            try:
+                future = self._pool().submit(parse_cas_pdf_in_worker, file_bytes, password)
+            except BrokenProcessPool:
+                # A child died (e.g. mupdf crash); start a fresh pool once
+                logger.warning("CAS process pool was broken; restarting it")
+                self._executor = None
+                future = self._pool().submit(parse_cas_pdf_in_worker, file_bytes, password)
+
+            self._jobs[job_id] = (user_id, key, future)
+            self._inflight[key] = job_id
+
+        self._save_job(job_id, user_id, key, PENDING)
+        future.add_done_callback(lambda f: self._on_done(job_id, user_id, key, f))
+        return job_id
+
+    def _on_done(self, job_id: str, user_id: str, key: str, future: Future):
+        error = _job_error(future)
+        with self._lock:
+            self._inflight.pop(key, None)
+            if error is None:
+                self._results[key] = future.result()
+        if error is None:
+            self._save_job(job_id, user_id, key, DONE, result=future.result())
+        else:
+            self._save_job(job_id, user_id, key, ERROR, error=error)
+
+    # ==================== STATUS / RESULT ====================
+
+    def status(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        {"job_id", "status", "error"?, "result"?} for a job of this user, or
+        None if unknown (expired, or never submitted by this user).
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+
+        if job is not None:
+            owner, _, future = job
+            if owner != user_id:
+                return None
+            if not future.done():
+                return {"job_id": job_id, "status": PENDING}
+            error = _job_error(future)
+            if error is not None:
+                return {"job_id": job_id, "status": ERROR, "error": error}
+            return {"job_id": job_id, "status": DONE, "result": future.result()}
+
+        # Submitted on the other worker
+        try:
+            doc = cas_jobs_collection.find_one({"_id": job_id, "user_id": user_id})
+        except Exception as e:
+            logger.warning(f"CAS job lookup failed for {job_id}: {e}")
+            return None
+        if not doc:
+            return None
+        status = {"job_id": job_id, "status": doc.get("status", PENDING)}
+        if doc.get("error"):
+            status["error"] = doc["error"]
+        if status["status"] == DONE:
+            result = self._load_result(doc.get("key"))
+            if result is None:
+                return None  # Result already expired
+            status["result"] = result
+        return status
+
+    def parse(self, file_bytes: bytes, password: str, user_id: str,
+              timeout: Optional[float] = 120) -> CasView:
+        """
+        Submit and wait: the parsed CasView. Raises ValueError for parse
+        errors (bad password, bad PDF) and CasQueueFull when saturated.
+        """
+        job_id = self.submit(file_bytes, password, user_id)
+        with self._lock:
+            _, _, future = self._jobs[job_id]
+        try:
+            return future.result(timeout=timeout)
+        except (ValueError, CasQueueFull):
+            raise
+        except TimeoutError:
+            raise ValueError("CAS parsing is taking too long. Please try again.")
+        except Exception as e:
+            raise ValueError(f"Failed to parse CAS: {str(e)}")
+
+    # ==================== PERSISTENCE ====================
+
+    def _save_job(self, job_id: str, user_id: str, key: str, status: str,
+                  result=None, error: Optional[str] = None):
+        expires_at = datetime.utcnow() + timedelta(seconds=settings.CAS_RESULT_TTL_SECONDS)
+        doc = {"user_id": user_id, "key": key, "status": status, "error": error, "expires_at": expires_at}
+        if result is not None:
+            doc["result"] = as_cas_view(result).to_dict()
+        try:
+            cas_jobs_collection.update_one({"_id": job_id}, {"$set": doc}, upsert=True)
+        except Exception as e:
+            # The local registry still serves this worker's polls
+            logger.warning(f"Failed to persist CAS job {job_id}: {e}")
+
+    def _load_result(self, key: Optional[str]) -> Optional[CasView]:
+        if not key:
+            return None
+        try:
+            doc = cas_jobs_collection.find_one(
+                {"key": key, "status": DONE, "result": {"$exists": True},
+                 "expires_at": {"$gt": datetime.utcnow()}},
+                {"result": 1},
+            )
+        except Exception as e:
+            logger.warning(f"CAS result lookup failed: {e}")
+            return None
+        return CasView.from_dict(doc["result"]) if doc else None
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._owns_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _job_error(future: Future) -> Optional[str]:
+    exc = future.exception()
+    if exc is None:
+        return None
+    if isinstance(exc, ValueError):
+        return str(exc)
+    logger.error(f"CAS parse job failed: {exc!r}")
+    return f"Failed to parse CAS: {str(exc)}"
+
+
+cas_jobs = CasJobs()
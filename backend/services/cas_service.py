@@ -5,12 +5,10 @@ Parses Consolidated Account Statement (CAS) PDF files using casparser library.
 Extracts transaction data for accurate XIRR calculation in detailed SIP mode.
 """
 
+import io
 import logging
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable
 from datetime import datetime, date
-import tempfile
-import os
-import json
 
 logger = logging.getLogger(__name__)
 
@@ -23,34 +21,169 @@ except ImportError:
     logger.warning("casparser not installed. CAS parsing will not be available.")
 
 
-def _to_dict(obj):
-    """Convert any object to a JSON-serializable dict."""
-    if obj is None:
-        return None
+def _get(obj, name, default=None):
+    """Field of a casparser model or of an already-converted dict."""
     if isinstance(obj, dict):
-        return {k: _to_dict(v) for k, v in obj.items()}
-    if isinstance(obj, (list, tuple)):
-        return [_to_dict(item) for item in obj]
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    if isinstance(obj, (int, float, str, bool)):
-        return obj
-    # Handle Decimal type (casparser uses this for amounts)
-    try:
-        from decimal import Decimal
-        if isinstance(obj, Decimal):
-            return float(obj)
-    except ImportError:
-        pass
-    # For objects with __dict__
-    if hasattr(obj, '__dict__'):
-        return {k: _to_dict(v) for k, v in obj.__dict__.items() if not k.startswith('_')}
-    # Fallback - try to convert to float if it looks numeric
+        value = obj.get(name, default)
+    else:
+        value = getattr(obj, name, default)
+    return default if value is None else value
+
+
+def _num(value) -> Optional[float]:
+    """Decimal / str / float -> float; None when missing or unparseable."""
+    if value is None or value == "":
+        return None
     try:
-        return float(obj)
+        return float(value)
     except (ValueError, TypeError):
-        pass
-    return str(obj)
+        return None
+
+
+def _iso_date(value) -> Optional[str]:
+    """Transaction date as YYYY-MM-DD where recognisable, else the raw string."""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str) and value:
+        if 'T' in value:
+            return value.split('T')[0]
+        return value
+    return None
+
+
+def _display_date(iso: str) -> str:
+    """YYYY-MM-DD -> DD-MM-YYYY (other strings are passed through)."""
+    if len(iso) == 10 and iso[4] == '-' and iso[7] == '-':
+        return f"{iso[8:10]}-{iso[5:7]}-{iso[0:4]}"
+    return iso
+
+
+class CasView:
+    """
+    Compact, indexed view of a parsed CAS.
+
+    Built in one pass over the casparser object graph, converting only the
+    fields the app uses: investor info, and per scheme its identifiers,
+    valuation and purchase transactions as [date, amount, units, nav,
+    description] rows (Decimals become floats, nothing else is copied).
+    Schemes are looked up by ISIN / AMFI code through indexes built on first
+    use. to_dict() / from_dict() give a plain form for pickling and Mongo.
+    """
+
+    __slots__ = ("investor_info", "statement_period", "schemes", "_by_isin", "_by_amfi")
+
+    def __init__(self, investor_info: Dict[str, Any], statement_period: Dict[str, Any],
+                 schemes: List[Dict[str, Any]]):
+        self.investor_info = investor_info
+        self.statement_period = statement_period
+        self.schemes = schemes
+        self._by_isin = None
+        self._by_amfi = None
+
+    @classmethod
+    def from_cas(cls, cas_data) -> "CasView":
+        """From a casparser CASData (or the older fully converted dict form)."""
+        folios = _get(cas_data, "folios", [])
+        if not folios and isinstance(cas_data, dict):
+            folios = (cas_data.get("cas_data") or {}).get("folios", [])
+
+        schemes = []
+        for folio in folios:
+            amc = _get(folio, "amc", "Unknown AMC")
+            folio_no = _get(folio, "folio", "")
+            for scheme in _get(folio, "schemes", []):
+                transactions = _get(scheme, "transactions", [])
+                valuation = _get(scheme, "valuation", {})
+                schemes.append({
+                    "name": _get(scheme, "scheme", "") or _get(scheme, "scheme_name", ""),
+                    "amc": amc,
+                    "folio": folio_no,
+                    "isin": _get(scheme, "isin", ""),
+                    "amfi": _get(scheme, "amfi", "") or _get(scheme, "amfi_code", ""),
+                    "cost_value": _num(_get(valuation, "cost")),  # Total Cost Value (includes stamp duty)
+                    "nav": _num(_get(valuation, "nav")),
+                    "market_value": _num(_get(valuation, "value")),
+                    "close_units": _num(_get(scheme, "close")),  # Closing unit balance
+                    "total_transactions": len(transactions),
+                    "purchases": list(_purchase_rows(transactions)),
+                })
+
+        investor = _get(cas_data, "investor_info", {})
+        period = _get(cas_data, "statement_period", {})
+        return cls(
+            investor_info={k: _get(investor, k, "") for k in ("name", "email", "pan")},
+            statement_period={
+                "from": str(_get(period, "from_", "") or _get(period, "from", "")),
+                "to": str(_get(period, "to", "")),
+            },
+            schemes=schemes,
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CasView":
+        return cls(data.get("investor_info", {}), data.get("statement_period", {}), data.get("schemes", []))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "investor_info": self.investor_info,
+            "statement_period": self.statement_period,
+            "schemes": self.schemes,
+        }
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.__init__(state.get("investor_info", {}), state.get("statement_period", {}), state.get("schemes", []))
+
+    def _index(self, field: str) -> Dict[str, List[int]]:
+        index: Dict[str, List[int]] = {}
+        for pos, scheme in enumerate(self.schemes):
+            value = scheme.get(field)
+            if value:
+                index.setdefault(str(value).upper(), []).append(pos)
+        return index
+
+    def by_isin(self, isin: str) -> List[Dict[str, Any]]:
+        if self._by_isin is None:
+            self._by_isin = self._index("isin")
+        return [self.schemes[i] for i in self._by_isin.get(str(isin).strip().upper(), [])]
+
+    def by_amfi(self, amfi: str) -> List[Dict[str, Any]]:
+        if self._by_amfi is None:
+            self._by_amfi = self._index("amfi")
+        return [self.schemes[i] for i in self._by_amfi.get(str(amfi).strip().upper(), [])]
+
+    def by_name(self, name_filter: str) -> List[Dict[str, Any]]:
+        """Schemes whose name contains name_filter (case-insensitive)."""
+        needle = name_filter.lower()
+        return [s for s in self.schemes if needle in (s.get("name") or "").lower()]
+
+
+def _purchase_rows(transactions: Iterable) -> Iterable[list]:
+    """Purchase transactions (positive units and amount) as compact rows."""
+    for txn in transactions:
+        units = _num(_get(txn, "units", 0)) or 0.0
+        amount = _num(_get(txn, "amount", 0)) or 0.0
+        if not (units > 0 and amount > 0):
+            continue
+        txn_date = _iso_date(_get(txn, "date"))
+        if not txn_date:
+            continue
+        description = _get(txn, "description", "") or _get(txn, "type", "")
+        description = getattr(description, "value", description)
+        yield [txn_date, amount, units, _num(_get(txn, "nav")), str(description)]
+
+
+def as_cas_view(cas_data) -> CasView:
+    """Accepts a CasView, its dict form, or a casparser result."""
+    if isinstance(cas_data, CasView):
+        return cas_data
+    if isinstance(cas_data, dict) and "schemes" in cas_data and "folios" not in cas_data:
+        return CasView.from_dict(cas_data)
+    return CasView.from_cas(cas_data)
 
 
 class CASService:
@@ -60,7 +193,7 @@ class CASService:
         if not CASPARSER_AVAILABLE:
             logger.warning("CASService initialized but casparser is not available.")
     
-    def parse_cas_pdf(self, file_bytes: bytes, password: str) -> Dict[str, Any]:
+    def parse_cas_pdf(self, file_bytes: bytes, password: str) -> CasView:
         """
         Parse a CAS PDF file and return structured data.
         
@@ -69,7 +202,7 @@ class CASService:
             password: PDF password (usually PAN + DOB or custom)
             
         Returns:
-            dict: Parsed CAS data with investor info and folios
+            CasView: Investor info and schemes, indexed by ISIN / AMFI code
             
         Raises:
             ValueError: If casparser is not available or parsing fails
@@ -77,23 +210,14 @@ class CASService:
         if not CASPARSER_AVAILABLE:
             raise ValueError("casparser library is not installed. Please run: pip install casparser[mupdf]")
         
-        # Write bytes to temp file (casparser requires file path)
-        temp_file = None
         try:
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-            temp_file.write(file_bytes)
-            temp_file.close()
-            
-            # Parse CAS - casparser returns CASData object
-            cas_data = casparser.read_cas_pdf(temp_file.name, password)
+            # casparser reads file-like objects directly; no temp file needed
+            cas_data = casparser.read_cas_pdf(io.BytesIO(file_bytes), password)
             
             if not cas_data:
                 raise ValueError("Failed to parse CAS PDF. Please check the file and password.")
             
-            # Convert CASData object to dict
-            data = _to_dict(cas_data)
-            
-            return data
+            return CasView.from_cas(cas_data)
             
         except Exception as e:
             error_msg = str(e)
@@ -104,15 +228,8 @@ class CASService:
             else:
                 logger.error(f"CAS parsing error: {e}")
                 raise ValueError(f"Failed to parse CAS: {error_msg}")
-        finally:
-            # Cleanup temp file
-            if temp_file and os.path.exists(temp_file.name):
-                try:
-                    os.unlink(temp_file.name)
-                except:
-                    pass
     
-    def extract_schemes(self, cas_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def extract_schemes(self, cas_data) -> List[Dict[str, Any]]:
         """
         Extract all schemes from parsed CAS data.
         
@@ -122,66 +239,32 @@ class CASService:
         Returns:
             list: List of schemes with name, isin, amfi, valuation data, and transaction count
         """
-        schemes = []
-        
-        # Handle both dict formats - folios might be under different keys
-        folios = cas_data.get("folios", [])
-        if not folios:
-            folios = cas_data.get("cas_data", {}).get("folios", [])
-        
-        for folio in folios:
-            amc = folio.get("amc", "Unknown AMC")
-            
-            folio_schemes = folio.get("schemes", [])
-            for scheme in folio_schemes:
-                scheme_name = scheme.get("scheme", "") or scheme.get("scheme_name", "Unknown Scheme")
-                isin = scheme.get("isin", "")
-                amfi = scheme.get("amfi", "") or scheme.get("amfi_code", "")
-                transactions = scheme.get("transactions", [])
-                
-                # Get valuation data (includes Total Cost Value from CAS)
-                valuation = scheme.get("valuation", {}) or {}
-                cost_value = valuation.get("cost")  # Total Cost Value (includes stamp duty)
-                nav = valuation.get("nav")
-                market_value = valuation.get("value")
-                
-                # Get close balance (total units)
-                close_units = scheme.get("close")  # Closing unit balance
-                
-                # Filter only purchase transactions (positive units)
-                purchase_txns = []
-                for t in transactions:
-                    try:
-                        units_val = float(t.get("units", 0) or 0)
-                        amount_val = float(t.get("amount", 0) or 0)
-                        if units_val > 0 and amount_val > 0:
-                            purchase_txns.append(t)
-                    except (ValueError, TypeError):
-                        continue
-                
-                schemes.append({
-                    "name": scheme_name,
-                    "amc": amc,
-                    "isin": isin,
-                    "amfi": amfi,
-                    "folio": folio.get("folio", ""),
-                    "transaction_count": len(purchase_txns),
-                    "total_transactions": len(transactions),
-                    # Valuation data from CAS
-                    "cost_value": float(cost_value) if cost_value else None,  # Total Cost Value (₹2,200.00)
-                    "nav": float(nav) if nav else None,
-                    "market_value": float(market_value) if market_value else None,
-                    "close_units": float(close_units) if close_units else None
-                })
-        
-        return schemes
+        view = as_cas_view(cas_data)
+        return [
+            {
+                "name": scheme["name"] or "Unknown Scheme",
+                "amc": scheme["amc"],
+                "isin": scheme["isin"],
+                "amfi": scheme["amfi"],
+                "folio": scheme["folio"],
+                "transaction_count": len(scheme["purchases"]),
+                "total_transactions": scheme["total_transactions"],
+                # Valuation data from CAS
+                "cost_value": scheme["cost_value"] or None,  # Total Cost Value (₹2,200.00)
+                "nav": scheme["nav"] or None,
+                "market_value": scheme["market_value"] or None,
+                "close_units": scheme["close_units"] or None
+            }
+            for scheme in view.schemes
+        ]
     
     def extract_transactions_for_scheme(
         self, 
-        cas_data: Dict[str, Any], 
+        cas_data, 
         scheme_filter: str = None,
         isin_filter: str = None,
-        sip_day: int = None  # SIP day for current month detection
+        sip_day: int = None,  # SIP day for current month detection
+        amfi_filter: str = None
     ) -> Dict[str, Any]:
         """
         Extract purchase transactions for a specific scheme.
@@ -195,6 +278,7 @@ class CASService:
             scheme_filter: Partial scheme name to filter (case-insensitive)
             isin_filter: ISIN to filter by
             sip_day: SIP day of month (for detecting missing current month installment)
+            amfi_filter: AMFI scheme code to filter by
             
         Returns:
             dict with:
@@ -204,85 +288,40 @@ class CASService:
                 - missing_current_month: True if current month SIP is missing
                 - pending_installment: Pending installment for current month (if any)
         """
+        view = as_cas_view(cas_data)
         transactions = []
         scheme_valuation = {}
         
-        # Handle both dict formats
-        folios = cas_data.get("folios", [])
-        if not folios:
-            folios = cas_data.get("cas_data", {}).get("folios", [])
+        # Only the matching schemes are touched (index lookup for ISIN / AMFI)
+        if isin_filter:
+            matches = view.by_isin(isin_filter)
+        elif amfi_filter:
+            matches = view.by_amfi(amfi_filter)
+        elif scheme_filter:
+            matches = view.by_name(scheme_filter)
+        else:
+            matches = view.schemes
         
-        for folio in folios:
-            folio_schemes = folio.get("schemes", [])
-            for scheme in folio_schemes:
-                scheme_name = scheme.get("scheme", "") or scheme.get("scheme_name", "")
-                isin = scheme.get("isin", "")
-                
-                # Apply filters
-                if isin_filter:
-                    if isin != isin_filter:
-                        continue
-                elif scheme_filter:
-                    if scheme_filter.lower() not in scheme_name.lower():
-                        continue
-                
-                # Get valuation data from scheme
-                valuation = scheme.get("valuation", {}) or {}
-                scheme_valuation = {
-                    "cost_value": float(valuation.get("cost") or 0) if valuation.get("cost") else None,
-                    "nav": float(valuation.get("nav") or 0) if valuation.get("nav") else None,
-                    "market_value": float(valuation.get("value") or 0) if valuation.get("value") else None,
-                    "close_units": float(scheme.get("close") or 0) if scheme.get("close") else None
-                }
-                
-                # Extract transactions
-                for txn in scheme.get("transactions", []):
-                    try:
-                        units = float(txn.get("units", 0) or 0)
-                        amount = float(txn.get("amount", 0) or 0)
-                        nav = float(txn.get("nav", 0) or 0)
-                    except (ValueError, TypeError):
-                        continue
-                    
-                    # Only include purchase transactions (positive units and amount)
-                    if units > 0 and amount > 0:
-                        # Parse date
-                        txn_date = txn.get("date")
-                        if txn_date:
-                            # Convert to DD-MM-YYYY format
-                            if isinstance(txn_date, datetime):
-                                date_str = txn_date.strftime("%d-%m-%Y")
-                            elif isinstance(txn_date, date):
-                                date_str = txn_date.strftime("%d-%m-%Y")
-                            elif isinstance(txn_date, str):
-                                # Try different formats
-                                try:
-                                    if 'T' in txn_date:
-                                        dt = datetime.fromisoformat(txn_date.split('T')[0])
-                                    elif '-' in txn_date and len(txn_date.split('-')[0]) == 4:
-                                        dt = datetime.strptime(txn_date[:10], "%Y-%m-%d")
-                                    else:
-                                        date_str = txn_date
-                                        dt = None
-                                    if dt:
-                                        date_str = dt.strftime("%d-%m-%Y")
-                                except:
-                                    date_str = str(txn_date)
-                            else:
-                                continue
-                        else:
-                            continue
-                        
-                        # Use raw amount from CAS (don't add stamp duty - CAS already tracked it)
-                        # The valuation.cost already includes all stamp duties
-                        transactions.append({
-                            "date": date_str,
-                            "amount": round(float(amount), 2),  # Raw amount from CAS
-                            "units": round(float(units), 4),
-                            "nav": round(float(nav), 4) if nav else None,
-                            "description": txn.get("description", "") or txn.get("type", ""),
-                            "status": "PAID"  # CAS transactions are already paid
-                        })
+        for scheme in matches:
+            # Valuation data from the (last) matching scheme
+            scheme_valuation = {
+                "cost_value": scheme["cost_value"] or None,
+                "nav": scheme["nav"] or None,
+                "market_value": scheme["market_value"] or None,
+                "close_units": scheme["close_units"] or None
+            }
+            
+            # Use raw amount from CAS (don't add stamp duty - CAS already tracked it)
+            # The valuation.cost already includes all stamp duties
+            for txn_date, amount, units, nav, description in scheme["purchases"]:
+                transactions.append({
+                    "date": _display_date(txn_date),
+                    "amount": round(amount, 2),  # Raw amount from CAS
+                    "units": round(units, 4),
+                    "nav": round(nav, 4) if nav else None,
+                    "description": description,
+                    "status": "PAID"  # CAS transactions are already paid
+                })
         
         # Sort by date (oldest first)
         try:
@@ -349,10 +388,11 @@ class CASService:
             "pending_installment": pending_installment
         }
     
-    def get_investor_info(self, cas_data: Dict[str, Any]) -> Dict[str, str]:
+    def get_investor_info(self, cas_data) -> Dict[str, str]:
         """Extract investor information from CAS data."""
-        investor = cas_data.get("investor_info", {}) or {}
-        period = cas_data.get("statement_period", {}) or {}
+        view = as_cas_view(cas_data)
+        investor = view.investor_info
+        period = view.statement_period
         
         return {
             "name": investor.get("name", "") or "",
@@ -365,3 +405,8 @@ class CASService:
 
 # Singleton instance
 cas_service = CASService()
+
+
+def parse_cas_pdf_in_worker(file_bytes: bytes, password: str) -> CasView:
+    """Process-pool entry point (see services.cas_jobs); module-level so it pickles."""
+    return cas_service.parse_cas_pdf(file_bytes, password)
@@ -0,0 +1,210 @@
+"""
+Close Store - Daily closes for the whole symbol universe, held in memory.
+
+Historical D-1 estimation used to ask Fyers for a fresh 7-day candle window
+per stock (NSE, then BSE) and fall back to a yfinance download per fund.
+Instead, once a day one worker (the holder of a Mongo lease) tops up the
+on-disk price history (services.price_history) for every symbol held by any
+fund - one bulk download of the days since the last fill - and every worker
+loads the last CLOSE_STORE_DAYS days from disk into a days x symbols matrix.
+Workers without the lease only read the disk, and count the day as filled
+once the lease holder has left a marker file for it. A lookup for "pct change on date X" over any set of
+symbols is then two row reads:
+
+    pct = close[X] / last close before X - 1
+
+with the previous close taken from a forward-filled copy, so a stock that
+missed a session still compares against its own last trade. Symbols not in
+the store (added since the fill) come back as None and callers fetch only
+those.
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from core.config import settings
+from db import holdings_collection, scheduler_locks_collection
+from services.price_history import PriceHistory
+from utils.date_utils import get_current_ist_time
+from utils.mongo_lease import acquire_lease, release_lease
+from core.logging import get_logger
+
+logger = get_logger("CloseStore")
+
+LEASE_NAME = "close_store_fill"
+# Written to the price history dir by the lease holder after a fill: the IST date
+_FILLED_MARKER = "close_store_filled_on"
+
+_CHECK_INTERVAL_SECONDS = 60 * 60
+# Until the day is filled (e.g. waiting on another worker's download)
+_RETRY_SECONDS = 5 * 60
+_LEASE_SECONDS = 30 * 60
+
+
+def _to_ordinal(d) -> int:
+    return (d.date() if isinstance(d, datetime) else d).toordinal()
+
+
+class CloseStore:
+    """Process-wide close matrix, plus the daily fill thread."""
+
+    def __init__(self, prices: Optional[PriceHistory] = None):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.prices = prices
+        self._lock = threading.Lock()
+        self._ordinals = np.zeros(0, dtype=np.int64)
+        self._closes = np.zeros((0, 0))
+        self._prev_closes = np.zeros((0, 0))
+        self._column: Dict[str, int] = {}
+        self._filled_on: Optional[date] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ==================== LOOKUPS ====================
+
+    @property
+    def filled_on(self) -> Optional[date]:
+        return self._filled_on
+
+    def pct_changes(self, symbols: Iterable[str], target_date) -> Dict[str, Optional[float]]:
+        """
+        Percent change (e.g. 1.23 for +1.23%) of each symbol's close on
+        target_date against its previous close; None where the store has no
+        close for that day.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        with self._lock:
+            ordinals, closes, prev_closes, column = self._ordinals, self._closes, self._prev_closes, self._column
+        result: Dict[str, Optional[float]] = dict.fromkeys(symbols)
+
+        target = _to_ordinal(target_date)
+        row = int(np.searchsorted(ordinals, target))
+        if row == 0 or row >= len(ordinals) or ordinals[row] != target:
+            return result
+
+        known = [s for s in symbols if s in column]
+        if not known:
+            return result
+        cols = np.fromiter((column[s] for s in known), dtype=np.intp, count=len(known))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = (closes[row, cols] / prev_closes[row - 1, cols] - 1.0) * 100
+        for sym, value in zip(known, pct.tolist()):
+            if value == value:  # not NaN
+                result[sym] = value
+        return result
+
+    # ==================== FILL ====================
+
+    @staticmethod
+    def _universe() -> List[str]:
+        """Distinct holding symbols across all funds of all users."""
+        symbols = holdings_collection.distinct("holdings.Symbol")
+        return sorted({s for s in symbols if isinstance(s, str) and s})
+
+    def _load(self, symbols: List[str], ordinals: np.ndarray, closes: np.ndarray):
+        # Row of the last close at or before each day, per column (-1: none yet)
+        rows = np.where(np.isnan(closes), -1, np.arange(len(ordinals))[:, None])
+        rows = np.maximum.accumulate(rows, axis=0) if len(ordinals) else rows
+        prev_closes = np.take_along_axis(closes, np.maximum(rows, 0), axis=0)
+        prev_closes[rows < 0] = np.nan
+        with self._lock:
+            self._ordinals, self._closes, self._prev_closes = ordinals, closes, prev_closes
+            self._column = {s: i for i, s in enumerate(symbols)}
+
+    @staticmethod
+    def _marker_date(cache_dir: Path) -> Optional[str]:
+        try:
+            return (cache_dir / _FILLED_MARKER).read_text().strip()
+        except OSError:
+            return None
+
+    @staticmethod
+    def _write_marker(cache_dir: Path, today: date):
+        tmp = cache_dir / f"{_FILLED_MARKER}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            tmp.write_text(today.isoformat())
+            os.replace(tmp, cache_dir / _FILLED_MARKER)
+        except OSError as e:
+            tmp.unlink(missing_ok=True)
+            logger.warning(f"Could not write close store marker: {e}")
+
+    def fill(self, today: Optional[date] = None, force: bool = False) -> int:
+        """
+        Tops up and reloads the closes through yesterday for the symbol
+        universe, at most once per day unless forced. Only the lease holder
+        downloads; other workers load what is on disk and mark the day filled
+        once the lease holder has filled it. Returns how many symbols have a
+        close in the window (0 when skipped or nothing came back).
+        """
+        today = today or get_current_ist_time().date()
+        if self._filled_on == today and not force:
+            return 0
+        symbols = self._universe()
+        if not symbols:
+            return 0
+
+        started = time.time()
+        prices = self.prices or PriceHistory()
+        start, end = today - timedelta(days=1 + settings.CLOSE_STORE_DAYS), today - timedelta(days=1)
+        leader = acquire_lease(scheduler_locks_collection, LEASE_NAME, self.owner, _LEASE_SECONDS)
+        # Read before loading, so a fill finishing meanwhile is not taken as loaded
+        filled = leader or self._marker_date(prices.cache_dir) == today.isoformat()
+        try:
+            if not leader:
+                prices = PriceHistory(prices.cache_dir, offline=True)
+            ordinals, closes = prices.matrix(symbols, start, end)
+        finally:
+            if leader:
+                release_lease(scheduler_locks_collection, LEASE_NAME, self.owner)
+        priced = int((~np.isnan(closes)).any(axis=0).sum()) if len(ordinals) else 0
+        if not priced:
+            if leader:
+                logger.warning(f"Close store fill returned no closes for {len(symbols)} symbols")
+            return 0
+
+        self._load(symbols, ordinals, closes)
+        if leader:
+            self._write_marker(prices.cache_dir, today)
+        if filled:
+            self._filled_on = today
+        logger.info(f"Close store {'filled' if leader else 'loaded from disk'}: {priced}/{len(symbols)} "
+                    f"symbols, {len(ordinals)} days in {time.time() - started:.2f}s")
+        return priced
+
+    # ==================== SCHEDULER ====================
+
+    def _run(self):
+        logger.info(f"Close store filler started ({self.owner})")
+        while not self._stop.is_set():
+            try:
+                self.fill()
+            except Exception:
+                logger.exception("Close store fill failed")
+            filled = self._filled_on == get_current_ist_time().date()
+            self._stop.wait(_CHECK_INTERVAL_SECONDS if filled else _RETRY_SECONDS)
+        logger.info("Close store filler stopped")
+
+    def start(self):
+        if not settings.CLOSE_STORE_ENABLED:
+            logger.info("Close store disabled")
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="close-store", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+close_store = CloseStore()
@@ -0,0 +1,196 @@
+"""
+Exposure Index - Per-user inverted index of stock holdings across funds.
+
+One document per (user, ISIN) in the `exposure_index` collection:
+
+    {"_id": "<user_id>:<isin>", "user_id", "isin", "symbol", "name",
+     "funds": [{"fund_id", "weight", "format"}, ...]}   # weight as a fraction
+
+It is maintained when holdings are saved (process_and_save_holdings,
+update_holdings_only) or a fund is deleted, so a look-through ("how much
+RELIANCE do I really own") reads only the user's index documents - a few
+hundred small rows - instead of every holdings list. The exposure itself is
+a sparse product: (ISIN x fund) weights in COO form times the funds'
+current values, summed per ISIN with one bincount.
+"""
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from db import exposure_index_collection, holdings_collection
+from utils.weight_vector import fraction_scale
+from core.logging import get_logger
+
+logger = get_logger("ExposureIndex")
+
+# Postings of an older format (weights scaled per holding instead of per fund) are re-indexed
+POSTING_FORMAT = 3
+
+
+def _doc_id(user_id: str, isin: str) -> str:
+    return f"{user_id}:{isin}"
+
+
+def _postings(holdings: Iterable[dict]) -> Dict[str, dict]:
+    """ISIN -> {symbol, name, weight}; weights scaled to fractions per fund (as WeightVector)."""
+    rows = []
+    for h in holdings:
+        isin = str(h.get("ISIN") or "").strip().upper()
+        weight = float(h.get("Weight") or 0)
+        if isin and weight > 0:
+            rows.append((isin, weight, h))
+    scale = fraction_scale(weight for _, weight, _ in rows)
+
+    postings: Dict[str, dict] = {}
+    for isin, weight, h in rows:
+        weight *= scale
+        if isin in postings:
+            # Same ISIN listed twice (e.g. split across sections): one posting
+            postings[isin]["weight"] += weight
+        else:
+            postings[isin] = {"symbol": h.get("Symbol"), "name": h.get("Name"), "weight": weight}
+    return postings
+
+
+class ExposureIndex:
+    """Maintains and queries the exposure_index collection."""
+
+    # ==================== MAINTENANCE ====================
+
+    @staticmethod
+    def index_fund(user_id: str, fund_id: str, holdings: Iterable[dict]) -> bool:
+        """Replaces one fund's postings with those of holdings. Never raises."""
+        try:
+            ExposureIndex._pull_fund(user_id, fund_id)
+            ops = [
+                UpdateOne(
+                    {"_id": _doc_id(user_id, isin)},
+                    {
+                        "$set": {"user_id": user_id, "isin": isin, "symbol": p["symbol"], "name": p["name"]},
+                        "$push": {"funds": {"fund_id": fund_id, "weight": p["weight"], "format": POSTING_FORMAT}},
+                    },
+                    upsert=True,
+                )
+                for isin, p in _postings(holdings).items()
+            ]
+            if ops:
+                exposure_index_collection.bulk_write(ops, ordered=False)
+            return True
+        except Exception as e:
+            logger.warning(f"Exposure index update failed for fund {fund_id}: {e}")
+            return False
+
+    @staticmethod
+    def remove_fund(user_id: str, fund_id: str) -> bool:
+        try:
+            ExposureIndex._pull_fund(user_id, fund_id)
+            return True
+        except Exception as e:
+            logger.warning(f"Exposure index cleanup failed for fund {fund_id}: {e}")
+            return False
+
+    @staticmethod
+    def _pull_fund(user_id: str, fund_id: str):
+        exposure_index_collection.update_many(
+            {"user_id": user_id, "funds.fund_id": fund_id},
+            {"$pull": {"funds": {"fund_id": fund_id}}},
+        )
+        exposure_index_collection.delete_many({"user_id": user_id, "funds": {"$size": 0}})
+
+    @staticmethod
+    def ensure_indexed(user_id: str, fund_ids: Iterable[str]) -> int:
+        """
+        Indexes funds saved before the index existed, or indexed in an older
+        posting format (one holdings read for all of them). Returns how many
+        funds were indexed.
+        """
+        indexed = set(exposure_index_collection.distinct("funds.fund_id", {"user_id": user_id}))
+        stale = set(exposure_index_collection.distinct(
+            "funds.fund_id", {"user_id": user_id, "funds": {"$elemMatch": {"format": {"$ne": POSTING_FORMAT}}}}
+        ))
+        missing = [fid for fid in fund_ids if fid not in indexed or fid in stale]
+        if not missing:
+            return 0
+        docs = holdings_collection.find(
+            {"_id": {"$in": [ObjectId(fid) for fid in missing]}, "user_id": user_id}, {"holdings": 1}
+        )
+        count = 0
+        for doc in docs:
+            if ExposureIndex.index_fund(user_id, str(doc["_id"]), doc.get("holdings", [])):
+                count += 1
+        return count
+
+    # ==================== LOOK-THROUGH ====================
+
+    @staticmethod
+    def look_through(user_id: str, fund_values: Dict[str, float], isin: Optional[str] = None,
+                     symbol: Optional[str] = None) -> List[dict]:
+        """
+        Value-weighted exposure per stock across the funds in fund_values
+        (fund_id -> current value), largest first. With isin or symbol only
+        that stock is returned, with its per-fund breakdown.
+        """
+        query = {"user_id": user_id}
+        if isin:
+            query["_id"] = _doc_id(user_id, isin.strip().upper())
+        elif symbol:
+            query["symbol"] = symbol.strip().upper()
+        docs = list(exposure_index_collection.find(query))
+        breakdown = bool(isin or symbol)
+
+        fund_ids = list(fund_values)
+        fund_pos = {fid: i for i, fid in enumerate(fund_ids)}
+        values = np.fromiter((float(fund_values[f]) for f in fund_ids), dtype=np.float64, count=len(fund_ids))
+
+        # COO entries of the (ISIN x fund) weight matrix
+        rows, cols, weights = [], [], []
+        for row, doc in enumerate(docs):
+            for posting in doc.get("funds", []):
+                col = fund_pos.get(posting.get("fund_id"))
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+                    weights.append(float(posting.get("weight") or 0))
+        if not rows:
+            return []
+
+        rows = np.asarray(rows, dtype=np.intp)
+        cols = np.asarray(cols, dtype=np.intp)
+        contributions = np.asarray(weights, dtype=np.float64) * values[cols]
+        exposure = np.bincount(rows, weights=contributions, minlength=len(docs))
+        fund_counts = np.bincount(rows, minlength=len(docs))
+
+        total_value = float(values.sum())
+        result = []
+        for row in np.argsort(-exposure, kind="stable"):
+            if fund_counts[row] == 0:
+                continue
+            doc = docs[row]
+            item = {
+                "isin": doc.get("isin"),
+                "symbol": doc.get("symbol"),
+                "name": doc.get("name"),
+                "value": round(float(exposure[row]), 2),
+                "weight_pct": round(float(exposure[row]) / total_value * 100, 2) if total_value > 0 else 0,
+                "fund_count": int(fund_counts[row]),
+            }
+            if breakdown:
+                mask = rows == row
+                item["funds"] = sorted(
+                    (
+                        {
+                            "fund_id": fund_ids[c],
+                            "weight_pct": round(w * 100, 2),
+                            "value": round(float(v), 2),
+                        }
+                        for c, w, v in zip(cols[mask], np.asarray(weights)[mask], contributions[mask])
+                    ),
+                    key=lambda f: f["value"], reverse=True,
+                )
+            result.append(item)
+        return result
+
+
+exposure_index = ExposureIndex()
@@ -1,22 +1,36 @@
 """
 Fyers API Service - Handles authentication and market data fetching
 """
+import asyncio
 import os
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List, Any
 from pathlib import Path
 
 from fyers_apiv3 import fyersModel
+from core import http
 from core.config import settings
 from core.logging import get_logger
+from utils.rate_limit import TokenBucket
+from utils.weight_vector import fyers_symbol_for
 
 logger = get_logger("FyersService")
 
 # Token storage path
 TOKEN_FILE = Path(__file__).parent.parent / ".fyers_token.json"
 
+# Fyers data API (quotes/history); the quotes endpoint takes at most 50 symbols
+FYERS_DATA_API = "https://api-t1.fyers.in/data"
+QUOTES_BATCH_SIZE = 50
+
+# Fyers allows ~10 data requests/second per app; every history call takes a
+# token from this bucket, and batch fetches run on a bounded pool.
+_history_bucket = TokenBucket(settings.FYERS_HISTORY_RATE_PER_SECOND)
+_history_pool = ThreadPoolExecutor(max_workers=settings.FYERS_HISTORY_WORKERS, thread_name_prefix="fyers-history")
+
 
 class FyersService:
     """
@@ -205,15 +219,7 @@ class FyersService:
         Convert a plain symbol to Fyers format.
         Example: RELIANCE -> NSE:RELIANCE-EQ
         """
-        symbol = symbol.upper().strip()
-        # Remove any existing suffix
-        if symbol.endswith(".NS") or symbol.endswith(".BO"):
-            symbol = symbol[:-3]
-        if symbol.endswith("-EQ"):
-            symbol = symbol[:-3]
-        if ":" in symbol:
-            return symbol  # Already formatted
-        return f"{exchange}:{symbol}-EQ"
+        return fyers_symbol_for(symbol, exchange)
 
     def _get_pct_change_for_formatted_symbols(self, formatted_symbols: List[str]) -> Dict[str, Optional[float]]:
         """Fetch pct change for already-formatted FYERS symbols (e.g., 'BSE:SBICARD-A').
@@ -225,26 +231,45 @@ class FyersService:
             return result
 
         try:
-            batch_size = 50
-            for i in range(0, len(formatted_symbols), batch_size):
-                batch = formatted_symbols[i:i + batch_size]
-                symbols_str = ",".join(batch)
-                response = self._fyers.quotes({"symbols": symbols_str})
-                if response.get("s") == "ok" and response.get("d"):
-                    for quote in response["d"]:
-                        v = quote.get("v", {})
-                        sym = quote.get("n")
-                        pct = v.get("chp")
-                        if sym:
-                            result[sym] = float(pct) if pct is not None else None
+            for i in range(0, len(formatted_symbols), QUOTES_BATCH_SIZE):
+                batch = formatted_symbols[i:i + QUOTES_BATCH_SIZE]
+                response = self._fyers.quotes({"symbols": ",".join(batch)})
+                result.update(self._parse_formatted_quotes(response))
 
-                if i + batch_size < len(formatted_symbols):
+                if i + QUOTES_BATCH_SIZE < len(formatted_symbols):
                     time.sleep(0.1)
         except Exception as e:
             logger.debug(f"Formatted quotes error: {e}")
 
         return result
 
+    @staticmethod
+    def _parse_formatted_quotes(response: dict) -> Dict[str, Optional[float]]:
+        """Quotes response -> {formatted symbol: pct_change}."""
+        result: Dict[str, Optional[float]] = {}
+        if response.get("s") == "ok" and response.get("d"):
+            for quote in response["d"]:
+                v = quote.get("v", {})
+                sym = quote.get("n")
+                pct = v.get("chp")
+                if sym:
+                    result[sym] = float(pct) if pct is not None else None
+        return result
+
+    @staticmethod
+    def _parse_exchange_quotes(response: dict, exchange: str) -> Dict[str, float]:
+        """Quotes response -> {plain symbol: pct_change} for one exchange."""
+        result: Dict[str, float] = {}
+        if response.get("s") == "ok" and response.get("d"):
+            for quote in response["d"]:
+                v = quote.get("v", {})
+                # Extract symbol name without exchange prefix
+                sym = quote.get("n", "").replace(f"{exchange}:", "").replace("-EQ", "")
+                pct = v.get("chp")
+                if pct is not None:
+                    result[sym] = float(pct)
+        return result
+
     def get_quotes(self, symbols: List[str]) -> Dict[str, Any]:
         """
         Fetch live quotes for multiple symbols.
@@ -391,7 +416,7 @@ class FyersService:
                 "cont_flag": "1"
             }
             
-            response = self._fyers.history(data)
+            response = self._history(data)
             
             if response.get("s") == "ok" and response.get("candles"):
                 candles = []
@@ -414,6 +439,25 @@ class FyersService:
             logger.error(f"Fyers history error for {symbol}: {e}")
             return None
 
+    def _history(self, data: dict) -> dict:
+        """FyersModel.history, within the process-wide request rate."""
+        _history_bucket.acquire()
+        return self._fyers.history(data)
+
+    @staticmethod
+    def _pct_on_date(candles: Optional[List[Dict]], target_date: datetime) -> Optional[float]:
+        """Percent change of the target date's close against the previous candle."""
+        if not candles or len(candles) < 2:
+            return None
+        target_str = target_date.strftime("%Y-%m-%d")
+        for i, c in enumerate(candles):
+            if c["date"] == target_str:
+                prev = candles[i - 1] if i > 0 else None
+                if prev and prev["close"] > 0:
+                    return ((c["close"] - prev["close"]) / prev["close"]) * 100
+                break
+        return None
+
     def get_historical_pct_change(self, symbol: str, target_date: datetime) -> Optional[float]:
         """
         Calculate percent change for a specific historical date.
@@ -426,22 +470,7 @@ class FyersService:
             try:
                 from_date = target_date - timedelta(days=7)
                 to_date = target_date + timedelta(days=1)
-                candles = self.get_historical_data(symbol, "D", from_date, to_date)
-                if not candles or len(candles) < 2:
-                    return None
-
-                target_str = target_date.strftime("%Y-%m-%d")
-                target_candle = None
-                prev_candle = None
-                for i, c in enumerate(candles):
-                    if c["date"] == target_str:
-                        target_candle = c
-                        if i > 0:
-                            prev_candle = candles[i - 1]
-                        break
-
-                if target_candle and prev_candle and prev_candle["close"] > 0:
-                    return ((target_candle["close"] - prev_candle["close"]) / prev_candle["close"]) * 100
+                return self._pct_on_date(self.get_historical_data(symbol, "D", from_date, to_date), target_date)
             except Exception as e:
                 logger.debug(f"Historical pct change failed for formatted symbol {symbol}: {e}")
             return None
@@ -468,28 +497,51 @@ class FyersService:
             to_date = target_date + timedelta(days=1)
             
             candles = self._get_historical_data_for_exchange(symbol, "D", from_date, to_date, exchange)
-            if not candles or len(candles) < 2:
-                return None
-
-            target_str = target_date.strftime("%Y-%m-%d")
-            target_candle = None
-            prev_candle = None
-            
-            for i, c in enumerate(candles):
-                if c["date"] == target_str:
-                    target_candle = c
-                    if i > 0:
-                        prev_candle = candles[i - 1]
-                    break
-
-            if target_candle and prev_candle and prev_candle["close"] > 0:
-                pct = ((target_candle["close"] - prev_candle["close"]) / prev_candle["close"]) * 100
-                return pct
+            return self._pct_on_date(candles, target_date)
         except Exception as e:
             logger.debug(f"Historical pct change error for {symbol} on {exchange}: {e}")
         
         return None
 
+    def get_historical_pct_changes(self, symbols: List[str], target_date: datetime) -> Dict[str, Optional[float]]:
+        """
+        get_historical_pct_change for many symbols at once: the history calls
+        fan out over the history pool (NSE pass, then a BSE pass for plain
+        symbols NSE could not price) within the shared rate limit, so latency
+        is two concurrent rounds instead of the sum of up to 2N serial calls.
+
+        Returns dict: symbol -> pct_change (or None if failed)
+        """
+        symbols = list(dict.fromkeys(symbols))
+        result: Dict[str, Optional[float]] = dict.fromkeys(symbols)
+        if not symbols or not self.is_authenticated():
+            return result
+
+        formatted_inputs = [s for s in symbols if ":" in s]
+        plain = {
+            s: s.upper().replace(".NS", "").replace(".BO", "").replace("-EQ", "")
+            for s in symbols if ":" not in s
+        }
+
+        def fan_out(exchange: str, pending: List[str]):
+            futures = {
+                s: _history_pool.submit(self._get_historical_pct_for_exchange, plain[s], target_date, exchange)
+                for s in pending
+            }
+            for s, fut in futures.items():
+                result[s] = fut.result()
+
+        formatted = {s: _history_pool.submit(self.get_historical_pct_change, s, target_date) for s in formatted_inputs}
+        fan_out("NSE", list(plain))
+        for s, fut in formatted.items():
+            result[s] = fut.result()
+
+        failed = [s for s in plain if result[s] is None]
+        if failed:
+            logger.debug(f"Trying {len(failed)} historical symbols on BSE...")
+            fan_out("BSE", failed)
+        return result
+
     def _get_historical_data_for_exchange(
         self, symbol: str, resolution: str, from_date: datetime, to_date: datetime, exchange: str
     ) -> Optional[List[Dict]]:
@@ -509,7 +561,7 @@ class FyersService:
                 "cont_flag": "1"
             }
             
-            response = self._fyers.history(data)
+            response = self._history(data)
             
             if response.get("s") == "ok" and response.get("candles"):
                 candles = []
@@ -540,9 +592,7 @@ class FyersService:
         if not symbols:
             return result
 
-        # Split into formatted (explicit exchange/suffix) vs plain symbols
-        formatted_inputs = [s for s in symbols if ":" in (s or "")]
-        plain_inputs = [s for s in symbols if ":" not in (s or "")]
+        formatted_inputs, symbol_map = self._split_bulk_symbols(symbols)
 
         # 1) Handle formatted symbols directly
         if formatted_inputs:
@@ -551,36 +601,45 @@ class FyersService:
                 result[s] = formatted_quotes.get(s)
 
         # 2) Handle plain symbols (legacy behavior: NSE first, then BSE with -EQ)
-        if not plain_inputs:
+        if not symbol_map:
             return result
 
-        clean_symbols = [s.upper().replace(".NS", "").replace(".BO", "").replace("-EQ", "") for s in plain_inputs]
-        symbol_map = {clean: orig for clean, orig in zip(clean_symbols, plain_inputs)}
-        
         # PASS 1: Try all on NSE
-        nse_quotes = self._get_bulk_quotes_for_exchange(clean_symbols, "NSE")
-        failed_symbols = []
-        
-        for clean_sym, orig_sym in symbol_map.items():
-            if clean_sym in nse_quotes and nse_quotes[clean_sym] is not None:
-                result[orig_sym] = nse_quotes[clean_sym]
-            else:
-                failed_symbols.append(clean_sym)
-        
+        nse_quotes = self._get_bulk_quotes_for_exchange(list(symbol_map), "NSE")
+        failed_symbols = self._merge_exchange_quotes(result, symbol_map, list(symbol_map), nse_quotes)
+
         # PASS 2: Try failed symbols on BSE
         if failed_symbols:
             logger.debug(f"Trying {len(failed_symbols)} symbols on BSE...")
             bse_quotes = self._get_bulk_quotes_for_exchange(failed_symbols, "BSE")
-            
-            for clean_sym in failed_symbols:
-                orig_sym = symbol_map[clean_sym]
-                if clean_sym in bse_quotes and bse_quotes[clean_sym] is not None:
-                    result[orig_sym] = bse_quotes[clean_sym]
-                else:
-                    result[orig_sym] = None
-        
+            for clean_sym in self._merge_exchange_quotes(result, symbol_map, failed_symbols, bse_quotes):
+                result[symbol_map[clean_sym]] = None
+
         return result
 
+    @staticmethod
+    def _split_bulk_symbols(symbols: List[str]):
+        """
+        Splits input symbols into formatted ones (explicit exchange, e.g.
+        'BSE:SBICARD-A') and plain ones. Returns (formatted_inputs,
+        {clean plain symbol: original input}).
+        """
+        formatted_inputs = [s for s in symbols if ":" in (s or "")]
+        plain_inputs = [s for s in symbols if ":" not in (s or "")]
+        clean_symbols = [s.upper().replace(".NS", "").replace(".BO", "").replace("-EQ", "") for s in plain_inputs]
+        return formatted_inputs, {clean: orig for clean, orig in zip(clean_symbols, plain_inputs)}
+
+    @staticmethod
+    def _merge_exchange_quotes(result, symbol_map, clean_symbols, quotes) -> List[str]:
+        """Copies priced symbols into result (keyed by original input); returns the unpriced ones."""
+        failed = []
+        for clean_sym in clean_symbols:
+            if quotes.get(clean_sym) is not None:
+                result[symbol_map[clean_sym]] = quotes[clean_sym]
+            else:
+                failed.append(clean_sym)
+        return failed
+
     def _get_bulk_quotes_for_exchange(self, symbols: List[str], exchange: str) -> Dict[str, Optional[float]]:
         """Helper to get bulk quotes from a specific exchange."""
         result = {}
@@ -588,31 +647,86 @@ class FyersService:
             return result
 
         try:
-            # Fyers API limit is ~50 symbols per request
-            batch_size = 50
-            for i in range(0, len(symbols), batch_size):
-                batch = symbols[i:i + batch_size]
+            for i in range(0, len(symbols), QUOTES_BATCH_SIZE):
+                batch = symbols[i:i + QUOTES_BATCH_SIZE]
                 formatted = [self.format_symbol(s, exchange) for s in batch]
-                symbols_str = ",".join(formatted)
-                
-                response = self._fyers.quotes({"symbols": symbols_str})
-                
-                if response.get("s") == "ok" and response.get("d"):
-                    for quote in response["d"]:
-                        v = quote.get("v", {})
-                        # Extract symbol name without exchange prefix
-                        sym = quote.get("n", "").replace(f"{exchange}:", "").replace("-EQ", "")
-                        pct = v.get("chp")
-                        if pct is not None:
-                            result[sym] = float(pct)
-                
-                if i + batch_size < len(symbols):
+
+                response = self._fyers.quotes({"symbols": ",".join(formatted)})
+                result.update(self._parse_exchange_quotes(response, exchange))
+
+                if i + QUOTES_BATCH_SIZE < len(symbols):
                     time.sleep(0.1)
         except Exception as e:
             logger.debug(f"Bulk quotes error on {exchange}: {e}")
         
         return result
 
+    # ==================== ASYNC QUOTES ====================
+    # Same results as the sync bulk methods above, but over the shared pooled
+    # HTTP client: batches go out concurrently (bounded per host by core.http)
+    # and the caller's event loop is never blocked.
+
+    async def _aquotes(self, symbols: List[str]) -> dict:
+        """Async equivalent of FyersModel.quotes for one batch (<= 50 symbols)."""
+        response = await http.get(
+            f"{FYERS_DATA_API}/quotes",
+            params={"symbols": ",".join(symbols)},
+            headers={"Authorization": f"{self.app_id}:{self._access_token}", "version": "3"},
+            timeout=10,
+        )
+        return response.json()
+
+    async def _aquotes_batched(self, symbols: List[str]) -> List[dict]:
+        batches = [symbols[i:i + QUOTES_BATCH_SIZE] for i in range(0, len(symbols), QUOTES_BATCH_SIZE)]
+        responses = await asyncio.gather(*(self._aquotes(b) for b in batches), return_exceptions=True)
+        ok = []
+        for r in responses:
+            if isinstance(r, Exception):
+                logger.debug(f"Async quotes batch error: {r}")
+            elif isinstance(r, dict):
+                ok.append(r)
+        return ok
+
+    async def _aget_bulk_quotes_for_exchange(self, symbols: List[str], exchange: str) -> Dict[str, float]:
+        result: Dict[str, float] = {}
+        if not self.is_authenticated() or not symbols:
+            return result
+        formatted = [self.format_symbol(s, exchange) for s in symbols]
+        for response in await self._aquotes_batched(formatted):
+            result.update(self._parse_exchange_quotes(response, exchange))
+        return result
+
+    async def aget_bulk_quotes_pct_change(self, symbols: List[str]) -> Dict[str, Optional[float]]:
+        """Async get_bulk_quotes_pct_change: NSE first, then BSE for failures."""
+        result: Dict[str, Optional[float]] = {}
+        if not symbols or not self.is_authenticated():
+            return result
+
+        formatted_inputs, symbol_map = self._split_bulk_symbols(symbols)
+
+        async def formatted_pass():
+            quotes: Dict[str, Optional[float]] = {}
+            for response in await self._aquotes_batched(formatted_inputs):
+                quotes.update(self._parse_formatted_quotes(response))
+            return quotes
+
+        # Formatted symbols and the NSE pass for plain ones are independent
+        formatted_quotes, nse_quotes = await asyncio.gather(
+            formatted_pass() if formatted_inputs else asyncio.sleep(0, {}),
+            self._aget_bulk_quotes_for_exchange(list(symbol_map), "NSE"),
+        )
+        for s in formatted_inputs:
+            result[s] = formatted_quotes.get(s)
+
+        failed_symbols = self._merge_exchange_quotes(result, symbol_map, list(symbol_map), nse_quotes)
+        if failed_symbols:
+            logger.debug(f"Trying {len(failed_symbols)} symbols on BSE...")
+            bse_quotes = await self._aget_bulk_quotes_for_exchange(failed_symbols, "BSE")
+            for clean_sym in self._merge_exchange_quotes(result, symbol_map, failed_symbols, bse_quotes):
+                result[symbol_map[clean_sym]] = None
+
+        return result
+
 
 # Singleton instance
 fyers_service = FyersService()
@@ -1,21 +1,24 @@
 import pandas as pd
-import csv
 import requests
 import os
-import re
-import time
-from io import StringIO
 from bson import ObjectId
 from db import holdings_collection, users_collection
 from typing import List, Optional
 import difflib
 
 from datetime import datetime
-from utils.common import NSE_HEADERS, NSE_CSV_URL, FYERS_BSE_CM_URL
+from utils.common import NSE_HEADERS, MFAPI_BASE_URL
 from utils.date_utils import format_date_for_api, parse_date_from_str, get_current_ist_time
+from utils.weight_vector import WeightVector, is_current
+from utils.sip_totals import SipTotals, installment_update
+from utils.holdings_parser import parse_holdings_workbook, score_columns
 from datetime import date, timedelta
 from dateutil.relativedelta import relativedelta
+from core import http
 from core.logging import get_logger
+from services.pnl_cache import pnl_cache
+from services.isin_master import isin_master, NSE as NSE_SOURCE, BSE as BSE_SOURCE
+from services.exposure_index import exposure_index
 
 logger = get_logger("HoldingsService")
 
@@ -25,158 +28,104 @@ DEBUG_HOLDINGS = os.getenv("DEBUG_HOLDINGS", "false").lower() == "true"
 session = requests.Session()
 session.headers.update(NSE_HEADERS)
 
-_FYERS_BSE_ISIN_MAP = None  # type: Optional[dict]
-_FYERS_BSE_ISIN_MAP_LOADED_AT = 0.0
-_FYERS_BSE_ISIN_MAP_TTL_SECONDS = 24 * 60 * 60
-_ISIN_RE = re.compile(r"\b[A-Z0-9]{12}\b")
+# Fields the P&L calculation reads. The raw holdings list (names, ISINs) and
+# the SIP installments are left out: the stored weight_vector and sip_totals
+# carry everything the estimate and the SIP figures need.
+PNL_PROJECTION = {
+    "user_id": 1, "fund_name": 1, "scheme_code": 1, "nickname": 1,
+    "investment_type": 1, "invested_amount": 1, "invested_date": 1,
+    "sip_mode": 1, "sip_start_date": 1, "sip_totals": 1,
+    "sip_day": 1, "sip_amount": 1, "current_sip_amount": 1,
+    "manual_total_units": 1, "manual_invested_amount": 1, "future_sip_units": 1,
+    "weight_vector": 1, "created_at": 1, "version": 1,
+}
 
-
-def _extract_fyers_symbol(line: str, exchange_prefix: str) -> Optional[str]:
-    idx = line.find(f"{exchange_prefix}:")
-    if idx < 0:
-        return None
-    end = line.find(",", idx)
-    if end < 0:
-        end = len(line)
-    sym = line[idx:end].strip()
-    return sym or None
+# Just enough to key the P&L result cache (see services.pnl_cache)
+PNL_CACHE_PROJECTION = {"user_id": 1, "scheme_code": 1, "version": 1}
 
 
 def load_fyers_bse_isin_map(force: bool = False) -> dict:
-    """Loads a mapping of ISIN -> FYERS BSE symbol (e.g., 'BSE:SBICARD-A').
+    """ISIN -> FYERS BSE symbol (e.g., 'BSE:SBICARD-A'), from the persisted ISIN master."""
+    return isin_master.get_map(BSE_SOURCE, force=force)
 
-    Uses FYERS public BSE symbol master file and caches it in-memory.
-    """
-    global _FYERS_BSE_ISIN_MAP, _FYERS_BSE_ISIN_MAP_LOADED_AT
 
-    now = time.time()
-    if (
-        not force
-        and _FYERS_BSE_ISIN_MAP is not None
-        and (now - _FYERS_BSE_ISIN_MAP_LOADED_AT) < _FYERS_BSE_ISIN_MAP_TTL_SECONDS
-    ):
-        return _FYERS_BSE_ISIN_MAP
+def load_nse_isin_map(force: bool = False) -> dict:
+    """ISIN -> NSE symbol from NSE's Equity Master List, via the persisted ISIN master.
 
-    mapping: dict = {}
-    try:
-        with requests.get(FYERS_BSE_CM_URL, stream=True, timeout=30) as r:
-            r.raise_for_status()
-            for raw in r.iter_lines(decode_unicode=True):
-                if not raw:
-                    continue
-                line = raw.strip()
-                if "BSE:" not in line:
-                    continue
+    The lists are stored in Mongo and refreshed in the background with
+    conditional requests (see services.isin_master), so a cold worker loads
+    them from the database instead of downloading and parsing the CSV.
+    """
+    return isin_master.get_map(NSE_SOURCE, force=force)
 
-                m = _ISIN_RE.search(line)
-                if not m:
-                    continue
-                isin = m.group(0).upper()
+def search_scheme_code(query):
+    # DEPRECATED: Use get_scheme_candidates logic instead
+    return None
 
-                sym = _extract_fyers_symbol(line, "BSE")
-                if sym:
-                    mapping[isin] = sym
+def _rank_scheme_candidates(query, data):
+    """Scores mfapi.in search results against the query; returns the top 5."""
+    if not data: return []
 
-        _FYERS_BSE_ISIN_MAP = mapping
-        _FYERS_BSE_ISIN_MAP_LOADED_AT = now
-        return mapping
-    except Exception as e:
-        logger.warning(f"Failed to load FYERS BSE symbol master: {e}")
-        _FYERS_BSE_ISIN_MAP = {}
-        _FYERS_BSE_ISIN_MAP_LOADED_AT = now
-        return _FYERS_BSE_ISIN_MAP
+    # Scoring Logic
+    def get_score(item):
+        name = item["schemeName"]
+        # Base similarity
+        ratio = difflib.SequenceMatcher(None, query.lower(), name.lower()).ratio()
 
-_NSE_ISIN_MAP = None  # type: Optional[dict]
-_NSE_ISIN_MAP_LOADED_AT = 0.0
-_NSE_ISIN_MAP_TTL_SECONDS = 24 * 60 * 60
+        # Heuristics
+        if "Direct" in name: ratio += 0.05
+        if "Growth" in name: ratio += 0.05
+        if "Regular" in name: ratio -= 0.05
+        if "IDCW" in name or "Dividend" in name: ratio -= 0.05
 
+        # Strict Penalty for 'Bonus' unless query has it
+        if "Bonus" in name and "Bonus" not in query: ratio -= 0.2
 
-def load_nse_isin_map(force: bool = False) -> dict:
-    """Downloads the NSE Equity Master List and caches an ISIN -> Symbol dict.
+        return ratio
 
-    Same 24h-TTL pattern as the FYERS BSE map above. Replaces the previous
-    per-upload CSV download + per-ISIN linear table scan. On download failure
-    the stale cache (if any) is served and the next call retries.
-    """
-    global _NSE_ISIN_MAP, _NSE_ISIN_MAP_LOADED_AT
+    # Calculate all scores
+    scored = []
+    for item in data:
+        s = get_score(item)
+        scored.append({"schemeCode": str(item["schemeCode"]), "schemeName": item["schemeName"], "score": s})
 
-    now = time.time()
-    if (
-        not force
-        and _NSE_ISIN_MAP is not None
-        and (now - _NSE_ISIN_MAP_LOADED_AT) < _NSE_ISIN_MAP_TTL_SECONDS
-    ):
-        return _NSE_ISIN_MAP
+    # Sort desc
+    scored.sort(key=lambda x: x["score"], reverse=True)
+    return scored[:5] # Return top 5
 
+
+def get_scheme_candidates(query):
+    """Returns top matches with scores."""
     try:
-        r = session.get(NSE_CSV_URL, timeout=20)
-        rows = list(csv.DictReader(StringIO(r.text)))
-        mapping: dict = {}
-        if rows:
-            headers = rows[0].keys()
-            isin_col = next((col for col in headers if "isin" in col.lower().replace(" ", "")), None)
-            symbol_col = next((col for col in headers if col.lower().strip() in ["symbol", "tradingsymbol", "sc_symbol"]), None)
-            if not symbol_col:  # Fallback
-                symbol_col = next((col for col in headers if "symbol" in col.lower()), None)
-            if isin_col and symbol_col:
-                for row in rows:
-                    isin = (row.get(isin_col) or "").strip()
-                    if isin:
-                        mapping[isin] = row.get(symbol_col)
-        _NSE_ISIN_MAP = mapping
-        _NSE_ISIN_MAP_LOADED_AT = now
+        response = requests.get(f"{MFAPI_BASE_URL}/search", params={"q": query}, timeout=5)
+        if response.status_code == 200:
+            return _rank_scheme_candidates(query, response.json())
     except Exception as e:
-        logger.error(f"Error downloading NSE CSV: {e}")
-        # Serve stale cache if we have one; otherwise an empty map.
-        # LOADED_AT is left untouched so the next call retries the download.
-
-    return _NSE_ISIN_MAP or {}
+        logger.warning(f"Search error for '{query}': {e}")
+    return []
 
-def search_scheme_code(query):
-    # DEPRECATED: Use get_scheme_candidates logic instead
-    return None
 
-def get_scheme_candidates(query):
-    """Returns top matches with scores."""
+async def aget_scheme_candidates(query):
+    """Async get_scheme_candidates over the shared pooled HTTP client."""
     try:
-        url = f"https://api.mfapi.in/mf/search?q={query}"
-        response = requests.get(url, timeout=5)
+        response = await http.get(f"{MFAPI_BASE_URL}/search", params={"q": query}, timeout=5)
         if response.status_code == 200:
-             data = response.json()
-             if not data: return []
-             
-             # Scoring Logic
-             def get_score(item):
-                 name = item["schemeName"]
-                 # Base similarity
-                 ratio = difflib.SequenceMatcher(None, query.lower(), name.lower()).ratio()
-                 
-                 # Heuristics
-                 if "Direct" in name: ratio += 0.05
-                 if "Growth" in name: ratio += 0.05
-                 if "Regular" in name: ratio -= 0.05
-                 if "IDCW" in name or "Dividend" in name: ratio -= 0.05
-                 
-                 # Strict Penalty for 'Bonus' unless query has it
-                 if "Bonus" in name and "Bonus" not in query: ratio -= 0.2
-                 
-                 return ratio
-
-             # Calculate all scores
-             scored = []
-             for item in data:
-                 s = get_score(item)
-                 scored.append({"schemeCode": str(item["schemeCode"]), "schemeName": item["schemeName"], "score": s})
-             
-             # Sort desc
-             scored.sort(key=lambda x: x["score"], reverse=True)
-             return scored[:5] # Return top 5
+            return _rank_scheme_candidates(query, response.json())
     except Exception as e:
         logger.warning(f"Search error for '{query}': {e}")
     return []
 
 
-def validate_excel_against_scheme(excel_file, scheme_name: str, threshold: float = 0.4) -> dict:
+def read_holdings_upload(excel_file):
+    """
+    Parses an uploaded holdings workbook once (see utils.holdings_parser).
+    The result can be handed to validate_excel_against_scheme and the
+    save/update paths so none of them re-reads the file.
+    """
+    return parse_holdings_workbook(excel_file.file)
+
+
+def validate_excel_against_scheme(excel_file, scheme_name: str, threshold: float = 0.4, parsed=None) -> dict:
     """
     Validates that the uploaded Excel file matches the selected scheme.
     
@@ -187,6 +136,7 @@ def validate_excel_against_scheme(excel_file, scheme_name: str, threshold: float
         excel_file: The uploaded Excel file object
         scheme_name: The official scheme name from MFAPI
         threshold: Minimum similarity score (0-1) to consider a match
+        parsed: Result of read_holdings_upload, if the file was already parsed
     
     Returns:
         dict with keys:
@@ -199,47 +149,19 @@ def validate_excel_against_scheme(excel_file, scheme_name: str, threshold: float
         return {"is_valid": True, "extracted_name": None, "similarity_score": 1.0, "warning": None}
     
     try:
-        # Read first 20 rows to find scheme name (before data header)
-        excel_file.file.seek(0)
-        df_header = pd.read_excel(excel_file.file, header=None, nrows=20)
-        excel_file.file.seek(0)  # Reset for subsequent reads
-        
-        # Common fund house keywords to help identify scheme name rows
-        fund_houses = ["HDFC", "SBI", "ICICI", "AXIS", "NIPPON", "KOTAK", "TATA", "ADITYA BIRLA", 
-                      "UTI", "DSP", "FRANKLIN", "MIRAE", "MOTILAL", "PARAG PARIKH", "QUANT",
-                      "INVESCO", "BANDHAN", "EDELWEISS", "CANARA", "SUNDARAM", "L&T", "IDFC"]
-        
-        # Keywords that indicate scheme name cells
-        scheme_keywords = ["FUND", "SCHEME", "DIRECT", "GROWTH", "REGULAR", "PLAN", "IDCW"]
+        if parsed is None:
+            parsed = read_holdings_upload(excel_file)
         
-        extracted_candidates = []
-        
-        # Scan all cells in the first 20 rows
-        for idx, row in df_header.iterrows():
-            for cell in row:
-                if pd.isna(cell):
-                    continue
-                    
-                cell_str = str(cell).strip()
-                
-                # Skip very short or very long strings
-                if len(cell_str) < 10 or len(cell_str) > 200:
-                    continue
-                
-                cell_upper = cell_str.upper()
-                
-                # Check if this cell might contain a scheme name
-                has_fund_house = any(fh in cell_upper for fh in fund_houses)
-                has_scheme_keyword = any(kw in cell_upper for kw in scheme_keywords)
-                
-                if has_fund_house or has_scheme_keyword:
-                    # Score based on similarity to the expected scheme name
-                    ratio = difflib.SequenceMatcher(None, scheme_name.lower(), cell_str.lower()).ratio()
-                    extracted_candidates.append({
-                        "text": cell_str,
-                        "score": ratio,
-                        "row": idx
-                    })
+        # Cells from the first rows (before data header) that look like a
+        # scheme name, scored by similarity to the expected scheme name
+        extracted_candidates = [
+            {
+                "text": text,
+                "score": difflib.SequenceMatcher(None, scheme_name.lower(), text.lower()).ratio(),
+                "row": row
+            }
+            for row, text in parsed.title_cells
+        ]
         
         # Sort by score descending
         extracted_candidates.sort(key=lambda x: x["score"], reverse=True)
@@ -403,84 +325,94 @@ class HoldingsService:
             return []
 
     @staticmethod
-    def sync_sip_installments(fund_id_str, user_id):
+    def due_sip_installment(doc, today=None):
         """
-        Syncs SIP installments by adding new PENDING installments as new months arrive.
-        
-        This should be called before checking for pending installments (e.g., in calculate_pnl).
-        
+        The PENDING installment a SIP fund is due for this month, or None.
+
         Logic:
         - Only applies to SIP investments (not lumpsum)
-        - If today >= SIP day of current month, ensure a PENDING installment exists for this month
-        - If no installment exists for current month, add one
-        
-        Returns: True if any changes were made, False otherwise
+        - If today >= SIP day of current month and no installment exists for
+          this month yet, returns the new PENDING installment (not saved)
+
+        With stored sip_totals the month check uses its last_date, so the
+        installments themselves need not be loaded.
         """
+        if doc.get("investment_type", "lumpsum") != "sip":
+            return None
+
+        sip_day = doc.get("sip_day")
+        sip_amount = float(doc.get("current_sip_amount") or doc.get("sip_amount", 0) or 0)
+        if not sip_day or sip_amount <= 0:
+            return None
+
+        # Both simple and detailed modes need sync for new months
+        today = today or get_current_ist_time().date()
+
+        # Check if SIP day of current month has passed
         try:
-            doc = holdings_collection.find_one({"_id": ObjectId(fund_id_str), "user_id": user_id})
-            if not doc:
-                return False
-            
-            investment_type = doc.get("investment_type", "lumpsum")
-            if investment_type != "sip":
-                return False
-            
-            sip_day = doc.get("sip_day")
-            sip_amount = float(doc.get("current_sip_amount") or doc.get("sip_amount", 0) or 0)
-            
-            if not sip_day or sip_amount <= 0:
-                return False
-            
-            # Both simple and detailed modes need sync for new months
-            
-            today = get_current_ist_time().date()
-            installments = doc.get("sip_installments", [])
-            
-            # Check if SIP day of current month has passed
-            try:
-                current_month_sip_date = today.replace(day=sip_day)
-            except ValueError:
-                # Handle months with fewer days (e.g., Feb 29, 30, 31)
-                # Use last day of month
-                next_month = today.replace(day=28) + timedelta(days=4)
-                current_month_sip_date = next_month - timedelta(days=next_month.day)
-            
-            if today < current_month_sip_date:
-                # SIP day hasn't arrived this month yet
-                return False
-            
-            # Check if installment for this month already exists
-            current_month_sip_str = format_date_for_api(current_month_sip_date)
-            
-            for inst in installments:
-                inst_date_str = inst.get("date")
+            current_month_sip_date = today.replace(day=sip_day)
+        except ValueError:
+            # Handle months with fewer days (e.g., Feb 29, 30, 31)
+            # Use last day of month
+            next_month = today.replace(day=28) + timedelta(days=4)
+            current_month_sip_date = next_month - timedelta(days=next_month.day)
+
+        if today < current_month_sip_date:
+            # SIP day hasn't arrived this month yet
+            return None
+
+        totals = doc.get("sip_totals")
+        if totals is not None:
+            last_date = totals.get("last_date")
+            # Installments are never dated ahead, so the latest one is enough
+            if last_date and last_date[:7] >= today.strftime("%Y-%m"):
+                return None
+        else:
+            for inst in doc.get("sip_installments", []):
                 try:
-                    inst_date = parse_date_from_str(inst_date_str).date()
+                    inst_date = parse_date_from_str(inst.get("date")).date()
                     # Same month and year? Already have an installment
                     if inst_date.month == today.month and inst_date.year == today.year:
-                        return False
+                        return None
                 except:
                     continue
-            
-            # No installment for this month - add a new PENDING one
-            logger.info(f"Syncing SIP: Adding PENDING installment for {current_month_sip_str}")
-            
-            new_installment = {
-                "date": current_month_sip_str,
-                "amount": sip_amount,
-                "units": None,
-                "nav": None,
-                "status": "PENDING",
-                "allocation_status": "PENDING_NAV",
-                "is_estimated": False
-            }
-            
-            holdings_collection.update_one(
-                {"_id": ObjectId(fund_id_str)},
-                {"$push": {"sip_installments": new_installment}}
+
+        return {
+            "date": format_date_for_api(current_month_sip_date),
+            "amount": sip_amount,
+            "units": None,
+            "nav": None,
+            "status": "PENDING",
+            "allocation_status": "PENDING_NAV",
+            "is_estimated": False
+        }
+
+    @staticmethod
+    def sync_sip_installments(fund_id_str, user_id):
+        """
+        Adds this month's PENDING installment to a SIP fund if it is due
+        (see due_sip_installment). Reads no longer call this; the nightly SIP
+        batch job (services.sip_batch) does the same for every fund in bulk.
+
+        Returns: True if any changes were made, False otherwise
+        """
+        try:
+            doc = holdings_collection.find_one({"_id": ObjectId(fund_id_str), "user_id": user_id})
+            if not doc:
+                return False
+
+            new_installment = HoldingsService.due_sip_installment(doc)
+            if not new_installment:
+                return False
+
+            logger.info(f"Syncing SIP: Adding PENDING installment for {new_installment['date']}")
+            update, _ = installment_update(
+                doc, [(None, new_installment)], [*doc.get("sip_installments", []), new_installment]
             )
+            result = holdings_collection.update_one({"_id": ObjectId(fund_id_str), "version": doc.get("version")}, update)
+            pnl_cache.invalidate(fund_id_str)
             
-            return True
+            return result.modified_count > 0
             
         except Exception as e:
             logger.error(f"Error syncing SIP installments: {e}")
@@ -549,10 +481,80 @@ class HoldingsService:
         return funds
 
     @staticmethod
-    def get_holdings(fund_id_str, user_id):
+    def _backfill_weight_vector(doc):
+        """
+        Documents saved before weight_vector existed (or with a vector of an
+        older format) get it computed from their holdings once and written
+        back, so later projected reads never need the holdings list.
+        """
+        if is_current(doc.get("weight_vector")):
+            return doc
+        try:
+            holdings = doc.get("holdings")
+            if holdings is None:
+                full = holdings_collection.find_one({"_id": doc["_id"]}, {"holdings": 1}) or {}
+                holdings = full.get("holdings", [])
+            vector = WeightVector.from_holdings(holdings).to_dict()
+            holdings_collection.update_one({"_id": doc["_id"]}, {"$set": {"weight_vector": vector}})
+            doc["weight_vector"] = vector
+        except Exception as e:
+            logger.warning(f"Weight vector backfill failed for {doc.get('_id')}: {e}")
+        return doc
+
+    @staticmethod
+    def _backfill_sip_totals(doc):
+        """
+        SIP documents saved before sip_totals existed get them derived from
+        their installments once and written back (unless the document changed
+        meanwhile), so later projected reads never need the installments.
+        """
+        if doc.get("investment_type") != "sip" or doc.get("sip_totals") is not None:
+            return doc
         try:
-            doc = holdings_collection.find_one({"_id": ObjectId(fund_id_str)})
+            installments = doc.get("sip_installments")
+            if installments is None:
+                full = holdings_collection.find_one({"_id": doc["_id"]}, {"sip_installments": 1}) or {}
+                installments = full.get("sip_installments", [])
+            totals = SipTotals.from_installments(installments).to_dict()
+            holdings_collection.update_one(
+                {"_id": doc["_id"], "version": doc.get("version"), "sip_totals": {"$exists": False}},
+                {"$set": {"sip_totals": totals}}
+            )
+            doc["sip_totals"] = totals
+        except Exception as e:
+            logger.warning(f"SIP totals backfill failed for {doc.get('_id')}: {e}")
+        return doc
+
+    @staticmethod
+    def list_holdings_docs(user_id, projection=None):
+        """Returns every holdings document of a user (single query), optionally projected."""
+        try:
+            docs = list(holdings_collection.find({"user_id": user_id}, projection))
+            if projection and "weight_vector" in projection:
+                docs = [HoldingsService._backfill_weight_vector(doc) for doc in docs]
+            if projection and "sip_totals" in projection:
+                docs = [HoldingsService._backfill_sip_totals(doc) for doc in docs]
+            return docs
+        except Exception as e:
+            logger.error(f"Failed to load holdings for user {user_id}: {e}")
+            return []
+
+    @staticmethod
+    def get_holdings(fund_id_str, user_id, projection=None):
+        """
+        Returns the user's holdings document, or None. With a projection
+        (e.g. PNL_PROJECTION) only those fields are loaded; user_id is always
+        included for the ownership check.
+        """
+        try:
+            if projection:
+                projection = {**projection, "user_id": 1}
+            doc = holdings_collection.find_one({"_id": ObjectId(fund_id_str)}, projection)
             if doc and doc.get("user_id") == user_id:
+                if projection and "weight_vector" in projection:
+                    doc = HoldingsService._backfill_weight_vector(doc)
+                if projection and "sip_totals" in projection:
+                    doc = HoldingsService._backfill_sip_totals(doc)
                 # Add stale status to single view as well if needed
                 doc["is_stale"] = HoldingsService._is_portfolio_stale(doc.get("created_at"))
                 return doc
@@ -565,6 +567,8 @@ class HoldingsService:
         try:
             res = holdings_collection.delete_one({"_id": ObjectId(fund_id_str), "user_id": user_id})
             if res.deleted_count > 0:
+                pnl_cache.invalidate(fund_id_str)
+                exposure_index.remove_fund(user_id, fund_id_str)
                 # Remove from user's uploads
                 users_collection.update_one(
                     {"_id": ObjectId(user_id)},
@@ -582,8 +586,9 @@ class HoldingsService:
             # Optionally update nickname or metadata if needed, for now just code
             res = holdings_collection.update_one(
                 {"_id": ObjectId(fund_id_str), "user_id": user_id},
-                {"$set": update_data}
+                {"$set": update_data, "$inc": {"version": 1}}
             )
+            pnl_cache.invalidate(fund_id_str)
             return res.modified_count > 0
         except Exception as e:
             logger.error(f"Update fund scheme failed: {e}")
@@ -596,79 +601,11 @@ class HoldingsService:
         Fixes issue where multiple columns could map to the same name (e.g. Name).
         Returns a dictionary for renaming columns {old_col: new_valid_col}.
         """
-        col_map = {}
-        
-        # Scored candidates: (column_name, score)
-        isin_candidates = []
-        name_candidates = []
-        weight_candidates = []
-
-        for col in df.columns:
-            c = str(col).strip().upper()
-            
-            # --- ISIN ---
-            score = 0
-            if "ISIN" in c:
-                score += 10
-                if c == "ISIN": score += 5
-            
-            if score > 0:
-                isin_candidates.append((col, score))
-
-            # --- Name ---
-            score = 0
-            # High priority keywords
-            if "NAME" in c:
-                score += 5
-                if "INSTRUMENT" in c: score += 5
-                elif "SCHEME" in c: score += 5
-                elif "SECURITY" in c: score += 5
-                elif "COMPANY" in c: score += 4
-                elif "ISSUER" in c: score += 3 # "Issuer Name" is less preferred than "Instrument Name" if both exist
-            
-            # Standalone keywords
-            if c in ["DESCRIPTION", "SCRIP", "SCRIPT", "PARTICULARS", "SECURITY"]:
-                score += 8 # Pretty high confidence
-            
-            # Lower priority but valid
-            if "INSTRUMENT" in c and "NAME" not in c: score += 3
-            
-            if score > 0:
-                name_candidates.append((col, score))
-
-            # --- Weight ---
-            score = 0
-            if "%" in c or "WEIGHT" in c or "ALLOCATION" in c or "AUM" in c or "HOLDING" in c:
-                if "%" in c: score += 5
-                if "WEIGHT" in c: score += 5
-                if "ALLOCATION" in c: score += 4
-                if "AUM" in c: score += 3
-                if "NET" in c and "ASSET" in c: score -= 2 # penalty for "Net Assets" value vs "% to Net Assets"
-                
-                # Boost if it explicitly mentions "to" or "of" (e.g. "% to AUM")
-                if "TO" in c or "OF" in c: score += 2
-            
-            if score > 0:
-                weight_candidates.append((col, score))
-
-        # Sort and pick best
-        isin_candidates.sort(key=lambda x: x[1], reverse=True)
-        name_candidates.sort(key=lambda x: x[1], reverse=True)
-        weight_candidates.sort(key=lambda x: x[1], reverse=True)
-
-        if isin_candidates:
-            col_map[isin_candidates[0][0]] = "ISIN"
-        
-        if name_candidates:
-            col_map[name_candidates[0][0]] = "Name"
-            
-        if weight_candidates:
-            col_map[weight_candidates[0][0]] = "Weight"
-            
-        return col_map
+        columns = list(df.columns)
+        return {columns[i]: target for i, target in score_columns(columns).items()}
 
     @staticmethod
-    def update_holdings_only(fund_id_str, user_id, excel_file):
+    def update_holdings_only(fund_id_str, user_id, excel_file, parsed=None):
         """
         Updates ONLY the holdings (stock weights) for an existing fund.
         Does NOT modify investment details, SIP config, or installments.
@@ -685,69 +622,29 @@ class HoldingsService:
             if not doc:
                 return {"error": "Fund not found or access denied."}
             
-            # 2. Parse Excel file (reuse existing logic)
-            try:
-                df_raw = pd.read_excel(excel_file.file, header=None)
-            except Exception as e:
-                return {"error": f"Failed to read Excel: {str(e)}"}
-            
-            # 3. Find header row
-            header_idx = None
-            for idx, row in df_raw.head(50).iterrows():
-                row_str = row.astype(str).str.upper().tolist()
-                has_isin = any("ISIN" in x.strip() for x in row_str if isinstance(x, str))
-                name_indicators = ["NAME", "INSTRUMENT", "ISSUER", "SECURITY", "COMPANY"]
-                has_name = any(
-                    any(indicator in x.strip() for indicator in name_indicators)
-                    for x in row_str if isinstance(x, str)
-                )
-                weight_indicators = ["%", "WEIGHT", "AUM", "ALLOCATION"]
-                has_weight = any(
-                    any(indicator in x.strip() for indicator in weight_indicators)
-                    for x in row_str if isinstance(x, str)
-                )
-                if has_isin and (has_name or has_weight):
-                    header_idx = idx
-                    break
+            # 2. Parse Excel file (single streaming pass)
+            if parsed is None:
+                try:
+                    parsed = read_holdings_upload(excel_file)
+                except Exception as e:
+                    return {"error": f"Failed to read Excel: {str(e)}"}
             
-            if header_idx is None:
+            if parsed.header_row is None:
                 return {"error": "Could not detect header row. Ensure file has 'ISIN' column."}
             
-            excel_file.file.seek(0)
-            df = pd.read_excel(excel_file.file, header=header_idx)
+            if parsed.missing_columns:
+                return {"error": f"Missing required columns. Found: {parsed.columns}"}
             
-            # 4. Normalize columns
-            col_map = HoldingsService._normalize_columns(df)
-            
-            df = df.rename(columns=col_map)
-            
-            if "ISIN" not in df.columns or "Weight" not in df.columns:
-                return {"error": f"Missing required columns. Found: {list(df.columns)}"}
-            
-            # 5. Clean data
-            df = df.dropna(subset=["ISIN"])
-            df["ISIN"] = df["ISIN"].astype(str).str.strip().str.upper()
-            df = df[df["ISIN"].str.match(r'^[A-Z0-9]{12}$', na=False)]
-            df = df.drop_duplicates(subset=["ISIN"], keep="first")
-            
-            def clean_weight(val):
-                try:
-                    if pd.isna(val): return 0.0
-                    s = str(val).strip().replace("%", "")
-                    return float(s)
-                except: return 0.0
-            
-            df["Weight"] = df["Weight"].apply(clean_weight)
-            
-            # 6. Resolve tickers
+            # 3. Resolve tickers
             nse_isin_map = load_nse_isin_map()
+            weights = parsed.weights.tolist()
+            # Not in NSE's equity list: FYERS NSE (other series), then BSE
+            fallback_symbols = isin_master.fallback_symbols(
+                isin for isin, weight in zip(parsed.isins, weights) if weight > 0 and isin not in nse_isin_map
+            )
             holdings_list = []
-            bse_isin_map = None
 
-            for _, row in df.iterrows():
-                isin = row["ISIN"]
-                name = row.get("Name", "Unknown")
-                weight = float(row["Weight"])
+            for isin, name, weight in zip(parsed.isins, parsed.names, weights):
                 if weight <= 0:
                     continue
 
@@ -755,31 +652,34 @@ class HoldingsService:
                 if ticker:
                     holdings_list.append({"ISIN": isin, "Name": name, "Symbol": ticker, "Weight": weight})
                 else:
-                    if bse_isin_map is None:
-                        bse_isin_map = load_fyers_bse_isin_map()
-                    bse_symbol = (bse_isin_map or {}).get(isin)
-                    if bse_symbol:
-                        holdings_list.append({"ISIN": isin, "Name": name, "Symbol": bse_symbol, "Weight": weight})
+                    fallback_symbol = fallback_symbols.get(isin)
+                    if fallback_symbol:
+                        holdings_list.append({"ISIN": isin, "Name": name, "Symbol": fallback_symbol, "Weight": weight})
             
             if not holdings_list:
                 return {"error": "No valid holdings resolved from the file."}
             
-            # 7. Validate using schema
+            # 4. Validate using schema
             from models.db_schemas import HoldingItem
             validated_holdings = []
             for h in holdings_list:
                 validated_holdings.append(HoldingItem(**h))
             
-            # 8. Update only holdings and timestamp
+            # 5. Update only holdings and timestamp
+            holding_dicts = [h.dict() for h in validated_holdings]
             holdings_collection.update_one(
                 {"_id": ObjectId(fund_id_str)},
                 {
                     "$set": {
-                        "holdings": [h.dict() for h in validated_holdings],
+                        "holdings": holding_dicts,
+                        "weight_vector": WeightVector.from_holdings(holding_dicts).to_dict(),
                         "created_at": datetime.utcnow()  # Reset freshness timestamp
-                    }
+                    },
+                    "$inc": {"version": 1}
                 }
             )
+            pnl_cache.invalidate(fund_id_str)
+            exposure_index.index_fund(user_id, fund_id_str, holding_dicts)
             
             logger.info(f"Updated holdings for fund {fund_id_str}: {len(holdings_list)} holdings")
             
@@ -804,151 +704,52 @@ class HoldingsService:
         # Detailed SIP Mode
         sip_mode="simple", detailed_installments=None,
         # CAS Cost Value (includes stamp duty)
-        cas_cost_value=None
+        cas_cost_value=None,
+        # Pre-parsed workbook (read_holdings_upload), to skip re-reading the file
+        parsed=None
     ):
-        # 1. Read Excel
-        try:
-            df_raw = pd.read_excel(excel_file.file, header=None)
-        except Exception as e:
-            return {"error": f"Failed to read Excel: {str(e)}"}
+        # 1. Read Excel (single streaming pass: header row, columns, cleaned ISIN/Name/Weight)
+        if parsed is None:
+            try:
+                parsed = read_holdings_upload(excel_file)
+            except Exception as e:
+                return {"error": f"Failed to read Excel: {str(e)}"}
 
-        # 2. Find Header (Robust)
-        header_idx = None
-        
-        # Scan first 50 rows only to find the header
-        # We look for a row that contains ISIN and some form of name/description column
-        for idx, row in df_raw.head(50).iterrows():
-            row_str = row.astype(str).str.upper().tolist()
-            
-            # ISIN detection - be flexible
-            has_isin = any(
-                "ISIN" in x.strip() 
-                for x in row_str if isinstance(x, str)
-            )
-            
-            # Name detection - many possible headers
-            name_indicators = [
-                "NAME", "INSTRUMENT", "ISSUER", "SECURITY", "COMPANY", 
-                "DESCRIPTION", "SCHEME", "STOCK", "SCRIP", "PARTICULARS"
-            ]
-            has_name = any(
-                any(indicator in x.strip() for indicator in name_indicators)
-                for x in row_str if isinstance(x, str)
-            )
-            
-            # Weight detection - for additional confidence
-            weight_indicators = ["%", "WEIGHT", "AUM", "ALLOCATION", "ASSET"]
-            has_weight = any(
-                any(indicator in x.strip() for indicator in weight_indicators)
-                for x in row_str if isinstance(x, str)
-            )
-            
-            # Best case: has all three
-            if has_isin and has_name and has_weight:
-                header_idx = idx
-                break
-            # Good case: has ISIN and name
-            elif has_isin and has_name:
-                header_idx = idx
-                break
-        
-        if header_idx is None:
-            # Fallback: Just look for ISIN + weight (name might be optional)
-            for idx, row in df_raw.head(50).iterrows():
-                row_str = row.astype(str).str.upper().tolist()
-                has_isin = any("ISIN" in x for x in row_str if isinstance(x, str))
-                has_weight = any(
-                    any(ind in x for ind in ["%", "WEIGHT", "AUM"])
-                    for x in row_str if isinstance(x, str)
-                )
-                if has_isin and has_weight:
-                    header_idx = idx
-                    break
-        
-        if header_idx is None:
-            # Last resort: Just look for ISIN
-            for idx, row in df_raw.head(50).iterrows():
-                row_str = row.astype(str).str.upper().tolist()
-                if any("ISIN" in x for x in row_str if isinstance(x, str)):
-                    header_idx = idx
-                    break
-        
-        if header_idx is None:
+        # 2. Header must mention ISIN (name/weight columns are looked for alongside)
+        if parsed.header_row is None:
             return {"error": "Could not detect header row. Ensure file has 'ISIN' column. Optional: 'Name/Instrument' and 'Weight/% to AUM' columns."}
 
-        excel_file.file.seek(0)
-        df = pd.read_excel(excel_file.file, header=header_idx)
-
-        # 3. Normalize Columns (ROBUST DETECTION)
-        col_map = HoldingsService._normalize_columns(df)
-        
-        df = df.rename(columns=col_map)
-        
-        # Better error message showing what we found and what's missing
-        missing = []
-        if "ISIN" not in df.columns:
-            missing.append("ISIN")
-        if "Weight" not in df.columns:
-            missing.append("Weight (% to AUM or similar)")
-        
-        if missing:
-            return {"error": f"Missing required columns: {missing}. Found columns: {[str(c) for c in df.columns.tolist()]}"}
-        
-        # 4. Clean Data
-        count_before_dropna = len(df)
-        df = df.dropna(subset=["ISIN"])
-        count_after_dropna = len(df)
-        
-        df["ISIN"] = df["ISIN"].astype(str).str.strip().str.upper()
-        
-        # Track invalid ISINs before filtering
-        invalid_isin_mask = ~df["ISIN"].str.match(r'^[A-Z0-9]{12}$', na=False)
-        invalid_isins = df[invalid_isin_mask][["ISIN", "Name"]].to_dict('records') if "Name" in df.columns else df[invalid_isin_mask]["ISIN"].tolist()
+        # 3. Columns
+        if parsed.missing_columns:
+            return {"error": f"Missing required columns: {parsed.missing_columns}. Found columns: {parsed.columns}"}
         
-        df = df[df["ISIN"].str.match(r'^[A-Z0-9]{12}$', na=False)]
-        count_after_isin_filter = len(df)
-        
-        # Track duplicates before removing
-        duplicates = df[df.duplicated(subset=["ISIN"], keep="first")][["ISIN", "Name"]].to_dict('records') if "Name" in df.columns else []
-        
-        df = df.drop_duplicates(subset=["ISIN"], keep="first")
-        count_after_dedup = len(df)
-        
-        # DEBUG LOGGING
+        # 4. Data is already cleaned (blank/invalid ISINs dropped, de-duplicated, weights parsed)
         if DEBUG_HOLDINGS:
+            invalid_isins, duplicates = parsed.invalid_isins, parsed.duplicates
             logger.info(f"=== HOLDINGS DEBUG: {fund_name} ===")
-            logger.info(f"  Rows after header parse: {count_before_dropna}")
-            logger.info(f"  After dropna(ISIN): {count_after_dropna} (dropped {count_before_dropna - count_after_dropna})")
-            logger.info(f"  After ISIN format filter: {count_after_isin_filter} (dropped {count_after_dropna - count_after_isin_filter})")
+            logger.info(f"  Header row: {parsed.header_row}, rows after header: {parsed.rows_read}")
+            logger.info(f"  Blank ISIN dropped: {parsed.missing_isin}")
+            logger.info(f"  Invalid ISIN format dropped: {len(invalid_isins)}")
             if invalid_isins:
                 logger.info(f"  Invalid ISINs removed: {invalid_isins[:10]}{'...' if len(invalid_isins) > 10 else ''}")
-            logger.info(f"  After dedup: {count_after_dedup} (dropped {count_after_isin_filter - count_after_dedup} duplicates)")
+            logger.info(f"  Duplicates dropped: {len(duplicates)}, kept: {len(parsed)}")
             if duplicates:
                 logger.info(f"  Duplicates removed: {duplicates[:5]}{'...' if len(duplicates) > 5 else ''}")
-        
-        def clean_weight(val):
-            try:
-                if pd.isna(val): return 0.0
-                s = str(val).strip().replace("%", "")
-                return float(s)
-            except: return 0.0
-            
-        df["Weight"] = df["Weight"].apply(clean_weight)
 
-        # 5. Resolve Tickers (NSE first, then FYERS BSE fallback)
+        # 5. Resolve Tickers (NSE first, then FYERS NSE / BSE fallback)
         nse_isin_map = load_nse_isin_map()
+        weights = parsed.weights.tolist()
+        fallback_symbols = isin_master.fallback_symbols(
+            isin for isin, weight in zip(parsed.isins, weights) if weight > 0 and isin not in nse_isin_map
+        )
         holdings_list = []
         unresolved = []
         zero_weight_skipped = []
 
         resolved_nse = 0
         resolved_bse = 0
-        bse_isin_map = None
 
-        for _, row in df.iterrows():
-            isin = row["ISIN"]
-            name = row.get("Name", "Unknown")
-            weight = float(row["Weight"])
+        for isin, name, weight in zip(parsed.isins, parsed.names, weights):
             if weight <= 0:
                 zero_weight_skipped.append(f"{name} ({isin})")
                 continue
@@ -958,13 +759,11 @@ class HoldingsService:
                 holdings_list.append({"ISIN": isin, "Name": name, "Symbol": ticker, "Weight": weight})
                 resolved_nse += 1
             else:
-                if bse_isin_map is None:
-                    bse_isin_map = load_fyers_bse_isin_map()
-
-                bse_symbol = (bse_isin_map or {}).get(isin)
-                if bse_symbol:
-                    # Store fully-qualified FYERS symbol so downstream quotes work (e.g., BSE:SBICARD-A)
-                    holdings_list.append({"ISIN": isin, "Name": name, "Symbol": bse_symbol, "Weight": weight})
+                fallback_symbol = fallback_symbols.get(isin)
+                if fallback_symbol:
+                    # Plain symbol for NSE equity series, else the fully-qualified
+                    # FYERS symbol so downstream quotes work (e.g., BSE:SBICARD-A)
+                    holdings_list.append({"ISIN": isin, "Name": name, "Symbol": fallback_symbol, "Weight": weight})
                     resolved_bse += 1
                 else:
                     unresolved.append(f"{name} ({isin})")
@@ -973,7 +772,7 @@ class HoldingsService:
         if DEBUG_HOLDINGS:
             logger.info(f"  === TICKER RESOLUTION ===")
             logger.info(f"  Resolved via NSE master: {resolved_nse}")
-            logger.info(f"  Resolved via BSE fallback: {resolved_bse}")
+            logger.info(f"  Resolved via FYERS NSE/BSE fallback: {resolved_bse}")
             logger.info(f"  Total resolved: {len(holdings_list)}")
             logger.info(f"  Zero weight skipped: {len(zero_weight_skipped)}")
             if zero_weight_skipped:
@@ -1106,6 +905,7 @@ class HoldingsService:
             "invested_date": invested_date,
             "nickname": nickname,
             "holdings": validated_holdings,
+            "weight_vector": WeightVector.from_holdings([h.dict() for h in validated_holdings]).to_dict(),
             
             # SIP Fields
             "investment_type": investment_type,
@@ -1118,6 +918,10 @@ class HoldingsService:
             "manual_invested_amount": manual_invested_amount if investment_type == "sip" else 0.0,
             "future_sip_units": future_sip_units,
             "sip_installments": sip_installments,
+            "sip_totals": (
+                SipTotals.from_installments(inst.dict() for inst in sip_installments).to_dict()
+                if investment_type == "sip" else None
+            ),
             
             # Step-Up SIP Config
             "stepup_enabled": stepup_enabled if investment_type == "sip" else False,
@@ -1156,11 +960,14 @@ class HoldingsService:
         # If SIP, sip details differentiate? Just assume one SIP per Fund/Date for now for simplicity
 
         # Dump model to dict for Mongo
-        holdings_collection.update_one(query, {"$set": doc_model.dict()}, upsert=True)
+        holdings_collection.update_one(query, {"$set": doc_model.dict(), "$inc": {"version": 1}}, upsert=True)
         
         # Fetch the ID
         saved_doc = holdings_collection.find_one(query)
         saved_id = str(saved_doc["_id"]) if saved_doc else None
+        if saved_id:
+            pnl_cache.invalidate(saved_id)
+            exposure_index.index_fund(user_id, saved_id, [h.dict() for h in validated_holdings])
 
         # Update User's Uploads List
         if saved_id:
@@ -1195,130 +1002,182 @@ class HoldingsService:
         """
         Updates the status of a specific SIP installment.
         If PAID, calculates units based on NAV and adds to future_sip_units.
+
+        Only that installment is written (arrayFilters) and the fund's running
+        totals move by $inc. The write is guarded by the document version and
+        retried if the fund changed in between.
         """
         try:
-            doc = holdings_collection.find_one({"_id": ObjectId(fund_id), "user_id": user_id})
-            if not doc:
-                return {"error": "Fund not found"}
+            for _ in range(3):
+                result = self._apply_sip_action(fund_id, user_id, date_str, action)
+                if result is not None:
+                    return result
+            return {"error": "Fund was updated concurrently. Please try again."}
             
-            installments = doc.get("sip_installments", [])
-            sip_amount = float(doc.get("sip_amount", 0) or 0)
-            scheme_code = doc.get("scheme_code")
+        except Exception as e:
+            logger.error(f"Error handling SIP action: {e}")
+            return {"error": str(e)}
+
+    @staticmethod
+    def _apply_sip_action(fund_id, user_id, date_str, action):
+        """One attempt of handle_sip_action; None if the version guard missed."""
+        doc = holdings_collection.find_one({"_id": ObjectId(fund_id), "user_id": user_id})
+        if not doc:
+            return {"error": "Fund not found"}
+        
+        installments = doc.get("sip_installments", [])
+        sip_amount = float(doc.get("sip_amount", 0) or 0)
+        scheme_code = doc.get("scheme_code")
+
+        # This month's installment may not be saved yet (the SIP batch job
+        # adds it nightly); reads already show it, so accept actions on it.
+        due = HoldingsService.due_sip_installment(doc)
+        if due and due["date"] == date_str:
+            installments.append(due)
+        
+        inst = next((i for i in installments if i["date"] == date_str), None)
+        if inst is None:
+            return {"error": "Installment for date not found"}
+        if inst.get("status") == action:
+            return {"message": "No change needed", "status": action}
+
+        old = None if inst is due else dict(inst)
+        inst["status"] = action
+        
+        if action == "PAID":
+            # User confirmed payment - invested_amount moves with the totals below
+            # Now check if NAV is available for unit allocation
+            from services.nav_service import nav_service  # Local import to avoid circular dep
             
-            updated = False
-            for inst in installments:
-                if inst["date"] == date_str:
-                    old_status = inst.get("status")
-                    if old_status == action: 
-                         return {"message": "No change needed", "status": action}
-                         
-                    inst["status"] = action
-                    updated = True
+            # Get the next official NAV on or after the SIP date
+            nav_res = nav_service.get_next_nav_after_date(scheme_code, date_str)
+            
+            if nav_res:
+                nav = nav_res[0]
+                nav_date_used = nav_res[1] if len(nav_res) > 1 else None
+                
+                # Check if this NAV is actually from the SIP date or later
+                # (not from before, which would mean NAV API returned old data)
+                try:
+                    sip_date = parse_date_from_str(date_str).date()
+                    used_date = parse_date_from_str(nav_date_used).date() if nav_date_used else None
                     
-                    if action == "PAID":
-                        # User confirmed payment - invested_amount will be updated below
-                        # Now check if NAV is available for unit allocation
-                        from services.nav_service import nav_service  # Local import to avoid circular dep
-                        from utils.date_utils import parse_date_from_str, get_current_ist_time
-                        
-                        # Get the next official NAV on or after the SIP date
-                        nav_res = nav_service.get_next_nav_after_date(scheme_code, date_str)
-                        
-                        if nav_res:
-                            nav = nav_res[0]
-                            nav_date_used = nav_res[1] if len(nav_res) > 1 else None
-                            
-                            # Check if this NAV is actually from the SIP date or later
-                            # (not from before, which would mean NAV API returned old data)
-                            try:
-                                sip_date = parse_date_from_str(date_str).date()
-                                used_date = parse_date_from_str(nav_date_used).date() if nav_date_used else None
-                                
-                                if used_date and used_date >= sip_date:
-                                    # NAV is available for this SIP date or later
-                                    # Calculate units - marked as ESTIMATED (T+1 settlement)
-                                    # Stamp duty is deducted before unit calculation (0.005%)
-                                    stamp_duty = round(sip_amount * 0.00005, 2)
-                                    net_amount = sip_amount - stamp_duty
-                                    units = net_amount / nav
-                                    inst["units"] = units
-                                    inst["nav"] = nav
-                                    inst["nav_date"] = nav_date_used
-                                    inst["allocation_status"] = "ESTIMATED"
-                                    inst["is_estimated"] = True
-                                else:
-                                    # NAV is from before SIP date - units pending
-                                    inst["units"] = None
-                                    inst["nav"] = None
-                                    inst["nav_date"] = None
-                                    inst["allocation_status"] = "PENDING_NAV"
-                                    inst["is_estimated"] = False
-                            except:
-                                # Date parsing failed - treat as pending
-                                inst["units"] = None
-                                inst["nav"] = None
-                                inst["allocation_status"] = "PENDING_NAV"
-                                inst["is_estimated"] = False
-                        else:
-                            # No NAV available at all - units pending
-                            inst["units"] = None
-                            inst["nav"] = None
-                            inst["nav_date"] = None
-                            inst["allocation_status"] = "PENDING_NAV"
-                            inst["is_estimated"] = False
-                            
-                    elif action == "SKIPPED":
+                    if used_date and used_date >= sip_date:
+                        # NAV is available for this SIP date or later
+                        # Calculate units - marked as ESTIMATED (T+1 settlement)
+                        # Stamp duty is deducted before unit calculation (0.005%)
+                        stamp_duty = round(sip_amount * 0.00005, 2)
+                        net_amount = sip_amount - stamp_duty
+                        units = net_amount / nav
+                        inst["units"] = units
+                        inst["nav"] = nav
+                        inst["nav_date"] = nav_date_used
+                        inst["allocation_status"] = "ESTIMATED"
+                        inst["is_estimated"] = True
+                    else:
+                        # NAV is from before SIP date - units pending
                         inst["units"] = None
                         inst["nav"] = None
                         inst["nav_date"] = None
-                        inst["allocation_status"] = "PENDING_NAV"  # Not applicable but safe default
-                    
-                    break
-            
-            if not updated:
-                return {"error": "Installment for date not found"}
-            
-            # Recalculate Totals
-            # INVESTED AMOUNT: All PAID installments add to invested (money is gone)
-            # UNITS: Only installments with allocated units (not None) count
-            # ASSUMED_PAID does not add to invested_amount (already in manual)
-            manual_invested = float(doc.get("manual_invested_amount", 0) or 0)
-            total_tracked_invested = 0.0
-            total_future_units = 0.0
-            has_pending_nav = False  # Track if any installment is waiting for NAV
-            
-            for inst in installments:
-                if inst["status"] == "PAID":
-                    # Invested amount always includes confirmed SIPs
-                    total_tracked_invested += float(inst.get("amount", 0))
+                        inst["allocation_status"] = "PENDING_NAV"
+                        inst["is_estimated"] = False
+                except:
+                    # Date parsing failed - treat as pending
+                    inst["units"] = None
+                    inst["nav"] = None
+                    inst["allocation_status"] = "PENDING_NAV"
+                    inst["is_estimated"] = False
+            else:
+                # No NAV available at all - units pending
+                inst["units"] = None
+                inst["nav"] = None
+                inst["nav_date"] = None
+                inst["allocation_status"] = "PENDING_NAV"
+                inst["is_estimated"] = False
+                
+        elif action == "SKIPPED":
+            inst["units"] = None
+            inst["nav"] = None
+            inst["nav_date"] = None
+            inst["allocation_status"] = "PENDING_NAV"  # Not applicable but safe default
+        
+        # Totals move by this installment's change alone:
+        # INVESTED AMOUNT: All PAID installments add to invested (money is gone)
+        # UNITS: Only installments with allocated units (not None) count
+        # ASSUMED_PAID does not add to invested_amount (already in manual)
+        update, array_filters = installment_update(doc, [(old, inst)], installments)
+        update.setdefault("$set", {})["last_updated"] = True
+        
+        result = holdings_collection.update_one(
+            {"_id": ObjectId(fund_id), "version": doc.get("version")},
+            update,
+            array_filters=array_filters
+        )
+        if result.matched_count == 0:
+            return None
+        pnl_cache.invalidate(fund_id)
+        
+        return {"message": "SIP Action Recorded", "status": action}
+
+    @staticmethod
+    def pending_nav_dates(doc):
+        """Dates of PAID installments still waiting for NAV allocation."""
+        return [
+            inst["date"] for inst in doc.get("sip_installments", [])
+            if inst.get("status") == "PAID" and inst.get("allocation_status") == "PENDING_NAV" and inst.get("date")
+        ]
+
+    @staticmethod
+    def allocate_pending_navs(doc, nav_results):
+        """
+        Allocates units to the doc's PENDING_NAV installments (in place) from
+        nav_results ({date_str: (nav, nav_date_str)}, see
+        NavService.get_next_navs_after_dates). Only a NAV dated on or after the
+        SIP date is used.
+
+        Returns (update, array_filters) setting just the resolved installments
+        and moving the totals by $inc (see utils.sip_totals.installment_update),
+        or None if nothing was resolved.
+        """
+        installments = doc.get("sip_installments", [])
+        sip_amount = float(doc.get("current_sip_amount") or doc.get("sip_amount", 0) or 0)
+
+        changes = []
+        for inst in installments:
+            if not (inst.get("status") == "PAID" and inst.get("allocation_status") == "PENDING_NAV"):
+                continue
+            old = dict(inst)
+            date_str = inst.get("date")
+            nav_res = nav_results.get(date_str)
+            if nav_res:
+                nav = nav_res[0]
+                nav_date_used = nav_res[1] if len(nav_res) > 1 else None
+                
+                try:
+                    sip_date = parse_date_from_str(date_str).date()
+                    used_date = parse_date_from_str(nav_date_used).date() if nav_date_used else None
                     
-                    # Units only count if they're allocated (not None)
-                    units_val = inst.get("units")
-                    if units_val is not None:
-                        total_future_units += float(units_val)
-                    else:
-                        has_pending_nav = True
-            
-            # Total invested = manual (CAS) + app-tracked (confirmed)
-            total_invested = round(manual_invested + total_tracked_invested, 2)
-            
-            holdings_collection.update_one(
-                {"_id": ObjectId(fund_id)},
-                {
-                    "$set": {
-                        "sip_installments": installments,
-                        "invested_amount": total_invested,
-                        "future_sip_units": total_future_units,
-                        "last_updated": True
-                    }
-                }
-            )
-            
-            return {"message": "SIP Action Recorded", "status": action}
-            
-        except Exception as e:
-            logger.error(f"Error handling SIP action: {e}")
-            return {"error": str(e)}
+                    if used_date and used_date >= sip_date:
+                        # NAV is now available! Allocate units
+                        inst_amount = float(inst.get("amount", sip_amount))
+                        stamp_duty = round(inst_amount * 0.00005, 2)
+                        net_amount = inst_amount - stamp_duty
+                        units = net_amount / nav
+                        
+                        inst["units"] = units
+                        inst["nav"] = nav
+                        inst["nav_date"] = nav_date_used
+                        inst["allocation_status"] = "ESTIMATED"
+                        inst["is_estimated"] = True
+                        changes.append((old, inst))
+                        logger.info(f"Resolved PENDING_NAV for {date_str}: NAV={nav}, units={units:.4f}")
+                except Exception as e:
+                    logger.debug(f"Date parse error during NAV resolution for {date_str}: {e}")
+                    continue
+
+        if not changes:
+            return None
+        return installment_update(doc, changes, installments)
 
     @staticmethod
     def resolve_pending_nav_installments(fund_id_str, user_id):
@@ -1327,91 +1186,36 @@ class HoldingsService:
         
         This handles the case where a user confirmed a SIP payment but the official
         NAV wasn't published yet (e.g., confirmed on SIP day before NAV was released).
-        Called during calculate_pnl to auto-resolve pending allocations.
+        The nightly SIP batch job (services.sip_batch) does this for every fund.
         
         Returns: True if any installments were resolved, False otherwise.
         """
         try:
             doc = holdings_collection.find_one({"_id": ObjectId(fund_id_str), "user_id": user_id})
-            if not doc:
+            if not doc or doc.get("investment_type", "lumpsum") != "sip" or not doc.get("scheme_code"):
                 return False
             
-            if doc.get("investment_type", "lumpsum") != "sip":
+            pending_dates = HoldingsService.pending_nav_dates(doc)
+            if not pending_dates:
                 return False
-            
-            installments = doc.get("sip_installments", [])
-            scheme_code = doc.get("scheme_code")
-            sip_amount = float(doc.get("current_sip_amount") or doc.get("sip_amount", 0) or 0)
-            
-            if not scheme_code or not installments:
+
+            # Import locally to avoid circular deps
+            from services.nav_service import nav_service
+
+            # One history fetch + bisect per date for every pending installment
+            nav_results = nav_service.get_next_navs_after_dates(doc["scheme_code"], pending_dates)
+            allocated = HoldingsService.allocate_pending_navs(doc, nav_results)
+            if not allocated:
                 return False
-            
-            # Find PAID installments with PENDING_NAV
-            resolved_any = False
-            for inst in installments:
-                if inst.get("status") == "PAID" and inst.get("allocation_status") == "PENDING_NAV":
-                    date_str = inst.get("date")
-                    if not date_str:
-                        continue
-                    
-                    # Import locally to avoid circular deps
-                    from services.nav_service import nav_service
-                    
-                    # Try to get NAV for this date
-                    nav_res = nav_service.get_next_nav_after_date(scheme_code, date_str)
-                    if nav_res:
-                        nav = nav_res[0]
-                        nav_date_used = nav_res[1] if len(nav_res) > 1 else None
-                        
-                        try:
-                            sip_date = parse_date_from_str(date_str).date()
-                            used_date = parse_date_from_str(nav_date_used).date() if nav_date_used else None
-                            
-                            if used_date and used_date >= sip_date:
-                                # NAV is now available! Allocate units
-                                inst_amount = float(inst.get("amount", sip_amount))
-                                stamp_duty = round(inst_amount * 0.00005, 2)
-                                net_amount = inst_amount - stamp_duty
-                                units = net_amount / nav
-                                
-                                inst["units"] = units
-                                inst["nav"] = nav
-                                inst["nav_date"] = nav_date_used
-                                inst["allocation_status"] = "ESTIMATED"
-                                inst["is_estimated"] = True
-                                resolved_any = True
-                                logger.info(f"Resolved PENDING_NAV for {date_str}: NAV={nav}, units={units:.4f}")
-                        except Exception as e:
-                            logger.debug(f"Date parse error during NAV resolution for {date_str}: {e}")
-                            continue
-            
-            if resolved_any:
-                # Recalculate totals
-                manual_invested = float(doc.get("manual_invested_amount", 0) or 0)
-                total_tracked_invested = 0.0
-                total_future_units = 0.0
-                
-                for inst in installments:
-                    if inst["status"] == "PAID":
-                        total_tracked_invested += float(inst.get("amount", 0))
-                        units_val = inst.get("units")
-                        if units_val is not None:
-                            total_future_units += float(units_val)
-                
-                total_invested = round(manual_invested + total_tracked_invested, 2)
-                
-                holdings_collection.update_one(
-                    {"_id": ObjectId(fund_id_str)},
-                    {
-                        "$set": {
-                            "sip_installments": installments,
-                            "invested_amount": total_invested,
-                            "future_sip_units": total_future_units
-                        }
-                    }
-                )
-            
-            return resolved_any
+
+            update, array_filters = allocated
+            result = holdings_collection.update_one(
+                {"_id": ObjectId(fund_id_str), "version": doc.get("version")},
+                update,
+                array_filters=array_filters
+            )
+            pnl_cache.invalidate(fund_id_str)
+            return result.modified_count > 0
             
         except Exception as e:
             logger.error(f"Error resolving pending NAV installments: {e}")
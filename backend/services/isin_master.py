@@ -0,0 +1,312 @@
+"""
+ISIN Master - Persisted ISIN -> exchange symbol index for holdings uploads.
+
+Three public symbol lists are parsed into compact ISIN -> symbol maps and
+stored in the `isin_master` collection (one document per source, with the
+ETag / Last-Modified of the file it came from):
+
+- NSE:       NSE's EQUITY_L.csv  -> plain NSE symbol (e.g. RELIANCE)
+- FYERS_NSE: FYERS NSE_CM.csv    -> plain symbol for -EQ series, else the
+                                    FYERS symbol (e.g. NSE:XYZ-BE)
+- BSE:       FYERS BSE_CM.csv    -> FYERS BSE symbol (e.g. BSE:SBICARD-A)
+
+Workers load the maps from Mongo (milliseconds) instead of downloading and
+parsing the files on their first upload. A background thread re-checks the
+files with conditional requests, so an unchanged file costs a 304; one
+worker does this at a time via a Mongo lease. Only a source that was never
+stored is downloaded on demand; if that fails, the source is not tried
+again for _RETRY_SECONDS, so uploads are not held up by repeated downloads.
+"""
+import csv
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, Optional
+
+import requests
+
+from core.config import settings
+from db import isin_master_collection, scheduler_locks_collection
+from utils.common import NSE_HEADERS, NSE_CSV_URL, FYERS_NSE_CM_URL, FYERS_BSE_CM_URL
+from utils.mongo_lease import acquire_lease, release_lease
+from core.logging import get_logger
+
+logger = get_logger("IsinMaster")
+
+NSE = "NSE"
+FYERS_NSE = "FYERS_NSE"
+BSE = "BSE"
+
+SOURCE_URLS = {
+    NSE: NSE_CSV_URL,
+    FYERS_NSE: FYERS_NSE_CM_URL,
+    BSE: FYERS_BSE_CM_URL,
+}
+
+LEASE_NAME = "isin_master_refresh"
+
+# Workers re-read the stored maps this often to pick up another worker's refresh
+_RELOAD_SECONDS = 60 * 60
+_CHECK_INTERVAL_SECONDS = 60 * 60
+_LEASE_SECONDS = 10 * 60
+# Backoff after an on-demand load found nothing stored and the download failed
+_RETRY_SECONDS = 10 * 60
+
+_ISIN_RE = re.compile(r"\b[A-Z0-9]{12}\b")
+
+_nse_session = requests.Session()
+_nse_session.headers.update(NSE_HEADERS)
+
+
+def _extract_fyers_symbol(line: str, exchange_prefix: str) -> Optional[str]:
+    idx = line.find(f"{exchange_prefix}:")
+    if idx < 0:
+        return None
+    end = line.find(",", idx)
+    if end < 0:
+        end = len(line)
+    sym = line[idx:end].strip()
+    return sym or None
+
+
+# ==================== PARSERS ====================
+# Each takes an iterator of decoded lines and yields (isin, symbol).
+
+def _parse_nse_equity_list(lines: Iterator[str]):
+    reader = csv.reader(lines)
+    headers = [h.strip().lstrip("\ufeff") for h in next(reader, [])]
+    isin_idx = next((i for i, h in enumerate(headers) if "isin" in h.lower().replace(" ", "")), None)
+    symbol_idx = next((i for i, h in enumerate(headers) if h.lower() in ["symbol", "tradingsymbol", "sc_symbol"]), None)
+    if symbol_idx is None:  # Fallback
+        symbol_idx = next((i for i, h in enumerate(headers) if "symbol" in h.lower()), None)
+    if isin_idx is None or symbol_idx is None:
+        return
+    width = max(isin_idx, symbol_idx)
+    for row in reader:
+        if len(row) > width:
+            isin, symbol = row[isin_idx].strip(), row[symbol_idx].strip()
+            if isin and symbol:
+                yield isin, symbol
+
+
+def _parse_fyers_symbols(lines: Iterator[str], exchange_prefix: str):
+    marker = f"{exchange_prefix}:"
+    for line in lines:
+        if not line or marker not in line:
+            continue
+        m = _ISIN_RE.search(line)
+        sym = _extract_fyers_symbol(line, exchange_prefix) if m else None
+        if sym:
+            yield m.group(0).upper(), sym
+
+
+def _parse_fyers_nse(lines: Iterator[str]):
+    for isin, sym in _parse_fyers_symbols(lines, "NSE"):
+        # Equity series maps onto the plain symbols holdings already use
+        if sym.endswith("-EQ"):
+            sym = sym[len("NSE:"):-len("-EQ")]
+        yield isin, sym
+
+
+_PARSERS = {
+    NSE: _parse_nse_equity_list,
+    FYERS_NSE: _parse_fyers_nse,
+    BSE: lambda lines: _parse_fyers_symbols(lines, "BSE"),
+}
+
+
+class IsinMaster:
+    """Process-wide view of the stored maps, plus the refresher thread."""
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._maps: Dict[str, Dict[str, str]] = {}
+        self._loaded_at: Dict[str, float] = {}
+        self._retry_at: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ==================== LOOKUPS ====================
+
+    def _cached(self, source: str) -> Optional[Dict[str, str]]:
+        """The in-memory map if fresh, or while a failed load backs off; else None."""
+        now = time.time()
+        mapping = self._maps.get(source)
+        if mapping is not None and now - self._loaded_at.get(source, 0) < _RELOAD_SECONDS:
+            return mapping
+        if now < self._retry_at.get(source, 0):
+            return mapping or {}
+        return None
+
+    def get_map(self, source: str, force: bool = False) -> Dict[str, str]:
+        """
+        ISIN -> symbol map for a source. Served from memory, re-read from
+        Mongo hourly; downloaded only if never stored (or force=True). A
+        failed download serves the last map (or {}) until _RETRY_SECONDS.
+        """
+        if not force:
+            mapping = self._cached(source)
+            if mapping is not None:
+                return mapping
+        with self._lock:
+            if not force:
+                # Loaded (or given up on) by another thread while we waited
+                mapping = self._cached(source)
+                if mapping is not None:
+                    return mapping
+            if force or not self._load_stored(source):
+                self.refresh(source, force=force)
+                if self._cached(source) is None:
+                    self._retry_at[source] = time.time() + _RETRY_SECONDS
+            return self._maps.get(source) or {}
+
+    def fallback_symbols(self, isins: Iterable[str]) -> Dict[str, str]:
+        """
+        Symbols for ISINs missing from NSE's equity list: FYERS NSE, then BSE.
+        Each map is resolved once for the whole batch; unresolved ISINs are
+        omitted.
+        """
+        missing = list(dict.fromkeys(isins))
+        resolved: Dict[str, str] = {}
+        for source in (FYERS_NSE, BSE):
+            if not missing:
+                break
+            mapping = self.get_map(source)
+            resolved.update((isin, mapping[isin]) for isin in missing if isin in mapping)
+            missing = [isin for isin in missing if isin not in resolved]
+        return resolved
+
+    def fallback_symbol(self, isin: str) -> Optional[str]:
+        """Symbol for an ISIN missing from NSE's equity list: FYERS NSE, then BSE."""
+        return self.fallback_symbols([isin]).get(isin)
+
+    def _load_stored(self, source: str) -> bool:
+        try:
+            doc = isin_master_collection.find_one({"_id": source}, {"pairs": 1})
+        except Exception as e:
+            logger.warning(f"Could not read stored ISIN map {source}: {e}")
+            doc = None
+        if not doc or not doc.get("pairs"):
+            return False
+        self._set(source, dict(doc["pairs"]))
+        return True
+
+    def _set(self, source: str, mapping: Dict[str, str]):
+        self._maps[source] = mapping
+        self._loaded_at[source] = time.time()
+
+    # ==================== REFRESH ====================
+
+    def refresh(self, source: str, force: bool = False) -> Optional[int]:
+        """
+        Conditionally re-downloads one source and stores it. Returns the number
+        of ISINs stored, 0 if unchanged (304), None on failure. On failure the
+        current (possibly stale) map keeps being served.
+        """
+        url = SOURCE_URLS[source]
+        try:
+            stored = isin_master_collection.find_one({"_id": source}, {"etag": 1, "last_modified": 1}) or {}
+        except Exception:
+            stored = {}
+
+        headers = {}
+        if not force and stored.get("etag"):
+            headers["If-None-Match"] = stored["etag"]
+        if not force and stored.get("last_modified"):
+            headers["If-Modified-Since"] = stored["last_modified"]
+
+        client = _nse_session if source == NSE else requests
+        try:
+            with client.get(url, headers=headers, stream=True, timeout=30) as r:
+                if r.status_code == 304:
+                    isin_master_collection.update_one(
+                        {"_id": source}, {"$set": {"checked_at": datetime.utcnow()}}
+                    )
+                    return 0
+                r.raise_for_status()
+                r.encoding = r.encoding or "utf-8"
+                mapping = dict(_PARSERS[source](r.iter_lines(decode_unicode=True)))
+                etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+        except Exception as e:
+            logger.warning(f"Failed to refresh ISIN map {source}: {e}")
+            return None
+
+        if not mapping:
+            logger.warning(f"ISIN map {source} parsed empty; keeping the stored one")
+            return None
+
+        self._set(source, mapping)
+        now = datetime.utcnow()
+        try:
+            # Pairs rather than an ISIN-keyed subdocument keeps it one compact array
+            isin_master_collection.replace_one(
+                {"_id": source},
+                {
+                    "_id": source,
+                    "pairs": [[isin, sym] for isin, sym in mapping.items()],
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "refreshed_at": now,
+                    "checked_at": now,
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            logger.warning(f"Could not store ISIN map {source}: {e}")
+        logger.info(f"ISIN map {source} refreshed: {len(mapping)} ISINs")
+        return len(mapping)
+
+    def _sources_due(self):
+        cutoff = datetime.utcnow() - timedelta(hours=settings.ISIN_MASTER_REFRESH_HOURS)
+        try:
+            checked = {
+                d["_id"]: d.get("checked_at")
+                for d in isin_master_collection.find({}, {"checked_at": 1})
+            }
+        except Exception as e:
+            logger.warning(f"Could not read ISIN master state: {e}")
+            return []
+        return [s for s in SOURCE_URLS if not checked.get(s) or checked[s] < cutoff]
+
+    def tick(self) -> Dict[str, Optional[int]]:
+        """Refreshes the sources not checked within ISIN_MASTER_REFRESH_HOURS."""
+        due = self._sources_due()
+        if not due or not acquire_lease(scheduler_locks_collection, LEASE_NAME, self.owner, _LEASE_SECONDS):
+            return {}
+        try:
+            return {source: self.refresh(source) for source in due}
+        finally:
+            release_lease(scheduler_locks_collection, LEASE_NAME, self.owner)
+
+    def _run(self):
+        logger.info(f"ISIN master refresher started ({self.owner})")
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("ISIN master refresh failed")
+            self._stop.wait(_CHECK_INTERVAL_SECONDS)
+        logger.info("ISIN master refresher stopped")
+
+    def start(self):
+        if not settings.ISIN_MASTER_REFRESH_ENABLED:
+            logger.info("ISIN master refresher disabled")
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="isin-master", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+isin_master = IsinMaster()
@@ -0,0 +1,271 @@
+"""
+NAV History Store - Persists mfapi.in NAV history in MongoDB.
+
+One document per scheme in the `nav_history` collection (unique on scheme_code):
+
+    {
+        "scheme_code": "119551",
+        "meta": {...},                                        # mfapi.in scheme metadata
+        "data": [{"date": "DD-MM-YYYY", "nav": "123.45"}, ...],  # newest first
+        "latest_date": datetime,                              # date of data[0]
+        "synced_at": datetime,                                # last successful upstream check
+    }
+
+A cold worker serves NAVs from this collection instead of re-downloading the
+full multi-thousand-row history; a sync only asks mfapi.in for rows newer
+than `latest_date` and prepends them to the stored array.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import requests
+
+from core import http
+from db import nav_history_collection
+from utils.common import MFAPI_BASE_URL
+from core.logging import get_logger
+
+logger = get_logger("NavHistoryStore")
+
+# Official NAVs publish once a day (around midnight IST), so re-checking
+# upstream more often than this gains nothing. Matches the NavService L1 TTL.
+SYNC_INTERVAL_SECONDS = 900
+
+_MFAPI_DATE_FORMAT = "%d-%m-%Y"
+
+# _read_response marker: transient failure, try again
+_RETRY = object()
+
+
+def _parse_row_date(row) -> Optional[datetime]:
+    try:
+        return datetime.strptime(row["date"], _MFAPI_DATE_FORMAT)
+    except Exception:
+        return None
+
+
+class NavHistoryStore:
+    """Read-through, incrementally synced NAV history backed by MongoDB."""
+
+    @staticmethod
+    def _load(scheme_code: str) -> Optional[dict]:
+        try:
+            return nav_history_collection.find_one({"scheme_code": scheme_code})
+        except Exception as e:
+            # Mongo being unavailable must not break NAV lookups; fall back
+            # to fetching straight from upstream.
+            logger.warning(f"nav_history read failed for {scheme_code}: {e}")
+            return None
+
+    @staticmethod
+    def _upstream_request(since: Optional[datetime]):
+        """Query params for a history fetch: only rows after `since` when given."""
+        params = {}
+        if since is not None:
+            params["startDate"] = (since + timedelta(days=1)).strftime("%Y-%m-%d")
+        return params or None
+
+    @staticmethod
+    def _read_response(scheme_code: str, response, attempt: int, retries: int):
+        """
+        Interprets one mfapi.in response (requests or httpx). Returns
+        (rows, meta), ([], None) when the API reports no data, or _RETRY.
+        """
+        if response.status_code == 200:
+            data = response.json()
+            if data.get("status") == "SUCCESS":
+                return (data.get("data") or [], data.get("meta"))
+            # Valid HTTP response but API reports no data — retrying won't help
+            logger.warning(f"NAV history for {scheme_code}: API status={data.get('status')}")
+            return ([], None)
+        logger.warning(
+            f"NAV history for {scheme_code} returned HTTP {response.status_code} "
+            f"(attempt {attempt + 1}/{retries + 1})"
+        )
+        return _RETRY
+
+    @staticmethod
+    def _fetch_upstream(scheme_code: str, since: Optional[datetime], retries: int):
+        """
+        Fetches NAV rows from mfapi.in. When `since` is given only rows after
+        it are requested (startDate filter); the caller still filters, so an
+        upstream that ignores the parameter just costs a bigger response.
+
+        mfapi.in is slow/overloaded around midnight IST (AMFI publishes the
+        day's NAVs then), so each request uses a 10s timeout and is retried
+        on a transient failure.
+
+        Returns (rows, meta) on success, ([], None) when the API reports no
+        data, or None when every attempt failed.
+        """
+        url = f"{MFAPI_BASE_URL}/{scheme_code}"
+        params = NavHistoryStore._upstream_request(since)
+
+        for attempt in range(retries + 1):
+            try:
+                response = requests.get(url, params=params, timeout=10)
+                result = NavHistoryStore._read_response(scheme_code, response, attempt, retries)
+                if result is not _RETRY:
+                    return result
+            except Exception as e:
+                logger.warning(
+                    f"Error fetching NAV history for {scheme_code} "
+                    f"(attempt {attempt + 1}/{retries + 1}): {e}"
+                )
+        logger.error(f"Could not fetch NAV history for {scheme_code} after {retries + 1} attempts")
+        return None
+
+    @staticmethod
+    async def _afetch_upstream(scheme_code: str, since: Optional[datetime], retries: int):
+        """Async _fetch_upstream over the shared pooled client."""
+        url = f"{MFAPI_BASE_URL}/{scheme_code}"
+        params = NavHistoryStore._upstream_request(since)
+
+        for attempt in range(retries + 1):
+            try:
+                response = await http.get(url, params=params, timeout=10)
+                result = NavHistoryStore._read_response(scheme_code, response, attempt, retries)
+                if result is not _RETRY:
+                    return result
+            except Exception as e:
+                logger.warning(
+                    f"Error fetching NAV history for {scheme_code} "
+                    f"(attempt {attempt + 1}/{retries + 1}): {e}"
+                )
+        logger.error(f"Could not fetch NAV history for {scheme_code} after {retries + 1} attempts")
+        return None
+
+    @staticmethod
+    def _merge(scheme_code: str, stored: Optional[dict], rows: List[dict], meta) -> Tuple[List[dict], object]:
+        """
+        Persists upstream rows and returns the merged (nav_data, meta).
+
+        Only rows strictly newer than the stored `latest_date` are written, via
+        a `$push` at position 0 so the array is never rewritten. The update is
+        conditional on `latest_date` being unchanged: if another worker synced
+        first, its result is re-read instead of pushing the same rows twice.
+        """
+        now = datetime.utcnow()
+        latest_date = stored.get("latest_date") if stored else None
+
+        dated = []
+        for row in rows:
+            row_date = _parse_row_date(row)
+            if row_date is not None and (latest_date is None or row_date > latest_date):
+                dated.append((row_date, row))
+        dated.sort(key=lambda x: x[0], reverse=True)
+        new_rows = [{"date": r["date"], "nav": r["nav"]} for _, r in dated]
+
+        if stored is None:
+            if not new_rows:
+                return ([], meta)
+            try:
+                nav_history_collection.update_one(
+                    {"scheme_code": scheme_code},
+                    {"$setOnInsert": {
+                        "scheme_code": scheme_code,
+                        "meta": meta,
+                        "data": new_rows,
+                        "latest_date": dated[0][0],
+                        "synced_at": now,
+                    }},
+                    upsert=True,
+                )
+            except Exception as e:
+                # Includes losing an insert race to another worker (unique index).
+                logger.debug(f"nav_history insert skipped for {scheme_code}: {e}")
+            return (new_rows, meta)
+
+        meta = meta or stored.get("meta")
+        try:
+            if new_rows:
+                res = nav_history_collection.update_one(
+                    {"scheme_code": scheme_code, "latest_date": latest_date},
+                    {
+                        "$push": {"data": {"$each": new_rows, "$position": 0}},
+                        "$set": {"latest_date": dated[0][0], "synced_at": now, "meta": meta},
+                    },
+                )
+                if res.matched_count == 0:
+                    # Another worker synced in between; its copy is authoritative.
+                    fresh = NavHistoryStore._load(scheme_code)
+                    if fresh:
+                        return (fresh.get("data") or [], fresh.get("meta"))
+            else:
+                nav_history_collection.update_one(
+                    {"scheme_code": scheme_code},
+                    {"$set": {"synced_at": now}},
+                )
+        except Exception as e:
+            logger.warning(f"nav_history write failed for {scheme_code}: {e}")
+
+        return (new_rows + (stored.get("data") or []), meta)
+
+    @staticmethod
+    def _stored_if_fresh(stored: Optional[dict]):
+        if stored and stored.get("data"):
+            synced_at = stored.get("synced_at")
+            if synced_at and (datetime.utcnow() - synced_at).total_seconds() < SYNC_INTERVAL_SECONDS:
+                return (stored["data"], stored.get("meta"), True)
+        return None
+
+    @staticmethod
+    def _sync_since(stored: Optional[dict]) -> Optional[datetime]:
+        return stored.get("latest_date") if stored and stored.get("data") else None
+
+    @staticmethod
+    def _apply_fetch(key: str, stored: Optional[dict], fetched):
+        """Turns an upstream result into (nav_data, meta, is_fresh), persisting new rows."""
+        if fetched is None:
+            if stored and stored.get("data"):
+                logger.warning(f"Serving stored NAV history for {key}; upstream sync failed")
+                return (stored["data"], stored.get("meta"), False)
+            return ([], None, False)
+
+        rows, meta = fetched
+        if NavHistoryStore._sync_since(stored) is None:
+            stored = None
+        nav_data, meta = NavHistoryStore._merge(key, stored, rows, meta)
+        return (nav_data, meta, bool(nav_data))
+
+    @staticmethod
+    def get_history(scheme_code, retries: int = 2):
+        """
+        Returns (nav_data, meta, is_fresh) for a scheme. nav_data is the full
+        NAV history list, newest first.
+
+        - Stored and synced within SYNC_INTERVAL_SECONDS: served from Mongo,
+          no network.
+        - Otherwise an incremental sync fetches only rows newer than the
+          stored latest date.
+        - If upstream is down, the stored copy is served with is_fresh=False
+          so callers don't cache it and the next call retries. With nothing
+          stored either, returns ([], None, False).
+        """
+        key = str(scheme_code)
+        stored = NavHistoryStore._load(key)
+        fresh = NavHistoryStore._stored_if_fresh(stored)
+        if fresh:
+            return fresh
+
+        fetched = NavHistoryStore._fetch_upstream(key, NavHistoryStore._sync_since(stored), retries)
+        return NavHistoryStore._apply_fetch(key, stored, fetched)
+
+    @staticmethod
+    async def aget_history(scheme_code, retries: int = 2):
+        """
+        Async get_history: the upstream call awaits on the pooled HTTP client
+        instead of holding a thread; Mongo reads/writes run in a worker thread.
+        """
+        key = str(scheme_code)
+        stored = await asyncio.to_thread(NavHistoryStore._load, key)
+        fresh = NavHistoryStore._stored_if_fresh(stored)
+        if fresh:
+            return fresh
+
+        fetched = await NavHistoryStore._afetch_upstream(key, NavHistoryStore._sync_since(stored), retries)
+        return await asyncio.to_thread(NavHistoryStore._apply_fetch, key, stored, fetched)
+
+
+nav_history_store = NavHistoryStore()
@@ -1,44 +1,67 @@
 from datetime import datetime, date, timedelta
+import asyncio
 import threading
 import time
-import requests
-from cachetools import TTLCache
-from services.holdings_service import holdings_service, session
+import numpy as np
+from cachetools import LRUCache, TTLCache
+from services.holdings_service import holdings_service, PNL_PROJECTION, PNL_CACHE_PROJECTION
 from services.fyers_service import fyers_service
+from services.nav_history_store import nav_history_store
+from services.quote_cache import quote_cache
+from services.quote_stream import quote_stream
+from services.pnl_cache import pnl_cache
+from services.exposure_index import exposure_index
+from services.close_store import close_store
+from services.nse_client import nse_client
 from utils.date_utils import (
     is_market_open,
     get_current_ist_time,
     is_trading_day,
-    get_previous_business_day,
+    get_previous_business_days,
     format_date_for_api,
     parse_date_from_str,
     MARKET_OPEN_TIME,
 )
-from utils.common import NSE_API_URL, NSE_BASE_URL
-from utils.xirr import calculate_sip_xirr
+from utils.xirr import calculate_xirr, calculate_xirr_batch, invested_cash_flows
+from utils.nav_series import NavSeries, EMPTY_SERIES
+from utils.singleflight import SingleFlight, AsyncSingleFlight
+from utils.weight_vector import WeightVector, weighted_change, weighted_changes, look_through_exposure, MIN_COVERAGE
+from utils.sip_totals import SipTotals
 from core.logging import get_logger
 
 logger = get_logger("NavService")
 
-# Full NAV history per scheme from mfapi.in (the /mf/{code} endpoint returns
-# the entire history, often thousands of rows). Official NAVs publish once a
-# day, so a 15-minute TTL is conservative. Failures are never cached.
+# In-process L1 over the Mongo-backed NAV history store. Official NAVs publish
+# once a day, so a 15-minute TTL is conservative. Failures are never cached.
 _NAV_HISTORY_CACHE = TTLCache(maxsize=256, ttl=900)
 _NAV_HISTORY_LOCK = threading.Lock()
 
+# Coalesce concurrent cache misses (AMFI publish around midnight IST, market
+# open) so each scheme / quote symbol has at most one upstream fetch in flight.
+_NAV_HISTORY_FLIGHT = SingleFlight()
+_NAV_HISTORY_AFLIGHT = AsyncSingleFlight()
+_QUOTE_FLIGHT = SingleFlight()
+_QUOTE_AFLIGHT = AsyncSingleFlight()
+
+# Last XIRR (as a fraction) per fund, to warm-start the next solve: between
+# refreshes only the current value moves, so Newton needs a step or two.
+_XIRR_GUESSES = LRUCache(maxsize=4096)
+_XIRR_GUESSES_LOCK = threading.Lock()
+
 
 class NavService:
     # ==================== FYERS-BASED METHODS (PRIMARY) ====================
     
     @staticmethod
-    def get_live_price_change_fyers(symbol):
+    def get_live_price_change_fyers(symbol, max_retries=3):
         """
         Fetches live P-Change using Fyers API.
         Returns float (e.g., 1.25 for +1.25%) or None.
+        max_retries bounds the attempts of the NSE fallback.
         """
         if not fyers_service.is_authenticated():
             logger.debug(f"Fyers not authenticated, falling back to NSE for {symbol}")
-            return NavService.get_live_price_change_nse(symbol)
+            return NavService.get_live_price_change_nse(symbol, max_retries)
         
         try:
             pct = fyers_service.get_quote_pct_change(symbol)
@@ -48,125 +71,91 @@ class NavService:
             logger.debug(f"Fyers quote failed for {symbol}: {e}")
         
         # Fallback to NSE
-        return NavService.get_live_price_change_nse(symbol)
+        return NavService.get_live_price_change_nse(symbol, max_retries)
 
     @staticmethod
     def get_live_price_change(symbol, max_retries=3):
         """
         Primary method: Uses Fyers if authenticated, falls back to NSE scraping.
         """
-        return NavService.get_live_price_change_fyers(symbol)
+        return NavService.get_live_price_change_fyers(symbol, max_retries)
 
     # ==================== NSE FALLBACK METHODS ====================
 
     @staticmethod
     def ensure_nse_cookies():
-        """Ensures that the session has valid cookies from NSE home page."""
-        if not session.cookies.get("nsit"):  # Check for a specific NSE cookie if possible, or just length
-             # If no cookies, or we want to be safe, visit home
-             try:
-                 # Check if we already have some cookies
-                 if len(session.cookies) > 0:
-                     return
-
-                 logger.info("Initializing NSE cookies (visiting home page)...")
-                 # User-Agent is already in headers
-                 session.get(NSE_BASE_URL, timeout=10)
-             except Exception as e:
-                 logger.error(f"Failed to initialize NSE cookies: {e}")
+        """Ensures that the NSE client has cookies from the NSE home page."""
+        nse_client.ensure_cookies()
 
     @staticmethod
     def get_live_price_change_nse(symbol, max_retries=3):
         """Fetches live P-Change from NSE for a symbol (FALLBACK method).
-        Includes retry logic with exponential backoff for robustness.
+        Pacing and cookie refresh are handled by the shared NSE client;
+        max_retries bounds its attempts for this symbol.
         """
-        for attempt in range(max_retries):
-            try:
-                r = session.get(NSE_API_URL, params={"symbol": symbol}, timeout=10)
-                content_type = r.headers.get("Content-Type", "")
-                
-                # Handle rate limiting (429) or server errors (5xx)
-                if r.status_code == 429 or r.status_code >= 500:
-                    wait_time = (attempt + 1) * 2  # 2s, 4s, 6s
-                    logger.debug(f"NSE rate limit/error for {symbol}, retry {attempt+1} after {wait_time}s")
-                    time.sleep(wait_time)
-                    continue
-                    
-                if "application/json" not in content_type:
-                    # Sometimes NSE returns HTML on overload, retry
-                    if attempt < max_retries - 1:
-                        time.sleep(1)
-                        continue
-                    logger.debug(f"NSE returned non-json for {symbol}: {content_type}")
-                    return None
-                    
-                data = r.json()
-                # defensive access
-                price_info = data.get("priceInfo") or {}
-                p_change = price_info.get("pChange")
-                return float(p_change) if p_change is not None else None
-                
-            except requests.exceptions.Timeout:
-                if attempt < max_retries - 1:
-                    logger.debug(f"Timeout for {symbol}, retry {attempt+1}")
-                    time.sleep(1)
-                    continue
-                logger.debug(f"get_live_price_change_nse({symbol}) timed out after {max_retries} attempts")
-                return None
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    time.sleep(0.5)
-                    continue
-                logger.debug(f"get_live_price_change_nse({symbol}) failed: {e}")
-                return None
-        return None
+        return nse_client.pct_change(symbol, max_attempts=max_retries)
 
     @staticmethod
-    def _get_scheme_history(scheme_code, retries=2):
+    def _get_scheme_series(scheme_code, retries=2):
         """
-        Returns (nav_data, meta) for a scheme from mfapi.in, where nav_data is
-        the full NAV history list (newest first). Cached for 15 minutes so the
-        multiple lookups within a single P&L calculation (latest NAV, purchase
-        NAV, per-installment NAVs) hit the network only once per scheme.
-
-        mfapi.in is slow/overloaded around midnight IST (AMFI publishes the
-        day's NAVs then), so each request uses a 10s timeout and is retried up
-        to twice on a transient failure. Returns ([], None) when every attempt
-        fails;
-        failures are not cached, so the next call retries and the P&L decision
-        tree falls back to estimating the NAV from holdings in the meantime.
+        Returns (series, meta) for a scheme, where series is a NavSeries over
+        the full NAV history, parsed once per fetch. Cached for 15 minutes so
+        the multiple lookups within a single P&L calculation (latest NAV,
+        purchase NAV, per-installment NAVs) resolve in-process.
+
+        On a cache miss the history comes from the persistent `nav_history`
+        store, which only asks mfapi.in for rows newer than what it already
+        holds (see NavHistoryStore). Returns (EMPTY_SERIES, None) when nothing
+        is stored and upstream fails; stale/failed results are not cached, so
+        the next call retries and the P&L decision tree falls back to
+        estimating the NAV from holdings in the meantime.
+
+        Concurrent misses for the same scheme share one fetch (single-flight).
         """
         key = str(scheme_code)
+        cached = NavService._cached_scheme_series(key)
+        if cached is not None:
+            return cached
+        return _NAV_HISTORY_FLIGHT.do(key, NavService._load_scheme_series, key, retries)
+
+    @staticmethod
+    def _cached_scheme_series(key):
         with _NAV_HISTORY_LOCK:
-            cached = _NAV_HISTORY_CACHE.get(key)
+            return _NAV_HISTORY_CACHE.get(key)
+
+    @staticmethod
+    def _store_scheme_series(key, nav_data, meta, is_fresh):
+        result = (NavSeries(nav_data) if nav_data else EMPTY_SERIES, meta)
+        if is_fresh:
+            with _NAV_HISTORY_LOCK:
+                _NAV_HISTORY_CACHE[key] = result
+        return result
+
+    @staticmethod
+    def _load_scheme_series(key, retries):
+        # A flight that landed just before we became leader may have filled it
+        cached = NavService._cached_scheme_series(key)
         if cached is not None:
             return cached
+        nav_data, meta, is_fresh = nav_history_store.get_history(key, retries=retries)
+        return NavService._store_scheme_series(key, nav_data, meta, is_fresh)
 
-        url = f"https://api.mfapi.in/mf/{scheme_code}"
-        for attempt in range(retries + 1):
-            try:
-                response = requests.get(url, timeout=10)
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("status") == "SUCCESS":
-                        result = (data.get("data") or [], data.get("meta"))
-                        with _NAV_HISTORY_LOCK:
-                            _NAV_HISTORY_CACHE[key] = result
-                        return result
-                    # Valid HTTP response but API reports no data — retrying won't help
-                    logger.warning(f"NAV history for {scheme_code}: API status={data.get('status')}")
-                    return ([], None)
-                logger.warning(
-                    f"NAV history for {scheme_code} returned HTTP {response.status_code} "
-                    f"(attempt {attempt + 1}/{retries + 1})"
-                )
-            except Exception as e:
-                logger.warning(
-                    f"Error fetching NAV history for {scheme_code} "
-                    f"(attempt {attempt + 1}/{retries + 1}): {e}"
-                )
-        logger.error(f"Could not fetch NAV history for {scheme_code} after {retries + 1} attempts")
-        return ([], None)
+    @staticmethod
+    async def _aget_scheme_series(scheme_code, retries=2):
+        """Async _get_scheme_series; fills the same in-process cache."""
+        key = str(scheme_code)
+        cached = NavService._cached_scheme_series(key)
+        if cached is not None:
+            return cached
+        return await _NAV_HISTORY_AFLIGHT.do(key, NavService._aload_scheme_series, key, retries)
+
+    @staticmethod
+    async def _aload_scheme_series(key, retries):
+        cached = NavService._cached_scheme_series(key)
+        if cached is not None:
+            return cached
+        nav_data, meta, is_fresh = await nav_history_store.aget_history(key, retries=retries)
+        return NavService._store_scheme_series(key, nav_data, meta, is_fresh)
 
     @staticmethod
     def get_latest_nav(scheme_code, limit=1):
@@ -175,21 +164,11 @@ class NavService:
         Each entry: {"date": "DD-MM-YYYY", "nav": float, "meta": ...}
         Always returns a list (empty if none).
         """
-        nav_data, meta = NavService._get_scheme_history(scheme_code)
-        results = []
-        # nav_data is usually newest-first; slice defensively
-        for item in nav_data[:limit]:
-            try:
-                results.append(
-                    {
-                        "date": item["date"],
-                        "nav": float(item["nav"]),
-                        "meta": meta,
-                    }
-                )
-            except Exception:
-                continue
-        return results
+        series, meta = NavService._get_scheme_series(scheme_code)
+        return [
+            {"date": nav_date, "nav": nav, "meta": meta}
+            for nav, nav_date in series.latest(limit)
+        ]
 
     @staticmethod
     def get_nav_at_date(scheme_code, target_date_str):
@@ -199,20 +178,10 @@ class NavService:
         Returns (nav_float, nav_date_str) or None.
         """
         try:
-            nav_data, _ = NavService._get_scheme_history(scheme_code)
-            if not nav_data:
+            series, _ = NavService._get_scheme_series(scheme_code)
+            if not series:
                 return None
-
-            target_date = parse_date_from_str(target_date_str).date()
-
-            # iterate through nav_data (assumed newest-first); find first entry <= target_date
-            for entry in nav_data:
-                try:
-                    entry_date = datetime.strptime(entry["date"], "%d-%m-%Y").date()
-                    if entry_date <= target_date:
-                        return (float(entry["nav"]), entry["date"])
-                except Exception:
-                    continue
+            return series.on_or_before(parse_date_from_str(target_date_str))
         except Exception as e:
             logger.error(f"Error fetching historical NAV for {scheme_code} date {target_date_str}: {e}")
         return None
@@ -226,172 +195,224 @@ class NavService:
 
         Returns (nav_float, nav_date_str) or None.
         """
-        try:
-            nav_data, _ = NavService._get_scheme_history(scheme_code)
-            if not nav_data:
-                return None
+        return NavService.get_next_navs_after_dates(scheme_code, [target_date_str]).get(target_date_str)
 
-            target_date = parse_date_from_str(target_date_str).date()
+    @staticmethod
+    def _parse_date_strs(date_strs):
+        """{date_str: date} for the parseable DD-MM-YYYY strings, input order kept."""
+        parsed = {}
+        for date_str in date_strs:
+            try:
+                parsed[date_str] = parse_date_from_str(date_str)
+            except ValueError:
+                continue
+        return parsed
 
-            # nav_data is newest-first, so we need to find the earliest entry >= target_date
-            # We'll collect all entries >= target_date, then take the oldest one (smallest date)
-            candidates = []
-            for entry in nav_data:
-                try:
-                    entry_date = datetime.strptime(entry["date"], "%d-%m-%Y").date()
-                    if entry_date >= target_date:
-                        candidates.append((entry_date, float(entry["nav"]), entry["date"]))
-                except Exception:
-                    continue
-
-            if candidates:
-                # Sort by date ascending and take the first (oldest/earliest)
-                candidates.sort(key=lambda x: x[0])
-                _, nav, nav_date_str = candidates[0]
-                return (nav, nav_date_str)
-
-            # If no NAV on or after target_date, fall back to latest available
-            if nav_data:
-                latest = nav_data[0]
-                return (float(latest["nav"]), latest["date"])
+    @staticmethod
+    def get_navs_at_dates(scheme_code, target_date_strs):
+        """
+        Batch form of get_nav_at_date: one history fetch for many dates.
+        Returns {date_str: (nav_float, nav_date_str) or None}.
+        """
+        results = {d: None for d in target_date_strs}
+        try:
+            series, _ = NavService._get_scheme_series(scheme_code)
+            if not series:
+                return results
+            parsed = NavService._parse_date_strs(results)
+            results.update(zip(parsed, series.on_or_before_many(parsed.values())))
+        except Exception as e:
+            logger.error(f"Error fetching historical NAVs for {scheme_code}: {e}")
+        return results
+
+    @staticmethod
+    def get_next_navs_after_dates(scheme_code, target_date_strs):
+        """
+        Batch form of get_next_nav_after_date: one history fetch for many dates.
+        Returns {date_str: (nav_float, nav_date_str) or None}.
 
+        As with the single-date lookup, a date with no NAV on or after it falls
+        back to the latest available NAV; callers compare the returned NAV
+        date against the SIP date before allocating units.
+        """
+        results = {d: None for d in target_date_strs}
+        try:
+            series, _ = NavService._get_scheme_series(scheme_code)
+            if not series:
+                return results
+            latest = series.latest(1)[0]
+            parsed = NavService._parse_date_strs(results)
+            results.update((d, point or latest) for d, point in zip(parsed, series.on_or_after_many(parsed.values())))
         except Exception as e:
-            logger.error(f"Error fetching next NAV for {scheme_code} date {target_date_str}: {e}")
-        return None
+            logger.error(f"Error fetching next NAVs for {scheme_code}: {e}")
+        return results
 
     @staticmethod
-    def calculate_portfolio_change(holdings):
+    def _fetch_nse_pct_changes(symbols):
         """
-        Calculates the weighted average percent change (intraday live) of the portfolio.
-        Uses Fyers bulk quotes if authenticated, falls back to parallel NSE fetching.
-        
-        Returns weighted pct change (e.g., 1.23 for +1.23%) or None if insufficient coverage.
+        Fetches live % changes for plain NSE symbols by scraping NSE, through
+        the process-wide client (rate limit, adaptive concurrency, single-flight
+        cookie refresh, per-symbol circuit breaker).
+        Returns dict: symbol -> pct_change (symbols that failed are omitted).
         """
-        import concurrent.futures
+        return nse_client.pct_changes(symbols)
 
-        total_prod = 0.0
-        total_wt = 0.0
-        stocks_checked = 0
+    @staticmethod
+    async def _afetch_nse_pct_changes(symbols):
+        """Async _fetch_nse_pct_changes; shares the same NSE client and limits."""
+        if not symbols:
+            return {}
+        return await asyncio.to_thread(nse_client.pct_changes, symbols)
 
-        # Filter valid stocks first
-        valid_stocks = [s for s in holdings if s.get("Symbol") and s.get("Weight", 0) > 0]
-        total_stocks = len(valid_stocks)
-        if total_stocks == 0:
-            return None
+    @staticmethod
+    def get_live_pct_changes(symbols):
+        """
+        Fetches live (intraday) % changes for a set of symbols in one sweep.
+        Uses Fyers bulk quotes if authenticated; plain symbols Fyers did not
+        price (or all of them, without Fyers) are filled in from NSE scraping.
+        Coverage is judged later, by weight per fund. Duplicate symbols are
+        fetched once.
+
+        Quotes are served from the streaming tick table (while the quote
+        socket is up in this worker) and then the shared quote_cache; only
+        misses are fetched, and fetched values are cached for every other request.
+        Misses another request is already fetching are waited on rather than
+        fetched again (single-flight per symbol).
+
+        Returns dict: symbol -> pct_change (e.g., 1.23 for +1.23%); symbols
+        that could not be fetched are omitted.
+        """
+        streamed, rest = quote_stream.get_many(s for s in symbols if s)
+        cached, unique = quote_cache.get_many(rest)
+        if not unique:
+            return {**streamed, **cached}
 
-        logger.info(f"Starting live price fetch for {total_stocks} stocks...")
+        fetched = _QUOTE_FLIGHT.do_many(unique, NavService._fetch_and_cache_pct_changes)
+        return {**streamed, **cached, **fetched}
+
+    @staticmethod
+    def _fetch_and_cache_pct_changes(symbols):
+        fetched = NavService._fetch_live_pct_changes(symbols)
+        quote_cache.set_many(fetched)
+        return fetched
+
+    @staticmethod
+    def _fetch_live_pct_changes(unique):
+        """Fetches % changes for deduplicated symbols, bypassing the cache."""
+        logger.info(f"Starting live price fetch for {len(unique)} stocks...")
         start_time = time.time()
+        results = {}
 
         # ============ TRY FYERS BULK QUOTES FIRST ============
         if fyers_service.is_authenticated():
             logger.info("Using Fyers API for bulk quotes...")
-            symbols = [s.get("Symbol") for s in valid_stocks]
-            pct_changes = fyers_service.get_bulk_quotes_pct_change(symbols)
-            
-            for stock in valid_stocks:
-                sym = stock.get("Symbol")
-                wt = float(stock.get("Weight", 0) or 0)
-                if wt > 1:
-                    wt = wt / 100.0
-                
-                pct = pct_changes.get(sym)
-                if pct is not None:
-                    total_prod += (wt * pct)
-                    total_wt += wt
-                    stocks_checked += 1
+            pct_changes = fyers_service.get_bulk_quotes_pct_change(unique)
+            results = {sym: pct for sym, pct in pct_changes.items() if pct is not None}
+            logger.info(
+                f"Fyers bulk fetch completed in {time.time() - start_time:.2f}s. "
+                f"Valid: {len(results)}/{len(unique)}"
+            )
+            if len(results) < len(unique):
+                logger.warning("Fyers missed some symbols, trying NSE fallback for them...")
 
-            duration = time.time() - start_time
-            logger.info(f"Fyers bulk fetch completed in {duration:.2f}s. Valid: {stocks_checked}/{total_stocks}, Coverage: {total_wt*100:.1f}%")
+        # ============ FALLBACK TO NSE SCRAPING ============
+        # NSE fallback can only handle plain NSE symbols (no exchange prefix)
+        missing = [s for s in unique if ":" not in s and s not in results]
+        if missing:
+            logger.info("Using NSE scraping fallback...")
+            results.update(NavService._fetch_nse_pct_changes(missing))
+            logger.info(
+                f"NSE fetch completed in {time.time() - start_time:.2f}s. "
+                f"Valid: {len(results)}/{len(unique)}"
+            )
+        return results
 
-            if total_wt >= 0.75:
-                return total_prod / total_wt
-            else:
-                logger.warning(f"Insufficient Fyers coverage ({total_wt*100:.1f}% < 75%), trying NSE fallback...")
+    @staticmethod
+    async def aget_live_pct_changes(symbols):
+        """Async get_live_pct_changes; same cache, sources and fallback rules."""
+        streamed, rest = quote_stream.get_many(s for s in symbols if s)
+        cached, unique = quote_cache.get_many(rest)
+        if not unique:
+            return {**streamed, **cached}
 
-        # ============ FALLBACK TO NSE SCRAPING ============
-        logger.info("Using NSE scraping fallback...")
-        total_prod = 0.0
-        total_wt = 0.0
-        stocks_checked = 0
+        fetched = await _QUOTE_AFLIGHT.do_many(unique, NavService._afetch_and_cache_pct_changes)
+        return {**streamed, **cached, **fetched}
 
-        # NSE fallback can only handle plain NSE symbols (no exchange prefix)
-        valid_stocks = [s for s in valid_stocks if ":" not in (s.get("Symbol") or "")]
-        total_stocks = len(valid_stocks)
-        if total_stocks == 0:
+    @staticmethod
+    async def _afetch_and_cache_pct_changes(symbols):
+        fetched = await NavService._afetch_live_pct_changes(symbols)
+        quote_cache.set_many(fetched)
+        return fetched
+
+    @staticmethod
+    async def _afetch_live_pct_changes(unique):
+        start_time = time.time()
+        results = {}
+
+        if fyers_service.is_authenticated():
+            pct_changes = await fyers_service.aget_bulk_quotes_pct_change(unique)
+            results = {sym: pct for sym, pct in pct_changes.items() if pct is not None}
+            logger.info(
+                f"Fyers async bulk fetch completed in {time.time() - start_time:.2f}s. "
+                f"Valid: {len(results)}/{len(unique)}"
+            )
+            if len(results) < len(unique):
+                logger.warning("Fyers missed some symbols, trying NSE fallback for them...")
+
+        missing = [s for s in unique if ":" not in s and s not in results]
+        if missing:
+            results.update(await NavService._afetch_nse_pct_changes(missing))
+            logger.info(
+                f"NSE async fetch completed in {time.time() - start_time:.2f}s. "
+                f"Valid: {len(results)}/{len(unique)}"
+            )
+        return results
+
+    @staticmethod
+    def calculate_portfolio_change(holdings, pct_changes=None, weight_vector=None):
+        """
+        Calculates the weighted average percent change (intraday live) of the portfolio.
+
+        pct_changes is an optional symbol -> pct map already fetched for a
+        larger symbol set (e.g. every fund of a user); when omitted, quotes for
+        this fund's holdings are fetched via get_live_pct_changes.
+        weight_vector is the fund's precomputed WeightVector; when omitted it
+        is derived from holdings.
+
+        Returns weighted pct change (e.g., 1.23 for +1.23%) or None if insufficient coverage.
+        """
+        vector = weight_vector if weight_vector is not None else WeightVector.from_holdings(holdings)
+        if not len(vector):
             return None
-        
-        # Ensure we have cookies before starting parallel requests
-        NavService.ensure_nse_cookies()
-        
-        # Track results and failures for retry
-        results = {}  # symbol -> (weight, pct_change)
-        failed_stocks = []
-
-        def fetch_price(stock):
-            sym = stock.get("Symbol")
-            # normalize weight to fraction
-            wt = float(stock.get("Weight", 0) or 0)
-            if wt > 1:
-                wt = wt / 100.0
-            pct = NavService.get_live_price_change_nse(sym)
-            return (sym, wt, pct)
-
-        # PASS 1: Parallel fetch with reduced concurrency to avoid rate limiting
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            future_to_stock = {executor.submit(fetch_price, stock): stock for stock in valid_stocks}
-            for future in concurrent.futures.as_completed(future_to_stock):
-                stock = future_to_stock[future]
-                try:
-                    sym, wt, pct = future.result()
-                    if pct is not None:
-                        results[sym] = (wt, pct)
-                        total_prod += (wt * pct)
-                        total_wt += wt
-                        stocks_checked += 1
-                    else:
-                        failed_stocks.append(stock)
-                except Exception as exc:
-                    logger.debug(f"Stock fetch exception for {stock.get('Symbol')}: {exc}")
-                    failed_stocks.append(stock)
-
-        # PASS 2: Sequential retry for failed stocks with delay between requests
-        if failed_stocks:
-            logger.info(f"Retrying {len(failed_stocks)} failed stocks sequentially...")
-            for stock in failed_stocks:
-                sym = stock.get("Symbol")
-                wt = float(stock.get("Weight", 0) or 0)
-                if wt > 1:
-                    wt = wt / 100.0
-                
-                # Small delay to avoid rate limiting
-                time.sleep(0.3)
-                
-                # Retry with fresh cookie refresh if many failures
-                if len(failed_stocks) > 20 and failed_stocks.index(stock) == 0:
-                    try:
-                        session.cookies.clear()
-                        session.get(NSE_BASE_URL, timeout=10)
-                    except Exception:
-                        pass
-                
-                pct = NavService.get_live_price_change_nse(sym, max_retries=2)
-                if pct is not None:
-                    results[sym] = (wt, pct)
-                    total_prod += (wt * pct)
-                    total_wt += wt
-                    stocks_checked += 1
 
-        duration = time.time() - start_time
-        logger.info(f"NSE fetch completed in {duration:.2f}s. Valid: {stocks_checked}/{total_stocks}, Coverage: {total_wt*100:.1f}%")
+        if pct_changes is None:
+            pct_changes = NavService.get_live_pct_changes(vector.symbols)
+
+        change, coverage, priced = weighted_change(vector.weights, vector.quotes(pct_changes))
+        logger.info(f"Live coverage. Valid: {priced}/{len(vector)}, Coverage: {coverage*100:.1f}%")
 
         # require at least 75% of portfolio weight coverage for reliable estimation
-        if total_wt >= 0.75:
-            # normalized weighted average percent change
-            return total_prod / total_wt
-        else:
-            logger.warning(f"Insufficient coverage ({total_wt*100:.1f}% < 75%), skipping D0 estimation")
+        if coverage >= MIN_COVERAGE:
+            return change
+        logger.warning(f"Insufficient coverage ({coverage*100:.1f}% < 75%), skipping D0 estimation")
         return None
 
+    @staticmethod
+    def calculate_portfolio_changes(docs, pct_changes):
+        """
+        calculate_portfolio_change for many funds at once (one matrix-vector
+        product over their symbol union). Returns a list aligned with docs:
+        weighted pct change, or None where coverage is below 75%.
+        """
+        vectors = [WeightVector.from_doc(doc) for doc in docs]
+        if not vectors:
+            return []
+        changes, coverages = weighted_changes(vectors, pct_changes)
+        return [
+            float(change) if coverage >= MIN_COVERAGE else None
+            for change, coverage in zip(changes, coverages)
+        ]
+
     @staticmethod
     def ensure_yf_symbol(sym):
         """Ensure a yfinance-friendly ticker (adds .NS if missing and symbol likely NSE)."""
@@ -400,22 +421,29 @@ class NavService:
         return f"{sym}.NS"
 
     @staticmethod
-    def get_historical_portfolio_change(holdings, target_date):
+    def get_historical_portfolio_change(holdings, target_date, weight_vector=None):
         """
         Calculates weighted average percent change for a specific historical date (target_date - a date object).
-        Uses Fyers if authenticated, falls back to yfinance.
+        Reads the in-memory close store first; only symbols it cannot price go to
+        Fyers (if authenticated), and yfinance is the last fallback.
+        weight_vector is the fund's precomputed WeightVector (derived from holdings if omitted).
         Returns weighted pct (e.g., 1.23 for +1.23%) or None if insufficient coverage.
         """
-        valid_stocks = [s for s in holdings if s.get("Symbol") and s.get("Weight", 0) > 0]
-        if not valid_stocks:
+        vector = weight_vector if weight_vector is not None else WeightVector.from_holdings(holdings)
+        if not len(vector):
             return None
 
-        # ============ TRY FYERS FIRST ============
+        # ============ LOCAL CLOSE STORE ============
+        pct_changes = close_store.pct_changes(vector.symbols, target_date)
+        change, coverage, priced = weighted_change(vector.weights, vector.quotes(pct_changes))
+        if coverage >= MIN_COVERAGE:
+            logger.debug(f"Close store priced {priced}/{len(vector)} for {target_date}")
+            return change
+
+        # ============ TRY FYERS FOR THE REST ============
         if fyers_service.is_authenticated():
-            logger.info(f"Using Fyers for historical data on {target_date}...")
-            total_prod = 0.0
-            total_wt = 0.0
-            stocks_checked = 0
+            missing = [sym for sym, pct in pct_changes.items() if pct is None]
+            logger.info(f"Using Fyers for historical data on {target_date} ({len(missing)} symbols not in close store)...")
 
             # Convert target_date to datetime if needed
             if isinstance(target_date, date) and not isinstance(target_date, datetime):
@@ -423,30 +451,19 @@ class NavService:
             else:
                 target_dt = target_date
 
-            for stock in valid_stocks:
-                sym = stock["Symbol"]
-                wt = float(stock.get("Weight", 0) or 0)
-                if wt > 1:
-                    wt = wt / 100.0
-
-                pct = fyers_service.get_historical_pct_change(sym, target_dt)
-                if pct is not None:
-                    total_prod += wt * pct
-                    total_wt += wt
-                    stocks_checked += 1
+            pct_changes.update(fyers_service.get_historical_pct_changes(missing, target_dt))
+            change, coverage, priced = weighted_change(vector.weights, vector.quotes(pct_changes))
+            logger.info(f"Fyers historical fetch complete. Valid: {priced}/{len(vector)}, Coverage: {coverage*100:.1f}%")
 
-            logger.info(f"Fyers historical fetch complete. Valid: {stocks_checked}/{len(valid_stocks)}, Coverage: {total_wt*100:.1f}%")
-
-            if total_wt >= 0.75:
-                return total_prod / total_wt
-            else:
-                logger.warning(f"Insufficient Fyers historical coverage ({total_wt*100:.1f}% < 75%), trying yfinance fallback...")
+            if coverage >= MIN_COVERAGE:
+                return change
+            logger.warning(f"Insufficient Fyers historical coverage ({coverage*100:.1f}% < 75%), trying yfinance fallback...")
 
         # ============ FALLBACK TO YFINANCE ============
-        return NavService._get_historical_portfolio_change_yfinance(holdings, target_date)
+        return NavService._get_historical_portfolio_change_yfinance(holdings, target_date, vector)
 
     @staticmethod
-    def _get_historical_portfolio_change_yfinance(holdings, target_date):
+    def _get_historical_portfolio_change_yfinance(holdings, target_date, weight_vector=None):
         """
         FALLBACK: Uses yfinance to fetch historical close prices.
         """
@@ -465,16 +482,12 @@ class NavService:
         except Exception:
             pass
 
-        valid_stocks = [s for s in holdings if s.get("Symbol") and s.get("Weight", 0) > 0]
-        if not valid_stocks:
+        vector = weight_vector if weight_vector is not None else WeightVector.from_holdings(holdings)
+        if not len(vector):
             return None
 
         # Prepare tickers
-        tickers_map = {}
-        for s in valid_stocks:
-            sym = s["Symbol"]
-            yf_sym = NavService.ensure_yf_symbol(sym)
-            tickers_map[sym] = yf_sym
+        tickers_map = {sym: NavService.ensure_yf_symbol(sym) for sym in vector.symbols}
         tickers_list = list(set(tickers_map.values()))
 
         try:
@@ -507,55 +520,35 @@ class NavService:
             else:
                 t_date = target_date
 
-            # Find index row that matches target_date
-            idx_loc = None
-            for idx in pct_df.index:
-                if idx.date() == t_date:
-                    idx_loc = idx
-                    break
-
-            if idx_loc is None:
+            # Row for target_date (vectorized date match over the index)
+            matches = np.flatnonzero(pct_df.index.date == t_date)
+            if not len(matches):
                 logger.warning(f"No yfinance pct row found for target date {t_date}")
                 return None
+            row = pct_df.iloc[matches[0]]
 
-            total_prod = 0.0
-            total_wt = 0.0
-            stocks_checked = 0
-
-            for stock in valid_stocks:
-                sym = stock["Symbol"]
-                wt = float(stock.get("Weight", 0) or 0)
-                if wt > 1:
-                    wt = wt / 100.0
-
-                yf_sym = tickers_map.get(sym)
-                # column names may be just yf_sym or a tuple depending on df shape; handle simple case
-                if yf_sym in pct_df.columns:
-                    val = pct_df.loc[idx_loc, yf_sym]
-                else:
-                    # try uppercase fallback
-                    found_col = next((c for c in pct_df.columns if str(c).upper() == yf_sym.upper()), None)
-                    val = pct_df.loc[idx_loc, found_col] if found_col is not None else None
-
-                if val is not None and not pd.isna(val):
-                    total_prod += wt * float(val)
-                    total_wt += wt
-                    stocks_checked += 1
+            # Column lookup, case-insensitive fallback, built once per download
+            columns = {str(c).upper(): c for c in pct_df.columns}
+            pct_changes = {}
+            for sym, yf_sym in tickers_map.items():
+                col = yf_sym if yf_sym in pct_df.columns else columns.get(yf_sym.upper())
+                val = row[col] if col is not None else None
+                pct_changes[sym] = None if val is None or pd.isna(val) else float(val)
 
-            logger.info(f"yfinance historical fetch complete. Valid: {stocks_checked}/{len(valid_stocks)}, Coverage: {total_wt*100:.1f}%")
+            change, coverage, priced = weighted_change(vector.weights, vector.quotes(pct_changes))
+            logger.info(f"yfinance historical fetch complete. Valid: {priced}/{len(vector)}, Coverage: {coverage*100:.1f}%")
 
             # require at least 75% of portfolio weight coverage for reliable estimation
-            if total_wt >= 0.75:
-                return total_prod / total_wt
-            else:
-                logger.warning(f"Insufficient coverage ({total_wt*100:.1f}% < 75%), skipping D-1 estimation")
+            if coverage >= MIN_COVERAGE:
+                return change
+            logger.warning(f"Insufficient coverage ({coverage*100:.1f}% < 75%), skipping D-1 estimation")
         except Exception as e:
             logger.error(f"yfinance history fetch failed: {e}")
 
         return None
 
     @staticmethod
-    def calculate_pnl(fund_id, user_id, investment=None, input_date=None):
+    async def calculate_pnl(fund_id, user_id, investment=None, input_date=None):
         """
         Main entry: returns NAV, units, PnL, day PnL etc using the robust decision tree:
          - Prefer Official D0
@@ -563,24 +556,117 @@ class NavService:
          - Else Use Official D-1
          - Else Estimate D-1 using historical closes
          - Else fallback to D-2...
+
+        Async: the NAV history and live quotes are awaited on the pooled HTTP
+        client, so a worker can serve other requests while upstreams respond.
+        Mongo access and the decision tree itself run in a worker thread.
+
+        Results are memoized (see services.pnl_cache): a repeat request with
+        the same document version, official NAV date and quote snapshot costs
+        one small projected read instead of the full calculation.
         """
-        doc = holdings_service.get_holdings(fund_id, user_id)
+        head = await asyncio.to_thread(holdings_service.get_holdings, fund_id, user_id, PNL_CACHE_PROJECTION)
+        if not head:
+            return {"error": "Fund not found."}
+
+        await NavService._awarm_scheme_series([head])
+        cached = pnl_cache.get(NavService._pnl_cache_key(head, fund_id, user_id, investment, input_date))
+        if cached is not None:
+            return cached
+
+        doc = await asyncio.to_thread(holdings_service.get_holdings, fund_id, user_id, PNL_PROJECTION)
         if not doc:
             return {"error": "Fund not found."}
+        doc = NavService._with_due_sip_installment(doc)
+        live_changes = await NavService._aget_live_changes_for_docs([doc])
+        # Keyed on the quotes this result is built from
+        cache_key = NavService._pnl_cache_key(doc, fund_id, user_id, investment, input_date)
+        result = await asyncio.to_thread(
+            NavService._calculate_pnl_for_doc, doc, fund_id, investment, input_date, live_changes
+        )
+        pnl_cache.set(cache_key, result)
+        return result
+
+    @staticmethod
+    def _pnl_cache_key(doc, fund_id, user_id, investment=None, input_date=None):
+        """pnl_cache key for a (projected) holdings doc whose NAV history is warm."""
+        nav_date = None
+        if doc.get("scheme_code"):
+            cached = NavService._cached_scheme_series(str(doc["scheme_code"]))
+            if cached is not None and len(cached[0]):
+                nav_date = cached[0].latest(1)[0][1]
+        return pnl_cache.key(
+            fund_id, user_id, doc.get("version"), nav_date, quote_cache.epoch(),
+            get_current_ist_time().date(), investment, input_date,
+        )
+
+    @staticmethod
+    async def _awarm_scheme_series(docs):
+        """Loads NAV history for every distinct scheme of docs, concurrently."""
+        scheme_codes = list({str(d["scheme_code"]) for d in docs if d.get("scheme_code")})
+        if scheme_codes:
+            await asyncio.gather(*(NavService._aget_scheme_series(code) for code in scheme_codes))
 
+    @staticmethod
+    def _needs_live_estimate(doc, d0_str):
+        """
+        True when the decision tree will try a live D0 estimate for this fund:
+        no official NAV for today yet, or today's row is a stale copy of D-1.
+        """
+        if not doc.get("scheme_code"):
+            return False
+        latest = NavService.get_latest_nav(doc["scheme_code"], limit=2)
+        if not latest or latest[0]["date"] != d0_str:
+            return True
+        return len(latest) > 1 and float(latest[0]["nav"]) == float(latest[1]["nav"])
+
+    @staticmethod
+    async def _aget_live_changes_for_docs(docs):
+        """
+        One quote sweep for the union of symbols across the funds that need a
+        live D0 estimate. Returns None outside the live window (trading day,
+        after market open), where the decision tree never uses live quotes.
+        """
+        now = get_current_ist_time()
+        if not (is_trading_day(now) and now.time() >= MARKET_OPEN_TIME):
+            return None
+
+        d0_str = format_date_for_api(now.date())
+        symbols = []
+        for doc in docs:
+            if NavService._needs_live_estimate(doc, d0_str):
+                symbols.extend(WeightVector.from_doc(doc).symbols)
+        return await NavService.aget_live_pct_changes(symbols)
+
+    @staticmethod
+    def _with_due_sip_installment(doc):
+        """
+        Read-only SIP sync: if this month's installment is due but not saved
+        yet (the nightly SIP batch job adds it, see services.sip_batch), it is
+        shown as PENDING so the user is prompted once the SIP day has passed.
+        Nothing is written; pending NAV allocations are resolved by the batch.
+        """
+        due = holdings_service.due_sip_installment(doc)
+        if due:
+            doc = {**doc, "sip_totals": SipTotals.from_doc(doc).add(due).to_dict()}
+        return doc
+
+    @staticmethod
+    def _calculate_pnl_for_doc(doc, fund_id, investment=None, input_date=None, live_changes=None,
+                               live_port_change=None, defer_xirr=False):
+        """
+        Runs the P&L decision tree for an already-loaded holdings document.
+        live_changes is an optional symbol -> pct map shared across funds
+        (see calculate_portfolio_summary); without it the fund's own holdings
+        are quoted when a live D0 estimate is needed. live_port_change is the
+        fund's live weighted change when already computed for many funds at
+        once (calculate_portfolio_changes). With defer_xirr the SIP cash
+        flows are returned under "_xirr_flows" for a batch solve
+        (see _solve_deferred_xirrs) instead of being solved here.
+        """
         # Get stale info for the response
         stale_info = holdings_service._get_stale_info(doc.get("created_at"))
 
-        # Sync SIP installments (adds new PENDING installments for current month if needed)
-        # This ensures the user is prompted about new month's SIP if the day has passed
-        investment_type = doc.get("investment_type", "lumpsum")
-        if investment_type == "sip":
-            synced = holdings_service.sync_sip_installments(fund_id, user_id)
-            resolved = holdings_service.resolve_pending_nav_installments(fund_id, user_id)
-            if synced or resolved:
-                # Re-fetch document to get updated installments
-                doc = holdings_service.get_holdings(fund_id, user_id)
-
         fund_name = doc.get("fund_name", "Unknown Fund")
         scheme_code = doc.get("scheme_code")
         if not scheme_code:
@@ -591,13 +677,9 @@ class NavService:
         d0_date = now.date()
         d0_str = format_date_for_api(d0_date)
 
-        d_minus_1_date = get_previous_business_day(d0_date)
+        d_minus_1_date, d_minus_2_date, d_minus_3_date = get_previous_business_days(d0_date, 3)
         d_minus_1_str = format_date_for_api(d_minus_1_date)
-
-        d_minus_2_date = get_previous_business_day(d_minus_1_date)
         d_minus_2_str = format_date_for_api(d_minus_2_date)
-
-        d_minus_3_date = get_previous_business_day(d_minus_2_date)
         d_minus_3_str = format_date_for_api(d_minus_3_date)
 
         # --- fetch official nav history ---
@@ -629,6 +711,7 @@ class NavService:
              data_is_d0 = True
 
         # --- Prepare Estimates ---
+        weight_vector = WeightVector.from_doc(doc)
         estimated_d0 = None
         has_d0_prices = False
 
@@ -637,7 +720,11 @@ class NavService:
 
         # BRANCH A: Estimate D0 (Live/Intraday) - only if official D0 missing and we believe live data maps to D0
         if official_d0 is None and data_is_d0:
-            port_change_d0 = NavService.calculate_portfolio_change(doc.get("holdings", []))
+            port_change_d0 = live_port_change
+            if port_change_d0 is None:
+                port_change_d0 = NavService.calculate_portfolio_change(
+                    doc.get("holdings", []), live_changes, weight_vector
+                )
             if port_change_d0 is not None and official_d_minus_1 is not None:
                 # port_change_d0 is percent (e.g., 1.23), official_d_minus_1 is NAV
                 estimated_d0 = official_d_minus_1 * (1 + (port_change_d0 / 100.0))
@@ -645,7 +732,9 @@ class NavService:
 
         # BRANCH B: Estimate D-1 (Historical Close) - only if official D-1 missing
         if official_d_minus_1 is None:
-            port_change_d_minus_1 = NavService.get_historical_portfolio_change(doc.get("holdings", []), d_minus_1_date)
+            port_change_d_minus_1 = NavService.get_historical_portfolio_change(
+                doc.get("holdings", []), d_minus_1_date, weight_vector
+            )
             if port_change_d_minus_1 is not None and official_d_minus_2 is not None:
                 estimated_d_minus_1 = official_d_minus_2 * (1 + (port_change_d_minus_1 / 100.0))
                 has_d_minus_1_prices = True
@@ -782,22 +871,15 @@ class NavService:
             # Check if any units are estimated
             has_estimated_units = future_units > 0  # future_sip_units are always estimated
             
-            # Recalculate investment with stamp duty from installments
-            # This ensures accurate display even for old data
+            # Installment figures come from the running totals (utils.sip_totals),
+            # never from walking the installments
             sip_mode = doc.get("sip_mode", "simple")
-            installments = doc.get("sip_installments", [])
+            sip_totals = SipTotals.from_doc(doc)
             
-            if sip_mode == "detailed" and installments:
+            if sip_mode == "detailed" and sum(sip_totals.counts.values()) > 0:
                 # For detailed mode: use stored invested_amount (includes CAS cost_value)
-                # Just sum units from installments for current value calculation
-                total_units_from_installments = 0.0
-                
-                for inst in installments:
-                    if inst.get("status") in ("PAID", "ASSUMED_PAID"):
-                        # Sum units from installments (CAS provides actual units)
-                        inst_units = inst.get("units")
-                        if inst_units is not None:
-                            total_units_from_installments += float(inst_units)
+                # Units of PAID / ASSUMED_PAID installments (CAS provides actual units)
+                total_units_from_installments = sip_totals.allocated_units
                 
                 # Use stored invested_amount (already includes CAS cost_value or calculated stamp duty)
                 investment = float(doc.get("invested_amount", 0) or 0)
@@ -835,44 +917,33 @@ class NavService:
         # Detect Pending SIP Installments for Frontend Alert
         sip_pending_installments = []
         xirr_value = None  # XIRR (Annualized Return)
+        xirr_flows = None
         has_pending_nav_sip = False  # SIP paid but units not yet allocated
         pending_nav_amount = 0.0  # Amount invested but not yet allocated units
         
         if investment_type == "sip":
-            installments = doc.get("sip_installments", [])
-            for inst in installments:
-                if inst.get("status") == "PENDING":
-                    sip_pending_installments.append(inst)
-                elif inst.get("status") == "PAID":
-                    # Check if this PAID installment has pending NAV (units is None)
-                    if inst.get("units") is None or inst.get("allocation_status") == "PENDING_NAV":
-                        has_pending_nav_sip = True
-                        pending_nav_amount += float(inst.get("amount", 0))
-                    # Check if units are estimated
-                    if inst.get("allocation_status") == "ESTIMATED" or inst.get("is_estimated"):
-                        has_estimated_units = True
+            sip_pending_installments = sip_totals.pending_installments()
+            # PAID installments whose units wait for a NAV
+            has_pending_nav_sip = sip_totals.pending_nav_count > 0
+            pending_nav_amount = sip_totals.pending_nav_amount
+            if sip_totals.estimated_count > 0:
+                has_estimated_units = True
             
             # Calculate XIRR for SIP
             # Only calculate if we have current value and confirmed installments with units
-            if current_value > 0 and installments and units > 0:
+            invested = sip_totals.invested_flows()
+            if current_value > 0 and invested and units > 0:
                 try:
-                    manual_invested = float(doc.get("manual_invested_amount", 0) or 0)
-                    sip_start = doc.get("sip_start_date") or doc.get("invested_date")
-                    
-                    xirr_value = calculate_sip_xirr(
-                        installments=installments,
-                        current_value=current_value,
-                        current_date=d0_date,
-                        manual_invested_amount=manual_invested,
-                        sip_start_date=sip_start
-                    )
-                    if xirr_value is not None:
-                        xirr_value = round(xirr_value, 2)
+                    xirr_flows = invested_cash_flows(invested.items(), current_value, d0_date)
+                    if xirr_flows and not defer_xirr:
+                        xirr_value = calculate_xirr(xirr_flows, guess=NavService._xirr_guess(fund_id))
+                        xirr_value = NavService._remember_xirr(fund_id, xirr_value)
                 except Exception as e:
                     logger.debug(f"XIRR calculation failed for {fund_id}: {e}")
+                    xirr_flows = None
                     xirr_value = None
 
-        return {
+        result = {
             "fund_id": fund_id,
             "fund_name": fund_name,
             "invested_amount": round(investment, 2),
@@ -898,6 +969,238 @@ class NavService:
             "is_stale": stale_info["is_stale"],
             "days_since_update": stale_info["days_since_update"]
         }
+        if defer_xirr and xirr_flows:
+            result["_xirr_flows"] = xirr_flows
+        return result
+
+    # ==================== XIRR ====================
+
+    @staticmethod
+    def _xirr_guess(fund_id):
+        with _XIRR_GUESSES_LOCK:
+            return _XIRR_GUESSES.get(str(fund_id))
+
+    @staticmethod
+    def _remember_xirr(fund_id, xirr_value):
+        """Rounds an XIRR (percent) for the response and keeps it as the next warm start."""
+        if xirr_value is None:
+            return None
+        with _XIRR_GUESSES_LOCK:
+            _XIRR_GUESSES[str(fund_id)] = xirr_value / 100.0
+        return round(xirr_value, 2)
+
+    @staticmethod
+    def _solve_deferred_xirrs(results):
+        """
+        Fills "xirr" for results computed with defer_xirr, solving all their
+        cash-flow series in one calculate_xirr_batch call.
+        """
+        pending = [r for r in results if "_xirr_flows" in r]
+        if not pending:
+            return
+        flow_sets = [r.pop("_xirr_flows") for r in pending]
+        guesses = [NavService._xirr_guess(r["fund_id"]) for r in pending]
+        try:
+            solved = calculate_xirr_batch(flow_sets, guesses)
+        except Exception as e:
+            logger.debug(f"Batch XIRR calculation failed: {e}")
+            solved = [None] * len(pending)
+        for r, xirr_value in zip(pending, solved):
+            r["xirr"] = NavService._remember_xirr(r["fund_id"], xirr_value)
+
+    @staticmethod
+    async def _aportfolio_results(user_id):
+        """
+        (docs, funds): every holdings document of a user and its P&L result,
+        computed in one pass:
+         - all holdings documents come from a single query
+         - NAV histories are fetched once per distinct scheme code
+         - live quotes are fetched once for the union of symbols across the
+           funds that still need a live D0 estimate
+        """
+        docs = await asyncio.to_thread(holdings_service.list_holdings_docs, user_id, PNL_PROJECTION)
+        await NavService._awarm_scheme_series(docs)
+        docs = [NavService._with_due_sip_installment(doc) for doc in docs]
+        live_changes = await NavService._aget_live_changes_for_docs(docs)
+
+        def compute_all():
+            # Funds unchanged since their last calculation come from pnl_cache
+            keys = [NavService._pnl_cache_key(doc, str(doc["_id"]), user_id) for doc in docs]
+            funds = [pnl_cache.get(key) for key in keys]
+            todo = [i for i, fund in enumerate(funds) if fund is None]
+
+            # Live change for every remaining fund in one matrix-vector product
+            port_changes = (
+                NavService.calculate_portfolio_changes([docs[i] for i in todo], live_changes)
+                if live_changes is not None and todo else [None] * len(todo)
+            )
+            for i, port_change in zip(todo, port_changes):
+                funds[i] = NavService._calculate_pnl_for_doc(
+                    docs[i], str(docs[i]["_id"]), live_changes=live_changes, live_port_change=port_change,
+                    defer_xirr=True
+                )
+            # Every SIP fund's XIRR in one vectorized solve
+            NavService._solve_deferred_xirrs([funds[i] for i in todo])
+            for i in todo:
+                pnl_cache.set(keys[i], funds[i])
+            return funds
+
+        funds = await asyncio.to_thread(compute_all)
+        return docs, funds
+
+    @staticmethod
+    def _portfolio_totals(funds):
+        """Totals over the funds that computed; funds that errored are left out."""
+        ok = [f for f in funds if "error" not in f]
+        invested = sum(f["invested_amount"] for f in ok)
+        current_value = sum(f["current_value"] for f in ok)
+        day_pnl = sum(f["day_pnl"] for f in ok)
+        pnl = current_value - invested
+        previous_value = current_value - day_pnl
+
+        return {
+            "fund_count": len(ok),
+            "invested_amount": round(invested, 2),
+            "current_value": round(current_value, 2),
+            "pnl": round(pnl, 2),
+            "pnl_pct": round((pnl / invested) * 100, 2) if invested > 0 else 0,
+            "day_pnl": round(day_pnl, 2),
+            "day_pnl_pct": round((day_pnl / previous_value) * 100, 2) if previous_value > 0 else 0,
+        }
+
+    @staticmethod
+    async def calculate_portfolio_summary(user_id):
+        """
+        P&L for every fund of a user in one pass (see _aportfolio_results).
+
+        Returns {"funds": [...per-fund calculate_pnl results...], "totals": {...}}.
+        Funds that error are listed but excluded from the totals.
+        """
+        _, funds = await NavService._aportfolio_results(user_id)
+        return {"funds": funds, "totals": NavService._portfolio_totals(funds)}
+
+    @staticmethod
+    def _invested_flows(doc, fund):
+        """(date, amount invested) pairs of one fund: its lumpsum, or its SIP / CAS installments."""
+        if doc.get("investment_type", "lumpsum") == "sip":
+            return list(SipTotals.from_doc(doc).invested_flows().items())
+        if doc.get("invested_date") and fund["invested_amount"] > 0:
+            return [(doc["invested_date"], fund["invested_amount"])]
+        return []
+
+    @staticmethod
+    async def calculate_portfolio_analytics(user_id):
+        """
+        Portfolio-level figures on top of the summary's batched pass (same
+        cached per-fund results, NAV histories and quote sweep):
+         - one XIRR over every fund's cash flows merged into a single dated
+           stream (lumpsum investments, SIP / CAS installments) against
+           today's total value; lumpsum funds get their own XIRR as well,
+           all solved in one calculate_xirr_batch call
+         - allocation: each fund's share of the current value
+         - look-through exposure: each fund's value spread over its holdings
+           weights and summed per stock across funds, so a stock held by
+           several funds is counted once with its combined weight
+        """
+        docs, funds = await NavService._aportfolio_results(user_id)
+        totals = NavService._portfolio_totals(funds)
+        d0_date = get_current_ist_time().date()
+
+        ok = [(doc, fund) for doc, fund in zip(docs, funds) if "error" not in fund]
+        total_value = totals["current_value"]
+
+        # Lumpsum XIRRs and the portfolio XIRR in one batch
+        portfolio_invested = []
+        flow_sets, owners = [], []
+        for doc, fund in ok:
+            invested = NavService._invested_flows(doc, fund)
+            portfolio_invested.extend(invested)
+            if doc.get("investment_type", "lumpsum") != "sip" and fund["current_value"] > 0:
+                flows = invested_cash_flows(invested, fund["current_value"], d0_date)
+                if flows:
+                    flow_sets.append(flows)
+                    owners.append(fund["fund_id"])
+        portfolio_flows = invested_cash_flows(portfolio_invested, total_value, d0_date) if total_value > 0 else None
+        if portfolio_flows:
+            flow_sets.append(portfolio_flows)
+            owners.append(f"portfolio:{user_id}")
+
+        try:
+            solved = calculate_xirr_batch(flow_sets, [NavService._xirr_guess(o) for o in owners])
+        except Exception as e:
+            logger.debug(f"Portfolio XIRR calculation failed: {e}")
+            solved = [None] * len(flow_sets)
+        xirrs = {o: NavService._remember_xirr(o, x) for o, x in zip(owners, solved)}
+
+        allocation = [
+            {
+                "fund_id": fund["fund_id"],
+                "fund_name": fund["fund_name"],
+                "nickname": fund.get("nickname"),
+                "investment_type": fund["investment_type"],
+                "invested_amount": fund["invested_amount"],
+                "current_value": fund["current_value"],
+                "weight_pct": round(fund["current_value"] / total_value * 100, 2) if total_value > 0 else 0,
+                "xirr": fund["xirr"] if fund.get("xirr") is not None else xirrs.get(fund["fund_id"]),
+            }
+            for _, fund in ok
+        ]
+        allocation.sort(key=lambda row: row["current_value"], reverse=True)
+
+        symbols, values, fund_counts = look_through_exposure(
+            [WeightVector.from_doc(doc) for doc, _ in ok], [fund["current_value"] for _, fund in ok]
+        )
+        order = np.argsort(-values, kind="stable")
+        exposure = [
+            {
+                "symbol": symbols[i],
+                "value": round(float(values[i]), 2),
+                "weight_pct": round(float(values[i]) / total_value * 100, 2) if total_value > 0 else 0,
+                "fund_count": int(fund_counts[i]),
+            }
+            for i in order
+        ]
+        overlap_value = float(values[fund_counts > 1].sum())
+        classified_value = float(values.sum())
+
+        return {
+            "totals": totals,
+            "xirr": xirrs.get(f"portfolio:{user_id}"),
+            "allocation": allocation,
+            "exposure": exposure,
+            # Value in stocks held through two or more funds
+            "overlap_pct": round(overlap_value / total_value * 100, 2) if total_value > 0 else 0,
+            # Cash, debt and anything without a stock symbol
+            "unclassified_pct": round(max(total_value - classified_value, 0.0) / total_value * 100, 2)
+            if total_value > 0 else 0,
+        }
+
+
+    @staticmethod
+    async def calculate_look_through(user_id, isin=None, symbol=None):
+        """
+        Stock-level exposure across a user's funds from the exposure index
+        (services.exposure_index): each fund's current value - from the same
+        cached batched pass as the summary - spread over its indexed weights.
+        With isin or symbol, just that stock with its per-fund breakdown.
+        """
+        _, funds = await NavService._aportfolio_results(user_id)
+        ok = [f for f in funds if "error" not in f]
+        fund_values = {f["fund_id"]: f["current_value"] for f in ok}
+        names = {f["fund_id"]: f.get("nickname") or f["fund_name"] for f in ok}
+
+        def look_through():
+            exposure_index.ensure_indexed(user_id, fund_values)
+            return exposure_index.look_through(user_id, fund_values, isin=isin, symbol=symbol)
+
+        stocks = await asyncio.to_thread(look_through)
+        for stock in stocks:
+            for fund in stock.get("funds", []):
+                fund["fund_name"] = names.get(fund["fund_id"])
+        return {
+            "total_value": round(sum(fund_values.values()), 2),
+            "stocks": stocks,
+        }
 
 
 nav_service = NavService()
@@ -0,0 +1,179 @@
+"""
+NSE Client - Process-wide client for the NSE quote scraping fallback.
+
+Every NSE quote request in the worker goes through one NseClient:
+
+- Token bucket: at most NSE_RATE_PER_SECOND requests per second in total.
+- Adaptive concurrency (AIMD): the number of requests in flight grows by
+  about one per successful round and halves on 401/403/429/5xx, HTML
+  overload pages or timeouts, so throughput settles at what NSE tolerates.
+  Retries wait on these two instead of fixed sleeps.
+- Cookies: NSE wants the cookies of its home page. On 401/403 the home page
+  is visited again by exactly one thread; the others wait for that refresh
+  and retry with the new cookies. Cookies are replaced in place, never
+  cleared under concurrent requests.
+- Circuit breaker per symbol: a symbol NSE has no quote for fails
+  NSE_BREAKER_FAILURES times in a row and is then not requested for
+  NSE_BREAKER_COOLDOWN_SECONDS (throttling never counts against a symbol).
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.config import settings
+from utils.common import NSE_API_URL, NSE_BASE_URL, NSE_HEADERS
+from utils.rate_limit import AdaptiveLimit, TokenBucket
+from core.logging import get_logger
+
+logger = get_logger("NseClient")
+
+# Request outcomes
+OK = "ok"
+AUTH = "auth"            # 401/403: cookies expired or rejected
+THROTTLED = "throttled"  # 429/5xx, HTML overload page, timeout, connection error
+NO_QUOTE = "no_quote"    # NSE answered, but has no price for the symbol
+
+REQUEST_TIMEOUT_SECONDS = 10
+
+
+def _new_session(pool_size: int) -> requests.Session:
+    s = requests.Session()
+    s.headers.update(NSE_HEADERS)
+    s.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+    return s
+
+
+class NseClient:
+    """Rate-limited, adaptive NSE quote client shared by the whole process."""
+
+    def __init__(self, session: Optional[requests.Session] = None, rate: Optional[float] = None,
+                 max_concurrency: Optional[int] = None, max_attempts: int = 3):
+        max_concurrency = max_concurrency or settings.NSE_MAX_CONCURRENCY
+        self.session = session or _new_session(max_concurrency)
+        self.bucket = TokenBucket(rate or settings.NSE_RATE_PER_SECOND)
+        self.concurrency = AdaptiveLimit(initial=min(4, max_concurrency), maximum=max_concurrency)
+        self.max_attempts = max_attempts
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="nse")
+        self._cookie_lock = threading.Lock()
+        self._cookie_epoch = 0
+        self._breaker_lock = threading.Lock()
+        self._failures: Dict[str, int] = {}
+        self._open_until: Dict[str, float] = {}
+
+    # ==================== COOKIES ====================
+
+    def ensure_cookies(self):
+        """Visits the home page once if the session has no NSE cookies yet."""
+        if len(self.session.cookies) == 0:
+            self._refresh_cookies(self._cookie_epoch)
+
+    def _refresh_cookies(self, seen_epoch: int):
+        """
+        Re-reads the home page cookies, once per expiry: callers that saw the
+        same epoch wait on the lock, find it already bumped and return.
+        """
+        with self._cookie_lock:
+            if self._cookie_epoch != seen_epoch:
+                return
+            try:
+                logger.info("Refreshing NSE cookies (visiting home page)...")
+                self.session.get(NSE_BASE_URL, timeout=REQUEST_TIMEOUT_SECONDS)
+            except Exception as e:
+                logger.error(f"Failed to refresh NSE cookies: {e}")
+            self._cookie_epoch += 1
+
+    # ==================== CIRCUIT BREAKER ====================
+
+    def _breaker_allows(self, symbol: str) -> bool:
+        with self._breaker_lock:
+            # Past the cooldown the next request is the half-open trial
+            return self._open_until.get(symbol, 0.0) <= time.monotonic()
+
+    def _record(self, symbol: str, priced: bool):
+        with self._breaker_lock:
+            if priced:
+                self._failures.pop(symbol, None)
+                self._open_until.pop(symbol, None)
+                return
+            failures = self._failures.get(symbol, 0) + 1
+            self._failures[symbol] = failures
+            if failures >= settings.NSE_BREAKER_FAILURES:
+                self._open_until[symbol] = time.monotonic() + settings.NSE_BREAKER_COOLDOWN_SECONDS
+                logger.debug(f"NSE breaker open for {symbol} after {failures} failures")
+
+    # ==================== REQUESTS ====================
+
+    def _request(self, symbol: str) -> Tuple[str, Optional[float]]:
+        try:
+            r = self.session.get(NSE_API_URL, params={"symbol": symbol}, timeout=REQUEST_TIMEOUT_SECONDS)
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"NSE request for {symbol} failed: {e}")
+            return THROTTLED, None
+
+        if r.status_code in (401, 403):
+            return AUTH, None
+        if r.status_code == 429 or r.status_code >= 500:
+            return THROTTLED, None
+        if "application/json" not in r.headers.get("Content-Type", ""):
+            # NSE serves an HTML page when overloaded
+            return THROTTLED, None
+        try:
+            p_change = (r.json().get("priceInfo") or {}).get("pChange")
+            return (OK, float(p_change)) if p_change is not None else (NO_QUOTE, None)
+        except (ValueError, TypeError, AttributeError):
+            return NO_QUOTE, None
+
+    def pct_change(self, symbol: str, max_attempts: Optional[int] = None) -> Optional[float]:
+        """Live % change for one plain NSE symbol, or None (max_attempts defaults to the client's)."""
+        if not self._breaker_allows(symbol):
+            return None
+        max_attempts = max_attempts or self.max_attempts
+        for _ in range(max_attempts):
+            epoch = self._cookie_epoch
+            round_ = self.concurrency.acquire()
+            outcome = THROTTLED
+            try:
+                self.bucket.acquire()
+                outcome, pct = self._request(symbol)
+            finally:
+                self.concurrency.release(round_, congested=outcome in (AUTH, THROTTLED))
+
+            if outcome == OK:
+                self._record(symbol, priced=True)
+                return pct
+            if outcome == NO_QUOTE:
+                self._record(symbol, priced=False)
+                return None
+            if outcome == AUTH:
+                self._refresh_cookies(epoch)
+        logger.debug(f"NSE gave up on {symbol} after {max_attempts} attempts")
+        return None
+
+    def pct_changes(self, symbols: Iterable[str]) -> Dict[str, float]:
+        """
+        Live % changes for plain NSE symbols, fetched concurrently within the
+        rate and concurrency limits. Symbols that could not be priced are
+        omitted.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return {}
+        self.ensure_cookies()
+        futures = {s: self._pool.submit(self.pct_change, s) for s in symbols}
+        results = {}
+        for sym, fut in futures.items():
+            try:
+                pct = fut.result()
+            except Exception as exc:
+                logger.debug(f"Stock fetch exception for {sym}: {exc}")
+                continue
+            if pct is not None:
+                results[sym] = pct
+        return results
+
+
+nse_client = NseClient()
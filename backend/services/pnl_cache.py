@@ -0,0 +1,63 @@
+"""
+P&L Cache - Memoized calculate_pnl results per fund.
+
+Outside market hours a fund's P&L only changes when its holdings document
+changes or a new official NAV lands, yet every dashboard refresh used to redo
+the Mongo reads, SIP sync, decision tree and XIRR. Results are keyed by
+everything they depend on:
+
+    (fund_id, user_id, doc version, latest official NAV date,
+     quote epoch, today, investment, input_date)
+
+so any change to those is simply a new key. `version` is bumped ($inc) by
+every write to a holdings document, which keeps other workers' entries
+honest; writes in this worker also drop the fund's entries eagerly via
+invalidate(). Error results are never cached.
+"""
+import threading
+from typing import Hashable, Optional, Tuple
+
+from cachetools import TTLCache
+
+from core.config import settings
+
+_PNL_CACHE_MAXSIZE = 4096
+
+
+class PnlCache:
+    """Thread-safe cache of calculate_pnl results."""
+
+    def __init__(self, maxsize: int = _PNL_CACHE_MAXSIZE, ttl: Optional[float] = None):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl if ttl is not None else settings.PNL_CACHE_TTL_SECONDS)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(fund_id, user_id, version, nav_date, quote_epoch, today,
+            investment=None, input_date=None) -> Tuple[Hashable, ...]:
+        return (str(fund_id), user_id, version or 0, nav_date, quote_epoch, today, investment, input_date)
+
+    def get(self, key: Tuple[Hashable, ...]) -> Optional[dict]:
+        with self._lock:
+            result = self._cache.get(key)
+        # Callers may annotate the result; keep the cached copy intact
+        return dict(result) if result is not None else None
+
+    def set(self, key: Tuple[Hashable, ...], result: dict):
+        if not result or "error" in result:
+            return
+        with self._lock:
+            self._cache[key] = dict(result)
+
+    def invalidate(self, fund_id):
+        """Drops every cached result of a fund (after a write to its document)."""
+        fund_id = str(fund_id)
+        with self._lock:
+            for key in [k for k in self._cache.keys() if k[0] == fund_id]:
+                self._cache.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+pnl_cache = PnlCache()
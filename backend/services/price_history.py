@@ -0,0 +1,174 @@
+"""
+Price History - Daily stock closes cached on disk.
+
+One `<SYMBOL>.npz` per stock under settings.PRICE_HISTORY_DIR holding two
+parallel arrays (ascending date ordinals, float64 closes) plus the date
+range the file is known to cover. Missing symbols / ranges are filled in
+bulk - one yfinance download for every symbol that needs it, starting at
+the earliest missing day - and written back, so a replay over months of
+history downloads each stock once and a daily top-up only the new days.
+Only symbols the download returned closes for are marked covered; the rest
+are asked for again by the next call.
+
+With offline=True nothing is downloaded: symbols not in the cache simply
+come back as NaN columns (used by the backtest against cached fixtures).
+"""
+import os
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.config import settings
+from core.logging import get_logger
+
+logger = get_logger("PriceHistory")
+
+# (ordinals, closes) for one symbol, both ascending by date
+Series = Tuple[np.ndarray, np.ndarray]
+Downloader = Callable[[List[str], date, date], Dict[str, Series]]
+
+
+def yf_ticker(symbol: str) -> str:
+    """yfinance ticker for a holdings symbol (NSE unless already suffixed)."""
+    symbol = symbol.upper()
+    if symbol.endswith(".NS") or symbol.endswith(".BO"):
+        return symbol
+    if ":" in symbol:
+        # FYERS form from the ISIN master, e.g. NSE:XYZ-BE / BSE:SBICARD-A
+        exchange, _, name = symbol.partition(":")
+        return f"{name.rsplit('-', 1)[0]}{'.BO' if exchange == 'BSE' else '.NS'}"
+    return f"{symbol}.NS"
+
+
+def _yf_download(symbols: List[str], start: date, end: date) -> Dict[str, Series]:
+    """Closes for symbols over [start, end] in one yfinance download."""
+    import pandas as pd
+    import yfinance as yf
+
+    tickers = {yf_ticker(s): s for s in symbols}
+    data = yf.download(list(tickers), start=start, end=end + timedelta(days=1),
+                       progress=False, threads=True, group_by="column")
+    if data is None or data.empty:
+        return {}
+    closes = data["Close"] if "Close" in data else data
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(next(iter(tickers)))
+
+    ordinals = np.fromiter((d.toordinal() for d in pd.to_datetime(closes.index).date),
+                           dtype=np.int64, count=len(closes.index))
+    result = {}
+    for column in closes.columns:
+        symbol = tickers.get(str(column)) or tickers.get(str(column).upper())
+        if symbol is None:
+            continue
+        values = closes[column].to_numpy(dtype=np.float64)
+        keep = ~np.isnan(values)
+        if keep.any():  # An all-NaN column is a ticker that failed within the batch
+            result[symbol] = (ordinals[keep], values[keep])
+    return result
+
+
+def _merge(a: Series, b: Series) -> Series:
+    """Union of two series by date; b wins on a shared date."""
+    ordinals = np.concatenate([b[0], a[0]])
+    closes = np.concatenate([b[1], a[1]])
+    ordinals, first = np.unique(ordinals, return_index=True)
+    return ordinals, closes[first]
+
+
+class PriceHistory:
+    """Disk-backed daily closes for any set of symbols."""
+
+    def __init__(self, cache_dir: Optional[str] = None, offline: bool = False,
+                 downloader: Optional[Downloader] = None):
+        self.cache_dir = Path(cache_dir or settings.PRICE_HISTORY_DIR)
+        self.offline = offline
+        self._download = downloader or _yf_download
+
+    def _path(self, symbol: str) -> Path:
+        return self.cache_dir / f"{symbol.upper().replace(':', '_').replace('/', '_')}.npz"
+
+    def _read(self, symbol: str) -> Optional[Tuple[Series, int, int]]:
+        path = self._path(symbol)
+        if not path.exists():
+            return None
+        try:
+            with np.load(path) as f:
+                return (f["ordinals"], f["closes"]), int(f["covered"][0]), int(f["covered"][1])
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable price cache {path.name}: {e}")
+            return None
+
+    def _write(self, symbol: str, series: Series, covered: Tuple[int, int]):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(symbol)
+        # Own temp file per writer: other processes may be writing the same symbol
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp.npz")
+        try:
+            np.savez(tmp, ordinals=series[0], closes=series[1], covered=np.asarray(covered, dtype=np.int64))
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    @staticmethod
+    def _first_missing(cached: Optional[Tuple[Series, int, int]], lo: int, hi: int) -> Optional[int]:
+        """First day of [lo, hi] the cache lacks: lo, unless only the tail is missing; None if covered."""
+        if cached is None or cached[1] > lo:
+            return lo
+        return cached[2] + 1 if cached[2] < hi else None
+
+    def series(self, symbols: Iterable[str], start: date, end: date) -> Dict[str, Series]:
+        """Each symbol's closes within [start, end], filling the cache in bulk first."""
+        symbols = list(dict.fromkeys(symbols))
+        lo, hi = start.toordinal(), end.toordinal()
+
+        cached = {s: self._read(s) for s in symbols}
+        need = {s: self._first_missing(c, lo, hi) for s, c in cached.items()}
+        need = {s: day for s, day in need.items() if day is not None}
+        stale = list(need)
+        if stale and not self.offline:
+            try:
+                fetched = self._download(stale, date.fromordinal(min(need.values())), end)
+            except Exception as e:
+                logger.error(f"Price history download failed for {len(stale)} symbols: {e}")
+                fetched = {}
+            # Only symbols that came back count as covered; the rest (failed
+            # tickers in the batch, or upstream down) are asked for again next time
+            for s in stale:
+                if s not in fetched:
+                    continue
+                old = cached[s]
+                new = fetched[s]
+                merged = _merge(old[0], new) if old else new
+                covered = (min(lo, old[1]), max(hi, old[2])) if old else (lo, hi)
+                self._write(s, merged, covered)
+                cached[s] = (merged, *covered)
+
+        result = {}
+        for s in symbols:
+            if cached[s] is None:
+                continue
+            ordinals, closes = cached[s][0]
+            window = (ordinals >= lo) & (ordinals <= hi)
+            result[s] = (ordinals[window], closes[window])
+        return result
+
+    def matrix(self, symbols: Sequence[str], start: date, end: date) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (ordinals, closes): the union of trading days across symbols and a
+        days x symbols float64 matrix of closes, NaN where a stock has none.
+        """
+        data = self.series(symbols, start, end)
+        if not data:
+            return np.zeros(0, dtype=np.int64), np.full((0, len(symbols)), np.nan)
+        ordinals = np.unique(np.concatenate([o for o, _ in data.values()]))
+        closes = np.full((len(ordinals), len(symbols)), np.nan)
+        for col, s in enumerate(symbols):
+            if s in data:
+                o, c = data[s]
+                closes[np.searchsorted(ordinals, o), col] = c
+        return ordinals, closes
@@ -0,0 +1,109 @@
+"""
+Quote Cache - Process-wide cache of live % changes shared by every request.
+
+Live quotes are per symbol, not per user or fund: 500 users holding
+Nifty-heavy funds all need the same RELIANCE quote. Entries are keyed by the
+symbol as stored in holdings (plain NSE symbol or "BSE:XXX-A") and hold
+(pct_change, fetched_at).
+
+TTL follows the market clock:
+- Market open: settings.QUOTE_CACHE_MARKET_TTL_SECONDS (a few seconds).
+- Market closed (after 15:30 IST, weekends, NSE holidays, pre-open): the
+  quote cannot change until the next open, so it lives until then.
+
+Failed fetches (None) are never cached so the next request retries them.
+"""
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cachetools import TLRUCache
+
+from core.config import settings
+from utils.date_utils import get_current_ist_time, is_market_open, get_next_market_open
+
+# Comfortably above the distinct-symbol universe across all tracked funds.
+_QUOTE_CACHE_MAXSIZE = 5000
+
+
+def _entry_expiry(key, value, now):
+    # value = (pct_change, fetched_at, expires_at); expiry is decided at insert time
+    return value[2]
+
+
+class QuoteCache:
+    """Thread-safe symbol -> (pct_change, fetched_at) cache with market-aware TTL."""
+
+    def __init__(self, maxsize: int = _QUOTE_CACHE_MAXSIZE):
+        self._cache = TLRUCache(maxsize=maxsize, ttu=_entry_expiry, timer=time.time)
+        self._lock = threading.Lock()
+        self._stores = 0  # bumped on every set_many that stored something
+
+    @staticmethod
+    def _expires_at(fetched_at: float, ttl: Optional[float] = None) -> float:
+        """
+        Epoch seconds until which a quote fetched at `fetched_at` stays valid.
+        `ttl` overrides the market-hours TTL (the background refresher keeps
+        its quotes until its next poll).
+        """
+        current_dt = get_current_ist_time()
+        if is_market_open(current_dt):
+            return fetched_at + (ttl if ttl is not None else settings.QUOTE_CACHE_MARKET_TTL_SECONDS)
+        return get_next_market_open(current_dt).timestamp()
+
+    def get_many(self, symbols: Iterable[str]) -> Tuple[Dict[str, float], List[str]]:
+        """
+        Splits symbols into cached hits and misses.
+
+        Returns (hits, misses): hits maps symbol -> pct_change, misses lists the
+        symbols that still need fetching (deduplicated, input order kept).
+        """
+        hits = {}
+        misses = []
+        with self._lock:
+            for sym in dict.fromkeys(symbols):
+                entry = self._cache.get(sym)
+                if entry is None:
+                    misses.append(sym)
+                else:
+                    hits[sym] = entry[0]
+        return hits, misses
+
+    def set_many(self, pct_changes: Dict[str, float], fetched_at: Optional[float] = None,
+                 ttl: Optional[float] = None):
+        """
+        Stores % changes fetched at `fetched_at` (epoch seconds, default now);
+        None values are skipped.
+        """
+        if fetched_at is None:
+            fetched_at = time.time()
+        expires_at = QuoteCache._expires_at(fetched_at, ttl)
+        with self._lock:
+            stored = False
+            for sym, pct in pct_changes.items():
+                if pct is not None:
+                    self._cache[sym] = (pct, fetched_at, expires_at)
+                    stored = True
+            if stored:
+                self._stores += 1
+
+    def epoch(self) -> Tuple[int, int]:
+        """
+        Identifies the current quote snapshot for results derived from it
+        (see pnl_cache): changes whenever new quotes are stored, and every
+        market-hours TTL window since cached quotes expire that often. Outside
+        market hours the window is pinned to the next open.
+        """
+        current_dt = get_current_ist_time()
+        if is_market_open(current_dt):
+            window = int(time.time() // settings.QUOTE_CACHE_MARKET_TTL_SECONDS)
+        else:
+            window = int(get_next_market_open(current_dt).timestamp())
+        return self._stores, window
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+quote_cache = QuoteCache()
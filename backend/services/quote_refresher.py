@@ -0,0 +1,223 @@
+"""
+Quote Refresher - Keeps the live quote cache warm during market hours.
+
+A daemon thread in every uvicorn worker. Each tick, workers compete for a
+Mongo lease in `scheduler_locks`; only the holder (leader) polls quotes:
+
+- Leader: refreshes the distinct symbol universe across the `holdings`
+  collection through Fyers bulk quotes (50-symbol batches), writes the
+  result into its quote_cache and publishes it to `quote_snapshots`. With
+  QUOTE_STREAM_ENABLED it keeps the Fyers data socket subscribed to the
+  universe instead and publishes the latest-tick table (services.quote_stream),
+  falling back to REST polling only while the socket is down.
+- Followers: copy the latest published snapshot into their own quote_cache.
+
+Request handlers then read quotes from memory; they only fetch symbols the
+refresher could not price. Outside market hours the thread sleeps until the
+next open.
+"""
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import List, Optional
+
+from core.config import settings
+from db import holdings_collection, scheduler_locks_collection, quote_snapshots_collection
+from services.fyers_service import fyers_service
+from services.quote_cache import quote_cache
+from services.quote_stream import quote_stream
+from utils.mongo_lease import acquire_lease, release_lease
+from utils.date_utils import (
+    get_current_ist_time,
+    get_next_market_open,
+    is_trading_day,
+    MARKET_OPEN_TIME,
+    MARKET_CLOSE_TIME,
+)
+from core.logging import get_logger
+
+logger = get_logger("QuoteRefresher")
+
+LEASE_NAME = "quote_refresher"
+SNAPSHOT_ID = "live_quotes"
+
+# The symbol universe changes only on upload/delete; no need to re-run the
+# distinct() every poll.
+UNIVERSE_REFRESH_SECONDS = 300
+
+# Upper bound on a single off-hours sleep, so config/clock changes are picked up.
+_MAX_IDLE_SLEEP_SECONDS = 300
+
+
+def _in_market_window(current_dt) -> bool:
+    return is_trading_day(current_dt) and MARKET_OPEN_TIME <= current_dt.time() <= MARKET_CLOSE_TIME
+
+
+class QuoteRefresher:
+    """In-process scheduler; one leader across workers via a Mongo lease."""
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._universe: List[str] = []
+        self._universe_loaded_at = 0.0
+        self._last_snapshot_at: Optional[datetime] = None
+
+    @staticmethod
+    def _interval() -> float:
+        return settings.QUOTE_REFRESH_INTERVAL_SECONDS
+
+    @staticmethod
+    def _quote_ttl() -> float:
+        # Keep each poll's quotes until the next poll lands, plus some slack.
+        return settings.QUOTE_REFRESH_INTERVAL_SECONDS + settings.QUOTE_REFRESH_JITTER_SECONDS + 5
+
+    @staticmethod
+    def _lease_seconds() -> float:
+        # A leader that misses a few polls (crash, long Fyers call) loses the lease.
+        return max(3 * settings.QUOTE_REFRESH_INTERVAL_SECONDS, 30)
+
+    # ==================== LEADER LEASE ====================
+
+    def _acquire_lease(self) -> bool:
+        return acquire_lease(scheduler_locks_collection, LEASE_NAME, self.owner, self._lease_seconds())
+
+    def _release_lease(self):
+        release_lease(scheduler_locks_collection, LEASE_NAME, self.owner)
+
+    # ==================== LEADER WORK ====================
+
+    def _get_universe(self) -> List[str]:
+        """Distinct holding symbols across all funds of all users."""
+        if self._universe and time.time() - self._universe_loaded_at < UNIVERSE_REFRESH_SECONDS:
+            return self._universe
+        try:
+            symbols = holdings_collection.distinct("holdings.Symbol")
+            self._universe = sorted({s for s in symbols if isinstance(s, str) and s})
+            self._universe_loaded_at = time.time()
+        except Exception as e:
+            logger.warning(f"Could not load symbol universe: {e}")
+        return self._universe
+
+    def _refresh(self) -> int:
+        """Polls quotes for the whole universe and publishes them. Returns count priced."""
+        universe = self._get_universe()
+        if not universe:
+            return 0
+
+        start_time = time.time()
+        if settings.QUOTE_STREAM_ENABLED and quote_stream.sync(universe):
+            source = "stream"
+            valid = quote_stream.snapshot()
+        elif not fyers_service.is_authenticated():
+            logger.debug("Quote refresh skipped: Fyers not authenticated")
+            return 0
+        else:
+            source = "REST"
+            quotes = fyers_service.get_bulk_quotes_pct_change(universe)
+            valid = {sym: pct for sym, pct in quotes.items() if pct is not None}
+        fetched_at = time.time()
+        quote_cache.set_many(valid, fetched_at=fetched_at, ttl=self._quote_ttl())
+
+        try:
+            # Symbols may contain '.', so store pairs rather than a symbol-keyed map.
+            quote_snapshots_collection.replace_one(
+                {"_id": SNAPSHOT_ID},
+                {
+                    "_id": SNAPSHOT_ID,
+                    "quotes": [[sym, pct] for sym, pct in valid.items()],
+                    "fetched_at": datetime.utcfromtimestamp(fetched_at),
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            logger.warning(f"Could not publish quote snapshot: {e}")
+
+        logger.info(
+            f"Refreshed {len(valid)}/{len(universe)} quotes ({source}) in {time.time() - start_time:.2f}s"
+        )
+        return len(valid)
+
+    # ==================== FOLLOWER WORK ====================
+
+    def _pull_snapshot(self) -> int:
+        """Copies the leader's latest snapshot into this worker's cache."""
+        try:
+            snap = quote_snapshots_collection.find_one({"_id": SNAPSHOT_ID})
+        except Exception as e:
+            logger.debug(f"Could not read quote snapshot: {e}")
+            return 0
+        if not snap or not snap.get("fetched_at") or snap["fetched_at"] == self._last_snapshot_at:
+            return 0
+
+        self._last_snapshot_at = snap["fetched_at"]
+        fetched_at = (snap["fetched_at"] - datetime(1970, 1, 1)).total_seconds()
+        quotes = {sym: pct for sym, pct in snap.get("quotes") or []}
+        # TTL counts from the leader's fetch time, so a stale snapshot from a
+        # dead leader expires instead of being served indefinitely.
+        quote_cache.set_many(quotes, fetched_at=fetched_at, ttl=self._quote_ttl())
+        return len(quotes)
+
+    # ==================== SCHEDULER ====================
+
+    def tick(self, current_dt=None) -> Optional[str]:
+        """
+        Runs one scheduling step. Returns "leader", "follower", or None when
+        outside market hours.
+        """
+        current_dt = current_dt or get_current_ist_time()
+        if not _in_market_window(current_dt):
+            quote_stream.stop()
+            return None
+        if self._acquire_lease():
+            self._refresh()
+            return "leader"
+        # Only the leader holds the socket
+        quote_stream.stop()
+        self._pull_snapshot()
+        return "follower"
+
+    def _next_wait(self, current_dt) -> float:
+        if _in_market_window(current_dt):
+            return self._interval() + random.uniform(0, settings.QUOTE_REFRESH_JITTER_SECONDS)
+        until_open = (get_next_market_open(current_dt) - current_dt).total_seconds()
+        return min(max(until_open, 1), _MAX_IDLE_SLEEP_SECONDS)
+
+    def _run(self):
+        logger.info(f"Quote refresher started ({self.owner})")
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("Quote refresher tick failed")
+            try:
+                wait = self._next_wait(get_current_ist_time())
+            except Exception:
+                wait = self._interval()
+            self._stop.wait(wait)
+        quote_stream.stop()
+        self._release_lease()
+        logger.info("Quote refresher stopped")
+
+    def start(self):
+        if not settings.QUOTE_REFRESH_ENABLED:
+            logger.info("Quote refresher disabled")
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="quote-refresher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+quote_refresher = QuoteRefresher()
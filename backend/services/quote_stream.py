@@ -0,0 +1,266 @@
+"""
+Quote Stream - Live % changes pushed over the Fyers market-data socket.
+
+Optional (QUOTE_STREAM_ENABLED). The quote refresher's leader subscribes the
+socket to the distinct symbol universe across all holdings and re-syncs the
+subscription each poll (subscribe added / unsubscribe removed symbols).
+Every tick updates an in-memory latest-tick table keyed by the holdings
+symbol, so while the socket is up:
+
+- live P&L reads quotes from the table (no REST call for ticking symbols);
+- the refresher publishes the table as its snapshot instead of polling the
+  REST quotes endpoint in 50-symbol batches.
+
+Ticks are the Fyers SymbolUpdate messages ({"symbol": "NSE:RELIANCE-EQ",
+"ltp", "prev_close_price", "chp", ...}). QUOTE_STREAM_URL=tcp://host:port
+swaps the Fyers socket for a plain TCP feed of the same messages, one JSON
+object per line (local development and tests).
+"""
+import json
+import socket
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from core.config import settings
+from services.fyers_service import fyers_service
+from utils.weight_vector import fyers_symbol_for
+from core.logging import get_logger
+
+logger = get_logger("QuoteStream")
+
+
+def _tick_pct(tick: dict) -> Optional[float]:
+    """% change of a SymbolUpdate tick: chp, else from ltp / prev_close_price."""
+    pct = tick.get("chp")
+    if pct is not None:
+        return float(pct)
+    ltp, prev = tick.get("ltp"), tick.get("prev_close_price")
+    if ltp is None or not prev:
+        return None
+    return (float(ltp) - float(prev)) / float(prev) * 100
+
+
+class _FyersSocket:
+    """Fyers data socket (fyers_apiv3 FyersDataSocket), SymbolUpdate ticks."""
+
+    def __init__(self, on_message: Callable[[dict], None], on_close: Callable[[], None]):
+        from fyers_apiv3.FyersWebsocket import data_ws
+
+        self._symbols: List[str] = []
+        self.alive = False      # opened and not closed; the handshake may still be running
+        self.connected = False  # subscribed and receiving ticks
+        self._on_close_cb = on_close
+        self._socket = data_ws.FyersDataSocket(
+            access_token=f"{fyers_service.app_id}:{fyers_service._access_token}",
+            litemode=False,
+            write_to_file=False,
+            # Reconnects are the refresher's next sync(), not the SDK's own loop
+            reconnect=False,
+            on_connect=self._on_connect,
+            on_close=self._on_close,
+            on_error=lambda msg: logger.warning(f"Fyers socket error: {msg}"),
+            on_message=on_message,
+        )
+
+    def _on_connect(self):
+        self.connected = True
+        if self._symbols:
+            self._socket.subscribe(symbols=self._symbols, data_type="SymbolUpdate")
+
+    def _on_close(self, message):
+        self.alive = self.connected = False
+        logger.info(f"Fyers socket closed: {message}")
+        self._on_close_cb()
+
+    def open(self, symbols: List[str]):
+        self._symbols = list(symbols)
+        self.alive = True
+        self._socket.connect()
+
+    def subscribe(self, symbols: List[str]):
+        self._symbols.extend(symbols)
+        if self.connected:
+            self._socket.subscribe(symbols=symbols, data_type="SymbolUpdate")
+
+    def unsubscribe(self, symbols: List[str]):
+        gone = set(symbols)
+        self._symbols = [s for s in self._symbols if s not in gone]
+        if self.connected:
+            self._socket.unsubscribe(symbols=symbols, data_type="SymbolUpdate")
+
+    def close(self):
+        self.alive = self.connected = False
+        try:
+            self._socket.close_connection()
+        except Exception as e:
+            logger.debug(f"Fyers socket close failed: {e}")
+
+
+class _JsonLineSocket:
+    """Same ticks over plain TCP, one JSON object per line."""
+
+    def __init__(self, url: str, on_message: Callable[[dict], None], on_close: Callable[[], None]):
+        parts = urlsplit(url)
+        self._address = (parts.hostname, parts.port)
+        self._on_message = on_message
+        self._on_close = on_close
+        self._sock: Optional[socket.socket] = None
+        self._send_lock = threading.Lock()
+        self.alive = self.connected = False
+
+    def _send(self, message: dict):
+        with self._send_lock:
+            self._sock.sendall((json.dumps(message) + "\n").encode())
+
+    def _read(self, sock: socket.socket):
+        try:
+            with sock.makefile("r", encoding="utf-8") as lines:
+                for line in lines:
+                    if line.strip():
+                        self._on_message(json.loads(line))
+        except (OSError, ValueError) as e:
+            logger.debug(f"Quote feed read ended: {e}")
+        finally:
+            self.alive = self.connected = False
+            self._on_close()
+
+    def open(self, symbols: List[str]):
+        self._sock = socket.create_connection(self._address, timeout=10)
+        self._sock.settimeout(None)
+        self.alive = self.connected = True
+        self._send({"type": "subscribe", "symbols": list(symbols)})
+        threading.Thread(target=self._read, args=(self._sock,), name="quote-feed", daemon=True).start()
+
+    def subscribe(self, symbols: List[str]):
+        self._send({"type": "subscribe", "symbols": list(symbols)})
+
+    def unsubscribe(self, symbols: List[str]):
+        self._send({"type": "unsubscribe", "symbols": list(symbols)})
+
+    def close(self):
+        self.alive = self.connected = False
+        if self._sock:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+
+
+class QuoteStream:
+    """Latest-tick table fed by the market-data socket."""
+
+    def __init__(self, url: Optional[str] = None):
+        self._url = url
+        self._lock = threading.Lock()
+        self._ticks: Dict[str, Tuple[float, float]] = {}  # holdings symbol -> (pct, received_at)
+        self._holding_for: Dict[str, str] = {}            # subscribed socket symbol -> holdings symbol
+        self._transport = None
+
+    # ==================== TABLE ====================
+
+    def is_live(self) -> bool:
+        transport = self._transport
+        return bool(transport and transport.connected)
+
+    def get_many(self, symbols: Iterable[str]) -> Tuple[Dict[str, float], List[str]]:
+        """
+        (hits, misses) like QuoteCache.get_many: the latest tick for each
+        symbol while the socket is up; everything is a miss when it is down.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        if not self.is_live():
+            return {}, symbols
+        hits, misses = {}, []
+        with self._lock:
+            for sym in symbols:
+                tick = self._ticks.get(sym)
+                if tick is None:
+                    misses.append(sym)
+                else:
+                    hits[sym] = tick[0]
+        return hits, misses
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {sym: tick[0] for sym, tick in self._ticks.items()}
+
+    def _on_message(self, message):
+        ticks = message if isinstance(message, list) else [message]
+        now = time.time()
+        with self._lock:
+            for tick in ticks:
+                if not isinstance(tick, dict):
+                    continue
+                holding = self._holding_for.get(tick.get("symbol"))
+                pct = _tick_pct(tick) if holding else None
+                if pct is not None:
+                    self._ticks[holding] = (pct, now)
+
+    def _on_close(self):
+        with self._lock:
+            self._ticks.clear()
+
+    # ==================== SUBSCRIPTION ====================
+
+    def _new_transport(self):
+        url = self._url if self._url is not None else settings.QUOTE_STREAM_URL
+        if url.startswith("tcp://"):
+            return _JsonLineSocket(url, self._on_message, self._on_close)
+        if not fyers_service.is_authenticated():
+            return None
+        return _FyersSocket(self._on_message, self._on_close)
+
+    def sync(self, universe: Iterable[str]) -> bool:
+        """
+        Subscribes the socket to exactly the symbols in universe, opening it
+        if needed. Returns whether the stream is live afterwards.
+        """
+        wanted = {fyers_symbol_for(s): s for s in universe if s}
+        if not wanted:
+            return self.is_live()
+
+        if self._transport is None or not self._transport.alive:
+            self.stop()
+            transport = self._new_transport()
+            if transport is None:
+                return False
+            with self._lock:
+                self._holding_for = wanted
+            try:
+                transport.open(list(wanted))
+            except Exception as e:
+                logger.warning(f"Quote stream connect failed: {e}")
+                return False
+            self._transport = transport
+            logger.info(f"Quote stream subscribed to {len(wanted)} symbols")
+            return self.is_live()
+
+        with self._lock:
+            current = self._holding_for
+            added = [s for s in wanted if s not in current]
+            removed = [s for s in current if s not in wanted]
+            self._holding_for = wanted
+            for s in removed:
+                self._ticks.pop(current[s], None)
+        try:
+            if removed:
+                self._transport.unsubscribe(removed)
+            if added:
+                self._transport.subscribe(added)
+        except Exception as e:
+            logger.warning(f"Quote stream resubscribe failed: {e}")
+        return self.is_live()
+
+    def stop(self):
+        transport, self._transport = self._transport, None
+        if transport is not None:
+            transport.close()
+            logger.info("Quote stream closed")
+        with self._lock:
+            self._ticks.clear()
+
+
+quote_stream = QuoteStream()
@@ -0,0 +1,221 @@
+"""
+SIP Batch - Nightly sweep of every SIP fund, off the request path.
+
+Once a day (settings.SIP_BATCH_TIME, IST, after AMFI publishes NAVs) one
+worker, chosen by a Mongo lease, runs a single cursor over all SIP funds and:
+
+- adds this month's PENDING installment where the SIP day has passed
+- allocates units to PAID installments still waiting for a NAV, fetching
+  each scheme's NAV history once however many funds/installments need it
+
+The sweep reads each fund's sip_totals rather than its installments; only
+funds with NAVs pending (or no stored totals yet) have their installments
+loaded, in one extra query. Updates push or arrayFilter-set single
+installments and move the totals by $inc (utils.sip_totals).
+
+Changes go out in one unordered bulk_write. Each update is guarded by the
+document's `version`, so a user's SIP action landing mid-sweep is never
+overwritten; that fund is simply picked up by the next run. Reads only show
+a due installment (NavService._with_due_sip_installment) and never write.
+"""
+import os
+import socket
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone
+from typing import Optional
+
+from pymongo import UpdateOne
+
+from core.config import settings
+from db import holdings_collection, scheduler_locks_collection
+from services.holdings_service import HoldingsService
+from services.nav_service import nav_service
+from services.pnl_cache import pnl_cache
+from utils.sip_totals import installment_update
+from utils.date_utils import IST, get_current_ist_time
+from utils.mongo_lease import acquire_lease, release_lease
+from core.logging import get_logger
+
+logger = get_logger("SipBatch")
+
+LEASE_NAME = "sip_batch"
+STATE_ID = "sip_batch_state"
+
+# Fields due_sip_installment reads; installments are loaded only where needed
+SIP_BATCH_PROJECTION = {
+    "investment_type": 1, "scheme_code": 1, "sip_day": 1, "sip_amount": 1,
+    "current_sip_amount": 1, "sip_totals": 1, "version": 1,
+}
+
+# Long enough for a full sweep; a crashed leader's lease still expires
+_LEASE_SECONDS = 30 * 60
+# How often a worker checks whether a run is due
+_CHECK_INTERVAL_SECONDS = 300
+
+
+def _run_time() -> time:
+    hour, minute = settings.SIP_BATCH_TIME.split(":")
+    return time(int(hour), int(minute))
+
+
+def _to_utc_naive(dt: datetime) -> datetime:
+    # pymongo stores and returns naive UTC datetimes
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class SipBatchJob:
+    """Daily scheduler; one runner across workers via a Mongo lease."""
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ==================== SCHEDULE ====================
+
+    @staticmethod
+    def _last_slot(current_dt) -> datetime:
+        """The most recent scheduled run time at or before current_dt (IST)."""
+        day = current_dt.date()
+        if current_dt.time() < _run_time():
+            day -= timedelta(days=1)
+        return IST.localize(datetime.combine(day, _run_time()))
+
+    @staticmethod
+    def _last_completed_at() -> Optional[datetime]:
+        try:
+            state = scheduler_locks_collection.find_one({"_id": STATE_ID})
+        except Exception as e:
+            logger.warning(f"Could not read SIP batch state: {e}")
+            return None
+        return state.get("completed_at") if state else None
+
+    def is_due(self, current_dt=None) -> bool:
+        current_dt = current_dt or get_current_ist_time()
+        completed_at = self._last_completed_at()
+        return completed_at is None or completed_at < _to_utc_naive(self._last_slot(current_dt))
+
+    # ==================== SWEEP ====================
+
+    def run_once(self, today=None) -> dict:
+        """Sweeps all SIP funds once. Returns counts for logging/tests."""
+        today = today or get_current_ist_time().date()
+        stats = {"funds": 0, "added": 0, "resolved": 0, "written": 0, "skipped": 0}
+
+        # Pass 1: one cursor over the small projection
+        docs = list(holdings_collection.find({"investment_type": "sip"}, SIP_BATCH_PROJECTION))
+        stats["funds"] = len(docs)
+        need_installments = [
+            doc["_id"] for doc in docs
+            if doc.get("sip_totals") is None or doc["sip_totals"].get("pending_nav_count")
+        ]
+        if need_installments:
+            installments = {
+                row["_id"]: row.get("sip_installments", [])
+                for row in holdings_collection.find({"_id": {"$in": need_installments}}, {"sip_installments": 1})
+            }
+            for doc in docs:
+                if doc["_id"] in installments:
+                    doc["sip_installments"] = installments[doc["_id"]]
+
+        # Keep only funds with something to do
+        candidates = []  # (doc, due installment or None)
+        pending_by_scheme = defaultdict(set)
+        for doc in docs:
+            due = HoldingsService.due_sip_installment(doc, today)
+            if due:
+                stats["added"] += 1
+            pending = HoldingsService.pending_nav_dates(doc) if doc.get("scheme_code") else []
+            if pending:
+                pending_by_scheme[str(doc["scheme_code"])].update(pending)
+            if due or pending:
+                candidates.append((doc, due))
+
+        # One NAV history per scheme, however many funds hold it
+        nav_results = {
+            code: nav_service.get_next_navs_after_dates(code, sorted(dates))
+            for code, dates in pending_by_scheme.items()
+        }
+
+        # Pass 2: build version-guarded updates
+        ops = []
+        followups = []  # Due installments of funds also resolved tonight
+        fund_ids = []
+        for doc, due in candidates:
+            version = doc.get("version")
+            allocated = HoldingsService.allocate_pending_navs(doc, nav_results.get(str(doc.get("scheme_code")), {}))
+            if allocated:
+                update, array_filters = allocated
+                ops.append(UpdateOne({"_id": doc["_id"], "version": version}, update, array_filters=array_filters))
+                version = (version or 0) + 1
+                stats["resolved"] += 1
+            if due:
+                # Pushing and arrayFilter-setting installments can't share an
+                # update, so a fund with both gets a second, later write
+                update, _ = installment_update(doc, [(None, due)], [*doc.get("sip_installments", []), due])
+                (followups if allocated else ops).append(UpdateOne({"_id": doc["_id"], "version": version}, update))
+            if allocated or due:
+                fund_ids.append(str(doc["_id"]))
+
+        for batch in (ops, followups):
+            if batch:
+                result = holdings_collection.bulk_write(batch, ordered=False)
+                stats["written"] += result.modified_count
+                stats["skipped"] += len(batch) - result.matched_count
+        for fund_id in fund_ids:
+            pnl_cache.invalidate(fund_id)
+        return stats
+
+    # ==================== SCHEDULER ====================
+
+    def tick(self, current_dt=None) -> Optional[dict]:
+        """Runs the sweep if a run is due and this worker holds the lease."""
+        current_dt = current_dt or get_current_ist_time()
+        if not self.is_due(current_dt):
+            return None
+        if not acquire_lease(scheduler_locks_collection, LEASE_NAME, self.owner, _LEASE_SECONDS):
+            return None
+        try:
+            # Another worker may have finished the run just before we got the lease
+            if not self.is_due(current_dt):
+                return None
+            stats = self.run_once(current_dt.date())
+            scheduler_locks_collection.update_one(
+                {"_id": STATE_ID},
+                {"$set": {"completed_at": datetime.utcnow(), "stats": stats}},
+                upsert=True,
+            )
+            logger.info(f"SIP batch complete: {stats}")
+            return stats
+        finally:
+            release_lease(scheduler_locks_collection, LEASE_NAME, self.owner)
+
+    def _run(self):
+        logger.info(f"SIP batch scheduler started ({self.owner})")
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("SIP batch run failed")
+            self._stop.wait(_CHECK_INTERVAL_SECONDS)
+        logger.info("SIP batch scheduler stopped")
+
+    def start(self):
+        if not settings.SIP_BATCH_ENABLED:
+            logger.info("SIP batch disabled")
+            return
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sip-batch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+sip_batch_job = SipBatchJob()
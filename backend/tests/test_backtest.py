@@ -0,0 +1,117 @@
+"""
+Backtest Tests
+
+The replay must reproduce an official NAV exactly when the fund really is its
+holdings, skip days under the coverage threshold like the live estimate, and
+read closes from the on-disk cache - one bulk download for the missing
+symbols, none at all offline.
+"""
+
+import sys
+import os
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import MagicMock
+
+import numpy as np
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+sys.modules.setdefault('db', MagicMock())
+
+from services.backtest import Backtest, replay, score
+from services.price_history import PriceHistory
+from utils.nav_series import NavSeries
+
+START = date(2025, 3, 3)
+DAYS = np.arange(START.toordinal(), START.toordinal() + 6, dtype=np.int64)
+CLOSES = {
+    "AAA": (DAYS, np.array([100.0, 101.0, 99.0, 102.0, 103.0, 101.0])),
+    "BBB": (DAYS, np.array([50.0, 50.5, 51.0, 50.0, 49.0, 49.5])),
+}
+DOC = {"_id": "f1", "scheme_code": "100", "fund_name": "Test Fund",
+       "holdings": [{"Symbol": "AAA", "Weight": 60.0}, {"Symbol": "BBB", "Weight": 40.0}]}
+
+
+def _nav_rows(ordinals, navs):
+    return [{"date": date.fromordinal(int(o)).strftime("%d-%m-%Y"), "nav": str(n)} for o, n in zip(ordinals, navs)]
+
+
+class TestBacktest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.downloader = MagicMock(side_effect=lambda symbols, start, end: {s: CLOSES[s] for s in symbols})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_exact_fund_has_zero_tracking_error(self):
+        closes = np.column_stack([CLOSES["AAA"][1], CLOSES["BBB"][1]])
+        # A fund held at constant weights moves by exactly the weighted daily change
+        navs = 10.0 * np.cumprod(np.r_[1.0, 1.0 + (closes[1:] / closes[:-1] - 1) @ np.array([0.6, 0.4])])
+        prices = PriceHistory(self.tmp.name, downloader=self.downloader)
+        backtest = Backtest(prices, nav_loader=lambda code: NavSeries(_nav_rows(DAYS, navs)))
+
+        (report,) = backtest.run([DOC], date.fromordinal(int(DAYS[1])), date.fromordinal(int(DAYS[-1])))
+        self.assertEqual((report["days"], report["estimated_days"]), (5, 5))
+        self.assertEqual(report["mean_coverage_pct"], 100.0)
+        self.assertLess(abs(report["rmse_pct"]), 1e-6)
+        self.assertEqual(report["direction_hit_rate"], 1.0)
+
+    def test_low_coverage_days_are_skipped(self):
+        closes = np.column_stack([CLOSES["AAA"][1], CLOSES["BBB"][1]])
+        closes[3, 0] = np.nan  # AAA unpriced on day 3 -> days 3 and 4 lose 60% of the weight
+        navs = np.linspace(10.0, 10.5, 6)
+        weights = np.array([0.6, 0.4])
+
+        days = replay(weights, DAYS, closes, DAYS, navs)
+        np.testing.assert_allclose(days["coverage"], [1.0, 1.0, 0.4, 0.4, 1.0])
+        self.assertEqual(np.isnan(days["estimate"]).tolist(), [False, False, True, True, False])
+        self.assertEqual(score(days)["estimated_days"], 3)
+
+        lenient = replay(weights, DAYS, closes, DAYS, navs, min_coverage=0.3)
+        self.assertFalse(np.isnan(lenient["estimate"]).any())
+        # Renormalized: BBB's move stands for the fund; raw: AAA's weight counts as 0%
+        bbb = closes[3, 1] / closes[2, 1] - 1
+        self.assertAlmostEqual(lenient["change"][2], bbb)
+        raw = replay(weights, DAYS, closes, DAYS, navs, min_coverage=0.3, renormalize=False)
+        self.assertAlmostEqual(raw["change"][2], 0.4 * bbb)
+
+    def test_closes_are_downloaded_once_and_cached(self):
+        prices = PriceHistory(self.tmp.name, downloader=self.downloader)
+        end = date.fromordinal(int(DAYS[-1]))
+        ordinals, closes = prices.matrix(["AAA", "BBB"], START, end)
+        self.assertEqual(closes.shape, (6, 2))
+        self.downloader.assert_called_once()
+        self.assertEqual(sorted(self.downloader.call_args.args[0]), ["AAA", "BBB"])
+
+        prices.matrix(["AAA", "BBB"], START, end)
+        self.downloader.assert_called_once()
+
+        offline = PriceHistory(self.tmp.name, offline=True, downloader=self.downloader)
+        ordinals, closes = offline.matrix(["AAA", "CCC"], START, end)
+        self.downloader.assert_called_once()
+        self.assertEqual(closes[:, 0].tolist(), CLOSES["AAA"][1].tolist())
+        self.assertTrue(np.isnan(closes[:, 1]).all())
+
+    def test_sweep_scores_each_setting_from_one_load(self):
+        navs = np.linspace(10.0, 10.5, 6)
+        prices = PriceHistory(self.tmp.name, offline=True)
+        prices._write("AAA", CLOSES["AAA"], (int(DAYS[0]), int(DAYS[-1])))
+        loader = MagicMock(return_value=NavSeries(_nav_rows(DAYS, navs)))
+
+        results = Backtest(prices, nav_loader=loader).sweep(
+            [DOC], START, date.fromordinal(int(DAYS[-1])), thresholds=(0.5, 0.75))
+        self.assertEqual([(r["min_coverage"], r["renormalize"]) for r in results],
+                         [(0.5, True), (0.5, False), (0.75, True), (0.75, False)])
+        loader.assert_called_once_with("100")
+        # Only AAA (60%) is cached: estimated at 50%, skipped at 75%
+        self.assertEqual([r["estimated_days"] for r in results], [5, 5, 0, 0])
+        self.assertIsNone(results[2]["mean_tracking_error_pct"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+CAS Jobs Tests
+
+A submitted PDF is parsed once: polling returns the pool's result, the same
+statement submitted again (e.g. the follow-up transactions call) reuses it,
+and parse errors surface as ValueError / an "error" status.
+"""
+
+import sys
+import os
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+sys.modules.setdefault('db', MagicMock())
+
+from core.config import settings
+from services.cas_jobs import CasJobs, CasQueueFull
+
+CAS_DATA = {"investor_info": {"name": "A"}, "folios": []}
+
+
+class TestCasJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.jobs = CasJobs(executor=self.executor)
+        self.collection = MagicMock()
+        self.collection.find_one.return_value = None
+        self.parser = MagicMock(return_value=CAS_DATA)
+        self.patches = [
+            patch('services.cas_jobs.cas_jobs_collection', self.collection),
+            patch('services.cas_jobs.parse_cas_pdf_in_worker', self.parser),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.executor.shutdown(wait=True)
+
+    def test_submit_poll_and_reuse_by_content_hash(self):
+        job_id = self.jobs.submit(b"%PDF", "pw", "u1")
+        self.assertEqual(self.jobs.parse(b"%PDF", "pw", "u1"), CAS_DATA)
+
+        status = self.jobs.status(job_id, "u1")
+        self.assertEqual(status["status"], "done")
+        self.assertEqual(status["result"], CAS_DATA)
+        self.assertIsNone(self.jobs.status(job_id, "someone-else"))
+
+        self.parser.assert_called_once_with(b"%PDF", "pw")
+        # Different password is a different parse
+        self.jobs.parse(b"%PDF", "other", "u1")
+        self.assertEqual(self.parser.call_count, 2)
+
+    def test_parse_error_and_queue_limit(self):
+        self.parser.side_effect = ValueError("Invalid password.")
+        job_id = self.jobs.submit(b"%PDF", "bad", "u1")
+        with self.assertRaises(ValueError):
+            self.jobs.parse(b"%PDF", "bad", "u1")
+        self.assertEqual(self.jobs.status(job_id, "u1"),
+                         {"job_id": job_id, "status": "error", "error": "Invalid password."})
+
+        release = threading.Event()
+        self.parser.side_effect = lambda *a: release.wait(5) and CAS_DATA
+        try:
+            with patch.object(settings, 'CAS_MAX_PENDING_JOBS', 1):
+                self.jobs.submit(b"one", "pw", "u1")
+                with self.assertRaises(CasQueueFull):
+                    self.jobs.submit(b"two", "pw", "u1")
+        finally:
+            release.set()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+CAS Service Tests
+
+The indexed CAS view must carry what the import screens need - scheme
+valuation and purchase transactions - and find a scheme by ISIN, AMFI code
+or name without walking the other folios.
+"""
+
+import sys
+import os
+import pickle
+import unittest
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace as NS
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.cas_service import CasView, cas_service
+
+
+def txn(d, amount, units, nav, description="Purchase"):
+    return NS(date=d, amount=Decimal(amount), units=Decimal(units), nav=Decimal(nav),
+              description=description, type="PURCHASE")
+
+
+CAS = NS(
+    investor_info=NS(name="Investor", email="i@example.com"),
+    statement_period=NS(from_="01-Jan-2024", to="31-Dec-2024"),
+    folios=[
+        NS(folio="123/45", amc="HDFC Mutual Fund", schemes=[
+            NS(scheme="HDFC Flexi Cap Fund - Direct Growth", isin="INF179K01UT0", amfi="118955",
+               close=Decimal("12.5"), valuation=NS(cost=Decimal("2200"), nav=Decimal("180"), value=Decimal("2250")),
+               transactions=[
+                   txn(date(2024, 2, 5), "1000", "5.5", "181.8"),
+                   txn(date(2024, 1, 5), "1000", "5.7", "175.4"),
+                   txn(date(2024, 3, 1), "-500", "-2.7", "185.0", "Redemption"),
+               ]),
+        ]),
+        NS(folio="999", amc="SBI Mutual Fund", schemes=[
+            NS(scheme="SBI Bluechip Fund - Direct Growth", isin="INF200K01QX4", amfi="119598",
+               close=None, valuation=None, transactions=[]),
+        ]),
+    ],
+)
+
+
+class TestCasView(unittest.TestCase):
+
+    def setUp(self):
+        self.view = CasView.from_cas(CAS)
+
+    def test_schemes_and_investor_info(self):
+        schemes = cas_service.extract_schemes(self.view)
+        self.assertEqual([s["amfi"] for s in schemes], ["118955", "119598"])
+        self.assertEqual(schemes[0]["transaction_count"], 2)
+        self.assertEqual(schemes[0]["total_transactions"], 3)
+        self.assertEqual(schemes[0]["cost_value"], 2200.0)
+        self.assertIsNone(schemes[1]["close_units"])
+
+        info = cas_service.get_investor_info(self.view)
+        self.assertEqual((info["name"], info["period_from"]), ("Investor", "01-Jan-2024"))
+
+    def test_transactions_by_isin_amfi_and_name(self):
+        by_isin = cas_service.extract_transactions_for_scheme(self.view, isin_filter="inf179k01ut0")
+        self.assertEqual([t["date"] for t in by_isin["transactions"]], ["05-01-2024", "05-02-2024"])
+        self.assertEqual(by_isin["transactions"][0]["amount"], 1000.0)
+        self.assertEqual(by_isin["close_units"], 12.5)
+
+        by_amfi = cas_service.extract_transactions_for_scheme(self.view, amfi_filter="118955")
+        self.assertEqual(by_amfi["transactions"], by_isin["transactions"])
+
+        by_name = cas_service.extract_transactions_for_scheme(self.view, scheme_filter="bluechip")
+        self.assertEqual(by_name["transactions"], [])
+
+    def test_round_trips_through_dict_and_pickle(self):
+        for copy in (CasView.from_dict(self.view.to_dict()), pickle.loads(pickle.dumps(self.view))):
+            self.assertEqual(cas_service.extract_schemes(copy), cas_service.extract_schemes(self.view))
+            self.assertEqual(len(copy.by_isin("INF200K01QX4")), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
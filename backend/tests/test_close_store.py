@@ -0,0 +1,182 @@
+"""
+Close Store Tests
+
+The daily fill tops up the disk cache for the whole symbol universe with one
+bulk download (only the new days after the first fill) in the worker holding
+the lease, while the others only load from disk. Symbols a batch returns
+nothing for are not marked covered, so the next fill asks for them again. Historical D-1 estimation
+reads its percent changes from memory, going to Fyers only for symbols the
+store cannot price.
+"""
+
+import sys
+import os
+import tempfile
+import threading
+import unittest
+from datetime import date, timedelta
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+sys.modules.setdefault('services.fyers_service', MagicMock())
+sys.modules.setdefault('db', MagicMock())
+
+from services.close_store import CloseStore
+from services.nav_service import NavService
+from services.price_history import PriceHistory
+from utils.weight_vector import WeightVector
+
+TODAY = date(2025, 3, 10)
+# Mon 3rd .. Fri 7th; BBB did not trade on the 6th
+DAYS = [date(2025, 3, d).toordinal() for d in (3, 4, 5, 6, 7)]
+CLOSES = {
+    "AAA": (np.array(DAYS), np.array([100.0, 102.0, 101.0, 103.02, 100.0])),
+    "BBB": (np.array([DAYS[0], DAYS[1], DAYS[2], DAYS[4]]), np.array([50.0, 50.0, 49.0, 49.98])),
+}
+
+
+def _download(symbols, start, end):
+    lo, hi = start.toordinal(), end.toordinal()
+    result = {}
+    for s in symbols:
+        if s in CLOSES:
+            o, c = CLOSES[s]
+            keep = (o >= lo) & (o <= hi)
+            result[s] = (o[keep], c[keep])
+    return result
+
+
+class TestCloseStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.downloader = MagicMock(side_effect=_download)
+        self.holdings = MagicMock()
+        self.holdings.distinct.return_value = ["AAA", "BBB", "NODATA", None]
+        self.leader = MagicMock(return_value=True)
+        self.patches = [
+            patch('services.close_store.holdings_collection', self.holdings),
+            patch('services.close_store.acquire_lease', self.leader),
+            patch('services.close_store.release_lease'),
+        ]
+        for p in self.patches:
+            p.start()
+        self.store = CloseStore(PriceHistory(self.tmp.name, downloader=self.downloader))
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.tmp.cleanup()
+
+    def test_pct_changes_from_memory(self):
+        self.assertEqual(self.store.fill(TODAY), 2)
+        self.downloader.assert_called_once()
+        self.assertEqual(sorted(self.downloader.call_args.args[0]), ["AAA", "BBB", "NODATA"])
+
+        pct = self.store.pct_changes(["AAA", "BBB", "NODATA", "NEW"], date(2025, 3, 6))
+        self.assertAlmostEqual(pct["AAA"], 2.0)
+        self.assertEqual([pct["BBB"], pct["NODATA"], pct["NEW"]], [None, None, None])
+
+        # BBB's previous close is its last trade (5th), not the missed session
+        pct = self.store.pct_changes(["AAA", "BBB"], date(2025, 3, 7))
+        self.assertAlmostEqual(pct["BBB"], 2.0)
+        # No session on the target day, or nothing before it
+        self.assertIsNone(self.store.pct_changes(["AAA"], date(2025, 3, 8))["AAA"])
+        self.assertIsNone(self.store.pct_changes(["AAA"], date(2025, 3, 3))["AAA"])
+
+    def test_fill_once_a_day_and_only_new_days(self):
+        self.holdings.distinct.return_value = ["AAA", "BBB"]
+        self.store.fill(TODAY)
+        self.assertEqual(self.store.fill(TODAY), 0)
+        self.downloader.assert_called_once()
+
+        self.store.fill(TODAY + timedelta(days=1))
+        self.assertEqual(self.downloader.call_count, 2)
+        self.assertEqual(self.downloader.call_args.args[1], TODAY)
+
+    def test_symbols_missing_from_a_batch_are_retried(self):
+        # BBB fails inside an otherwise good batch (as do NODATA's lookups)
+        self.downloader.side_effect = lambda symbols, start, end: _download(
+            [s for s in symbols if s != "BBB"], start, end)
+        self.assertEqual(self.store.fill(TODAY), 1)
+        self.assertIsNone(self.store.pct_changes(["BBB"], date(2025, 3, 7))["BBB"])
+
+        # Not marked covered, so the next fill asks for its whole window again
+        self.downloader.side_effect = _download
+        self.assertEqual(self.store.fill(TODAY + timedelta(days=1)), 2)
+        self.assertEqual(sorted(self.downloader.call_args.args[0]), ["AAA", "BBB", "NODATA"])
+        self.assertEqual(self.downloader.call_args.args[1], TODAY - timedelta(days=45))
+        self.assertAlmostEqual(self.store.pct_changes(["BBB"], date(2025, 3, 7))["BBB"], 2.0)
+
+    def test_failed_download_is_retried(self):
+        self.downloader.side_effect = RuntimeError("down")
+        self.assertEqual(self.store.fill(TODAY), 0)
+        self.assertIsNone(self.store.filled_on)
+
+        self.downloader.side_effect = _download
+        self.assertEqual(self.store.fill(TODAY), 2)
+        self.assertEqual(self.downloader.call_args.args[1], TODAY - timedelta(days=46))
+
+    def test_followers_only_load_from_disk(self):
+        self.leader.return_value = False
+        follower = self.store
+        self.assertEqual(follower.fill(TODAY), 0)
+        self.downloader.assert_not_called()
+        self.assertIsNone(follower.filled_on)
+
+        # Once the lease holder has filled the disk, the follower loads it
+        self.leader.return_value = True
+        CloseStore(PriceHistory(self.tmp.name, downloader=self.downloader)).fill(TODAY)
+        self.leader.return_value = False
+        self.assertEqual(follower.fill(TODAY), 2)
+        self.assertEqual(follower.filled_on, TODAY)
+        self.downloader.assert_called_once()
+        self.assertAlmostEqual(follower.pct_changes(["AAA"], date(2025, 3, 6))["AAA"], 2.0)
+
+    def test_concurrent_writers_use_own_temp_files(self):
+        prices = PriceHistory(self.tmp.name)
+        series = CLOSES["AAA"]
+        errors = []
+
+        def write():
+            try:
+                for _ in range(20):
+                    prices._write("AAA", series, (DAYS[0], DAYS[-1]))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(os.listdir(self.tmp.name), ["AAA.npz"])
+        np.testing.assert_array_equal(prices._read("AAA")[0][1], series[1])
+
+    def test_historical_change_uses_store_before_fyers(self):
+        self.store.fill(TODAY)
+        vector = WeightVector(["AAA", "BBB"], [0.8, 0.2])
+        fyers = MagicMock()
+        fyers.is_authenticated.return_value = True
+        fyers.get_historical_pct_changes.side_effect = lambda symbols, target: dict.fromkeys(symbols, 1.0)
+
+        with patch('services.nav_service.close_store', self.store), \
+             patch('services.nav_service.fyers_service', fyers):
+            change = NavService.get_historical_portfolio_change([], date(2025, 3, 7), vector)
+            self.assertAlmostEqual(change, (100.0 / 103.02 - 1) * 100 * 0.8 + 2.0 * 0.2)
+            fyers.get_historical_pct_changes.assert_not_called()
+
+            # 80% covered on the 6th is enough; AAA alone at 50% is not
+            vector = WeightVector(["AAA", "BBB"], [0.5, 0.5])
+            change = NavService.get_historical_portfolio_change([], date(2025, 3, 6), vector)
+            self.assertEqual(fyers.get_historical_pct_changes.call_args.args[0], ["BBB"])
+            self.assertAlmostEqual(change, 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
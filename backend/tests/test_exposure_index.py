@@ -0,0 +1,125 @@
+"""
+Exposure Index Tests
+
+Saving a fund replaces its postings in the per-user ISIN index, and the
+look-through turns the index plus fund values into value-weighted exposure
+per stock without reading any holdings document. Weights are scaled per fund
+(percents or fractions), and postings of an older format are re-indexed.
+"""
+
+import sys
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+from bson import ObjectId
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+sys.modules.setdefault('db', MagicMock())
+
+from services.exposure_index import ExposureIndex, POSTING_FORMAT
+
+F1, F2 = str(ObjectId()), str(ObjectId())
+
+INDEX = [
+    {"_id": "u:INE002A01018", "isin": "INE002A01018", "symbol": "RELIANCE", "name": "Reliance",
+     "funds": [{"fund_id": F1, "weight": 0.10}, {"fund_id": F2, "weight": 0.05}]},
+    {"_id": "u:INE467B01029", "isin": "INE467B01029", "symbol": "TCS", "name": "TCS",
+     "funds": [{"fund_id": F2, "weight": 0.20}, {"fund_id": "deleted-fund", "weight": 0.5}]},
+]
+
+
+class TestExposureIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = MagicMock()
+        self.holdings = MagicMock()
+        self.patches = [
+            patch('services.exposure_index.exposure_index_collection', self.index),
+            patch('services.exposure_index.holdings_collection', self.holdings),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_index_fund_replaces_postings(self):
+        holdings = [
+            {"ISIN": "INE002A01018", "Symbol": "RELIANCE", "Name": "Reliance", "Weight": 9.5},
+            {"ISIN": "INE002A01018", "Symbol": "RELIANCE", "Name": "Reliance", "Weight": 1.5},
+            {"ISIN": "INE467B01029", "Symbol": "TCS", "Name": "TCS", "Weight": 4.0},
+        ]
+        self.assertTrue(ExposureIndex.index_fund("u", F1, holdings))
+
+        pull = self.index.update_many.call_args.args
+        self.assertEqual(pull, ({"user_id": "u", "funds.fund_id": F1}, {"$pull": {"funds": {"fund_id": F1}}}))
+        ops = self.index.bulk_write.call_args.args[0]
+        self.assertEqual([op._filter["_id"] for op in ops], ["u:INE002A01018", "u:INE467B01029"])
+        # Percent weights stored as fractions; a repeated ISIN is one posting
+        self.assertAlmostEqual(ops[0]._doc["$push"]["funds"]["weight"], 0.095 + 0.015)
+        self.assertEqual(ops[1]._doc["$push"]["funds"], {"fund_id": F1, "weight": 0.04, "format": POSTING_FORMAT})
+
+    def test_weight_scale_is_decided_per_fund(self):
+        # Sub-1% holding of a percent fund
+        ExposureIndex.index_fund("u", F1, [
+            {"ISIN": "INE002A01018", "Symbol": "RELIANCE", "Name": "Reliance", "Weight": 0.5},
+            {"ISIN": "INE467B01029", "Symbol": "TCS", "Name": "TCS", "Weight": 60.0},
+        ])
+        ops = self.index.bulk_write.call_args.args[0]
+        self.assertEqual([op._doc["$push"]["funds"]["weight"] for op in ops], [0.005, 0.6])
+
+        # Fund stored as fractions
+        ExposureIndex.index_fund("u", F2, [
+            {"ISIN": "INE002A01018", "Symbol": "RELIANCE", "Name": "Reliance", "Weight": 0.0952},
+            {"ISIN": "INE467B01029", "Symbol": "TCS", "Name": "TCS", "Weight": 0.8438},
+        ])
+        ops = self.index.bulk_write.call_args.args[0]
+        self.assertEqual([op._doc["$push"]["funds"]["weight"] for op in ops], [0.0952, 0.8438])
+
+    def test_look_through_is_value_weighted(self):
+        self.index.find.return_value = INDEX
+        stocks = ExposureIndex.look_through("u", {F1: 1000.0, F2: 2000.0})
+
+        self.assertEqual([s["symbol"] for s in stocks], ["TCS", "RELIANCE"])
+        self.assertEqual(stocks[0]["value"], 400.0)  # deleted fund ignored
+        self.assertEqual(stocks[1]["value"], 200.0)
+        self.assertEqual(stocks[1]["fund_count"], 2)
+        self.assertAlmostEqual(stocks[1]["weight_pct"], 6.67)
+        self.assertNotIn("funds", stocks[1])
+
+        self.index.find.return_value = INDEX[:1]
+        (reliance,) = ExposureIndex.look_through("u", {F1: 1000.0, F2: 2000.0}, symbol="reliance")
+        self.assertEqual(self.index.find.call_args.args[0], {"user_id": "u", "symbol": "RELIANCE"})
+        self.assertEqual(reliance["funds"], [
+            {"fund_id": F1, "weight_pct": 10.0, "value": 100.0},
+            {"fund_id": F2, "weight_pct": 5.0, "value": 100.0},
+        ])
+
+    def _index_state(self, indexed, stale=()):
+        self.index.distinct.side_effect = lambda key, query: list(stale if "funds" in query else indexed)
+
+    def test_ensure_indexed_only_reads_missing_funds(self):
+        self._index_state([F1])
+        self.holdings.find.return_value = [{"_id": ObjectId(F2), "holdings": [
+            {"ISIN": "INE467B01029", "Symbol": "TCS", "Name": "TCS", "Weight": 20.0},
+        ]}]
+        self.assertEqual(ExposureIndex.ensure_indexed("u", [F1, F2]), 1)
+        self.assertEqual(self.holdings.find.call_args.args[0]["_id"], {"$in": [ObjectId(F2)]})
+
+        self.holdings.find.reset_mock()
+        self._index_state([F1, F2])
+        self.assertEqual(ExposureIndex.ensure_indexed("u", [F1, F2]), 0)
+        self.holdings.find.assert_not_called()
+
+        # Funds with postings of an older format are indexed again
+        self._index_state([F1, F2], stale=[F2])
+        self.assertEqual(ExposureIndex.ensure_indexed("u", [F1, F2]), 1)
+        self.assertEqual(self.holdings.find.call_args.args[0]["_id"], {"$in": [ObjectId(F2)]})
+
+
+if __name__ == '__main__':
+    unittest.main()
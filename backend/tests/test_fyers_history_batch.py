@@ -0,0 +1,100 @@
+"""
+Fyers Historical Batch Tests
+
+D-1 estimation fetches candles for all of a fund's stocks at once: the calls
+run concurrently on the history pool (NSE first, BSE only for misses), and
+every call takes a token from the shared per-second bucket.
+"""
+
+import sys
+import os
+import importlib.util
+import threading
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.rate_limit import TokenBucket
+
+# Other test modules replace services.fyers_service with a MagicMock; load the real one
+_spec = importlib.util.spec_from_file_location(
+    "fyers_service_real", os.path.join(os.path.dirname(__file__), '..', 'services', 'fyers_service.py'))
+fyers_module = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(fyers_module)
+
+TARGET = datetime(2025, 3, 7)
+
+
+def _candles(prev_close, close):
+    stamp = lambda d: int(datetime(2025, 3, d, 9, 15).timestamp())
+    return {"s": "ok", "candles": [[stamp(6), 0, 0, 0, prev_close, 0], [stamp(7), 0, 0, 0, close, 0]]}
+
+
+class TestFyersHistoryBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.service = fyers_module.FyersService.__new__(fyers_module.FyersService)
+        self.fyers = MagicMock()
+        self.patches = [
+            patch.object(fyers_module.FyersService, '_fyers', self.fyers),
+            patch.object(fyers_module.FyersService, 'is_authenticated', return_value=True),
+            patch.object(fyers_module, '_history_bucket', TokenBucket(1000)),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_batch_runs_concurrently_with_bse_fallback(self):
+        in_flight, peak, lock = [0], [0], threading.Lock()
+        responses = {
+            "NSE:AAA-EQ": _candles(100.0, 102.0),
+            "NSE:BBB-EQ": {"s": "error"},
+            "BSE:BBB-EQ": _candles(50.0, 49.0),
+            "NSE:XYZ-BE": _candles(10.0, 11.0),
+        }
+
+        def history(data):
+            with lock:
+                in_flight[0] += 1
+                peak[0] = max(peak[0], in_flight[0])
+            time.sleep(0.05)
+            with lock:
+                in_flight[0] -= 1
+            return responses.get(data["symbol"], {"s": "no_data"})
+
+        self.fyers.history.side_effect = history
+        result = self.service.get_historical_pct_changes(["AAA", "BBB", "NSE:XYZ-BE", "CCC", "AAA"], TARGET)
+
+        self.assertEqual(list(result), ["AAA", "BBB", "NSE:XYZ-BE", "CCC"])
+        self.assertAlmostEqual(result["AAA"], 2.0)
+        self.assertAlmostEqual(result["BBB"], -2.0)
+        self.assertAlmostEqual(result["NSE:XYZ-BE"], 10.0)
+        self.assertIsNone(result["CCC"])
+        called = sorted(c.args[0]["symbol"] for c in self.fyers.history.call_args_list)
+        self.assertEqual(called, ["BSE:BBB-EQ", "BSE:CCC-EQ", "NSE:AAA-EQ", "NSE:BBB-EQ", "NSE:CCC-EQ", "NSE:XYZ-BE"])
+        self.assertGreater(peak[0], 1)
+
+    def test_unauthenticated_returns_none_for_all(self):
+        with patch.object(fyers_module.FyersService, 'is_authenticated', return_value=False):
+            self.assertEqual(self.service.get_historical_pct_changes(["AAA"], TARGET), {"AAA": None})
+        self.fyers.history.assert_not_called()
+
+    def test_token_bucket_paces_calls(self):
+        bucket = TokenBucket(rate=50, capacity=2)
+        start = time.monotonic()
+        for _ in range(7):
+            bucket.acquire()
+        # 2 from the burst, then 5 at 50/s
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        self.assertFalse(bucket.acquire(timeout=0.001))
+
+
+if __name__ == '__main__':
+    unittest.main()
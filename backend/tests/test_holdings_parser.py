@@ -0,0 +1,98 @@
+"""
+Holdings Parser Tests
+
+One streaming pass over an AMC factsheet must find the scheme-name cells,
+the header row below them and the cleaned ISIN/Name/Weight columns, with
+the same header fallbacks and column scoring the pandas path used.
+"""
+
+import sys
+import os
+import unittest
+from io import BytesIO
+
+from openpyxl import Workbook
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.holdings_parser import parse_holdings_workbook, parse_rows, score_columns
+
+
+def _workbook(rows):
+    wb = Workbook()
+    ws = wb.active
+    for row in rows:
+        ws.append(list(row))
+    buf = BytesIO()
+    wb.save(buf)
+    buf.seek(0)
+    return buf
+
+
+FACTSHEET = [
+    ["SBI Mutual Fund"],
+    ["SBI Bluechip Fund - Direct Plan - Growth"],
+    [],
+    ["Name of the Instrument / Issuer", "ISIN", "Quantity", "Market value", "% to AUM"],
+    ["Equity & Equity related"],
+    ["Reliance Industries Ltd", "INE002A01018", 100, 2500.5, "9.5%"],
+    ["HDFC Bank Ltd", "ine040a01034 ", 200, 1800, 7.25],
+    ["Reliance Industries Ltd", "INE002A01018", 10, 250, 1.0],   # duplicate, dropped
+    ["Cash & Equivalents", "N/A", None, None, 2.1],              # invalid ISIN
+    ["Some Bond", "INE123B07012", 5, 10, None],                  # blank weight -> 0
+    ["Total", None, None, None, 100],
+]
+
+
+class TestHoldingsParser(unittest.TestCase):
+
+    def test_single_pass_extracts_header_title_and_columns(self):
+        f = _workbook(FACTSHEET)
+        parsed = parse_holdings_workbook(f)
+
+        self.assertEqual(parsed.header_row, 3)
+        self.assertEqual(parsed.missing_columns, [])
+        self.assertEqual(parsed.isins, ["INE002A01018", "INE040A01034", "INE123B07012"])
+        self.assertEqual(parsed.names[:2], ["Reliance Industries Ltd", "HDFC Bank Ltd"])
+        self.assertEqual(parsed.weights.tolist(), [9.5, 7.25, 0.0])
+        self.assertEqual([d["ISIN"] for d in parsed.duplicates], ["INE002A01018"])
+        self.assertEqual([d["ISIN"] for d in parsed.invalid_isins], ["N/A"])
+        self.assertIn((1, "SBI Bluechip Fund - Direct Plan - Growth"), parsed.title_cells)
+        # File is rewound for anything that still wants to read it
+        self.assertEqual(f.tell(), 0)
+
+    def test_percent_formatted_fractions_become_percents(self):
+        wb = Workbook()
+        ws = wb.active
+        ws.append(["Name of the Instrument", "ISIN", "% to Net Assets"])
+        for row in (["Reliance", "INE002A01018", 0.0952], ["HDFC Bank", "INE040A01034", 0.061],
+                    ["TCS", "INE467B01029", 0.8438]):
+            ws.append(row)
+            ws.cell(row=ws.max_row, column=3).number_format = "0.00%"
+        buf = BytesIO()
+        wb.save(buf)
+
+        parsed = parse_holdings_workbook(buf)
+        self.assertEqual([round(w, 4) for w in parsed.weights.tolist()], [9.52, 6.1, 84.38])
+
+    def test_header_fallback_and_missing_columns(self):
+        # No name column: the ISIN + weight row still wins over a later ISIN-only row
+        parsed = parse_rows([("ISIN", "Weight"), ("INE002A01018", 5), ("ISIN list",)])
+        self.assertEqual(parsed.header_row, 0)
+        self.assertEqual(parsed.names, ["Unknown"])
+
+        parsed = parse_rows([("Scheme",), ("Security Name", "ISIN Code"), ("Reliance", "INE002A01018")])
+        self.assertEqual(parsed.header_row, 1)
+        self.assertEqual(parsed.missing_columns, ["Weight (% to AUM or similar)"])
+        self.assertEqual(parsed.isins, [])
+
+        self.assertIsNone(parse_rows([("Name", "Weight"), ("Reliance", 5)]).header_row)
+
+    def test_score_columns_prefers_percent_to_aum(self):
+        cols = ["Name of the Instrument / Issuer", "ISIN", "Market value (Rs. In Lakhs)", "% to Net Assets"]
+        self.assertEqual(score_columns(cols), {0: "Name", 1: "ISIN", 3: "Weight"})
+
+
+if __name__ == '__main__':
+    unittest.main()
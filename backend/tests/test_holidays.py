@@ -9,7 +9,10 @@ import os
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.date_utils import is_nse_holiday, is_trading_day, is_market_open, get_previous_business_day
+from utils.date_utils import (
+    is_nse_holiday, is_trading_day, is_market_open, get_previous_business_day,
+    get_previous_business_days, get_next_business_day,
+)
 
 
 class TestNSEHolidays:
@@ -57,6 +60,24 @@ class TestNSEHolidays:
         prev_day = get_previous_business_day(jan_27)
         assert prev_day == date(2026, 1, 23)
 
+    def test_get_previous_business_days_in_one_lookup(self):
+        """D-1, D-2, D-3 come back most recent first, skipping weekend and holiday."""
+        # Jan 28, 2026 (Wed) -> Jan 27 (Tue), Jan 23 (Fri), Jan 22 (Thu)
+        assert get_previous_business_days(date(2026, 1, 28), 3) == [
+            date(2026, 1, 27), date(2026, 1, 23), date(2026, 1, 22)
+        ]
+
+    def test_get_next_business_day_across_year_end(self):
+        """Next business day after the last session of a year lands in the next year."""
+        # Dec 31, 2027 is a Friday -> Jan 3, 2028 (Monday)
+        assert get_next_business_day(date(2027, 12, 31)) == date(2028, 1, 3)
+
+    def test_dates_outside_preloaded_window(self):
+        """Old dates (e.g. SIP start dates) widen the calendar on demand."""
+        # Christmas 2005 was a Sunday; Dec 26, 2005 was a Monday session
+        assert get_previous_business_day(date(2005, 12, 27)) == date(2005, 12, 26)
+        assert is_trading_day(date(2005, 12, 26)) is True
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,102 @@
+"""
+ISIN Master Tests
+
+Parsing of the three symbol lists, loading stored maps without a download,
+conditional refresh (304 keeps the stored map), and backing off after an
+on-demand download fails.
+"""
+
+import sys
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+sys.modules.setdefault('db', MagicMock())
+
+from services import isin_master as isin_master_module
+from services.isin_master import IsinMaster, NSE, FYERS_NSE, BSE, _PARSERS
+
+NSE_CSV = [
+    "﻿SYMBOL,NAME OF COMPANY, SERIES, DATE OF LISTING, PAID UP VALUE, MARKET LOT, ISIN NUMBER, FACE VALUE",
+    "RELIANCE,Reliance Industries Limited,EQ,29-NOV-1995,10,1,INE002A01018,10",
+    "TCS,Tata Consultancy Services Limited,EQ,25-AUG-2004,1,1,INE467B01029,1",
+]
+FYERS_NSE_CSV = [
+    "10100000002885,RELIANCE INDUSTRIES LTD,0,1,0.05,INE002A01018,0915-1530|1815-1915:,2024-01-01,,NSE:RELIANCE-EQ,10,10,2885,RELIANCE",
+    "10100000009999,SOME SME LTD,0,1,0.05,INE999Z01011,0915-1530|1815-1915:,2024-01-01,,NSE:SOMESME-BE,10,10,9999,SOMESME",
+]
+BSE_CSV = [
+    "12000000543066,SBI CARDS,0,1,0.05,INE018E01016,0915-1530|1815-1915:,2024-01-01,,BSE:SBICARD-A,12,8,543066,SBICARD",
+]
+
+
+class TestIsinMaster(unittest.TestCase):
+
+    def setUp(self):
+        self.collection = MagicMock()
+        self.patch = patch.object(isin_master_module, 'isin_master_collection', self.collection)
+        self.patch.start()
+        self.master = IsinMaster()
+
+    def tearDown(self):
+        self.patch.stop()
+
+    def test_parsers(self):
+        self.assertEqual(dict(_PARSERS[NSE](iter(NSE_CSV))),
+                         {"INE002A01018": "RELIANCE", "INE467B01029": "TCS"})
+        # -EQ maps to the plain symbol, other series stay fully qualified
+        self.assertEqual(dict(_PARSERS[FYERS_NSE](iter(FYERS_NSE_CSV))),
+                         {"INE002A01018": "RELIANCE", "INE999Z01011": "NSE:SOMESME-BE"})
+        self.assertEqual(dict(_PARSERS[BSE](iter(BSE_CSV))), {"INE018E01016": "BSE:SBICARD-A"})
+
+    def test_stored_map_is_loaded_without_download(self):
+        self.collection.find_one.return_value = {"pairs": [["INE002A01018", "RELIANCE"]]}
+        with patch('services.isin_master._nse_session') as session:
+            mapping = self.master.get_map(NSE)
+        session.get.assert_not_called()
+        self.assertEqual(mapping, {"INE002A01018": "RELIANCE"})
+
+    def test_refresh_is_conditional(self):
+        self.collection.find_one.return_value = {"etag": '"abc"', "last_modified": "Fri, 16 Oct 2026 10:00:00 GMT"}
+        response = MagicMock(status_code=304)
+        with patch('services.isin_master.requests.get') as get:
+            get.return_value.__enter__.return_value = response
+            self.assertEqual(self.master.refresh(BSE), 0)
+        headers = get.call_args.kwargs["headers"]
+        self.assertEqual(headers["If-None-Match"], '"abc"')
+        self.collection.replace_one.assert_not_called()
+
+        response = MagicMock(status_code=200, encoding="utf-8", headers={"ETag": '"def"'})
+        response.iter_lines.return_value = iter(BSE_CSV)
+        with patch('services.isin_master.requests.get') as get:
+            get.return_value.__enter__.return_value = response
+            self.assertEqual(self.master.refresh(BSE), 1)
+        stored = self.collection.replace_one.call_args.args[1]
+        self.assertEqual(stored["pairs"], [["INE018E01016", "BSE:SBICARD-A"]])
+        self.assertEqual(stored["etag"], '"def"')
+        self.master._set(FYERS_NSE, {})
+        self.assertEqual(self.master.fallback_symbol("INE018E01016"), "BSE:SBICARD-A")
+
+    def test_failed_download_backs_off(self):
+        # Nothing stored and the download fails: five unresolved ISINs cost
+        # one attempt per source, not one per ISIN and source
+        self.collection.find_one.return_value = None
+        isins = [f"INE00000000{i}" for i in range(5)]
+        with patch('services.isin_master.requests.get', side_effect=OSError("timed out")) as get:
+            self.assertEqual(self.master.fallback_symbols(isins), {})
+            for isin in isins:
+                self.assertIsNone(self.master.fallback_symbol(isin))
+        self.assertEqual(get.call_count, 2)
+
+        # Past the backoff the next lookup tries again
+        self.master._retry_at[BSE] = 0
+        with patch('services.isin_master.requests.get', side_effect=OSError("timed out")) as get:
+            self.master.get_map(BSE)
+        self.assertEqual(get.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+NAV History Store Tests
+
+Verifies the incremental sync: stored history is served without a network
+call while fresh, and a sync only pushes rows newer than the stored latest date.
+"""
+
+import asyncio
+import sys
+import os
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# No MongoDB in unit tests
+sys.modules.setdefault('db', MagicMock())
+
+from services.nav_history_store import NavHistoryStore, SYNC_INTERVAL_SECONDS
+
+
+STORED_ROWS = [
+    {"date": "02-01-2025", "nav": "101.0"},
+    {"date": "01-01-2025", "nav": "100.0"},
+]
+
+
+def _stored_doc(synced_ago_seconds):
+    return {
+        "scheme_code": "123",
+        "meta": {"scheme_name": "Test Fund"},
+        "data": list(STORED_ROWS),
+        "latest_date": datetime(2025, 1, 2),
+        "synced_at": datetime.utcnow() - timedelta(seconds=synced_ago_seconds),
+    }
+
+
+class TestNavHistoryStore(unittest.TestCase):
+
+    def test_fresh_store_skips_network(self):
+        """A recently synced document is served straight from Mongo."""
+        coll = MagicMock()
+        coll.find_one.return_value = _stored_doc(10)
+        with patch('services.nav_history_store.nav_history_collection', coll), \
+             patch('services.nav_history_store.requests.get') as mock_get:
+            nav_data, meta, fresh = NavHistoryStore.get_history("123")
+
+        mock_get.assert_not_called()
+        self.assertTrue(fresh)
+        self.assertEqual(nav_data, STORED_ROWS)
+        self.assertEqual(meta["scheme_name"], "Test Fund")
+
+    def test_incremental_sync_pushes_only_new_rows(self):
+        """Rows at or before latest_date are ignored even if upstream returns them."""
+        coll = MagicMock()
+        coll.find_one.return_value = _stored_doc(SYNC_INTERVAL_SECONDS + 60)
+        coll.update_one.return_value.matched_count = 1
+
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            "status": "SUCCESS",
+            "meta": {"scheme_name": "Test Fund"},
+            "data": [
+                {"date": "06-01-2025", "nav": "103.0"},
+                {"date": "03-01-2025", "nav": "102.0"},
+                {"date": "02-01-2025", "nav": "101.0"},  # already stored
+            ],
+        }
+        with patch('services.nav_history_store.nav_history_collection', coll), \
+             patch('services.nav_history_store.requests.get', return_value=response) as mock_get:
+            nav_data, _, fresh = NavHistoryStore.get_history("123")
+
+        # Only asked upstream for rows after the stored latest date
+        self.assertEqual(mock_get.call_args.kwargs["params"], {"startDate": "2025-01-03"})
+
+        update_filter, update_doc = coll.update_one.call_args.args
+        self.assertEqual(update_filter["latest_date"], datetime(2025, 1, 2))
+        pushed = update_doc["$push"]["data"]
+        self.assertEqual([r["date"] for r in pushed["$each"]], ["06-01-2025", "03-01-2025"])
+        self.assertEqual(pushed["$position"], 0)
+        self.assertEqual(update_doc["$set"]["latest_date"], datetime(2025, 1, 6))
+
+        self.assertTrue(fresh)
+        self.assertEqual([r["date"] for r in nav_data],
+                         ["06-01-2025", "03-01-2025", "02-01-2025", "01-01-2025"])
+
+    def test_upstream_failure_serves_stale_store(self):
+        """If mfapi.in is down, the stored copy is returned but marked not fresh."""
+        coll = MagicMock()
+        coll.find_one.return_value = _stored_doc(SYNC_INTERVAL_SECONDS + 60)
+        with patch('services.nav_history_store.nav_history_collection', coll), \
+             patch('services.nav_history_store.requests.get', side_effect=Exception("timeout")):
+            nav_data, _, fresh = NavHistoryStore.get_history("123", retries=0)
+
+        self.assertFalse(fresh)
+        self.assertEqual(nav_data, STORED_ROWS)
+        coll.update_one.assert_not_called()
+
+    def test_async_sync_uses_pooled_client(self):
+        """aget_history follows the same incremental path over core.http."""
+        coll = MagicMock()
+        coll.find_one.return_value = _stored_doc(SYNC_INTERVAL_SECONDS + 60)
+        coll.update_one.return_value.matched_count = 1
+
+        response = MagicMock(status_code=200)
+        response.json.return_value = {
+            "status": "SUCCESS",
+            "meta": {"scheme_name": "Test Fund"},
+            "data": [{"date": "03-01-2025", "nav": "102.0"}],
+        }
+        with patch('services.nav_history_store.nav_history_collection', coll), \
+             patch('services.nav_history_store.http.get', new=AsyncMock(return_value=response)) as mock_get, \
+             patch('services.nav_history_store.requests.get') as mock_requests:
+            nav_data, _, fresh = asyncio.run(NavHistoryStore.aget_history("123"))
+
+        mock_requests.assert_not_called()
+        self.assertEqual(mock_get.call_args.kwargs["params"], {"startDate": "2025-01-03"})
+        self.assertTrue(fresh)
+        self.assertEqual([r["date"] for r in nav_data], ["03-01-2025", "02-01-2025", "01-01-2025"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+NAV Series Tests
+
+Checks the bisect lookups used for purchase-NAV and SIP unit allocation
+against a small newest-first history with a weekend gap.
+"""
+
+import sys
+import os
+import unittest
+from datetime import date
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.nav_series import NavSeries, EMPTY_SERIES
+
+
+# mfapi.in order: newest first. 04/05-01-2025 are a weekend.
+NAV_DATA = [
+    {"date": "07-01-2025", "nav": "104.00"},
+    {"date": "06-01-2025", "nav": "103.00"},
+    {"date": "03-01-2025", "nav": "102.00"},
+    {"date": "02-01-2025", "nav": "101.00"},
+    {"date": "01-01-2025", "nav": "100.00"},
+]
+
+
+class TestNavSeries(unittest.TestCase):
+
+    def setUp(self):
+        self.series = NavSeries(NAV_DATA)
+
+    def test_latest_is_newest_first(self):
+        self.assertEqual(self.series.latest(2), [(104.0, "07-01-2025"), (103.0, "06-01-2025")])
+        self.assertEqual(len(self.series.latest(50)), 5)
+
+    def test_on_or_before_weekend_uses_friday(self):
+        self.assertEqual(self.series.on_or_before(date(2025, 1, 5)), (102.0, "03-01-2025"))
+        self.assertEqual(self.series.on_or_before(date(2025, 1, 6)), (103.0, "06-01-2025"))
+        self.assertIsNone(self.series.on_or_before(date(2024, 12, 31)))
+
+    def test_on_or_after_weekend_uses_monday(self):
+        self.assertEqual(self.series.on_or_after(date(2025, 1, 4)), (103.0, "06-01-2025"))
+        self.assertEqual(self.series.on_or_after(date(2025, 1, 3)), (102.0, "03-01-2025"))
+        self.assertIsNone(self.series.on_or_after(date(2025, 1, 8)))
+
+    def test_batch_matches_single_lookups(self):
+        targets = [date(2025, 1, 1), date(2025, 1, 4), date(2025, 1, 9)]
+        self.assertEqual(self.series.on_or_after_many(targets),
+                         [self.series.on_or_after(t) for t in targets])
+
+    def test_unsorted_and_bad_rows(self):
+        """Rows are sorted on parse; malformed rows and duplicate dates are dropped."""
+        series = NavSeries([
+            {"date": "01-01-2025", "nav": "100"},
+            {"date": "bad", "nav": "1"},
+            {"date": "03-01-2025", "nav": "N.A."},
+            {"date": "02-01-2025", "nav": "101"},
+            {"date": "02-01-2025", "nav": "999"},
+        ])
+        self.assertEqual(len(series), 2)
+        self.assertEqual(series.latest(1), [(101.0, "02-01-2025")])
+
+    def test_empty_series(self):
+        self.assertFalse(EMPTY_SERIES)
+        self.assertEqual(EMPTY_SERIES.latest(5), [])
+        self.assertIsNone(EMPTY_SERIES.on_or_after(date(2025, 1, 1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
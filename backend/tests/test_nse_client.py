@@ -0,0 +1,127 @@
+"""
+NSE Client Tests
+
+The NSE fallback shares one client per process: throttling responses shrink
+its concurrency instead of sleeping, an expired cookie is refreshed by one
+thread for everyone, and a symbol NSE has no quote for stops being
+requested once its breaker opens. Callers' max_retries bound the attempts.
+"""
+
+import sys
+import os
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+sys.modules.setdefault('services.fyers_service', MagicMock())
+sys.modules.setdefault('db', MagicMock())
+
+from services.nav_service import NavService
+from services.nse_client import NseClient
+from utils.rate_limit import AdaptiveLimit
+
+
+def _response(status=200, p_change=None, content_type="application/json"):
+    r = MagicMock()
+    r.status_code = status
+    r.headers = {"Content-Type": content_type}
+    r.json.return_value = {"priceInfo": {"pChange": p_change}} if p_change is not None else {}
+    return r
+
+
+class FakeSession:
+    """Answers quote requests from a script of responses per symbol."""
+
+    def __init__(self, script, expired_cookies=0):
+        self.script = {s: list(r) for s, r in script.items()}
+        self.expired_cookies = expired_cookies  # home visits whose cookies NSE rejects
+        self.cookies = {}
+        self.home_visits = 0
+        self.quote_calls = []
+        self.lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=None):
+        if params is None:  # home page visit
+            time.sleep(0.02)
+            with self.lock:
+                self.home_visits += 1
+                self.cookies = {"nsit": str(self.home_visits)}
+            return _response()
+        sym = params["symbol"]
+        with self.lock:
+            self.quote_calls.append(sym)
+            if self.home_visits <= self.expired_cookies:
+                return _response(403)
+            responses = self.script[sym]
+            return responses.pop(0) if len(responses) > 1 else responses[0]
+
+
+class TestNseClient(unittest.TestCase):
+
+    def test_concurrent_fetch_and_single_cookie_refresh(self):
+        # The first cookies are already expired: every request in flight gets a 403
+        script = {f"S{i}": [_response(p_change=float(i))] for i in range(12)}
+        session = FakeSession(script, expired_cookies=1)
+        client = NseClient(session=session, rate=1000, max_concurrency=8)
+
+        start = time.monotonic()
+        result = client.pct_changes([*script, "S0"])
+        self.assertEqual(result, {f"S{i}": float(i) for i in range(12)})
+        self.assertLess(time.monotonic() - start, 1.0)  # no fixed sleeps
+        # One visit to get the first cookies, one refresh for all the 403s
+        self.assertEqual(session.home_visits, 2)
+
+    def test_throttling_halves_concurrency_then_recovers(self):
+        limit = AdaptiveLimit(initial=8, maximum=8)
+        rounds = [limit.acquire() for _ in range(4)]
+        for r in rounds:
+            limit.release(r, congested=True)
+        self.assertEqual(limit.limit, 4)  # one round, one decrease
+        r = limit.acquire()
+        limit.release(r, congested=True)
+        self.assertEqual(limit.limit, 2)
+        for _ in range(10):
+            limit.release(limit.acquire())
+        self.assertGreater(limit.limit, 4)
+
+        session = FakeSession({"A": [_response(429), _response(503), _response(p_change=1.5)]})
+        client = NseClient(session=session, rate=1000, max_concurrency=8)
+        client.ensure_cookies()
+        self.assertEqual(client.pct_change("A"), 1.5)
+        # 4 -> 2 -> 1 on the two failures (each retry starts a new round), +1/1 on success
+        self.assertEqual(client.concurrency.limit, 2.0)
+
+    def test_breaker_skips_symbols_without_quotes(self):
+        session = FakeSession({"GONE": [_response()], "HTML": [_response(content_type="text/html")]})
+        client = NseClient(session=session, rate=1000, max_concurrency=4)
+        client.ensure_cookies()
+
+        for _ in range(5):
+            self.assertIsNone(client.pct_change("GONE"))
+        self.assertEqual(session.quote_calls.count("GONE"), 3)
+
+        # Overload pages are throttling, not the symbol's fault
+        for _ in range(2):
+            self.assertIsNone(client.pct_change("HTML"))
+        self.assertEqual(session.quote_calls.count("HTML"), 6)
+        self.assertTrue(client._breaker_allows("HTML"))
+
+    def test_max_retries_bounds_attempts(self):
+        session = FakeSession({"SLOW": [_response(503)]})
+        client = NseClient(session=session, rate=1000, max_concurrency=4)
+        client.ensure_cookies()
+        fyers = MagicMock()
+        fyers.is_authenticated.return_value = False
+
+        with patch('services.nav_service.nse_client', client), \
+             patch('services.nav_service.fyers_service', fyers):
+            self.assertIsNone(NavService.get_live_price_change("SLOW", max_retries=1))
+        self.assertEqual(session.quote_calls, ["SLOW"])
+
+
+if __name__ == '__main__':
+    unittest.main()
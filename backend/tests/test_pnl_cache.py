@@ -0,0 +1,66 @@
+"""
+P&L Cache Tests
+
+A repeat calculate_pnl with an unchanged document version, NAV date and
+quote snapshot must be served from pnl_cache; a version bump or an explicit
+invalidation must recompute.
+"""
+
+import asyncio
+import sys
+import os
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+sys.modules.setdefault('services.fyers_service', MagicMock())
+sys.modules.setdefault('db', MagicMock())
+
+from services.nav_service import NavService
+from services.pnl_cache import PnlCache, pnl_cache
+
+
+class TestPnlCache(unittest.TestCase):
+
+    def setUp(self):
+        pnl_cache.clear()
+        self.doc = {"_id": "f1", "user_id": "u1", "scheme_code": "123", "version": 3}
+
+    def _run(self, doc, compute):
+        with patch('services.nav_service.holdings_service.get_holdings', return_value=doc), \
+             patch('services.nav_service.NavService._aget_scheme_series', new=AsyncMock()), \
+             patch('services.nav_service.NavService._aget_live_changes_for_docs',
+                   new=AsyncMock(return_value=None)), \
+             patch('services.nav_service.NavService._calculate_pnl_for_doc', compute):
+            return asyncio.run(NavService.calculate_pnl("f1", "u1"))
+
+    def test_repeat_request_is_served_from_cache(self):
+        compute = MagicMock(return_value={"current_value": 110.0})
+        first = self._run(self.doc, compute)
+        second = self._run(self.doc, compute)
+        self.assertEqual(first, second)
+        compute.assert_called_once()
+
+    def test_version_bump_recomputes(self):
+        compute = MagicMock(return_value={"current_value": 110.0})
+        self._run(self.doc, compute)
+        self._run({**self.doc, "version": 4}, compute)
+        self.assertEqual(compute.call_count, 2)
+
+    def test_invalidate_and_errors(self):
+        cache = PnlCache(ttl=60)
+        key = PnlCache.key("f1", "u1", 1, "17-10-2026", (0, 0), None)
+        cache.set(key, {"error": "NAV unavailable"})
+        self.assertIsNone(cache.get(key))
+
+        cache.set(key, {"current_value": 1.0})
+        cache.set(PnlCache.key("f2", "u1", 1, "17-10-2026", (0, 0), None), {"current_value": 2.0})
+        cache.invalidate("f1")
+        self.assertIsNone(cache.get(key))
+        self.assertIsNotNone(cache.get(PnlCache.key("f2", "u1", 1, "17-10-2026", (0, 0), None)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+"""
+Portfolio Summary Tests
+
+Verifies the batched summary: one holdings query, one quote sweep for the
+union of symbols across funds, and totals that add up the per-fund results.
+The analytics endpoint builds on the same pass: one XIRR over the merged
+cash flows, allocation by fund and look-through stock exposure.
+"""
+
+import asyncio
+import sys
+import os
+import unittest
+from datetime import datetime, time, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Mock fyers_service BEFORE importing nav_service
+sys.modules.setdefault('services.fyers_service', MagicMock())
+sys.modules.setdefault('db', MagicMock())
+
+from services.nav_service import NavService
+from services.quote_cache import quote_cache
+from services.pnl_cache import pnl_cache
+
+
+def _doc(fund_id, name, invested, symbols, invested_date=None, weight=50.0):
+    return {
+        "_id": fund_id,
+        "fund_name": name,
+        "scheme_code": "100",
+        "investment_type": "lumpsum",
+        "invested_amount": invested,
+        "invested_date": invested_date,
+        "holdings": [{"Symbol": s, "Weight": weight} for s in symbols],
+    }
+
+
+class TestPortfolioSummary(unittest.TestCase):
+
+    def setUp(self):
+        quote_cache.clear()
+        pnl_cache.clear()
+
+    def test_one_quote_sweep_for_shared_symbols(self):
+        docs = [
+            _doc("f1", "Fund One", 1000.0, ["RELIANCE", "HDFCBANK"]),
+            _doc("f2", "Fund Two", 2000.0, ["RELIANCE", "TCS"]),
+        ]
+        # Official D-1 only: live estimate needed for both funds
+        navs = [{"date": "02-01-2025", "nav": 10.0}, {"date": "01-01-2025", "nav": 9.0}]
+        now = MagicMock()
+        now.date.return_value = datetime(2025, 1, 3).date()
+        now.time.return_value = time(11, 0)
+
+        fyers = MagicMock()
+        fyers.is_authenticated.return_value = True
+        fyers.aget_bulk_quotes_pct_change = AsyncMock(
+            return_value={"RELIANCE": 1.0, "HDFCBANK": 1.0, "TCS": 1.0}
+        )
+
+        with patch('services.nav_service.holdings_service.list_holdings_docs', return_value=docs), \
+             patch('services.nav_service.holdings_service._get_stale_info',
+                   return_value={"is_stale": False, "days_since_update": 1}), \
+             patch('services.nav_service.NavService._aget_scheme_series',
+                   new=AsyncMock(return_value=(MagicMock(), None))), \
+             patch('services.nav_service.NavService.get_latest_nav', return_value=navs), \
+             patch('services.nav_service.NavService.get_nav_at_date', return_value=None), \
+             patch('services.nav_service.fyers_service', fyers), \
+             patch('services.nav_service.get_current_ist_time', return_value=now), \
+             patch('services.nav_service.is_trading_day', return_value=True), \
+             patch('services.nav_service.is_market_open', return_value=True), \
+             patch('services.nav_service.get_previous_business_days',
+                   side_effect=lambda d, n: [d - timedelta(days=i) for i in range(1, n + 1)]):
+            summary = asyncio.run(NavService.calculate_portfolio_summary("user-1"))
+
+        fyers.aget_bulk_quotes_pct_change.assert_awaited_once()
+        swept = fyers.aget_bulk_quotes_pct_change.call_args.args[0]
+        self.assertEqual(sorted(swept), ["HDFCBANK", "RELIANCE", "TCS"])
+
+        funds = summary["funds"]
+        self.assertEqual(len(funds), 2)
+        for fund in funds:
+            # +1% on every stock -> estimated NAV 10.1
+            self.assertAlmostEqual(fund["current_nav"], 10.1, places=4)
+
+        totals = summary["totals"]
+        self.assertEqual(totals["fund_count"], 2)
+        self.assertEqual(totals["invested_amount"], 3000.0)
+        self.assertAlmostEqual(totals["current_value"], sum(f["current_value"] for f in funds), places=2)
+        self.assertAlmostEqual(totals["day_pnl"], sum(f["day_pnl"] for f in funds), places=2)
+
+    def _analytics(self, docs):
+        # Official D0 available: no live estimate, NAV 10 -> 11 since purchase
+        navs = [{"date": "02-01-2025", "nav": 11.0}, {"date": "01-01-2025", "nav": 11.0}]
+        now = MagicMock()
+        now.date.return_value = datetime(2025, 1, 2).date()
+        now.time.return_value = time(20, 0)
+
+        with patch('services.nav_service.holdings_service.list_holdings_docs', return_value=docs), \
+             patch('services.nav_service.holdings_service._get_stale_info',
+                   return_value={"is_stale": False, "days_since_update": 1}), \
+             patch('services.nav_service.NavService._aget_scheme_series',
+                   new=AsyncMock(return_value=(MagicMock(), None))), \
+             patch('services.nav_service.NavService.get_latest_nav', return_value=navs), \
+             patch('services.nav_service.NavService.get_nav_at_date', return_value=[10.0, "02-01-2024"]), \
+             patch('services.nav_service.get_current_ist_time', return_value=now), \
+             patch('services.nav_service.is_trading_day', return_value=False):
+            return asyncio.run(NavService.calculate_portfolio_analytics("user-2"))
+
+    def test_analytics_merges_cash_flows_and_looks_through(self):
+        analytics = self._analytics([
+            _doc("f1", "Fund One", 1000.0, ["RELIANCE", "HDFCBANK"], "02-01-2024"),
+            _doc("f2", "Fund Two", 2000.0, ["RELIANCE", "TCS"], "02-01-2024"),
+        ])
+
+        self.assertEqual(analytics["totals"]["current_value"], 3300.0)
+        # Both funds +10% over 366 days; so is the portfolio
+        self.assertAlmostEqual(analytics["xirr"], (1.1 ** (365 / 366) - 1) * 100, places=2)
+        self.assertEqual([row["fund_id"] for row in analytics["allocation"]], ["f2", "f1"])
+        self.assertAlmostEqual(analytics["allocation"][0]["weight_pct"], 66.67)
+        self.assertAlmostEqual(analytics["allocation"][1]["xirr"], analytics["xirr"], places=2)
+
+        exposure = {row["symbol"]: row for row in analytics["exposure"]}
+        self.assertEqual(exposure["RELIANCE"]["value"], 1650.0)
+        self.assertEqual(exposure["RELIANCE"]["fund_count"], 2)
+        self.assertEqual(analytics["exposure"][0]["symbol"], "RELIANCE")
+        self.assertEqual(analytics["overlap_pct"], 50.0)
+        self.assertEqual(analytics["unclassified_pct"], 0.0)
+
+    def test_sub_one_percent_and_fraction_weights(self):
+        # Percent fund with a 0.5% holding; fraction fund (0.2 = 20%)
+        percents = _doc("f1", "Fund One", 1000.0, ["RELIANCE"], "02-01-2024", weight=50.0)
+        percents["holdings"].append({"Symbol": "HDFCBANK", "Weight": 0.5})
+        fractions = _doc("f2", "Fund Two", 1000.0, ["TCS", "INFY"], "02-01-2024", weight=0.2)
+        analytics = self._analytics([percents, fractions])
+
+        exposure = {row["symbol"]: row["value"] for row in analytics["exposure"]}
+        self.assertEqual(exposure, {"RELIANCE": 550.0, "HDFCBANK": 5.5, "TCS": 220.0, "INFY": 220.0})
+        self.assertEqual(analytics["unclassified_pct"], 54.75)
+
+
+if __name__ == '__main__':
+    unittest.main()
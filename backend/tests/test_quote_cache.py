@@ -0,0 +1,88 @@
+"""
+Quote Cache Tests
+
+Checks the market-aware TTL (seconds while open, until the next open while
+closed), that get_live_pct_changes only fetches cache misses, and that
+symbols Fyers misses are filled in from NSE however many Fyers priced.
+"""
+
+import sys
+import os
+import asyncio
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+sys.modules.setdefault('services.fyers_service', MagicMock())
+sys.modules.setdefault('db', MagicMock())
+
+from services.quote_cache import QuoteCache, quote_cache
+from services.nav_service import NavService
+from utils.date_utils import IST, get_next_market_open
+
+
+class TestQuoteCache(unittest.TestCase):
+
+    def setUp(self):
+        quote_cache.clear()
+
+    def test_market_hours_ttl_is_short(self):
+        with patch('services.quote_cache.is_market_open', return_value=True):
+            self.assertEqual(QuoteCache._expires_at(1000.0), 1005.0)
+
+    def test_closed_ttl_runs_to_next_open(self):
+        # Friday evening -> Monday 09:15
+        friday = IST.localize(datetime(2025, 1, 3, 16, 0))
+        with patch('services.quote_cache.get_current_ist_time', return_value=friday):
+            expires = QuoteCache._expires_at(friday.timestamp())
+        self.assertEqual(expires, IST.localize(datetime(2025, 1, 6, 9, 15)).timestamp())
+
+    def test_pre_open_uses_same_day_open(self):
+        morning = IST.localize(datetime(2025, 1, 6, 8, 0))
+        self.assertEqual(get_next_market_open(morning), IST.localize(datetime(2025, 1, 6, 9, 15)))
+
+    def test_none_is_not_cached(self):
+        cache = QuoteCache()
+        with patch('services.quote_cache.is_market_open', return_value=True):
+            cache.set_many({"RELIANCE": 1.5, "TCS": None})
+        hits, misses = cache.get_many(["RELIANCE", "TCS", "RELIANCE"])
+        self.assertEqual(hits, {"RELIANCE": 1.5})
+        self.assertEqual(misses, ["TCS"])
+
+    def test_live_fetch_only_covers_misses(self):
+        with patch('services.quote_cache.is_market_open', return_value=True):
+            quote_cache.set_many({"RELIANCE": 1.0})
+            with patch.object(NavService, '_fetch_live_pct_changes', return_value={"TCS": -0.5}) as fetch:
+                result = NavService.get_live_pct_changes(["RELIANCE", "TCS"])
+
+        fetch.assert_called_once_with(["TCS"])
+        self.assertEqual(result, {"RELIANCE": 1.0, "TCS": -0.5})
+
+    def test_symbols_missed_by_fyers_fall_back_to_nse(self):
+        # 3 of 4 priced by Fyers, but the miss is a 40% holding
+        unique = ["BIG", "A", "B", "NSE:C-EQ"]
+        fyers = MagicMock()
+        fyers.is_authenticated.return_value = True
+        fyers.get_bulk_quotes_pct_change.return_value = {"A": 1.0, "B": 2.0, "NSE:C-EQ": 3.0, "BIG": None}
+
+        async def abulk(symbols):
+            return fyers.get_bulk_quotes_pct_change(symbols)
+
+        async def anse(symbols):
+            return {"BIG": 0.5}
+
+        fyers.aget_bulk_quotes_pct_change = abulk
+        expected = {"A": 1.0, "B": 2.0, "NSE:C-EQ": 3.0, "BIG": 0.5}
+        with patch('services.nav_service.fyers_service', fyers), \
+                patch.object(NavService, '_fetch_nse_pct_changes', return_value={"BIG": 0.5}) as nse, \
+                patch.object(NavService, '_afetch_nse_pct_changes', side_effect=anse):
+            self.assertEqual(NavService._fetch_live_pct_changes(unique), expected)
+            self.assertEqual(asyncio.run(NavService._afetch_live_pct_changes(unique)), expected)
+        nse.assert_called_once_with(["BIG"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Quote Refresher Tests
+
+Covers the scheduler's decisions without a database: idle outside market
+hours, leader polls and publishes, follower only copies the snapshot.
+"""
+
+import sys
+import os
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+from pymongo.errors import DuplicateKeyError
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+sys.modules.setdefault('services.fyers_service', MagicMock())
+sys.modules.setdefault('db', MagicMock())
+
+from services.quote_refresher import QuoteRefresher
+from services.quote_cache import quote_cache
+from utils.date_utils import IST
+
+MARKET_DT = IST.localize(datetime(2025, 1, 6, 11, 0))  # Monday
+
+
+class TestQuoteRefresher(unittest.TestCase):
+
+    def setUp(self):
+        quote_cache.clear()
+        self.refresher = QuoteRefresher()
+        self.locks = MagicMock()
+        self.snapshots = MagicMock()
+        self.holdings = MagicMock()
+        self.fyers = MagicMock()
+        self.patches = [
+            patch('services.quote_refresher.scheduler_locks_collection', self.locks),
+            patch('services.quote_refresher.quote_snapshots_collection', self.snapshots),
+            patch('services.quote_refresher.holdings_collection', self.holdings),
+            patch('services.quote_refresher.fyers_service', self.fyers),
+            patch('services.quote_refresher.is_trading_day', return_value=True),
+            patch('services.quote_cache.is_market_open', return_value=True),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_idle_outside_market_hours(self):
+        evening = IST.localize(datetime(2025, 1, 6, 18, 0))
+        self.assertIsNone(self.refresher.tick(evening))
+        self.locks.find_one_and_update.assert_not_called()
+
+    def test_leader_refreshes_universe_and_publishes(self):
+        self.locks.find_one_and_update.return_value = {"owner": self.refresher.owner}
+        self.holdings.distinct.return_value = ["TCS", "RELIANCE", None, "TCS"]
+        self.fyers.is_authenticated.return_value = True
+        self.fyers.get_bulk_quotes_pct_change.return_value = {"RELIANCE": 1.0, "TCS": None}
+
+        self.assertEqual(self.refresher.tick(MARKET_DT), "leader")
+
+        self.fyers.get_bulk_quotes_pct_change.assert_called_once_with(["RELIANCE", "TCS"])
+        published = self.snapshots.replace_one.call_args.args[1]
+        self.assertEqual(published["quotes"], [["RELIANCE", 1.0]])
+        hits, misses = quote_cache.get_many(["RELIANCE", "TCS"])
+        self.assertEqual(hits, {"RELIANCE": 1.0})
+        self.assertEqual(misses, ["TCS"])
+
+    def test_follower_copies_snapshot_once(self):
+        self.locks.find_one_and_update.side_effect = DuplicateKeyError("held")
+        self.snapshots.find_one.return_value = {
+            "quotes": [["HDFCBANK", -0.4]],
+            "fetched_at": datetime.utcnow(),
+        }
+
+        self.assertEqual(self.refresher.tick(MARKET_DT), "follower")
+        self.fyers.get_bulk_quotes_pct_change.assert_not_called()
+        self.assertEqual(quote_cache.get_many(["HDFCBANK"])[0], {"HDFCBANK": -0.4})
+
+        # Same snapshot again: nothing re-applied
+        self.assertEqual(self.refresher._pull_snapshot(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
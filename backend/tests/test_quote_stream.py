@@ -0,0 +1,160 @@
+"""
+Quote Stream Tests
+
+Runs the streaming quotes against a local stand-in feed server (Fyers
+SymbolUpdate ticks, one JSON object per line over TCP): the subscription
+follows the symbol universe, ticks land in the latest-tick table, and live
+estimation and the refresher leader read that table with no REST calls.
+"""
+
+import sys
+import os
+import json
+import socket
+import socketserver
+import threading
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+sys.modules.setdefault('services.fyers_service', MagicMock())
+sys.modules.setdefault('db', MagicMock())
+
+from services.nav_service import NavService
+from services.quote_cache import quote_cache
+from services.quote_refresher import QuoteRefresher
+from services.quote_stream import QuoteStream
+from utils.date_utils import IST
+
+
+class StandInFeed(socketserver.ThreadingTCPServer):
+    """Records subscription messages and pushes ticks to the connected client."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _FeedHandler)
+        self.messages = []
+        self.clients = []
+        self.cond = threading.Condition()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"tcp://127.0.0.1:{self.server_address[1]}"
+
+    def push(self, *ticks):
+        for tick in ticks:
+            self.clients[-1].wfile.write((json.dumps(tick) + "\n").encode())
+
+    def drop_clients(self):
+        for client in self.clients:
+            client.request.shutdown(socket.SHUT_RDWR)
+
+    def wait_for(self, count):
+        with self.cond:
+            self.cond.wait_for(lambda: len(self.messages) >= count, timeout=2)
+        return self.messages[:count]
+
+
+class _FeedHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.clients.append(self)
+        for line in self.rfile:
+            with self.server.cond:
+                self.server.messages.append(json.loads(line))
+                self.server.cond.notify_all()
+
+
+def _wait(predicate):
+    deadline = time.time() + 2
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestQuoteStream(unittest.TestCase):
+
+    def setUp(self):
+        quote_cache.clear()
+        self.feed = StandInFeed()
+        self.stream = QuoteStream(url=self.feed.url)
+
+    def tearDown(self):
+        self.stream.stop()
+        self.feed.shutdown()
+        self.feed.server_close()
+
+    def test_ticks_fill_the_table(self):
+        self.assertTrue(self.stream.sync(["RELIANCE", "TCS", "BSE:SBICARD-A"]))
+        (sub,) = self.feed.wait_for(1)
+        self.assertEqual(sub, {"type": "subscribe", "symbols": ["NSE:RELIANCE-EQ", "NSE:TCS-EQ", "BSE:SBICARD-A"]})
+
+        self.feed.push(
+            {"type": "sf", "symbol": "NSE:RELIANCE-EQ", "ltp": 1212.0, "prev_close_price": 1200.0},
+            {"type": "sf", "symbol": "BSE:SBICARD-A", "chp": -0.5},
+            {"type": "sf", "symbol": "NSE:UNKNOWN-EQ", "chp": 9.0},
+            {"type": "sf", "symbol": "NSE:RELIANCE-EQ", "chp": 1.25},
+        )
+        self.assertTrue(_wait(lambda: self.stream.snapshot().get("RELIANCE") == 1.25))
+        hits, misses = self.stream.get_many(["RELIANCE", "BSE:SBICARD-A", "TCS", "RELIANCE"])
+        self.assertEqual(hits, {"RELIANCE": 1.25, "BSE:SBICARD-A": -0.5})
+        self.assertEqual(misses, ["TCS"])
+
+        # Feed gone: table unusable, every symbol is a miss again
+        self.feed.drop_clients()
+        self.assertTrue(_wait(lambda: not self.stream.is_live()))
+        self.assertEqual(self.stream.get_many(["RELIANCE"]), ({}, ["RELIANCE"]))
+
+    def test_subscription_follows_universe(self):
+        self.stream.sync(["RELIANCE", "TCS"])
+        self.feed.wait_for(1)
+        self.feed.push({"symbol": "NSE:TCS-EQ", "chp": 0.3})
+        self.assertTrue(_wait(lambda: "TCS" in self.stream.snapshot()))
+
+        self.stream.sync(["RELIANCE", "INFY"])
+        self.assertEqual(self.feed.wait_for(3)[1:], [
+            {"type": "unsubscribe", "symbols": ["NSE:TCS-EQ"]},
+            {"type": "subscribe", "symbols": ["NSE:INFY-EQ"]},
+        ])
+        self.assertNotIn("TCS", self.stream.snapshot())
+
+    def test_live_estimate_and_refresher_read_the_table(self):
+        self.stream.sync(["RELIANCE", "TCS"])
+        self.feed.wait_for(1)
+        self.feed.push({"symbol": "NSE:RELIANCE-EQ", "chp": 2.0}, {"symbol": "NSE:TCS-EQ", "chp": -1.0})
+        self.assertTrue(_wait(lambda: len(self.stream.snapshot()) == 2))
+
+        fyers = MagicMock()
+        holdings = [{"Symbol": "RELIANCE", "Weight": 60.0}, {"Symbol": "TCS", "Weight": 40.0}]
+        with patch('services.nav_service.quote_stream', self.stream), \
+             patch('services.nav_service.fyers_service', fyers), \
+             patch('services.nav_service.nse_client') as nse:
+            self.assertAlmostEqual(NavService.calculate_portfolio_change(holdings), 0.8)
+        fyers.get_bulk_quotes_pct_change.assert_not_called()
+        nse.pct_changes.assert_not_called()
+
+        refresher = QuoteRefresher()
+        locks, snapshots, universe = MagicMock(), MagicMock(), MagicMock()
+        locks.find_one_and_update.return_value = {"owner": refresher.owner}
+        universe.distinct.return_value = ["RELIANCE", "TCS"]
+        with patch('services.quote_refresher.quote_stream', self.stream), \
+             patch('services.quote_refresher.fyers_service', fyers), \
+             patch('services.quote_refresher.scheduler_locks_collection', locks), \
+             patch('services.quote_refresher.quote_snapshots_collection', snapshots), \
+             patch('services.quote_refresher.holdings_collection', universe), \
+             patch('services.quote_refresher.is_trading_day', return_value=True), \
+             patch('services.quote_refresher.settings.QUOTE_STREAM_ENABLED', True), \
+             patch('services.quote_cache.is_market_open', return_value=True):
+            self.assertEqual(refresher.tick(IST.localize(datetime(2025, 1, 6, 11, 0))), "leader")
+        fyers.get_bulk_quotes_pct_change.assert_not_called()
+        published = snapshots.replace_one.call_args.args[1]
+        self.assertEqual(sorted(published["quotes"]), [["RELIANCE", 2.0], ["TCS", -1.0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+"""
+Single-Flight Tests
+
+Concurrent callers for the same key (or overlapping key batches) must share
+one upstream call, for both the thread and asyncio variants.
+"""
+
+import asyncio
+import sys
+import os
+import threading
+import time
+import unittest
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.singleflight import SingleFlight, AsyncSingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def _run_threads(self, target, n):
+        threads = [threading.Thread(target=target) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+        results = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.2)
+            return "nav-history"
+
+        self._run_threads(lambda: results.append(flight.do("119551", fetch)), 8)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["nav-history"] * 8)
+
+    def test_errors_propagate_and_are_not_kept(self):
+        flight = SingleFlight()
+
+        def boom():
+            raise ValueError("upstream down")
+
+        with self.assertRaises(ValueError):
+            flight.do("k", boom)
+        self.assertEqual(flight.do("k", lambda: 1), 1)
+
+    def test_do_many_only_fetches_keys_not_in_flight(self):
+        flight = SingleFlight()
+        batches = []
+        started = threading.Event()
+
+        def slow_fetch(keys):
+            batches.append(sorted(keys))
+            started.set()
+            time.sleep(0.2)
+            return {k: k.lower() for k in keys if k != "GONE"}
+
+        first = {}
+        t = threading.Thread(target=lambda: first.update(flight.do_many(["TCS", "INFY"], slow_fetch)))
+        t.start()
+        started.wait()
+        second = flight.do_many(["INFY", "HDFCBANK", "GONE"], slow_fetch)
+        t.join()
+
+        self.assertEqual(batches, [["INFY", "TCS"], ["GONE", "HDFCBANK"]])
+        self.assertEqual(first, {"TCS": "tcs", "INFY": "infy"})
+        self.assertEqual(second, {"INFY": "infy", "HDFCBANK": "hdfcbank"})
+
+
+class TestAsyncSingleFlight(unittest.TestCase):
+
+    def test_concurrent_coroutines_share_one_call(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 42
+
+        async def main():
+            return await asyncio.gather(*(flight.do("k", fetch) for _ in range(10)))
+
+        self.assertEqual(asyncio.run(main()), [42] * 10)
+        self.assertEqual(len(calls), 1)
+
+    def test_cancelled_waiter_does_not_cancel_fetch(self):
+        flight = AsyncSingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        async def main():
+            leader = asyncio.ensure_future(flight.do("k", fetch))
+            waiter = asyncio.ensure_future(flight.do("k", fetch))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            return await leader
+
+        self.assertEqual(asyncio.run(main()), "ok")
+
+    def test_do_many_overlap(self):
+        flight = AsyncSingleFlight()
+        batches = []
+
+        async def fetch(keys):
+            batches.append(sorted(keys))
+            await asyncio.sleep(0.05)
+            return {k: 1.0 for k in keys}
+
+        async def main():
+            return await asyncio.gather(
+                flight.do_many(["A", "B"], fetch),
+                flight.do_many(["B", "C"], fetch),
+            )
+
+        first, second = asyncio.run(main())
+        self.assertEqual(batches, [["A", "B"], ["C"]])
+        self.assertEqual(first, {"A": 1.0, "B": 1.0})
+        self.assertEqual(second, {"B": 1.0, "C": 1.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+SIP Batch Tests
+
+The nightly sweep must add due installments, allocate pending NAVs with one
+NAV lookup per scheme, and write everything in a single version-guarded
+bulk_write that touches single installments and moves the running totals.
+Scheduling: due once per day after SIP_BATCH_TIME.
+"""
+
+import sys
+import os
+import unittest
+from datetime import date, datetime
+from unittest.mock import MagicMock, patch
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+sys.modules.setdefault('services.fyers_service', MagicMock())
+sys.modules.setdefault('db', MagicMock())
+
+from services.sip_batch import SipBatchJob
+from utils.date_utils import IST
+from utils.sip_totals import SipTotals
+
+
+def sip_doc(_id, scheme_code, installments, sip_day=5, version=1):
+    # As the sweep's projection returns it: totals, no installments
+    return {
+        "_id": _id, "investment_type": "sip", "scheme_code": scheme_code,
+        "sip_day": sip_day, "sip_amount": 1000.0,
+        "sip_totals": SipTotals.from_installments(installments).to_dict(), "version": version,
+    }
+
+
+class TestSipBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.job = SipBatchJob()
+        self.holdings = MagicMock()
+        self.locks = MagicMock()
+        self.nav = MagicMock()
+        self.patches = [
+            patch('services.sip_batch.holdings_collection', self.holdings),
+            patch('services.sip_batch.scheduler_locks_collection', self.locks),
+            patch('services.sip_batch.nav_service', self.nav),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def test_sweep_adds_due_and_resolves_pending_in_one_bulk_write(self):
+        pending = {"date": "05-10-2026", "amount": 1000.0, "status": "PAID",
+                   "allocation_status": "PENDING_NAV", "units": None}
+        current = {"date": "05-10-2026", "amount": 1000.0, "status": "PENDING",
+                   "allocation_status": "PENDING_NAV"}
+        self.holdings.find.side_effect = [
+            [
+                sip_doc("a", "100", [pending], sip_day=25),   # pending NAV only
+                sip_doc("b", "100", [pending], sip_day=25),   # same scheme
+                sip_doc("c", "200", [], sip_day=5),           # due installment only
+                sip_doc("d", "200", [current], sip_day=5),    # nothing to do
+            ],
+            # Installments are loaded only for the funds with NAVs pending
+            [{"_id": "a", "sip_installments": [dict(pending)]},
+             {"_id": "b", "sip_installments": [dict(pending)]}],
+        ]
+        self.nav.get_next_navs_after_dates.return_value = {"05-10-2026": (50.0, "05-10-2026")}
+        self.holdings.bulk_write.return_value = MagicMock(modified_count=3, matched_count=3)
+
+        stats = self.job.run_once(date(2026, 10, 18))
+
+        self.assertEqual(self.holdings.find.call_args.args[0], {"_id": {"$in": ["a", "b"]}})
+        # Scheme 100 looked up once for both funds; scheme 200 has nothing pending
+        self.nav.get_next_navs_after_dates.assert_called_once_with("100", ["05-10-2026"])
+        self.assertEqual(stats, {"funds": 4, "added": 1, "resolved": 2, "written": 3, "skipped": 0})
+
+        self.holdings.bulk_write.assert_called_once()
+        ops = self.holdings.bulk_write.call_args.args[0]
+        self.assertEqual([op._filter for op in ops], [
+            {"_id": "a", "version": 1}, {"_id": "b", "version": 1}, {"_id": "c", "version": 1},
+        ])
+        # Only the resolved installment's fields are set, and totals move by $inc
+        resolved = ops[0]._doc
+        units = (1000.0 - 0.05) / 50.0
+        self.assertEqual(ops[0]._array_filters, [
+            {"i0.date": "05-10-2026", "i0.status": "PAID", "i0.allocation_status": "PENDING_NAV"},
+        ])
+        self.assertAlmostEqual(resolved["$set"]["sip_installments.$[i0].units"], units)
+        self.assertNotIn("sip_installments", resolved["$set"])
+        self.assertAlmostEqual(resolved["$inc"]["future_sip_units"], units)
+        self.assertEqual(resolved["$inc"]["sip_totals.pending_nav_count"], -1)
+        self.assertNotIn("invested_amount", resolved["$inc"])  # Already counted when paid
+
+        added = ops[2]._doc
+        self.assertEqual(added["$push"]["sip_installments"]["$each"][0]["date"], "05-10-2026")
+        self.assertEqual(added["$inc"]["sip_totals.counts.PENDING"], 1)
+        self.assertEqual(added["$max"], {"sip_totals.last_date": "2026-10-05"})
+
+    def test_due_once_per_day_after_run_time(self):
+        evening = IST.localize(datetime(2026, 10, 18, 23, 45))
+        morning = IST.localize(datetime(2026, 10, 19, 9, 0))
+        with patch('services.sip_batch._run_time', return_value=datetime(2026, 1, 1, 23, 30).time()):
+            # Last completed yesterday night: today's run is due after 23:30
+            self.locks.find_one.return_value = {"completed_at": datetime(2026, 10, 17, 18, 5)}
+            self.assertTrue(self.job.is_due(evening))
+            # Completed tonight (18:05 UTC = 23:35 IST): not due again until tomorrow's slot
+            self.locks.find_one.return_value = {"completed_at": datetime(2026, 10, 18, 18, 5)}
+            self.assertFalse(self.job.is_due(evening))
+            self.assertFalse(self.job.is_due(morning))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,9 @@
+import asyncio
 import sys
 import os
 import unittest
 from datetime import date, timedelta
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Add backend to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -12,6 +13,7 @@ sys.modules['services.fyers_service'] = MagicMock()
 
 from services.holdings_service import HoldingsService, apply_stepup_if_due, months_between
 from services.nav_service import NavService
+from services.pnl_cache import pnl_cache
 from models.db_schemas import SIPInstallment
 
 class TestSIPLogic(unittest.TestCase):
@@ -51,6 +53,7 @@ class TestSIPLogic(unittest.TestCase):
             self.assertEqual(installments[1]["status"], "PENDING")
 
     def test_pnl_sip_logic(self):
+        pnl_cache.clear()
         # Mock Doc - MUST include scheme_code or calculate_pnl returns error
         mock_doc = {
             "fund_name": "Test SIP Fund",
@@ -69,6 +72,7 @@ class TestSIPLogic(unittest.TestCase):
         # Mock all dependencies at once
         with patch('services.nav_service.holdings_service.get_holdings', return_value=mock_doc), \
              patch('services.nav_service.NavService.get_latest_nav', return_value=[{"date": "19-12-2025", "nav": 20.0}]), \
+             patch('services.nav_service.NavService._aget_scheme_series', new=AsyncMock()), \
              patch('services.nav_service.get_current_ist_time') as mock_time, \
              patch('services.nav_service.is_trading_day', return_value=False):
              
@@ -76,7 +80,7 @@ class TestSIPLogic(unittest.TestCase):
              mock_time.return_value.date.return_value = date(2025, 12, 19)
              mock_time.return_value.time.return_value = date(2025, 12, 19)  # dummy
              
-             res = NavService.calculate_pnl("dummy_id", "dummy_user")
+             res = asyncio.run(NavService.calculate_pnl("dummy_id", "dummy_user"))
              
              # Debug: Print result if error
              if "error" in res:
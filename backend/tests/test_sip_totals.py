@@ -0,0 +1,100 @@
+"""
+SIP Totals Tests
+
+The running totals moved by $inc on each installment change must always
+equal the totals recomputed from the installments, and SIP writes must set
+only the changed installment (arrayFilters) instead of the whole array.
+"""
+
+import sys
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+sys.modules.setdefault('services.fyers_service', MagicMock())
+sys.modules.setdefault('db', MagicMock())
+
+from services.holdings_service import HoldingsService
+from utils.sip_totals import SipTotals, installment_update, totals_delta
+
+INSTALLMENTS = [
+    {"date": "05-01-2025", "amount": 1000.0, "status": "ASSUMED_PAID", "units": None},
+    {"date": "05-02-2025", "amount": 1000.0, "status": "PAID", "units": 20.0, "allocation_status": "ESTIMATED",
+     "is_estimated": True},
+    {"date": "05-03-2025", "amount": 1000.0, "status": "PAID", "units": None, "allocation_status": "PENDING_NAV"},
+    {"date": "05-04-2025", "amount": 1000.0, "status": "SKIPPED", "units": None},
+    {"date": "05-05-2025", "amount": 1000.0, "status": "PENDING", "units": None},
+]
+
+
+class TestSipTotals(unittest.TestCase):
+
+    def test_totals_from_installments(self):
+        totals = SipTotals.from_installments(INSTALLMENTS)
+        self.assertEqual(totals.counts, {"ASSUMED_PAID": 1, "PAID": 2, "SKIPPED": 1, "PENDING": 1})
+        self.assertEqual(totals.allocated_units, 20.0)
+        self.assertEqual((totals.pending_nav_count, totals.pending_nav_amount), (1, 1000.0))
+        self.assertEqual(totals.estimated_count, 1)
+        self.assertEqual(list(totals.invested_flows()), ["05-01-2025", "05-02-2025", "05-03-2025"])
+        self.assertEqual(totals.pending_installments(),
+                         [{"date": "05-05-2025", "amount": 1000.0, "status": "PENDING"}])
+        self.assertEqual(totals.last_date, "2025-05-05")
+
+    def test_increments_match_recomputed_totals(self):
+        before = [dict(i) for i in INSTALLMENTS]
+        after = [dict(i) for i in INSTALLMENTS]
+        after[2].update(units=19.5, allocation_status="ESTIMATED", is_estimated=True)  # NAV resolved
+        after[4].update(status="PAID", allocation_status="PENDING_NAV")               # user paid
+
+        inc = totals_delta([(before[2], after[2]), (before[4], after[4])])
+        self.assertEqual(inc["invested_amount"], 1000.0)
+        self.assertEqual(inc["future_sip_units"], 19.5)
+
+        totals = SipTotals.from_installments(before)
+        totals.apply(inc)
+        expected = SipTotals.from_installments(after).to_dict()
+        # $inc leaves zeroed keys behind; readers skip them
+        expected["counts"]["PENDING"] = 0
+        expected["pending"] = {"05-05-2025": 0.0}
+        self.assertEqual(totals.to_dict(), expected)
+
+    def test_sip_action_sets_one_installment(self):
+        doc = {"_id": "f", "user_id": "u", "scheme_code": "100", "sip_amount": 1000.0, "version": 7,
+               "investment_type": "sip", "sip_installments": [dict(i) for i in INSTALLMENTS]}
+        doc["sip_totals"] = SipTotals.from_installments(INSTALLMENTS).to_dict()
+        holdings = MagicMock()
+        holdings.find_one.return_value = doc
+        nav = MagicMock()
+        nav.get_next_nav_after_date.return_value = (50.0, "05-05-2025")
+
+        with patch('services.holdings_service.holdings_collection', holdings), \
+             patch('services.holdings_service.ObjectId', side_effect=lambda x: x), \
+             patch('services.holdings_service.HoldingsService.due_sip_installment', return_value=None), \
+             patch('services.nav_service.nav_service', nav):
+            result = HoldingsService().handle_sip_action("f", "u", "05-05-2025", "PAID")
+
+        self.assertEqual(result["status"], "PAID")
+        filter_, update = holdings.update_one.call_args.args
+        self.assertEqual(filter_, {"_id": "f", "version": 7})
+        self.assertEqual(holdings.update_one.call_args.kwargs["array_filters"], [
+            {"i0.date": "05-05-2025", "i0.status": "PENDING", "i0.allocation_status": None},
+        ])
+        self.assertEqual(update["$set"]["sip_installments.$[i0].status"], "PAID")
+        self.assertNotIn("sip_installments", update["$set"])
+        self.assertEqual(update["$inc"]["invested_amount"], 1000.0)
+        self.assertAlmostEqual(update["$inc"]["future_sip_units"], (1000.0 - 0.05) / 50.0)
+        self.assertEqual(update["$inc"]["sip_totals.counts.PENDING"], -1)
+
+        # A document without stored totals gets them whole, after the change
+        legacy = {"sip_installments": INSTALLMENTS}
+        update, _ = installment_update(legacy, [(None, {"date": "05-06-2025", "amount": 1000.0})],
+                                       [*INSTALLMENTS, {"date": "05-06-2025", "amount": 1000.0}])
+        self.assertEqual(update["$set"]["sip_totals"]["counts"]["PENDING"], 2)
+        self.assertFalse([k for k in update["$inc"] if k.startswith("sip_totals.")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Weight Vector Tests
+
+The vectorized weighted change must match the old per-stock loop: percent
+weights rescaled (or fraction weights kept, decided per fund), missing quotes excluded from both sum and coverage, and
+the matrix form agreeing with fund-by-fund results.
+"""
+
+import sys
+import os
+import unittest
+
+import numpy as np
+
+# Add backend to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.weight_vector import WeightVector, look_through_exposure, weighted_change, weighted_changes
+
+
+HOLDINGS = [
+    {"Symbol": "RELIANCE", "Weight": 40.0},
+    {"Symbol": "HDFCBANK", "Weight": 35.0},
+    {"Symbol": "TCS", "Weight": 25.0},
+    {"Symbol": "", "Weight": 5.0},            # unresolved, dropped
+    {"Symbol": "INFY", "Weight": 0},          # zero weight, dropped
+]
+
+
+class TestWeightVector(unittest.TestCase):
+
+    def test_from_holdings_normalizes(self):
+        vector = WeightVector.from_holdings(HOLDINGS)
+        self.assertEqual(vector.symbols, ["RELIANCE", "HDFCBANK", "TCS"])
+        np.testing.assert_allclose(vector.weights, [0.40, 0.35, 0.25])
+
+    def test_scale_is_decided_per_fund(self):
+        # Sub-1% holdings of a percent fund stay percents
+        vector = WeightVector.from_holdings([{"Symbol": "A", "Weight": 60.0}, {"Symbol": "B", "Weight": 0.5}])
+        np.testing.assert_allclose(vector.weights, [0.6, 0.005])
+        # A fund stored as fractions (total <= 1.5) is kept as is
+        vector = WeightVector.from_holdings([{"Symbol": "A", "Weight": 0.0952}, {"Symbol": "B", "Weight": 0.8438}])
+        np.testing.assert_allclose(vector.weights, [0.0952, 0.8438])
+
+    def test_stored_vector_round_trip(self):
+        stored = WeightVector.from_holdings(HOLDINGS).to_dict()
+        vector = WeightVector.from_doc({"weight_vector": stored, "holdings": []})
+        self.assertEqual(vector.symbols, ["RELIANCE", "HDFCBANK", "TCS"])
+        # Documents saved before the vector existed fall back to holdings
+        self.assertEqual(len(WeightVector.from_doc({"holdings": HOLDINGS})), 3)
+
+    def test_pre_resolved_fyers_symbols(self):
+        vector = WeightVector.from_holdings(HOLDINGS + [{"Symbol": "BSE:SBICARD-A", "Weight": 2.0}])
+        stored = vector.to_dict()
+        self.assertEqual(stored["fyers_symbols"][0], "NSE:RELIANCE-EQ")
+        self.assertEqual(stored["fyers_symbols"][-1], "BSE:SBICARD-A")
+        self.assertEqual(stored["exchanges"], ["NSE", "NSE", "NSE", "BSE"])
+        self.assertAlmostEqual(stored["total_weight"], 1.02)
+        # A vector of an older format is rebuilt from the holdings
+        old = {"symbols": ["RELIANCE"], "weights": [0.005], "format": 2}
+        vector = WeightVector.from_doc({"weight_vector": old, "holdings": [{"Symbol": "RELIANCE", "Weight": 0.5}]})
+        self.assertEqual(vector.fyers_symbols, ["NSE:RELIANCE-EQ"])
+        np.testing.assert_allclose(vector.weights, [0.5])
+
+    def test_weighted_change_skips_missing_quotes(self):
+        vector = WeightVector.from_holdings(HOLDINGS)
+        change, coverage, priced = weighted_change(
+            vector.weights, vector.quotes({"RELIANCE": 1.0, "HDFCBANK": -2.0, "TCS": None})
+        )
+        self.assertAlmostEqual(coverage, 0.75)
+        self.assertEqual(priced, 2)
+        self.assertAlmostEqual(change, (0.40 * 1.0 + 0.35 * -2.0) / 0.75)
+
+    def test_nothing_priced(self):
+        vector = WeightVector.from_holdings(HOLDINGS)
+        self.assertEqual(weighted_change(vector.weights, vector.quotes({})), (None, 0.0, 0))
+
+    def test_matrix_matches_per_fund(self):
+        funds = [
+            WeightVector.from_holdings(HOLDINGS),
+            WeightVector(["TCS", "WIPRO"], [0.5, 0.5]),
+            WeightVector([], []),
+        ]
+        quotes = {"RELIANCE": 1.0, "HDFCBANK": 0.5, "TCS": -1.0}
+        changes, coverages = weighted_changes(funds, quotes)
+
+        for i, vector in enumerate(funds[:2]):
+            change, coverage, _ = weighted_change(vector.weights, vector.quotes(quotes))
+            self.assertAlmostEqual(changes[i], change)
+            self.assertAlmostEqual(coverages[i], coverage)
+        self.assertTrue(np.isnan(changes[2]))
+        self.assertEqual(coverages[2], 0.0)
+
+    def test_look_through_exposure_sums_across_funds(self):
+        funds = [
+            WeightVector(["RELIANCE", "TCS", "RELIANCE"], [0.3, 0.5, 0.2]),
+            WeightVector(["RELIANCE", "INFY"], [0.4, 0.6]),
+            WeightVector([], []),
+        ]
+        symbols, exposure, fund_counts = look_through_exposure(funds, [1000.0, 500.0, 200.0])
+        self.assertEqual(symbols, ["RELIANCE", "TCS", "INFY"])
+        np.testing.assert_allclose(exposure, [500.0 + 200.0, 500.0, 300.0])
+        self.assertEqual(fund_counts.tolist(), [2, 1, 1])
+        self.assertEqual(look_through_exposure([], [])[0], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
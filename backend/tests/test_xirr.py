@@ -12,7 +12,7 @@ from datetime import date
 # Add backend to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from utils.xirr import calculate_xirr, calculate_sip_xirr
+from utils.xirr import calculate_xirr, calculate_xirr_batch, calculate_sip_xirr
 
 
 class TestXIRRCalculation(unittest.TestCase):
@@ -173,5 +173,39 @@ class TestXIRREdgeCases(unittest.TestCase):
         self.assertLess(xirr, 50)
 
 
+class TestXIRRBatch(unittest.TestCase):
+    """The batch solver and warm starts must agree with one-at-a-time solves."""
+    
+    def _monthly(self, months, final_value, start_year=2015):
+        flows = [(date(start_year + i // 12, i % 12 + 1, 5), -1000) for i in range(months)]
+        flows.append((date(start_year + months // 12, months % 12 + 1, 5), final_value))
+        return flows
+    
+    def test_batch_matches_individual(self):
+        flow_sets = [
+            self._monthly(120, 200000),
+            self._monthly(36, 30000),                        # loss
+            [(date(2023, 1, 1), -10000), (date(2024, 1, 1), 11000)],  # closed form
+            [(date(2023, 1, 1), -10000)],                    # insufficient data
+            self._monthly(12, 13200, start_year=2023),
+        ]
+        batch = calculate_xirr_batch(flow_sets)
+        for flows, value in zip(flow_sets, batch):
+            single = calculate_xirr(flows)
+            if single is None:
+                self.assertIsNone(value)
+            else:
+                self.assertAlmostEqual(value, single, places=6)
+        self.assertAlmostEqual(batch[2], 10.0, places=6)
+    
+    def test_warm_start_converges_to_same_rate(self):
+        flows = self._monthly(240, 760000, start_year=2003)
+        cold = calculate_xirr(flows)
+        warm = calculate_xirr(flows, guess=cold / 100 + 0.001)
+        far = calculate_xirr(flows, guess=5.0)
+        self.assertAlmostEqual(warm, cold, places=6)
+        self.assertAlmostEqual(far, cold, places=6)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,3 +1,4 @@
+import asyncio
 
 import sys
 import os
@@ -45,7 +46,7 @@ def run_verification():
                      with patch.object(NavService, 'calculate_portfolio_change', return_value=1.0) as mock_calc_change:
                         
                         # EXECUTE
-                        result = NavService.calculate_pnl("dummy_id", "dummy_user")
+                        result = asyncio.run(NavService.calculate_pnl("dummy_id", "dummy_user"))
                         
                         print("\n--- Result ---")
                         print(f"Current NAV: {result.get('current_nav')}")
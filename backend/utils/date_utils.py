@@ -1,4 +1,6 @@
-from datetime import datetime, time, timedelta, timezone
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta, timezone
 import pytz
 
 from core.logging import get_logger
@@ -64,6 +66,77 @@ def _get_fallback_holidays():
     }
 
 
+# --- Trading-day Ordinals ---
+# Sessions for a multi-year window are loaded once (one valid_days() call)
+# into a sorted list of date ordinals plus a set of the same, so a trading-day
+# check is a set lookup and previous/next business day is a bisect. The
+# window is rebuilt when the IST year rolls over, and widened on demand for
+# dates outside it (e.g. old SIP start dates).
+
+_CALENDAR_YEARS_BACK = 10
+_CALENDAR_YEARS_AHEAD = 1
+
+_calendar_lock = threading.Lock()
+_session_ordinals = []  # sorted date.toordinal() of every trading session
+_session_set = frozenset()
+_calendar_years = (1, 0)  # (first_year, last_year) covered; empty initially
+_calendar_built_in = None  # IST year the window was built in
+
+
+def _to_date(dt_obj):
+    return dt_obj.date() if isinstance(dt_obj, datetime) else dt_obj
+
+
+def _load_session_ordinals(first_year, last_year):
+    """Trading-session ordinals for whole years first_year..last_year."""
+    _init_nse_calendar()
+    start, end = date(first_year, 1, 1), date(last_year, 12, 31)
+
+    if _nse_calendar is not None:
+        try:
+            days = _nse_calendar.valid_days(start_date=start.isoformat(), end_date=end.isoformat())
+            return [d.toordinal() for d in days.date]
+        except Exception:
+            logger.exception(f"Error loading NSE sessions for {first_year}-{last_year}")
+
+    # Fallback: weekdays minus the hardcoded holidays
+    ordinals = []
+    for o in range(start.toordinal(), end.toordinal() + 1):
+        d = date.fromordinal(o)
+        if d.weekday() < 5 and d.isoformat() not in _nse_holidays_set:
+            ordinals.append(o)
+    return ordinals
+
+
+def _ensure_calendar(*years):
+    """Makes sure the loaded window covers `years`, (re)building it if needed."""
+    global _session_ordinals, _session_set, _calendar_years, _calendar_built_in
+    this_year = get_current_ist_time().year
+    first, last = _calendar_years
+    if _calendar_built_in == this_year and all(first <= y <= last for y in years):
+        return
+
+    with _calendar_lock:
+        first, last = _calendar_years
+        if _calendar_built_in != this_year:
+            first, last = this_year - _CALENDAR_YEARS_BACK, this_year + _CALENDAR_YEARS_AHEAD
+        elif all(first <= y <= last for y in years):
+            return
+        first, last = min([first, *years]), max([last, *years])
+
+        ordinals = _load_session_ordinals(first, last)
+        _session_ordinals = ordinals
+        _session_set = frozenset(ordinals)
+        _calendar_years = (first, last)
+        _calendar_built_in = this_year
+        logger.info(f"Loaded {len(ordinals)} NSE sessions for {first}-{last}")
+
+
+def _is_session(target_date):
+    _ensure_calendar(target_date.year)
+    return target_date.toordinal() in _session_set
+
+
 def is_nse_holiday(date_obj):
     """
     Check if a given date is an NSE holiday.
@@ -71,28 +144,13 @@ def is_nse_holiday(date_obj):
 
     Note: Weekends are non-trading days but are not treated as "holidays" by this function.
     """
-    _init_nse_calendar()
-
-    # Normalize to a date-like object
-    target_date = date_obj.date() if hasattr(date_obj, "date") else date_obj
+    target_date = _to_date(date_obj)
 
     # Do not classify weekends as exchange holidays
     if target_date.weekday() >= 5:  # 5=Sat, 6=Sun
         return False
 
-    date_str = target_date.strftime("%Y-%m-%d")
-
-    if _nse_calendar is not None:
-        try:
-            import pandas as pd
-            # Check if this date is a valid session (trading day).
-            # On weekdays, a lack of valid sessions indicates an exchange holiday.
-            return _nse_calendar.valid_days(start_date=date_str, end_date=date_str).size == 0
-        except Exception:
-            logger.exception(f"Error checking NSE calendar for {date_str}")
-
-    # Fallback to hardcoded set
-    return date_str in _nse_holidays_set
+    return not _is_session(target_date)
 
 
 def get_current_ist_time():
@@ -124,41 +182,58 @@ def is_trading_day(dt_obj=None):
     """Checks if the given date is a valid trading day (Mon-Fri, not holiday)."""
     if not dt_obj:
         dt_obj = get_current_ist_time()
+    return _is_session(_to_date(dt_obj))
 
-    # Check Weekend
-    if dt_obj.weekday() >= 5:
-        return False
 
-    # Check Holiday (dynamic)
-    date_to_check = dt_obj.date() if hasattr(dt_obj, 'date') else dt_obj
-    if is_nse_holiday(date_to_check):
-        return False
+def get_previous_business_days(ref_date=None, count=1):
+    """
+    Returns the `count` business days before ref_date, most recent first
+    (e.g. [D-1, D-2, D-3] for count=3).
+    """
+    if not ref_date:
+        ref_date = get_current_ist_time().date()
+    ref_date = _to_date(ref_date)
 
-    return True
+    # Each year has ~250 sessions; one extra year back covers any count we use
+    _ensure_calendar(ref_date.year, ref_date.year - 1 - count // 200)
+    sessions = _session_ordinals
+    idx = bisect_left(sessions, ref_date.toordinal())
+    return [date.fromordinal(o) for o in reversed(sessions[max(idx - count, 0):idx])]
 
 
 def get_previous_business_day(ref_date=None):
     """
     Returns the date of the previous valid business day.
     """
+    return get_previous_business_days(ref_date, 1)[0]
+
+
+def get_next_business_day(ref_date=None):
+    """
+    Returns the date of the next valid business day after ref_date.
+    """
     if not ref_date:
         ref_date = get_current_ist_time().date()
+    ref_date = _to_date(ref_date)
 
-    check_date = ref_date - timedelta(days=1)
+    _ensure_calendar(ref_date.year, ref_date.year + 1)
+    sessions = _session_ordinals
+    return date.fromordinal(sessions[bisect_right(sessions, ref_date.toordinal())])
 
-    # Loop back until we find a business day
-    while True:
-        # Check Weekend
-        if check_date.weekday() >= 5:
-            check_date -= timedelta(days=1)
-            continue
 
-        # Check Holiday (dynamic)
-        if is_nse_holiday(check_date):
-            check_date -= timedelta(days=1)
-            continue
+def get_next_market_open(current_dt=None):
+    """
+    Returns the IST datetime at which the market next opens: today's open if
+    called before MARKET_OPEN_TIME on a trading day, else the next business
+    day's open.
+    """
+    if not current_dt:
+        current_dt = get_current_ist_time()
 
-        return check_date
+    day = current_dt.date()
+    if not (is_trading_day(day) and current_dt.time() < MARKET_OPEN_TIME):
+        day = get_next_business_day(day)
+    return IST.localize(datetime.combine(day, MARKET_OPEN_TIME))
 
 
 def format_date_for_api(dt_obj):
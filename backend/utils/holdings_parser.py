@@ -0,0 +1,312 @@
+"""
+Holdings Excel Parser
+
+Reads an AMC portfolio disclosure workbook in one streaming pass (openpyxl
+read-only mode): the scheme-name cells near the top, the header row (the
+first row mentioning ISIN plus a name/weight column) and the ISIN, Name and
+Weight columns below it, cleaned and de-duplicated as they are read.
+
+The upload paths used to read the same workbook with pd.read_excel up to
+three times (scheme-name check, header detection, data); one parse now
+feeds all of them.
+"""
+import re
+import zipfile
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.weight_vector import FRACTION_TOTAL_MAX
+
+# Rows scanned for the header / for scheme-name cells
+HEADER_SCAN_ROWS = 50
+TITLE_SCAN_ROWS = 20
+
+ISIN_PATTERN = re.compile(r"^[A-Z0-9]{12}$")
+
+NAME_INDICATORS = (
+    "NAME", "INSTRUMENT", "ISSUER", "SECURITY", "COMPANY",
+    "DESCRIPTION", "SCHEME", "STOCK", "SCRIP", "PARTICULARS",
+)
+WEIGHT_INDICATORS = ("%", "WEIGHT", "AUM")
+
+# Common fund house keywords to help identify scheme name cells
+FUND_HOUSES = (
+    "HDFC", "SBI", "ICICI", "AXIS", "NIPPON", "KOTAK", "TATA", "ADITYA BIRLA",
+    "UTI", "DSP", "FRANKLIN", "MIRAE", "MOTILAL", "PARAG PARIKH", "QUANT",
+    "INVESCO", "BANDHAN", "EDELWEISS", "CANARA", "SUNDARAM", "L&T", "IDFC",
+)
+# Keywords that indicate scheme name cells
+SCHEME_KEYWORDS = ("FUND", "SCHEME", "DIRECT", "GROWTH", "REGULAR", "PLAN", "IDCW")
+
+
+class ParsedHoldings:
+    """
+    Result of one parse. isins/names/weights are aligned (valid, unique
+    ISINs in file order; weights as float64 percents, 0.0 where unparseable;
+    a sheet holding fractions behind a % cell format is scaled up to percents).
+    header_row is None when no header was found; column_map maps the
+    detected column index to "ISIN" / "Name" / "Weight".
+    """
+
+    __slots__ = ("isins", "names", "weights", "header_row", "columns", "column_map",
+                 "title_cells", "rows_read", "missing_isin", "invalid_isins", "duplicates")
+
+    def __init__(self):
+        self.isins: List[str] = []
+        self.names: List[str] = []
+        self.weights = np.empty(0, dtype=np.float64)
+        self.header_row: Optional[int] = None
+        self.columns: List[str] = []
+        self.column_map: Dict[int, str] = {}
+        self.title_cells: List[Tuple[int, str]] = []  # (row, text) scheme-name candidates
+        # Counters for debug logging
+        self.rows_read = 0
+        self.missing_isin = 0
+        self.invalid_isins: List[dict] = []
+        self.duplicates: List[dict] = []
+
+    @property
+    def missing_columns(self) -> List[str]:
+        found = set(self.column_map.values())
+        missing = []
+        if "ISIN" not in found:
+            missing.append("ISIN")
+        if "Weight" not in found:
+            missing.append("Weight (% to AUM or similar)")
+        return missing
+
+    def __len__(self) -> int:
+        return len(self.isins)
+
+
+def score_columns(labels: Sequence) -> Dict[int, str]:
+    """
+    Robustly identifies ISIN, Name, and Weight columns from header labels.
+    Each target goes to its single best-scoring column, so multiple columns
+    can't map to the same name. Returns {column_index: "ISIN"/"Name"/"Weight"}.
+    """
+    # Scored candidates: (column_index, score)
+    isin_candidates = []
+    name_candidates = []
+    weight_candidates = []
+
+    for i, label in enumerate(labels):
+        c = str(label).strip().upper() if label is not None else ""
+
+        # --- ISIN ---
+        score = 0
+        if "ISIN" in c:
+            score += 10
+            if c == "ISIN": score += 5
+
+        if score > 0:
+            isin_candidates.append((i, score))
+
+        # --- Name ---
+        score = 0
+        # High priority keywords
+        if "NAME" in c:
+            score += 5
+            if "INSTRUMENT" in c: score += 5
+            elif "SCHEME" in c: score += 5
+            elif "SECURITY" in c: score += 5
+            elif "COMPANY" in c: score += 4
+            elif "ISSUER" in c: score += 3 # "Issuer Name" is less preferred than "Instrument Name" if both exist
+
+        # Standalone keywords
+        if c in ["DESCRIPTION", "SCRIP", "SCRIPT", "PARTICULARS", "SECURITY"]:
+            score += 8 # Pretty high confidence
+
+        # Lower priority but valid
+        if "INSTRUMENT" in c and "NAME" not in c: score += 3
+
+        if score > 0:
+            name_candidates.append((i, score))
+
+        # --- Weight ---
+        score = 0
+        if "%" in c or "WEIGHT" in c or "ALLOCATION" in c or "AUM" in c or "HOLDING" in c:
+            if "%" in c: score += 5
+            if "WEIGHT" in c: score += 5
+            if "ALLOCATION" in c: score += 4
+            if "AUM" in c: score += 3
+            if "NET" in c and "ASSET" in c: score -= 2 # penalty for "Net Assets" value vs "% to Net Assets"
+
+            # Boost if it explicitly mentions "to" or "of" (e.g. "% to AUM")
+            if "TO" in c or "OF" in c: score += 2
+
+        if score > 0:
+            weight_candidates.append((i, score))
+
+    # Sort (stable, so ties keep the leftmost column) and pick best
+    col_map = {}
+    for candidates, target in ((isin_candidates, "ISIN"), (name_candidates, "Name"),
+                               (weight_candidates, "Weight")):
+        if candidates:
+            candidates.sort(key=lambda x: x[1], reverse=True)
+            col_map[candidates[0][0]] = target
+    return col_map
+
+
+def clean_weight(val) -> float:
+    """'5.2%', '5.2' or 5.2 -> 5.2; blanks and junk -> 0.0."""
+    if val is None:
+        return 0.0
+    if isinstance(val, (int, float)):
+        val = float(val)
+        return 0.0 if val != val else val  # NaN
+    try:
+        return float(str(val).strip().replace("%", ""))
+    except ValueError:
+        return 0.0
+
+
+def _header_tier(cells: List[str]) -> int:
+    """1: ISIN + name column, 2: ISIN + weight column, 3: ISIN only, 0: not a header."""
+    if not any("ISIN" in c for c in cells):
+        return 0
+    if any(ind in c for c in cells for ind in NAME_INDICATORS):
+        return 1
+    if any(ind in c for c in cells for ind in WEIGHT_INDICATORS):
+        return 2
+    return 3
+
+
+def _title_cells(row_idx: int, row: Sequence) -> Iterator[Tuple[int, str]]:
+    for cell in row:
+        if cell is None:
+            continue
+        text = str(cell).strip()
+        # Skip very short or very long strings
+        if not 10 <= len(text) <= 200:
+            continue
+        upper = text.upper()
+        if any(fh in upper for fh in FUND_HOUSES) or any(kw in upper for kw in SCHEME_KEYWORDS):
+            yield row_idx, text
+
+
+def _iter_sheet_rows(fileobj) -> Iterator[tuple]:
+    """Rows of the first sheet as value tuples (None for blank cells)."""
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        wb = load_workbook(fileobj, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException):
+        # Legacy .xls: openpyxl can't stream it, fall back to a single pandas read
+        import pandas as pd
+        fileobj.seek(0)
+        df = pd.read_excel(fileobj, header=None)
+        for row in df.itertuples(index=False, name=None):
+            yield tuple(None if pd.isna(v) else v for v in row)
+        return
+
+    try:
+        ws = wb.worksheets[0]
+        # Some generators write a wrong <dimension>; don't let it truncate the sheet
+        ws.reset_dimensions()
+        yield from ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def parse_rows(rows: Iterable[Sequence]) -> ParsedHoldings:
+    """Single pass over worksheet rows (see module docstring)."""
+    parsed = ParsedHoldings()
+    rows = iter(rows)
+
+    # 1. Header: first ISIN + name row within HEADER_SCAN_ROWS, else the first
+    #    ISIN + weight row, else the first ISIN row. Rows are buffered only
+    #    until the header turns up.
+    buffered = []
+    fallbacks = {}
+    header_idx = None
+    for idx, row in enumerate(rows):
+        if idx < TITLE_SCAN_ROWS:
+            parsed.title_cells.extend(_title_cells(idx, row))
+        buffered.append(row)
+        tier = _header_tier([str(c).strip().upper() for c in row if c is not None])
+        if tier == 1:
+            header_idx = idx
+            break
+        if tier:
+            fallbacks.setdefault(tier, idx)
+        if idx + 1 >= HEADER_SCAN_ROWS:
+            break
+
+    if header_idx is None:
+        header_idx = fallbacks.get(2, fallbacks.get(3))
+    if header_idx is None:
+        return parsed
+
+    header = buffered[header_idx]
+    parsed.header_row = header_idx
+    parsed.columns = [str(c).strip() if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+    parsed.column_map = score_columns(header)
+    if parsed.missing_columns:
+        return parsed
+
+    by_target = {target: i for i, target in parsed.column_map.items()}
+    isin_col, weight_col = by_target["ISIN"], by_target["Weight"]
+    name_col = by_target.get("Name")
+
+    # 2. Data rows: whatever was buffered past the header, then the rest of the sheet
+    isins, names, weights = [], [], []
+    seen = set()
+
+    def data_rows():
+        yield from buffered[header_idx + 1:]
+        for idx, row in enumerate(rows, start=len(buffered)):
+            if idx < TITLE_SCAN_ROWS:
+                parsed.title_cells.extend(_title_cells(idx, row))
+            yield row
+
+    for row in data_rows():
+        n = len(row)
+        raw_isin = row[isin_col] if isin_col < n else None
+        if raw_isin is None and not any(c is not None for c in row):
+            continue  # Blank row
+        parsed.rows_read += 1
+        if raw_isin is None or (isinstance(raw_isin, str) and not raw_isin.strip()):
+            parsed.missing_isin += 1
+            continue
+
+        raw_name = row[name_col] if name_col is not None and name_col < n else None
+        name = str(raw_name).strip() if raw_name is not None else "Unknown"
+
+        isin = str(raw_isin).strip().upper()
+        if not ISIN_PATTERN.match(isin):
+            parsed.invalid_isins.append({"ISIN": isin, "Name": name})
+            continue
+        if isin in seen:
+            parsed.duplicates.append({"ISIN": isin, "Name": name})
+            continue
+        seen.add(isin)
+
+        isins.append(isin)
+        names.append(name)
+        weights.append(clean_weight(row[weight_col] if weight_col < n else None))
+
+    parsed.isins = isins
+    parsed.names = names
+    parsed.weights = np.asarray(weights, dtype=np.float64)
+    total = float(parsed.weights.sum())
+    if 0 < total <= FRACTION_TOTAL_MAX:
+        # "% to Net Assets" stored as fractions (0.0952) and shown as 9.52%
+        parsed.weights *= 100.0
+    return parsed
+
+
+def parse_holdings_workbook(fileobj) -> ParsedHoldings:
+    """
+    Parses an uploaded holdings workbook (.xlsx streamed; .xls via pandas).
+    Raises if the file can't be read as a workbook at all.
+    """
+    fileobj.seek(0)
+    rows = _iter_sheet_rows(fileobj)
+    try:
+        return parse_rows(rows)
+    finally:
+        rows.close()  # Closes the workbook even if parse_rows stopped early
+        fileobj.seek(0)
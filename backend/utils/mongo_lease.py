@@ -0,0 +1,45 @@
+"""
+Mongo Lease - Leader election for in-process background jobs.
+
+Every uvicorn worker runs the same scheduler threads; a lease document in
+`scheduler_locks` ({_id: name, owner, expires_at}) decides which one does
+the work. The holder renews it by re-acquiring; if it dies the lease expires
+and another worker takes over.
+"""
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from core.logging import get_logger
+
+logger = get_logger("MongoLease")
+
+
+def acquire_lease(collection, name: str, owner: str, seconds: float) -> bool:
+    """
+    Takes or renews the lease. The filter only matches if we already own
+    it or it has expired; otherwise the upsert collides with the existing
+    _id and raises DuplicateKeyError, meaning another worker leads.
+    """
+    now = datetime.utcnow()
+    try:
+        doc = collection.find_one_and_update(
+            {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=seconds)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return bool(doc) and doc.get("owner") == owner
+    except DuplicateKeyError:
+        return False
+    except Exception as e:
+        logger.warning(f"Lease check for {name} failed: {e}")
+        return False
+
+
+def release_lease(collection, name: str, owner: str):
+    try:
+        collection.delete_one({"_id": name, "owner": owner})
+    except Exception as e:
+        logger.debug(f"Lease release for {name} failed: {e}")
@@ -0,0 +1,80 @@
+"""
+NAV Series
+
+Parsed, date-sorted view of a scheme's NAV history. mfapi.in returns rows as
+{"date": "DD-MM-YYYY", "nav": "123.45"} strings, newest first; this parses
+them once into parallel arrays (ascending date ordinals, float NAVs) so every
+lookup is an O(log n) bisect instead of a strptime walk over the whole list.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Tuple, Union
+
+NavPoint = Tuple[float, str]  # (nav, "DD-MM-YYYY")
+
+
+def _row_ordinal(date_str: str) -> int:
+    """Ordinal of a DD-MM-YYYY string without going through strptime."""
+    return date(int(date_str[6:10]), int(date_str[3:5]), int(date_str[0:2])).toordinal()
+
+
+def _to_ordinal(d: Union[date, datetime]) -> int:
+    if isinstance(d, datetime):
+        d = d.date()
+    return d.toordinal()
+
+
+class NavSeries:
+    """Immutable NAV history with bisect-based date lookups."""
+
+    __slots__ = ("ordinals", "navs", "dates")
+
+    def __init__(self, nav_data: Iterable[dict]):
+        points = {}
+        for row in nav_data:
+            try:
+                date_str = row["date"]
+                ordinal = _row_ordinal(date_str)
+                nav = float(row["nav"])
+            except Exception:
+                continue
+            # Input is newest-first; on a duplicated date keep the first row seen.
+            if ordinal not in points:
+                points[ordinal] = (nav, date_str)
+
+        ordered = sorted(points.items())
+        self.ordinals = array("l", (o for o, _ in ordered))
+        self.navs = array("d", (p[0] for _, p in ordered))
+        self.dates = [p[1] for _, p in ordered]
+
+    def __len__(self) -> int:
+        return len(self.ordinals)
+
+    def _point(self, idx: int) -> NavPoint:
+        return (self.navs[idx], self.dates[idx])
+
+    def latest(self, limit: int = 1) -> List[NavPoint]:
+        """Most recent `limit` points, newest first."""
+        n = len(self.ordinals)
+        return [self._point(i) for i in range(n - 1, max(n - limit, 0) - 1, -1)]
+
+    def on_or_before(self, target: Union[date, datetime]) -> Optional[NavPoint]:
+        """Last NAV dated on or before target (the NAV in force on that day)."""
+        idx = bisect_right(self.ordinals, _to_ordinal(target)) - 1
+        return self._point(idx) if idx >= 0 else None
+
+    def on_or_after(self, target: Union[date, datetime]) -> Optional[NavPoint]:
+        """First NAV dated on or after target (the NAV a purchase is allotted at)."""
+        idx = bisect_left(self.ordinals, _to_ordinal(target))
+        return self._point(idx) if idx < len(self.ordinals) else None
+
+    def on_or_before_many(self, targets: Iterable[Union[date, datetime]]) -> List[Optional[NavPoint]]:
+        return [self.on_or_before(t) for t in targets]
+
+    def on_or_after_many(self, targets: Iterable[Union[date, datetime]]) -> List[Optional[NavPoint]]:
+        return [self.on_or_after(t) for t in targets]
+
+
+EMPTY_SERIES = NavSeries(())
@@ -0,0 +1,89 @@
+"""
+Rate limiting for upstream APIs.
+
+- TokenBucket: refills at `rate` tokens per second up to `capacity`; each
+  call takes one token, waiting for it if the bucket is empty. Shared by
+  every thread in the process, so a pool of workers stays under an
+  upstream's per-second limit however many requests are in flight.
+- AdaptiveLimit: how many requests may be in flight at once, grown
+  additively while the upstream keeps up and halved when it pushes back
+  (AIMD), so throughput settles at what the upstream tolerates.
+"""
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Thread-safe token bucket."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Takes tokens if available and returns 0, else returns the seconds to wait."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        """Blocks until tokens are taken; False if that would exceed timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class AdaptiveLimit:
+    """
+    AIMD concurrency limit. Each success raises the limit by 1/limit (about
+    +1 per round of requests). A congestion signal halves it, at most once
+    per round: only requests started since the last decrease can cut it
+    again, so a burst of failures from one round counts once.
+    """
+
+    def __init__(self, initial: float, minimum: float = 1, maximum: float = 16):
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.limit = min(max(float(initial), self.minimum), self.maximum)
+        self._in_flight = 0
+        self._round = 0
+        self._cond = threading.Condition()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self) -> int:
+        """Waits for a slot; returns the round to pass back to release()."""
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+            return self._round
+
+    def release(self, round_: int, congested: bool = False):
+        with self._cond:
+            self._in_flight -= 1
+            if congested:
+                if round_ == self._round:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._round += 1
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
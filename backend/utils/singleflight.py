@@ -0,0 +1,182 @@
+"""
+Single-flight request coalescing.
+
+Concurrent callers asking for the same key while a fetch for it is already
+in flight wait for that fetch and share its result instead of issuing their
+own upstream request. Nothing is cached once the flight lands; that is the
+job of the caches in front of these calls.
+
+- SingleFlight: for threads (sync routes, thread pools).
+- AsyncSingleFlight: for coroutines on one event loop.
+
+Both offer do(key, fn) for one key and do_many(keys, fn) for batch fetches
+(e.g. quotes), where fn(keys) -> {key: value} is called only with the keys
+nobody else is already fetching.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List
+
+# Marks a key the leader's batch fetch returned no value for
+_MISSING = object()
+
+
+class SingleFlight:
+    """Thread-based in-flight deduplication."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Runs fn(*args, **kwargs) once per concurrent burst for key."""
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = Future()
+                self._calls[key] = fut
+        if not leader:
+            return fut.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def do_many(self, keys: Iterable[Hashable], fn: Callable[[List[Hashable]], Dict]) -> Dict:
+        """
+        Batch variant: fn is called with the keys not already in flight; keys
+        another caller is fetching are waited on. Returns {key: value} for the
+        keys that got a value. A failed leader's keys are simply absent.
+        """
+        own: List[Hashable] = []
+        waits: Dict[Hashable, Future] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                fut = self._calls.get(key)
+                if fut is None:
+                    self._calls[key] = Future()
+                    own.append(key)
+                else:
+                    waits[key] = fut
+
+        results = {}
+        if own:
+            try:
+                fetched = fn(own) or {}
+            except BaseException as e:
+                self._finish(own, lambda f, k: f.set_exception(e))
+                raise
+            self._finish(own, lambda f, k: f.set_result(fetched.get(k, _MISSING)))
+            results.update({k: fetched[k] for k in own if k in fetched})
+
+        for key, fut in waits.items():
+            try:
+                value = fut.result()
+            except Exception:
+                continue
+            if value is not _MISSING:
+                results[key] = value
+        return results
+
+    def _finish(self, keys, resolve):
+        with self._lock:
+            futs = [(k, self._calls.pop(k)) for k in keys]
+        for k, fut in futs:
+            resolve(fut, k)
+
+
+class AsyncSingleFlight:
+    """asyncio in-flight deduplication. Waiters are shielded, so a cancelled
+    waiter never cancels the shared fetch."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def _join(self, key: Hashable):
+        """Returns (future, is_leader) for key on the running loop."""
+        loop = asyncio.get_running_loop()
+        fut = self._calls.get(key)
+        if fut is not None and not fut.done() and fut.get_loop() is loop:
+            return fut, False
+        fut = loop.create_future()
+        self._calls[key] = fut
+        return fut, True
+
+    def _release(self, key: Hashable, fut: asyncio.Future):
+        if self._calls.get(key) is fut:
+            del self._calls[key]
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Awaits fn(*args, **kwargs) once per concurrent burst for key."""
+        while True:
+            fut, leader = self._join(key)
+            if not leader:
+                try:
+                    return await asyncio.shield(fut)
+                except asyncio.CancelledError:
+                    if fut.cancelled():
+                        # The leader was cancelled, not us: take over the fetch.
+                        continue
+                    raise
+
+            try:
+                result = await fn(*args, **kwargs)
+            except asyncio.CancelledError:
+                fut.cancel()
+                raise
+            except BaseException as e:
+                fut.set_exception(e)
+                # Waiters re-raise it; don't warn about an unretrieved exception.
+                fut.exception()
+                raise
+            else:
+                fut.set_result(result)
+                return result
+            finally:
+                self._release(key, fut)
+
+    async def do_many(self, keys: Iterable[Hashable],
+                      fn: Callable[[List[Hashable]], Awaitable[Dict]]) -> Dict:
+        """Batch variant of do(); see SingleFlight.do_many."""
+        own: Dict[Hashable, asyncio.Future] = {}
+        waits: Dict[Hashable, asyncio.Future] = {}
+        for key in dict.fromkeys(keys):
+            fut, leader = self._join(key)
+            (own if leader else waits)[key] = fut
+
+        results = {}
+        if own:
+            try:
+                fetched = await fn(list(own)) or {}
+            except BaseException:
+                for key, fut in own.items():
+                    fut.cancel()
+                    self._release(key, fut)
+                raise
+            for key, fut in own.items():
+                fut.set_result(fetched.get(key, _MISSING))
+                self._release(key, fut)
+            results.update({k: fetched[k] for k in own if k in fetched})
+
+        for key, fut in waits.items():
+            try:
+                value = await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    raise
+                continue
+            except Exception:
+                continue
+            if value is not _MISSING:
+                results[key] = value
+        return results
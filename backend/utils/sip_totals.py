@@ -0,0 +1,191 @@
+"""
+SIP Running Totals
+
+Everything a P&L read needs from a SIP fund's installments, kept on the
+holdings document as `sip_totals` and moved by `$inc` whenever an
+installment is added or changes, next to the document's own running
+`invested_amount` / `future_sip_units`:
+
+- counts: installments per status
+- allocated_units: units of PAID / ASSUMED_PAID installments (detailed mode)
+- pending_nav_count / pending_nav_amount: PAID, still waiting for a NAV
+- estimated_count: PAID with estimated (T+1) units
+- flows: date -> amount invested (PAID / ASSUMED_PAID), the XIRR cash flows
+- pending: date -> amount of PENDING installments (the "did you pay?" prompt)
+- last_date: latest installment date (ISO, kept with $max)
+
+Reads then never walk sip_installments, and writes touch only the changed
+installment (arrayFilters) instead of rewriting the array.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.date_utils import parse_date_from_str
+
+PREFIX = "sip_totals."
+INSTALLMENT_FIELDS = ("amount", "units", "nav", "nav_date", "status", "allocation_status", "is_estimated")
+
+# (old, new) installment pairs; old is None for an installment being added
+Changes = Iterable[Tuple[Optional[dict], dict]]
+
+
+def _iso_date(date_str) -> Optional[str]:
+    try:
+        return parse_date_from_str(date_str).strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+
+def contribution(inst: Optional[dict]) -> Dict[str, float]:
+    """What one installment adds to the running totals, as $inc paths."""
+    if not inst:
+        return {}
+    status = inst.get("status") or "PENDING"
+    amount = float(inst.get("amount") or 0)
+    units = inst.get("units")
+    date_str = inst.get("date")
+
+    inc = {f"{PREFIX}counts.{status}": 1}
+    if status == "PAID":
+        # Confirmed SIPs count as invested whether or not units are allocated yet
+        inc["invested_amount"] = amount
+        if units is not None:
+            inc["future_sip_units"] = float(units)
+        if units is None or inst.get("allocation_status") == "PENDING_NAV":
+            inc[f"{PREFIX}pending_nav_count"] = 1
+            inc[f"{PREFIX}pending_nav_amount"] = amount
+        if inst.get("allocation_status") == "ESTIMATED" or inst.get("is_estimated"):
+            inc[f"{PREFIX}estimated_count"] = 1
+    if status in ("PAID", "ASSUMED_PAID"):
+        if units is not None:
+            inc[f"{PREFIX}allocated_units"] = float(units)
+        if amount > 0 and date_str:
+            inc[f"{PREFIX}flows.{date_str}"] = amount
+    elif status == "PENDING" and date_str:
+        inc[f"{PREFIX}pending.{date_str}"] = amount
+    return inc
+
+
+def totals_delta(changes: Changes) -> Dict[str, float]:
+    """Net $inc for a set of installment changes; zero entries are dropped."""
+    inc: Dict[str, float] = {}
+    for old, new in changes:
+        for path, value in contribution(new).items():
+            inc[path] = inc.get(path, 0) + value
+        for path, value in contribution(old).items():
+            inc[path] = inc.get(path, 0) - value
+    return {path: value for path, value in inc.items() if value}
+
+
+class SipTotals:
+    """The stored sip_totals subdocument, as a small mutable object."""
+
+    __slots__ = ("counts", "allocated_units", "pending_nav_count", "pending_nav_amount",
+                 "estimated_count", "flows", "pending", "last_date")
+
+    def __init__(self, counts=None, allocated_units=0.0, pending_nav_count=0, pending_nav_amount=0.0,
+                 estimated_count=0, flows=None, pending=None, last_date=None):
+        self.counts: Dict[str, int] = dict(counts or {})
+        self.allocated_units = float(allocated_units or 0)
+        self.pending_nav_count = int(pending_nav_count or 0)
+        self.pending_nav_amount = float(pending_nav_amount or 0)
+        self.estimated_count = int(estimated_count or 0)
+        self.flows: Dict[str, float] = dict(flows or {})
+        self.pending: Dict[str, float] = dict(pending or {})
+        self.last_date: Optional[str] = last_date
+
+    @classmethod
+    def from_installments(cls, installments: Iterable[dict]) -> "SipTotals":
+        totals = cls()
+        for inst in installments:
+            totals.add(inst)
+        return totals
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "SipTotals":
+        """Stored totals when present, else derived from the installments (older documents)."""
+        stored = doc.get("sip_totals")
+        if stored is not None:
+            return cls(**{k: v for k, v in stored.items() if k in cls.__slots__})
+        return cls.from_installments(doc.get("sip_installments") or [])
+
+    def apply(self, inc: Dict[str, float]):
+        """Applies a $inc document in memory, the way Mongo would (other paths ignored)."""
+        for path, value in inc.items():
+            if not path.startswith(PREFIX):
+                continue
+            field, _, key = path[len(PREFIX):].partition(".")
+            if key:
+                bucket = getattr(self, field)
+                bucket[key] = bucket.get(key, 0) + value
+            else:
+                setattr(self, field, getattr(self, field) + value)
+
+    def add(self, inst: dict) -> "SipTotals":
+        self.apply(contribution(inst))
+        iso = _iso_date(inst.get("date"))
+        if iso and (self.last_date is None or iso > self.last_date):
+            self.last_date = iso
+        return self
+
+    def pending_installments(self) -> List[dict]:
+        """PENDING installments, oldest first, as the frontend prompt expects them."""
+        dates = [d for d, amount in self.pending.items() if amount > 0]
+        dates.sort(key=lambda d: _iso_date(d) or d)
+        return [{"date": d, "amount": self.pending[d], "status": "PENDING"} for d in dates]
+
+    def invested_flows(self) -> Dict[str, float]:
+        return {d: amount for d, amount in self.flows.items() if amount > 0}
+
+    def to_dict(self) -> dict:
+        return {
+            "counts": self.counts,
+            "allocated_units": self.allocated_units,
+            "pending_nav_count": self.pending_nav_count,
+            "pending_nav_amount": self.pending_nav_amount,
+            "estimated_count": self.estimated_count,
+            "flows": self.flows,
+            "pending": self.pending,
+            "last_date": self.last_date,
+        }
+
+
+def installment_update(doc: dict, changes: List[Tuple[Optional[dict], dict]],
+                       installments: List[dict]) -> Tuple[dict, Optional[List[dict]]]:
+    """
+    (update, array_filters) applying changes to a holdings document: added
+    installments are $push-ed, changed ones get $set on just their changed
+    fields through arrayFilters (matched on date and their old status), and
+    invested_amount, future_sip_units, sip_totals and version move by $inc.
+
+    installments is the document's list after the change; it is only read
+    for documents without stored sip_totals, which get them $set whole.
+    Pushing and editing sip_installments in one update would conflict, so
+    changes are either all additions or all edits.
+    """
+    update = {"$inc": {"version": 1, **totals_delta(changes)}}
+    if doc.get("sip_totals") is None:
+        update["$inc"] = {k: v for k, v in update["$inc"].items() if not k.startswith(PREFIX)}
+        update["$set"] = {"sip_totals": SipTotals.from_installments(installments).to_dict()}
+    else:
+        dates = [iso for iso in (_iso_date(new.get("date")) for _, new in changes) if iso]
+        if dates:
+            update["$max"] = {f"{PREFIX}last_date": max(dates)}
+
+    added = [new for old, new in changes if old is None]
+    if added:
+        update["$push"] = {"sip_installments": {"$each": added}}
+        return update, None
+
+    fields = update.setdefault("$set", {})
+    array_filters = []
+    for n, (old, new) in enumerate(changes):
+        name = f"i{n}"
+        for field in INSTALLMENT_FIELDS:
+            if new.get(field) != old.get(field):
+                fields[f"sip_installments.$[{name}].{field}"] = new.get(field)
+        array_filters.append({
+            f"{name}.date": old.get("date"),
+            f"{name}.status": old.get("status"),
+            f"{name}.allocation_status": old.get("allocation_status"),
+        })
+    return update, array_filters
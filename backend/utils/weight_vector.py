@@ -0,0 +1,188 @@
+"""
+Holdings Weight Vector
+
+A fund's holdings reduced to what the NAV estimate needs: the symbols, their
+weights as float64 fractions, and each symbol's Fyers form and exchange.
+Built once at upload time (stored on the holdings document as
+`weight_vector`) instead of re-filtering, rescaling and re-formatting the
+holdings list on every P&L call.
+
+A portfolio % change is then one dot product of the weights with a quotes
+array (NaN where no quote), and many funds at once are one matrix-vector
+product against the quotes of their symbol union.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Minimum fraction of portfolio weight that must be priced for an estimate
+MIN_COVERAGE = 0.75
+
+# A fund whose weights sum to at most this has them as fractions (0.0952 for
+# 9.52%, from sheets that show fractions through a % cell format); larger
+# totals are percents
+FRACTION_TOTAL_MAX = 1.5
+
+# Stored vectors of an older format (no fyers_symbols, or weights scaled per
+# holding instead of per fund) are rebuilt from the holdings
+VECTOR_FORMAT = 3
+
+
+def fraction_scale(weights: Iterable[float]) -> float:
+    """Factor turning one fund's stored weights into fractions: 1 for fractions, 0.01 for percents."""
+    return 1.0 if sum(weights) <= FRACTION_TOTAL_MAX else 0.01
+
+
+def fyers_symbol_for(symbol: str, exchange: str = "NSE") -> str:
+    """
+    Convert a holdings symbol to Fyers format.
+    Example: RELIANCE -> NSE:RELIANCE-EQ; already formatted symbols
+    (e.g. BSE:SBICARD-A) are returned as is.
+    """
+    symbol = symbol.upper().strip()
+    # Remove any existing suffix
+    if symbol.endswith(".NS") or symbol.endswith(".BO"):
+        symbol = symbol[:-3]
+    if symbol.endswith("-EQ"):
+        symbol = symbol[:-3]
+    if ":" in symbol:
+        return symbol  # Already formatted
+    return f"{exchange}:{symbol}-EQ"
+
+
+class WeightVector:
+    """
+    Symbols plus float64 weight fractions for one fund, with each holding's
+    pre-resolved Fyers symbol and exchange.
+    """
+
+    __slots__ = ("symbols", "weights", "fyers_symbols", "exchanges")
+
+    def __init__(self, symbols: Sequence[str], weights: Iterable[float],
+                 fyers_symbols: Optional[Sequence[str]] = None):
+        self.symbols: List[str] = list(symbols)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        if fyers_symbols is None or len(fyers_symbols) != len(self.symbols):
+            fyers_symbols = [fyers_symbol_for(s) for s in self.symbols]
+        self.fyers_symbols: List[str] = list(fyers_symbols)
+        self.exchanges: List[str] = [fs.split(":", 1)[0] for fs in self.fyers_symbols]
+
+    @classmethod
+    def from_holdings(cls, holdings: Iterable[dict]) -> "WeightVector":
+        """
+        Keeps holdings with a Symbol and positive Weight. Weights are percents
+        or fractions, decided once for the whole fund (see fraction_scale).
+        """
+        valid = [h for h in holdings if h.get("Symbol") and (h.get("Weight") or 0) > 0]
+        weights = np.fromiter((float(h["Weight"]) for h in valid), dtype=np.float64, count=len(valid))
+        return cls([h["Symbol"] for h in valid], weights * fraction_scale(weights))
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "WeightVector":
+        """Stored vector when present and current, else derived from the holdings list."""
+        stored = doc.get("weight_vector")
+        if is_current(stored) and stored.get("symbols"):
+            return cls(stored["symbols"], stored["weights"], stored.get("fyers_symbols"))
+        return cls.from_holdings(doc.get("holdings", []))
+
+    @property
+    def total_weight(self) -> float:
+        return float(self.weights.sum())
+
+    def to_dict(self) -> dict:
+        return {
+            "symbols": self.symbols,
+            "weights": self.weights.tolist(),
+            "fyers_symbols": self.fyers_symbols,
+            "exchanges": self.exchanges,
+            "total_weight": self.total_weight,
+            "format": VECTOR_FORMAT,
+        }
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def quotes(self, pct_changes: Dict[str, Optional[float]]) -> np.ndarray:
+        """Quotes aligned with symbols; NaN where a symbol has no quote."""
+        return _quotes_array(self.symbols, pct_changes)
+
+
+def is_current(stored: Optional[dict]) -> bool:
+    """Whether a stored weight_vector was written in the current format."""
+    return bool(stored) and stored.get("format") == VECTOR_FORMAT
+
+
+def _quotes_array(symbols: Sequence[str], pct_changes: Dict[str, Optional[float]]) -> np.ndarray:
+    values = (pct_changes.get(s) for s in symbols)
+    return np.fromiter(
+        (np.nan if v is None else float(v) for v in values), dtype=np.float64, count=len(symbols)
+    )
+
+
+def weighted_change(weights: np.ndarray, quotes: np.ndarray) -> Tuple[Optional[float], float, int]:
+    """
+    Weighted average % change over the priced holdings.
+
+    Returns (change, coverage, priced_count): change is None when nothing is
+    priced; coverage is the summed weight of priced holdings.
+    """
+    priced = ~np.isnan(quotes)
+    coverage = float(weights @ priced)
+    if coverage <= 0:
+        return None, 0.0, 0
+    return float(weights @ np.where(priced, quotes, 0.0)) / coverage, coverage, int(priced.sum())
+
+
+def weighted_changes(vectors: Sequence[WeightVector],
+                     pct_changes: Dict[str, Optional[float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    weighted_change for many funds at once. Builds a funds x symbols weight
+    matrix over the symbol union and does two matrix-vector products.
+
+    Returns (changes, coverages) as float64 arrays; changes is NaN where a
+    fund has nothing priced.
+    """
+    index: Dict[str, int] = {}
+    for v in vectors:
+        for s in v.symbols:
+            index.setdefault(s, len(index))
+
+    matrix = np.zeros((len(vectors), len(index)), dtype=np.float64)
+    for row, v in enumerate(vectors):
+        if len(v):
+            # add.at so a symbol listed twice in one fund keeps both weights
+            np.add.at(matrix[row], [index[s] for s in v.symbols], v.weights)
+
+    quotes = _quotes_array(list(index), pct_changes)
+    priced = ~np.isnan(quotes)
+    coverages = matrix @ priced
+    totals = matrix @ np.where(priced, quotes, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        changes = np.where(coverages > 0, totals / coverages, np.nan)
+    return changes, coverages
+
+
+def look_through_exposure(vectors: Sequence[WeightVector],
+                          values: Sequence[float]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Stock exposure across funds: each fund's value spread over its weights
+    and summed per symbol with one bincount over the symbol union.
+
+    Returns (symbols, exposure, fund_counts): exposure in the unit of values
+    (float64) and the number of distinct funds holding each symbol.
+    """
+    index: Dict[str, int] = {}
+    codes, amounts, owners = [], [], []
+    for fund, (v, value) in enumerate(zip(vectors, values)):
+        codes.extend(index.setdefault(s, len(index)) for s in v.symbols)
+        amounts.append(v.weights * float(value))
+        owners.append(np.full(len(v), fund, dtype=np.intp))
+    if not index:
+        return [], np.zeros(0, dtype=np.float64), np.zeros(0, dtype=np.intp)
+
+    codes = np.asarray(codes, dtype=np.intp)
+    exposure = np.bincount(codes, weights=np.concatenate(amounts), minlength=len(index))
+    # A symbol listed twice in one fund still counts that fund once
+    pairs = np.unique(np.concatenate(owners) * len(index) + codes)
+    fund_counts = np.bincount(pairs % len(index), minlength=len(index))
+    return list(index), exposure, fund_counts
@@ -7,11 +7,25 @@ Uses Newton-Raphson method to find the rate where NPV = 0.
 Cash Flow Convention:
 - Negative values = Investments (money out)
 - Positive values = Redemptions/current value (money in)
+
+Each cash-flow series is turned into two float64 arrays once (year
+fractions from the first date, and amounts), so NPV and its derivative are
+one NumPy pass per iteration. calculate_xirr_batch solves many series
+(e.g. every SIP fund of a portfolio) together: the series are padded into
+a matrix and Newton steps run on all unconverged rows at once. A one-in,
+one-out series (lumpsum) has a closed form and skips iteration entirely.
 """
 
 from datetime import date, datetime
-from typing import List, Tuple, Optional, Union
-import math
+from typing import List, Sequence, Tuple, Optional, Union
+
+import numpy as np
+
+# Rates are searched within -99% .. +1000%
+MIN_RATE = -0.99
+MAX_RATE = 10.0
+
+CashFlows = List[Tuple[Union[str, date, datetime], float]]
 
 
 def _parse_date(d: Union[str, date, datetime]) -> date:
@@ -31,52 +45,68 @@ def _parse_date(d: Union[str, date, datetime]) -> date:
     raise TypeError(f"Invalid date type: {type(d)}")
 
 
-def _xnpv(rate: float, cash_flows: List[Tuple[date, float]], base_date: date) -> float:
+def _xnpv(rate: float, times: np.ndarray, amounts: np.ndarray) -> float:
     """
-    Calculate Net Present Value for a given rate.
+    Net Present Value for a given rate.
     
-    NPV = Σ (Cash Flow_i / (1 + rate)^(days_i / 365))
+    NPV = Σ (Cash Flow_i / (1 + rate)^t_i), t_i = days_i / 365
     """
     if rate <= -1:
         return float('inf')  # Avoid division by zero or negative base
-    
-    npv = 0.0
-    for cf_date, amount in cash_flows:
-        days = (cf_date - base_date).days
-        if days < 0:
-            days = 0  # Shouldn't happen, but safety
-        try:
-            npv += amount / ((1 + rate) ** (days / 365.0))
-        except (OverflowError, ZeroDivisionError):
-            return float('inf')
-    return npv
+    with np.errstate(over='ignore', invalid='ignore'):
+        npv = float(amounts @ np.power(1.0 + rate, -times))
+    return npv if np.isfinite(npv) else float('inf')
 
 
-def _xnpv_derivative(rate: float, cash_flows: List[Tuple[date, float]], base_date: date) -> float:
+def _prepare(cash_flows: CashFlows):
     """
-    Calculate the derivative of NPV with respect to rate (for Newton-Raphson).
-    
-    d(NPV)/d(rate) = Σ (-days_i / 365) * Cash Flow_i / (1 + rate)^(days_i/365 + 1)
+    Validates and vectorizes one series. Returns ((times, amounts), None)
+    when it needs solving, else (None, result) (None / same-day simple
+    return / closed form).
     """
-    if rate <= -1:
-        return float('inf')
+    if not cash_flows or len(cash_flows) < 2:
+        return None, None
     
-    deriv = 0.0
-    for cf_date, amount in cash_flows:
-        days = (cf_date - base_date).days
-        if days < 0:
-            days = 0
-        exponent = days / 365.0
-        try:
-            deriv -= (exponent * amount) / ((1 + rate) ** (exponent + 1))
-        except (OverflowError, ZeroDivisionError):
-            return float('inf')
-    return deriv
+    # Parse and sort cash flows by date
+    try:
+        parsed_flows = [(parse_date(d), float(a)) for d, a in cash_flows]
+    except (ValueError, TypeError):
+        return None, None
+    
+    parsed_flows.sort(key=lambda x: x[0])
+    
+    ordinals = np.fromiter((d.toordinal() for d, _ in parsed_flows), dtype=np.float64, count=len(parsed_flows))
+    amounts = np.fromiter((a for _, a in parsed_flows), dtype=np.float64, count=len(parsed_flows))
+    
+    # Sanity checks
+    total_invested = float(amounts[amounts < 0].sum())
+    total_returned = float(amounts[amounts > 0].sum())
+    
+    if total_invested == 0 or total_returned == 0:
+        return None, None  # Need both investments and returns
+    
+    # Year fractions from the first date, computed once
+    times = (ordinals - ordinals[0]) / 365.0
+    
+    # Check if all cash flows are on the same date
+    if times[-1] == 0:
+        # All on same date - simple return
+        simple_return = (total_returned + total_invested) / abs(total_invested)
+        return None, simple_return * 100  # As percentage
+    
+    # Closed form for one investment and one return: c0 + c1 * (1+r)^-t = 0
+    if len(amounts) == 2 and times[0] == 0:
+        with np.errstate(over='ignore'):
+            rate = float(np.power(-amounts[1] / amounts[0], 1.0 / times[1])) - 1.0
+        # Bounded like the Newton steps below
+        return None, min(max(rate, MIN_RATE), MAX_RATE) * 100
+    
+    return (times, amounts), None
 
 
 def calculate_xirr(
-    cash_flows: List[Tuple[Union[str, date, datetime], float]],
-    guess: float = 0.1,
+    cash_flows: CashFlows,
+    guess: Optional[float] = 0.1,
     max_iterations: int = 100,
     tolerance: float = 1e-7
 ) -> Optional[float]:
@@ -87,7 +117,8 @@ def calculate_xirr(
         cash_flows: List of (date, amount) tuples. 
                     Negative amounts = investments
                     Positive amounts = returns/current value
-        guess: Initial guess for the rate (default 10%)
+        guess: Initial guess for the rate (default 10%); pass the fund's
+               previous XIRR (as a fraction) to warm-start
         max_iterations: Maximum Newton-Raphson iterations
         tolerance: Convergence tolerance
         
@@ -103,77 +134,114 @@ def calculate_xirr(
         >>> xirr = calculate_xirr(cash_flows)
         >>> print(f"{xirr:.2f}%")  # ~10.00%
     """
-    if not cash_flows or len(cash_flows) < 2:
-        return None
+    return calculate_xirr_batch([cash_flows], [guess], max_iterations, tolerance)[0]
+
+
+def calculate_xirr_batch(
+    flow_sets: Sequence[CashFlows],
+    guesses: Optional[Sequence[Optional[float]]] = None,
+    max_iterations: int = 100,
+    tolerance: float = 1e-7
+) -> List[Optional[float]]:
+    """
+    calculate_xirr for many cash-flow series at once (same conventions and
+    results). guesses, if given, is aligned with flow_sets; None entries
+    start from 10%.
+    """
+    results: List[Optional[float]] = [None] * len(flow_sets)
+    pending = []  # (position, times, amounts, guess)
     
-    # Parse and sort cash flows by date
-    try:
-        parsed_flows = [(parse_date(d), float(a)) for d, a in cash_flows]
-    except (ValueError, TypeError) as e:
-        return None
+    for pos, flows in enumerate(flow_sets):
+        arrays, result = _prepare(flows)
+        if arrays is None:
+            results[pos] = result
+            continue
+        guess = guesses[pos] if guesses is not None else None
+        pending.append((pos, *arrays, 0.1 if guess is None else guess))
     
-    parsed_flows.sort(key=lambda x: x[0])
+    if not pending:
+        return results
     
-    # Sanity checks
-    total_invested = sum(a for _, a in parsed_flows if a < 0)
-    total_returned = sum(a for _, a in parsed_flows if a > 0)
+    # Pad to a (series x flows) matrix; padded slots have amount 0 and add nothing
+    width = max(len(p[1]) for p in pending)
+    times = np.zeros((len(pending), width), dtype=np.float64)
+    amounts = np.zeros((len(pending), width), dtype=np.float64)
+    for row, (_, t, a, _) in enumerate(pending):
+        times[row, :len(t)] = t
+        amounts[row, :len(a)] = a
     
-    if total_invested == 0 or total_returned == 0:
-        return None  # Need both investments and returns
+    guesses_arr = np.array([p[3] for p in pending], dtype=np.float64)
+    solved = _newton(times, amounts, guesses_arr, max_iterations, tolerance)
     
-    base_date = parsed_flows[0][0]
+    # A warm start far from the root can walk Newton onto a bound; those
+    # series get a second, cold solve from the default guess
+    retry = np.flatnonzero(((solved == MIN_RATE) | (solved == MAX_RATE)) & (guesses_arr != 0.1))
+    if retry.size:
+        solved[retry] = _newton(times[retry], amounts[retry], np.full(retry.size, 0.1),
+                                max_iterations, tolerance)
     
-    # Check if all cash flows are on the same date
-    unique_dates = set(d for d, _ in parsed_flows)
-    if len(unique_dates) == 1:
-        # All on same date - simple return
-        if abs(total_invested) > 0:
-            simple_return = (total_returned + total_invested) / abs(total_invested)
-            return simple_return * 100  # As percentage
-        return None
-    
-    # Newton-Raphson iteration
-    rate = guess
+    for row, (pos, t, a, _) in enumerate(pending):
+        if np.isfinite(solved[row]):
+            results[pos] = float(solved[row]) * 100  # Return as percentage
+        else:
+            # If Newton-Raphson didn't converge, try bisection as fallback
+            results[pos] = _bisection_xirr(t, a)
+    return results
+
+
+def _newton(times: np.ndarray, amounts: np.ndarray, guesses: np.ndarray,
+            max_iterations: int, tolerance: float) -> np.ndarray:
+    """
+    Newton-Raphson on every row of (series x flows) matrices at once.
+    Returns the rates, NaN where a series did not converge.
+    """
+    rates = np.clip(guesses, MIN_RATE, MAX_RATE)
+    solved = np.full(len(rates), np.nan)
+    active = np.ones(len(rates), dtype=bool)
     
-    for i in range(max_iterations):
-        npv = _xnpv(rate, parsed_flows, base_date)
-        deriv = _xnpv_derivative(rate, parsed_flows, base_date)
+    for _ in range(max_iterations):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        r = rates[idx]
+        t = times[idx]
+        with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+            disc = np.power((1.0 + r)[:, None], -t)
+            weighted = amounts[idx] * disc
+            npv = weighted.sum(axis=1)
+            # d(NPV)/d(rate) = Σ -t_i * CF_i / (1 + rate)^(t_i + 1)
+            deriv = -(t * weighted).sum(axis=1) / (1.0 + r)
+            step = npv / deriv
         
-        if abs(deriv) < 1e-10:
-            # Derivative too small, try adjusting rate
-            if rate > 0:
-                rate = rate * 0.5
-            else:
-                rate = 0.1
-            continue
-            
-        # Newton-Raphson step
-        new_rate = rate - npv / deriv
+        # Overflow: leave the series to bisection
+        broken = ~(np.isfinite(npv) & np.isfinite(deriv))
+        # Derivative too small, try adjusting rate
+        flat = ~broken & (np.abs(deriv) < 1e-10)
+        moving = ~broken & ~flat
         
         # Bound the rate to reasonable values (-99% to 1000%)
-        new_rate = max(-0.99, min(10.0, new_rate))
+        new_rates = np.clip(r - np.where(moving, step, 0.0), MIN_RATE, MAX_RATE)
+        new_rates = np.where(flat, np.where(r > 0, r * 0.5, 0.1), new_rates)
         
-        if abs(new_rate - rate) < tolerance:
-            return new_rate * 100  # Return as percentage
-            
-        rate = new_rate
-    
-    # If Newton-Raphson didn't converge, try bisection as fallback
-    return _bisection_xirr(parsed_flows, base_date)
+        converged = moving & (np.abs(new_rates - r) < tolerance)
+        solved[idx[converged]] = new_rates[converged]
+        active[idx[converged | broken]] = False
+        rates[idx] = new_rates
+    return solved
 
 
 def _bisection_xirr(
-    cash_flows: List[Tuple[date, float]], 
-    base_date: date,
-    low: float = -0.99,
-    high: float = 10.0,
+    times: np.ndarray,
+    amounts: np.ndarray,
+    low: float = MIN_RATE,
+    high: float = MAX_RATE,
     max_iterations: int = 100,
     tolerance: float = 1e-6
 ) -> Optional[float]:
     """Fallback bisection method for XIRR when Newton-Raphson fails."""
     
-    npv_low = _xnpv(low, cash_flows, base_date)
-    npv_high = _xnpv(high, cash_flows, base_date)
+    npv_low = _xnpv(low, times, amounts)
+    npv_high = _xnpv(high, times, amounts)
 
     # Check if solution exists in range
     if npv_low * npv_high > 0:
@@ -184,7 +252,7 @@ def _bisection_xirr(
     
     for _ in range(max_iterations):
         mid = (low + high) / 2
-        npv_mid = _xnpv(mid, cash_flows, base_date)
+        npv_mid = _xnpv(mid, times, amounts)
         
         if abs(npv_mid) < tolerance or (high - low) / 2 < tolerance:
             return mid * 100
@@ -203,13 +271,74 @@ def _bisection_xirr(
 parse_date = _parse_date
 
 
-# Convenience function for SIP calculations
+def sip_cash_flows(
+    installments: List[dict],
+    current_value: float,
+    current_date: Union[str, date, datetime] = None
+) -> Optional[List[Tuple[date, float]]]:
+    """
+    Cash flows for a SIP's XIRR: each PAID / ASSUMED_PAID installment as an
+    investment at its own date plus the current value. None when there is
+    nothing (meaningful) to annualize yet.
+    """
+    # Add ALL installments (PAID and ASSUMED_PAID) as individual cash flows
+    # CAS amounts ARE the actual cashflows - stamp duty is included implicitly
+    # Units are already adjusted for stamp duty deduction
+    invested = [
+        (inst.get("date"), inst.get("amount", 0)) for inst in installments
+        if inst.get("status", "") in ("PAID", "ASSUMED_PAID")
+    ]
+    return invested_cash_flows(invested, current_value, current_date)
+
+
+def invested_cash_flows(
+    invested: Sequence[Tuple[Union[str, date, datetime], float]],
+    current_value: float,
+    current_date: Union[str, date, datetime] = None
+) -> Optional[List[Tuple[date, float]]]:
+    """
+    sip_cash_flows from (date, amount invested) pairs, e.g. the flows kept in
+    a fund's sip_totals (see utils.sip_totals) or several funds' flows for a
+    portfolio XIRR. Investments on the same day are merged into one flow.
+    """
+    if current_date is None:
+        current_date = date.today()
+    else:
+        current_date = parse_date(current_date)
+    
+    by_date = {}
+    for inst_date, amount in invested:
+        try:
+            inst_date = parse_date(inst_date)
+            amount = float(amount)
+            if amount > 0:
+                # Use raw amount as cashflow (stamp duty already included in CAS)
+                by_date[inst_date] = by_date.get(inst_date, 0.0) - amount  # Negative = investment
+        except (ValueError, TypeError):
+            continue
+    cash_flows = sorted(by_date.items())
+    
+    if not cash_flows:
+        return None  # No investments to calculate
+
+    # Annualizing a holding younger than ~30 days produces wild, meaningless
+    # numbers (a 1% week becomes ~68% "annualized"); suppress XIRR until then.
+    earliest = min(d for d, _ in cash_flows)
+    if (current_date - earliest).days < 30:
+        return None
+
+    # Add current value as positive cash flow (return)
+    cash_flows.append((current_date, current_value))
+    return cash_flows
+
+
 def calculate_sip_xirr(
     installments: List[dict],
     current_value: float,
     current_date: Union[str, date, datetime] = None,
     manual_invested_amount: float = 0.0,
-    sip_start_date: Union[str, date, datetime] = None
+    sip_start_date: Union[str, date, datetime] = None,
+    guess: Optional[float] = None
 ) -> Optional[float]:
     """
     Calculate XIRR specifically for SIP investments.
@@ -220,6 +349,7 @@ def calculate_sip_xirr(
         current_date: Date for current value (defaults to today)
         manual_invested_amount: DEPRECATED - kept for backward compatibility, ignored
         sip_start_date: DEPRECATED - kept for backward compatibility, ignored
+        guess: Warm start, e.g. the fund's previous XIRR as a fraction
         
     Returns:
         XIRR as percentage or None
@@ -229,41 +359,7 @@ def calculate_sip_xirr(
         at its actual date. CAS amounts ARE the actual invested amounts - stamp duty
         is already included implicitly and units are already adjusted.
     """
-    from datetime import date as date_type
-    
-    if current_date is None:
-        current_date = date_type.today()
-    else:
-        current_date = parse_date(current_date)
-    
-    cash_flows = []
-    
-    # Add ALL installments (PAID and ASSUMED_PAID) as individual cash flows
-    # CAS amounts ARE the actual cashflows - stamp duty is included implicitly
-    # Units are already adjusted for stamp duty deduction
-    for inst in installments:
-        status = inst.get("status", "")
-        if status in ("PAID", "ASSUMED_PAID"):
-            try:
-                inst_date = parse_date(inst["date"])
-                amount = float(inst.get("amount", 0))
-                if amount > 0:
-                    # Use raw amount as cashflow (stamp duty already included in CAS)
-                    cash_flows.append((inst_date, -amount))  # Negative = investment
-            except (ValueError, KeyError):
-                continue
-    
-    if not cash_flows:
-        return None  # No investments to calculate
-
-    # Annualizing a holding younger than ~30 days produces wild, meaningless
-    # numbers (a 1% week becomes ~68% "annualized"); suppress XIRR until then.
-    earliest = min(d for d, _ in cash_flows)
-    if (current_date - earliest).days < 30:
+    cash_flows = sip_cash_flows(installments, current_value, current_date)
+    if cash_flows is None:
         return None
-
-    # Add current value as positive cash flow (return)
-    cash_flows.append((current_date, current_value))
-
-    return calculate_xirr(cash_flows)
-
+    return calculate_xirr(cash_flows, guess=guess)